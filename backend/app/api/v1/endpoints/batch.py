@@ -1,74 +1,73 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
+from fastapi import APIRouter, BackgroundTasks, UploadFile, File, HTTPException, Depends
 from fastapi.responses import FileResponse
 import os
 import logging
 
+from app.core.config import settings
+from app.db.session import run_in_db_executor
 from app.services import batch as batch_service
-from app.utils.csv_parser import parse_csv_content, generate_sample_csv
+from app.utils.csv_parser import generate_sample_csv
+from app.utils.ingest import file_size as upload_size
 from app.api.deps import get_current_user
 from app.services.storage import storage
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
-MAX_FILE_SIZE = 5 * 1024 * 1024  # 5MB
-MAX_VENDORS_PER_BATCH = 500
+MAX_FILE_SIZE = settings.BATCH_MAX_FILE_SIZE_MB * 1024 * 1024
+MAX_VENDORS_PER_BATCH = settings.BATCH_MAX_VENDORS
 
 @router.post("/upload")
 async def upload_batch(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     current_user: dict = None  # Made optional for MVP
 ):
     """
     Upload a CSV for batch processing - Now async!
     Returns immediately with job_id for status polling
+
+    The CSV is streamed: rows are parsed and stored in chunks straight from
+    the upload, never read into memory as a whole. The vendors are checked by
+    a background task (run on Starlette's threadpool, off the event loop).
     """
     if not file.filename.endswith('.csv'):
         raise HTTPException(status_code=400, detail="Only CSV files are supported")
     
-    file.file.seek(0, 2)
-    file_size = file.file.tell()
-    file.file.seek(0)
-    
-    if file_size > MAX_FILE_SIZE:
-        raise HTTPException(status_code=400, detail="File too large")
-    
-    content = await file.read()
-    items, errors = parse_csv_content(content)
-    
-    if not items:
-        raise HTTPException(status_code=400, detail={"message": "No valid vendors found", "errors": errors[:10]})
+    if upload_size(file.file) > MAX_FILE_SIZE:
+        raise HTTPException(status_code=400, detail=f"File too large (max {settings.BATCH_MAX_FILE_SIZE_MB} MB)")
     
-    if len(items) > MAX_VENDORS_PER_BATCH:
-        raise HTTPException(status_code=400, detail=f"Maximum {MAX_VENDORS_PER_BATCH} vendors allowed")
-    
-    # Create batch job
-    result = batch_service.create_batch(items, file.filename, user_id=current_user.get("id") if current_user else None)
+    # Create batch job, parsing and storing the CSV chunk by chunk
+    result = await run_in_db_executor(
+        batch_service.create_batch_from_upload,
+        file.file,
+        file.filename,
+        user_id=current_user.get("id") if current_user else None,
+        max_vendors=MAX_VENDORS_PER_BATCH
+    )
+    errors = result["errors"]
+    if result.get("limit_exceeded"):
+        raise HTTPException(status_code=400, detail=result["error"])
+    if "error" in result:
+        raise HTTPException(status_code=400, detail={"message": result["error"], "errors": errors[:10]})
     job_id = result['job_id']
+    total = result['total_vendors']
     
-    # Process batch synchronously (optimized - takes 5-10 seconds)
-    logger.info(f"Starting synchronous batch processing for job {job_id} - {len(items)} vendors")
-    try:
-        batch_service.process_batch_sync(job_id)
-        logger.info(f"Batch processing completed for job {job_id}")
-        
-        # Get final status
-        final_status = batch_service.get_batch_status(job_id)
-        
-        return {
-            "job_id": job_id,
-            "total": len(items), # Fix for frontend which expects 'total'
-            "total_vendors": len(items),
-            "status": final_status.get('status', 'COMPLETED'),
-            "processed": final_status.get('processed', len(items)),
-            "success": final_status.get('success', 0),
-            "failed": final_status.get('failed', 0),
-            "message": f"Batch processed successfully - {final_status.get('success', 0)} succeeded, {final_status.get('failed', 0)} failed",
-            "parse_errors": errors[:5] if errors else []
-        }
-    except Exception as e:
-        logger.error(f"Batch processing failed for job {job_id}: {str(e)}", exc_info=True)
-        raise HTTPException(status_code=500, detail=f"Batch processing failed: {str(e)}")
+    # Processing runs after the response is sent; progress via /status/{job_id}
+    logger.info(f"Queued batch processing for job {job_id} - {total} vendors")
+    background_tasks.add_task(batch_service.run_batch_job, job_id, result['items'])
+    
+    return {
+        "job_id": job_id,
+        "total": total, # Fix for frontend which expects 'total'
+        "total_vendors": total,
+        "status": "PENDING",
+        "processed": 0,
+        "success": 0,
+        "failed": 0,
+        "message": f"Batch job created - {total} vendors queued for processing",
+        "parse_errors": errors[:5] if errors else []
+    }
 
 @router.get("/status/{job_id}")
 async def get_job_status(job_id: str, current_user: dict = None):
@@ -5,10 +5,11 @@ import logging
 
 from app.schemas.check import CheckRequest, CheckResponse, VendorDetail
 from app.services.decision import DecisionEngine
-from app.services.gsp import get_gsp_provider
+from app.services.gsp_async import get_async_gsp_provider
 from app.services.pdf import generate_certificate
-from app.db.crud import vendor as vendor_crud
+from app.services.vendor_cache import vendor_cache
 from app.db.crud import check as check_crud
+from app.db.session import run_in_db_executor
 from app.api.deps import limiter
 from app.core.config import settings
 from app.utils.validation import validator
@@ -25,6 +26,9 @@ async def check_compliance(request: Request, check_request: CheckRequest):
     
     Returns minimal response with certificate URL.
     PDF is generated on-demand when certificate is downloaded.
+    
+    Fully non-blocking: GSP calls go through the async provider and
+    DB calls run on the bounded DB executor.
     """
     start_time = datetime.now()
     gstin = check_request.gstin.strip().upper()
@@ -40,15 +44,23 @@ async def check_compliance(request: Request, check_request: CheckRequest):
         raise HTTPException(status_code=400, detail=error_msg)
     
     # Fetch vendor data from GSP (or cache)
-    vendor_data = vendor_crud.get_cached_vendor(gstin, max_age_hours=24)
+    vendor_data, status = vendor_cache.lookup_local(gstin) or await run_in_db_executor(vendor_cache.lookup, gstin)
     data_source = "CACHE"
     
-    if not vendor_data:
-        provider = get_gsp_provider()
-        vendor_data = provider.get_vendor_data(gstin)
+    if status == vendor_cache.STALE:
+        # Serve the stale entry now, refresh it in the background
+        data_source = "CACHE_STALE"
+        provider = await get_async_gsp_provider()
+        provider.revalidate(gstin)
+    elif status == vendor_cache.NEGATIVE:
+        # Lookup failed recently - don't hit the GSP again until the entry expires
+        data_source = "CACHE_NEGATIVE"
+    elif not vendor_data:
+        provider = await get_async_gsp_provider()
+        vendor_data = await provider.get_vendor_data(gstin)
         data_source = "GSP_LIVE"
         if vendor_data:
-            vendor_crud.save_vendor(vendor_data)
+            await run_in_db_executor(vendor_cache.set, vendor_data)
     
     # Run decision engine
     result = engine.check_vendor(vendor_data, check_request.amount)
@@ -62,7 +74,8 @@ async def check_compliance(request: Request, check_request: CheckRequest):
     }
     
     # Save to database
-    check_id = check_crud.save_compliance_check(
+    check_id = await run_in_db_executor(
+        check_crud.save_compliance_check,
         gstin=gstin,
         vendor_name=vendor_data.get("legal_name", check_request.party_name) if vendor_data else check_request.party_name,
         amount=check_request.amount,
@@ -97,8 +110,8 @@ async def check_compliance(request: Request, check_request: CheckRequest):
 async def get_vendor_details(gstin: str):
     """Get detailed vendor information with decision."""
     gstin = gstin.strip().upper()
-    provider = get_gsp_provider()
-    vendor_data = provider.get_vendor_data(gstin)
+    provider = await get_async_gsp_provider()
+    vendor_data = await provider.get_vendor_data(gstin)
     if not vendor_data:
         raise HTTPException(status_code=404, detail="Vendor not found")
     
@@ -128,11 +141,13 @@ async def get_vendor_history(gstin: str):
 async def download_certificate(check_id: int):
     """Download Due Diligence Certificate PDF."""
     try:
-        check = check_crud.get_check_by_id(check_id)
+        check = await run_in_db_executor(check_crud.get_check_by_id, check_id)
         if not check:
             raise HTTPException(status_code=404, detail="Check not found")
         
-        vendor_data = vendor_crud.get_cached_vendor(check["gstin"])
+        # Memory tier first; Redis / database lookups run off the event loop
+        gstin = check["gstin"]
+        vendor_data, _ = vendor_cache.lookup_local(gstin) or await run_in_db_executor(vendor_cache.lookup, gstin)
         filing_history = vendor_data.get("filing_history", []) if vendor_data else []
         registration_date = vendor_data.get("registration_date", "") if vendor_data else ""
         gst_status = vendor_data.get("gst_status", "") if vendor_data else ""
@@ -4,10 +4,12 @@ Handles OTP flow and GSTR-2B data synchronization
 """
 from fastapi import APIRouter, Depends, HTTPException, status
 from pydantic import BaseModel, Field
+from datetime import datetime
 from typing import Optional
 from app.api.deps import get_current_user
 from app.services.gsp import get_gsp_provider
 from app.db.crud import gst_credentials, gstr2b_data
+from app.db.session import run_in_db_executor
 import logging
 
 logger = logging.getLogger(__name__)
@@ -188,11 +190,12 @@ async def sync_gstr2b_data(
     """
     Fetch and sync GSTR-2B data for a specific return period.
     
-    This downloads all invoices from GSTR-2B and stores them for reconciliation.
+    This downloads all invoices from GSTR-2B and stores the changes since the
+    last sync (inserted, updated and removed invoices) for reconciliation.
     """
     try:
         # Get stored credentials
-        credential = gst_credentials.get_gst_credential(current_user["id"], request.gstin)
+        credential = await run_in_db_executor(gst_credentials.get_gst_credential, current_user["id"], request.gstin)
         
         if not credential or not credential["is_active"]:
             raise HTTPException(
@@ -202,42 +205,50 @@ async def sync_gstr2b_data(
         
         gsp = get_gsp_provider()
         
-        if not hasattr(gsp, 'fetch_gstr2b'):
+        if not hasattr(gsp, 'stream_gstr2b'):
             raise HTTPException(
                 status_code=status.HTTP_501_NOT_IMPLEMENTED,
                 detail="GSTR-2B is only available with Sandbox GSP provider"
             )
         
-        # Fetch GSTR-2B data from GSP
-        result = gsp.fetch_gstr2b(
+        # Stream GSTR-2B data from GSP (parsed and stored chunk by chunk). The request
+        # and the sync that reads the body both block, so they run on the DB executor
+        invoices = await run_in_db_executor(
+            gsp.stream_gstr2b,
             gstin=request.gstin,
             return_period=request.return_period,
             auth_token=credential["auth_token"]
         )
+        fetched_at = datetime.now().isoformat()
         
-        if not result:
+        if invoices is None:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Failed to fetch GSTR-2B data. Token may have expired."
             )
         
-        # Delete existing data for this period (if re-syncing)
-        gstr2b_data.delete_gstr2b_data(current_user["id"], request.return_period)
-        
-        # Store invoices in database
-        inserted_count = gstr2b_data.bulk_insert_gstr2b_invoices(
+        # Apply only what changed since the last sync (per-supplier, then per-invoice hashes)
+        counts = await run_in_db_executor(
+            gstr2b_data.sync_gstr2b_period,
             user_id=current_user["id"],
-            invoices=result["invoices"]
+            return_period=request.return_period,
+            invoices=invoices
         )
         
-        logger.info(f"Synced {inserted_count} invoices for GSTIN: {request.gstin}, Period: {request.return_period}")
+        logger.info(f"Synced GSTIN: {request.gstin}, Period: {request.return_period} - "
+                    f"{counts['inserted']} inserted, {counts['updated']} updated, {counts['deleted']} removed")
         
         return {
             "message": "GSTR-2B data synced successfully",
             "gstin": request.gstin,
             "return_period": request.return_period,
-            "total_invoices": inserted_count,
-            "fetched_at": result["fetched_at"]
+            "total_invoices": counts["inserted"] + counts["updated"] + counts["unchanged"],
+            "inserted_invoices": counts["inserted"],
+            "updated_invoices": counts["updated"],
+            "removed_invoices": counts["deleted"],
+            "unchanged_invoices": counts["unchanged"],
+            "suppliers_changed": counts["suppliers_changed"],
+            "fetched_at": fetched_at
         }
         
     except HTTPException:
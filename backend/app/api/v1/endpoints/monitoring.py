@@ -111,7 +111,7 @@ async def get_system_metrics():
             """)
             cache_stats = dict(cursor.fetchall())
             
-            cache_hits = cache_stats.get('CACHE', 0)
+            cache_hits = sum(count for source, count in cache_stats.items() if source and source.startswith('CACHE'))
             total_recent = sum(cache_stats.values())
             cache_hit_rate = (cache_hits / total_recent * 100) if total_recent > 0 else 0
             
@@ -128,6 +128,46 @@ async def get_system_metrics():
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/db/pool")
+async def get_db_pool_stats():
+    """
+    Get database connection pool metrics (in-use, idle, checkouts/sec, wait times)
+    """
+    from app.db.session import get_pool_stats
+    
+    return {
+        **get_pool_stats(),
+        "timestamp": datetime.now().isoformat()
+    }
+
+
+@router.get("/gsp/http-pool")
+async def get_gsp_http_pool_stats():
+    """
+    Get connection reuse and pool wait statistics for the shared GSP HTTP session
+    """
+    from app.services.gsp import get_http_pool_stats
+    
+    return {
+        **get_http_pool_stats(),
+        "timestamp": datetime.now().isoformat()
+    }
+
+
+@router.get("/cache/vendor")
+async def get_vendor_cache_stats():
+    """
+    Get per-tier hit/miss counters for the vendor cache (memory, Redis, database)
+    """
+    from app.services.vendor_cache import vendor_cache
+    
+    return {
+        "tiers": vendor_cache.stats(),
+        "freshness": vendor_cache.freshness_stats(),
+        "timestamp": datetime.now().isoformat()
+    }
+
+
 @router.post("/batch/cleanup")
 async def cleanup_old_batches(days: int = 7):
     """
@@ -1,72 +1,395 @@
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends
-from typing import Dict, List, Any
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends, Query
+from fastapi.responses import FileResponse, StreamingResponse
+from typing import Dict, List, Any, Optional, Tuple
+import csv
+import io
+import itertools
+import json
 import logging
 
 from app.api.deps import get_current_user
-from app.services.reconciliation import ReconciliationEngine
-from app.utils.file_parser import parse_purchase_register
+from app.core.config import settings
+from app.db.session import run_in_db_executor
+from app.services.reconciliation import (
+    RESULT_CATEGORIES, ReconciliationEngine, reconciliation_fingerprint, summarize_results
+)
+from app.services.reconciliation_partitioned import reconcile_partitioned
+from app.services.storage import storage
+from app.utils.file_parser import iter_purchase_register
+from app.utils.ingest import file_sha256
+from app.utils.pagination import PaginatedResponse, PaginationParams, decode_cursor, encode_cursor
 from app.db.crud import gstr2b_data
+from app.db.crud import reconciliation as recon_crud
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+TOLERANCE = 2.0  # Rs 2 tolerance
+
+# Parse errors returned with a run
+MAX_PARSE_ERRORS = 5
+
+# Rows fetched per query while streaming an export
+EXPORT_BATCH_ROWS = 5000
+EXPORT_COLUMNS = ("category", "gstin", "vendor_name", "invoice_number", "invoice_date", "pr_amount",
+                  "gstr2b_amount", "difference", "status", "message", "gstr2b_invoice_number",
+                  "gstr2b_invoice_date", "confidence")
+
+
+def _read_register(file, filename: str, partitioned: bool):
+    """
+    Parse the uploaded register chunk by chunk.
+
+    Returns:
+        (pr_items, errors, partitioned). pr_items is a list of every row, or -
+        for partitioned runs, requested or once the register passes
+        RECONCILIATION_PARTITION_THRESHOLD rows - an iterator that goes on
+        parsing while reconcile_partitioned spills it; errors (the first
+        MAX_PARSE_ERRORS) fills up as it is consumed.
+    """
+    chunks = iter_purchase_register(file, filename)
+    pr_items, errors = [], []
+
+    def remaining():
+        for items, chunk_errors in chunks:
+            errors.extend(chunk_errors[:MAX_PARSE_ERRORS - len(errors)])
+            yield from items
+
+    for items, chunk_errors in chunks:
+        errors.extend(chunk_errors[:MAX_PARSE_ERRORS - len(errors)])
+        pr_items.extend(items)
+        if pr_items and (partitioned or len(pr_items) > settings.RECONCILIATION_PARTITION_THRESHOLD):
+            return itertools.chain(pr_items, remaining()), errors, True
+    return pr_items, errors, partitioned
+
+
+def _find_cached_run(user_id: str, file, filename: str, return_period: str,
+                     partitioned: bool) -> Tuple[str, Optional[Dict]]:
+    """(fingerprint of this run's inputs, the stored run with that fingerprint or None)"""
+    version = gstr2b_data.get_period_version(user_id, return_period)
+    fingerprint = reconciliation_fingerprint(file_sha256(file), filename, return_period, version,
+                                             partitioned, TOLERANCE)
+    return fingerprint, recon_crud.find_cached_run(user_id, fingerprint)
+
+
+def _store_results(run_id: str, results: Dict[str, List[Dict]]) -> None:
+    for category in RESULT_CATEGORIES:
+        recon_crud.add_results(run_id, category, results[category])
+
+
+def _reconcile_inline(user_id: str, run_id: str, return_period: str, pr_items: List[Dict],
+                      parse_errors: List[str]) -> Tuple[Dict, Dict[str, List[Dict]]]:
+    """Match in memory, store the results and complete the run -> (summary, results)"""
+    # 2. Fetch GSTR-2B Data
+    gstr2b_items = gstr2b_data.get_invoices_by_period(user_id, return_period)
+
+    if not gstr2b_items:
+        # Informative message if 2B data is missing but proceed with matching (which will result in all Missing in 2B)
+        logger.warning(f"No GSTR-2B data found for period {return_period}. All items will be 'Missing in 2B'.")
+
+    # 3. Run Matching Logic
+    engine = ReconciliationEngine(tolerance=TOLERANCE)
+    results = engine.match_invoices(pr_items, gstr2b_items)
+
+    # 4. Store the run with its Summary Stats
+    summary = {
+        "total_pr": len(pr_items),
+        "total_2b": len(gstr2b_items),
+        **summarize_results(results),
+        "parse_errors": parse_errors
+    }
+    _store_results(run_id, results)
+    recon_crud.complete_run(run_id, summary)
+    return summary, results
+
+
+def _reconcile_partitioned(user_id: str, run_id: str, return_period: str, pr_items,
+                           parse_errors: List[str]) -> Tuple[Dict, Dict]:
+    """
+    Reconcile partition by partition, storing results as they come, and
+    complete the run -> (summary, result file). If this raises, the caller's
+    fail_run drops the results stored so far.
+    """
+    run = reconcile_partitioned(
+        user_id,
+        pr_items,
+        gstr2b_data.iter_invoices_by_period(user_id, return_period),
+        tolerance=TOLERANCE,
+        run_id=run_id,
+        on_results=_result_recorder(run_id),
+    )
+    # parse_errors fills up while pr_items is consumed, so the summary is built after the run
+    summary = {**run["summary"], "parse_errors": parse_errors}
+    result = run["result"]
+    try:
+        recon_crud.complete_run(run_id, summary, result_key=result["key"], result_format=result["format"])
+    except Exception:
+        # The run will be marked FAILED; nothing would point at the file any more
+        storage.delete_file(result["key"])
+        raise
+    return summary, result
+
+
+def _result_recorder(run_id: str):
+    """on_results callback for partitioned runs: seq keeps counting across partitions"""
+    next_seq = dict.fromkeys(RESULT_CATEGORIES, 0)
+
+    def record(category: str, rows: List[Dict]):
+        next_seq[category] += recon_crud.add_results(run_id, category, rows, first_seq=next_seq[category])
+    return record
+
+
+def _cached_response(run: Dict, include_results: bool) -> Dict[str, Any]:
+    """POST /run response for a stored run with the same fingerprint"""
+    response = {
+        "run_id": run["id"],
+        "summary": run["summary"],
+        "period": run["return_period"],
+        "cached": True
+    }
+    if run.get("result_key"):
+        response["result"] = {
+            "key": run["result_key"],
+            "format": run["result_format"],
+            "download_url": f"{settings.API_V1_STR}/reconcile/results/{run['id']}"
+        }
+    if include_results:
+        response["results"] = recon_crud.get_results(run["id"], RESULT_CATEGORIES)
+    return response
+
+
+async def _get_run_or_404(current_user: dict, run_id: str) -> Dict:
+    run = await run_in_db_executor(recon_crud.get_run, current_user["id"], run_id)
+    if not run:
+        raise HTTPException(status_code=404, detail="Reconciliation run not found")
+    return run
+
+
 @router.post("/run", response_model=Dict[str, Any])
 async def run_reconciliation(
     return_period: str = Form(..., description="Return period in MMYYYY format (e.g. 112024)"),
     file: UploadFile = File(...),
+    partitioned: bool = Form(False, description="Reconcile partition by partition and store the results as a file"),
+    include_results: bool = Form(False, description="Also return every result inline (small registers only)"),
     current_user: dict = Depends(get_current_user)
 ):
     """
     Run GSTR-2B Reconciliation.
-    
-    1. Upload Purchase Register (Excel/CSV)
+
+    1. Upload Purchase Register (Excel/CSV), parsed chunk by chunk from the upload
     2. Fetch GSTR-2B data for the period
-    3. Match invoices (Fuzzy Logic)
-    4. Return detailed results
+    3. Match invoices (exact, then a fuzzy pass over the leftovers)
+    4. Store the run and return its id and summary
+
+    A repeat upload of the same file for a period whose GSTR-2B data has not
+    changed since (RECONCILIATION_CACHE) returns the earlier run with
+    "cached": true, without parsing or matching again.
+
+    Results are fetched per category with GET /runs/{run_id}/results/{category}
+    or exported with GET /runs/{run_id}/export. Partitioned runs (requested, or
+    registers above RECONCILIATION_PARTITION_THRESHOLD rows) stream the GSTR-2B
+    data, reconcile per GSTIN partition and also write a result file
+    (GET /results/{run_id}).
     """
-    
+
     # Validate file type
     if not file.filename.lower().endswith(('.csv', '.xlsx', '.xls')):
         raise HTTPException(status_code=400, detail="Only .csv, .xlsx, .xls files are supported")
-    
+
+    run_id = None
     try:
         # 1. Parse Purchase Register
-        content = await file.read()
-        pr_items, errors = parse_purchase_register(content, file.filename)
-        
+        fingerprint = None
+        if settings.RECONCILIATION_CACHE:
+            fingerprint, cached_run = await run_in_db_executor(
+                _find_cached_run, current_user["id"], file.file, file.filename, return_period, partitioned
+            )
+            if cached_run:
+                logger.info(f"Reconciliation cache hit for period {return_period}: run {cached_run['id']}")
+                return await run_in_db_executor(_cached_response, cached_run, include_results)
+
+        pr_items, parse_errors, partitioned = await run_in_db_executor(
+            _read_register, file.file, file.filename, partitioned
+        )
+
         if not pr_items:
-            raise HTTPException(status_code=400, detail={"message": "No valid invoices found in file", "errors": errors[:5]})
-        
-        # 2. Fetch GSTR-2B Data
-        gstr2b_items = gstr2b_data.get_invoices_by_period(current_user["id"], return_period)
-        
-        if not gstr2b_items:
-            # Informative message if 2B data is missing but proceed with matching (which will result in all Missing in 2B)
-            logger.warning(f"No GSTR-2B data found for period {return_period}. All items will be 'Missing in 2B'.")
-            
-        # 3. Run Matching Logic
-        engine = ReconciliationEngine(tolerance=2.0) # Rs 2 tolerance
-        results = engine.match_invoices(pr_items, gstr2b_items)
-        
-        # Calculate Summary Stats
-        summary = {
-            "total_pr": len(pr_items),
-            "total_2b": len(gstr2b_items),
-            "matched": len(results["matched"]),
-            "mismatch": len(results["mismatch"]),
-            "missing_in_2b": len(results["missing_in_2b"]),
-            "missing_in_pr": len(results["missing_in_pr"]),
-            "parse_errors": errors[:5] if errors else []
-        }
-        
-        return {
+            raise HTTPException(status_code=400, detail={"message": "No valid invoices found in file", "errors": parse_errors})
+
+        run_id = await run_in_db_executor(
+            recon_crud.create_run, current_user["id"], return_period, file.filename,
+            mode="partitioned" if partitioned else "inline", fingerprint=fingerprint
+        )
+
+        if partitioned:
+            summary, result = await run_in_db_executor(
+                _reconcile_partitioned, current_user["id"], run_id, return_period, pr_items, parse_errors
+            )
+            result["download_url"] = f"{settings.API_V1_STR}/reconcile/results/{run_id}"
+            return {
+                "run_id": run_id,
+                "summary": summary,
+                "result": result,
+                "period": return_period,
+                "cached": False
+            }
+
+        # 2-4. Fetch GSTR-2B data, match and store the run (off the event loop)
+        summary, results = await run_in_db_executor(
+            _reconcile_inline, current_user["id"], run_id, return_period, pr_items, parse_errors
+        )
+
+        response = {
+            "run_id": run_id,
             "summary": summary,
-            "results": results,
-            "period": return_period
+            "period": return_period,
+            "cached": False
         }
+        if include_results:
+            response["results"] = results
+        return response
 
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Reconciliation failed: {str(e)}", exc_info=True)
+        if run_id:
+            await run_in_db_executor(recon_crud.fail_run, run_id, str(e))
         raise HTTPException(status_code=500, detail=f"Reconciliation failed: {str(e)}")
+
+
+@router.get("/runs", response_model=PaginatedResponse[Dict[str, Any]])
+async def list_reconciliation_runs(
+    page: int = Query(1, ge=1),
+    page_size: int = Query(20, ge=1, le=100),
+    current_user: dict = Depends(get_current_user)
+):
+    """The user's reconciliation runs, newest first"""
+    pagination = PaginationParams(page=page, page_size=page_size)
+    runs, total = await run_in_db_executor(
+        recon_crud.list_runs, current_user["id"], pagination.limit, pagination.offset
+    )
+    return PaginatedResponse.create(items=runs, total=total, page=page, page_size=page_size)
+
+
+@router.get("/runs/{run_id}", response_model=Dict[str, Any])
+async def get_reconciliation_run(run_id: str, current_user: dict = Depends(get_current_user)):
+    """Status and summary of a reconciliation run"""
+    return await _get_run_or_404(current_user, run_id)
+
+
+@router.delete("/runs/{run_id}")
+async def delete_reconciliation_run(run_id: str, current_user: dict = Depends(get_current_user)):
+    """Delete a run, its stored results and its result file"""
+    run = await _get_run_or_404(current_user, run_id)
+    await run_in_db_executor(recon_crud.delete_run, current_user["id"], run_id)
+    if run.get("result_key"):
+        await run_in_db_executor(storage.delete_file, run["result_key"])
+    return {"message": "Reconciliation run deleted", "run_id": run_id}
+
+
+@router.get("/runs/{run_id}/results/{category}", response_model=PaginatedResponse[Dict[str, Any]])
+async def get_reconciliation_results(
+    run_id: str,
+    category: str,
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    page_size: int = Query(50, ge=1, le=500),
+    sort: str = Query("seq", description="seq, amount, gstin or difference; prefix '-' for descending"),
+    gstin: Optional[str] = Query(None, description="Only this supplier GSTIN"),
+    min_amount: Optional[float] = Query(None),
+    max_amount: Optional[float] = Query(None),
+    current_user: dict = Depends(get_current_user)
+):
+    """One page of a run's results in a category (matched, mismatch, probable_match, missing_in_2b, missing_in_pr)"""
+    await _get_run_or_404(current_user, run_id)
+    if category not in RESULT_CATEGORIES:
+        raise HTTPException(status_code=404, detail=f"Unknown category '{category}'")
+    if sort not in recon_crud.RESULT_SORTS:
+        raise HTTPException(status_code=400, detail=f"sort must be one of {', '.join(recon_crud.RESULT_SORTS)}")
+
+    page, after = 1, None
+    if cursor:
+        position = decode_cursor(cursor)
+        if (not position or position.get("sort") != sort or not isinstance(position.get("after"), list)
+                or not isinstance(position.get("page"), int)):
+            raise HTTPException(status_code=400, detail="Invalid cursor for this sort order")
+        page, after = position["page"], position["after"]
+
+    items, total, last = await run_in_db_executor(
+        recon_crud.get_results_page, run_id, category, sort, page_size, after, gstin, min_amount, max_amount
+    )
+    next_cursor = encode_cursor({"sort": sort, "after": last, "page": page + 1}) if last else None
+    return PaginatedResponse.create(items=items, total=total, page=page, page_size=page_size, next_cursor=next_cursor)
+
+
+@router.get("/runs/{run_id}/export")
+async def export_reconciliation_results(
+    run_id: str,
+    format: str = Query("csv", description="csv or ndjson"),
+    category: Optional[str] = Query(None, description="One category (default: all)"),
+    sort: str = Query("seq"),
+    gstin: Optional[str] = Query(None),
+    min_amount: Optional[float] = Query(None),
+    max_amount: Optional[float] = Query(None),
+    current_user: dict = Depends(get_current_user)
+):
+    """Stream a run's results as CSV or NDJSON, EXPORT_BATCH_ROWS rows per query"""
+    await _get_run_or_404(current_user, run_id)
+    if format not in ("csv", "ndjson"):
+        raise HTTPException(status_code=400, detail="format must be csv or ndjson")
+    if category is not None and category not in RESULT_CATEGORIES:
+        raise HTTPException(status_code=404, detail=f"Unknown category '{category}'")
+    if sort not in recon_crud.RESULT_SORTS:
+        raise HTTPException(status_code=400, detail=f"sort must be one of {', '.join(recon_crud.RESULT_SORTS)}")
+    categories = [category] if category else list(RESULT_CATEGORIES)
+
+    def batches():
+        # Keyset batches, each its own short query - nothing is held open between chunks
+        for name in categories:
+            after = None
+            while True:
+                rows, _, after = recon_crud.get_results_page(
+                    run_id, name, sort, EXPORT_BATCH_ROWS, after, gstin, min_amount, max_amount, with_total=False
+                )
+                if rows:
+                    yield name, rows
+                if len(rows) < EXPORT_BATCH_ROWS:
+                    break
+
+    def ndjson():
+        for name, rows in batches():
+            yield "".join(json.dumps({"category": name, **row}) + "\n" for row in rows)
+
+    def csv_lines():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_COLUMNS)
+        for name, rows in batches():
+            writer.writerows([name] + [row.get(column) for column in EXPORT_COLUMNS[1:]] for row in rows)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        csv_lines() if format == "csv" else ndjson(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="reconciliation-{run_id}.{format}"'}
+    )
+
+
+@router.get("/results/{run_id}")
+async def download_reconciliation_results(run_id: str, current_user: dict = Depends(get_current_user)):
+    """Download the result file of a partitioned reconciliation run"""
+    run = await _get_run_or_404(current_user, run_id)
+    if not run.get("result_key"):
+        raise HTTPException(status_code=404, detail="This run has no result file")
+
+    if storage.use_s3:
+        return {"download_url": storage.generate_download_url(run["result_key"]), "expires_in": 3600}
+
+    path = storage.local_path(run["result_key"])
+    if path is None:
+        raise HTTPException(status_code=404, detail="Result file not found")
+    return FileResponse(path, media_type="application/octet-stream", filename=path.name)
@@ -15,6 +15,14 @@ class Settings(BaseModel):
     # Base directory
     BASE_DIR: str = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
     BATCH_OUTPUT_DIR: str = os.path.join(BASE_DIR, "output", "batches")
+    # Batch results are written behind: flushed every N items or T milliseconds
+    BATCH_WRITE_FLUSH_ITEMS: int = int(os.getenv("BATCH_WRITE_FLUSH_ITEMS", "100"))
+    BATCH_WRITE_FLUSH_MS: int = int(os.getenv("BATCH_WRITE_FLUSH_MS", "250"))
+    # Batch uploads are streamed, so these bound processing time rather than memory
+    BATCH_MAX_FILE_SIZE_MB: int = int(os.getenv("BATCH_MAX_FILE_SIZE_MB", "50"))
+    BATCH_MAX_VENDORS: int = int(os.getenv("BATCH_MAX_VENDORS", "10000"))
+    # Rows per chunk when reading uploaded CSV / Excel files
+    INGEST_CHUNK_ROWS: int = int(os.getenv("INGEST_CHUNK_ROWS", "5000"))
     
     # Security
     SECRET_KEY: str = os.getenv("JWT_SECRET_KEY", "")
@@ -30,6 +38,18 @@ class Settings(BaseModel):
     DB_POOL_MAX_CONN: int = int(os.getenv("DB_POOL_MAX_CONN", "50"))
     DB_CONNECT_TIMEOUT: int = int(os.getenv("DB_CONNECT_TIMEOUT", "10"))
     DB_STATEMENT_TIMEOUT: int = int(os.getenv("DB_STATEMENT_TIMEOUT", "30000"))  # 30 seconds
+    # Max seconds to wait for a free pooled connection before failing
+    DB_POOL_CHECKOUT_TIMEOUT: float = float(os.getenv("DB_POOL_CHECKOUT_TIMEOUT", "30"))
+    # Connections idle longer than this (seconds) are pinged before being handed out
+    DB_POOL_VALIDATE_AFTER: float = float(os.getenv("DB_POOL_VALIDATE_AFTER", "30"))
+    # Threads for running blocking DB calls from async endpoints (keep <= DB_POOL_MAX_CONN)
+    DB_EXECUTOR_MAX_WORKERS: int = int(os.getenv("DB_EXECUTOR_MAX_WORKERS", "20"))
+    
+    # SQLite engine (no DATABASE_URL): persistent per-thread connections in WAL mode
+    SQLITE_BUSY_TIMEOUT_MS: int = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "15000"))
+    SQLITE_SYNCHRONOUS: str = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")  # NORMAL is safe with WAL
+    SQLITE_CACHE_SIZE_KB: int = int(os.getenv("SQLITE_CACHE_SIZE_KB", "16384"))  # 16MB page cache per connection
+    SQLITE_MMAP_SIZE: int = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))  # 256MB
     
     # GSP Configuration
     # Modes: "mock" (default), "sandbox" (zoop.one)
@@ -37,10 +57,38 @@ class Settings(BaseModel):
     SANDBOX_CLIENT_ID: Optional[str] = os.getenv("SANDBOX_CLIENT_ID")
     SANDBOX_SECRET: Optional[str] = os.getenv("SANDBOX_SECRET")
     
+    # Max in-flight GSP lookups for bulk vendor fetches (get_vendor_data_many)
+    GSP_MAX_CONCURRENCY: int = int(os.getenv("GSP_MAX_CONCURRENCY", "10"))
+    # Keep-alive connections to the GSP host; match the batch worker count (30)
+    GSP_HTTP_POOL_SIZE: int = int(os.getenv("GSP_HTTP_POOL_SIZE", "30"))
+    
+    # Fuzzy second pass pairing missing_in_2b / missing_in_pr rows as probable matches
+    RECONCILIATION_FUZZY_MATCH: bool = os.getenv("RECONCILIATION_FUZZY_MATCH", "true").lower() == "true"
+    RECONCILIATION_FUZZY_MIN_CONFIDENCE: float = float(os.getenv("RECONCILIATION_FUZZY_MIN_CONFIDENCE", "0.75"))
+    RECONCILIATION_FUZZY_MAX_EDITS: int = int(os.getenv("RECONCILIATION_FUZZY_MAX_EDITS", "3"))
+    RECONCILIATION_FUZZY_DATE_WINDOW_DAYS: int = int(os.getenv("RECONCILIATION_FUZZY_DATE_WINDOW_DAYS", "30"))
+    # Registers above this many rows are reconciled partition by partition, results to storage
+    RECONCILIATION_PARTITION_THRESHOLD: int = int(os.getenv("RECONCILIATION_PARTITION_THRESHOLD", "200000"))
+    RECONCILIATION_PARTITIONS: int = int(os.getenv("RECONCILIATION_PARTITIONS", "64"))
+    # Result file of partitioned runs: "parquet", "arrow" (IPC) or "csv"
+    RECONCILIATION_RESULT_FORMAT: str = os.getenv("RECONCILIATION_RESULT_FORMAT", "parquet")
+    # Re-running the same register against unchanged GSTR-2B data returns the stored run
+    RECONCILIATION_CACHE: bool = os.getenv("RECONCILIATION_CACHE", "true").lower() == "true"
+    
     # Redis Cache Configuration
     # Redis Cache Configuration
     # Defaults to None if not set or invalid
     REDIS_URL: Optional[str] = os.getenv("REDIS_URL")
+    
+    # In-process vendor cache (sits in front of Redis and the vendors table)
+    VENDOR_CACHE_MAX_ENTRIES: int = int(os.getenv("VENDOR_CACHE_MAX_ENTRIES", "10000"))
+    VENDOR_CACHE_MAX_BYTES: int = int(os.getenv("VENDOR_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))  # 64MB
+    VENDOR_CACHE_TTL: int = int(os.getenv("VENDOR_CACHE_TTL", "300"))  # 5 minutes
+    
+    # Redis value encoding: "json" or "msgpack"; compression "none", "zlib" or "lz4"
+    CACHE_SERIALIZER: str = os.getenv("CACHE_SERIALIZER", "json")
+    CACHE_COMPRESSION: str = os.getenv("CACHE_COMPRESSION", "zlib")
+    CACHE_COMPRESS_MIN_BYTES: int = int(os.getenv("CACHE_COMPRESS_MIN_BYTES", "1024"))
 
     # CORS
     BACKEND_CORS_ORIGINS: Union[List[str], str] = os.getenv(
@@ -1,6 +1,6 @@
 from typing import Optional, List, Dict
 from datetime import datetime
-from app.db.session import get_connection, ph, row_to_dict
+from app.db.session import get_connection, ph, row_to_dict, sqlite_insert_returning_ids, DB_ENGINE
 
 def create_batch_job(job_id: str, total_count: int, input_filename: str) -> str:
     """Create a new batch job"""
@@ -14,16 +14,43 @@ def create_batch_job(job_id: str, total_count: int, input_filename: str) -> str:
     return job_id
 
 
-def add_batch_items(batch_id: str, items: List[Dict]):
-    """Add multiple items to a batch job"""
+def add_batch_items(batch_id: str, items: List[Dict]) -> List[Dict]:
+    """
+    Add multiple items to a batch job in bulk.
+    
+    Returns:
+        The created items (with their generated ids), in input order - the same
+        shape get_batch_items(batch_id, status="PENDING") would return
+    """
+    if not items:
+        return []
+    
+    rows = [
+        (batch_id, item['gstin'], item.get('vendor_name', ''), item.get('amount', 0), 'PENDING')
+        for item in items
+    ]
+    
     with get_connection() as (conn, cursor):
-        for item in items:
-            cursor.execute(f"""
+        if DB_ENGINE == "postgres":
+            import psycopg2.extras
+            # Multi-row INSERT ... VALUES (...), (...) RETURNING id, one statement per page
+            returned = psycopg2.extras.execute_values(cursor, """
                 INSERT INTO batch_items (batch_id, gstin, vendor_name, amount, status)
-                VALUES ({ph(5)})
-            """, (batch_id, item['gstin'], item.get('vendor_name', ''), item.get('amount', 0), 'PENDING'))
+                VALUES %s RETURNING id
+            """, rows, page_size=1000, fetch=True)
+            ids = [row_to_dict(row)['id'] for row in returned]
+        else:
+            ids = sqlite_insert_returning_ids(
+                cursor, "batch_items", ["batch_id", "gstin", "vendor_name", "amount", "status"], rows
+            )
         
         conn.commit()
+    
+    return [
+        {"id": item_id, "batch_id": batch_id, "gstin": gstin, "vendor_name": vendor_name,
+         "amount": amount, "status": status}
+        for item_id, (batch_id, gstin, vendor_name, amount, status) in zip(ids, rows)
+    ]
 
 
 def get_batch_job(job_id: str) -> Optional[Dict]:
@@ -67,6 +94,19 @@ def update_batch_job_status(job_id: str, status: str, error_message: str = None)
         conn.commit()
 
 
+def fail_batch_job(job_id: str, error_message: str):
+    """Mark a batch job FAILED and delete the items stored for it so far, in one transaction"""
+    with get_connection() as (conn, cursor):
+        cursor.execute(f"DELETE FROM batch_items WHERE batch_id = {ph()}", (job_id,))
+        cursor.execute(f"""
+            UPDATE batch_jobs 
+            SET status = 'FAILED', completed_at = {ph()}, error_message = {ph()}
+            WHERE id = {ph()}
+        """, (datetime.now().isoformat(), error_message, job_id))
+        
+        conn.commit()
+
+
 def update_batch_job_progress(job_id: str, processed: int, success: int, failed: int):
     """Update batch job progress counters"""
     with get_connection() as (conn, cursor):
@@ -94,6 +134,54 @@ def update_batch_item(item_id: int, status: str, decision: str = None,
         conn.commit()
 
 
+def update_batch_items(updates: List[Dict]):
+    """
+    Update many batch items in one transaction.
+    
+    Args:
+        updates: dicts with item_id, status and optionally decision, check_id,
+            error_message, risk_level, reason (as for update_batch_item)
+    """
+    if not updates:
+        return
+    
+    rows = [
+        (u["item_id"], u["status"], u.get("decision"), u.get("check_id"),
+         u.get("error_message"), u.get("risk_level"), u.get("reason"))
+        for u in updates
+    ]
+    
+    with get_connection() as (conn, cursor):
+        if DB_ENGINE == "postgres":
+            import psycopg2.extras
+            psycopg2.extras.execute_values(cursor, """
+                UPDATE batch_items AS b
+                SET status = v.status, decision = v.decision, check_id = v.check_id,
+                    error_message = v.error_message, risk_level = v.risk_level, reason = v.reason
+                FROM (VALUES %s) AS v (id, status, decision, check_id, error_message, risk_level, reason)
+                WHERE b.id = v.id
+            """, rows, template="(%s::uuid, %s, %s, %s::uuid, %s, %s, %s)", page_size=1000)
+        else:
+            cursor.executemany(f"""
+                UPDATE batch_items 
+                SET status = {ph()}, decision = {ph()}, check_id = {ph()}, 
+                    error_message = {ph()}, risk_level = {ph()}, reason = {ph()}
+                WHERE id = {ph()}
+            """, [row[1:] + row[:1] for row in rows])
+        
+        conn.commit()
+
+
+def set_batch_total_count(job_id: str, total_count: int):
+    """Set the item count of a batch job whose items were added in chunks"""
+    with get_connection() as (conn, cursor):
+        cursor.execute(f"""
+            UPDATE batch_jobs SET total_count = {ph()} WHERE id = {ph()}
+        """, (total_count, job_id))
+        
+        conn.commit()
+
+
 def set_batch_output_file(job_id: str, output_filename: str):
     """Set the output ZIP filename for a batch job"""
     with get_connection() as (conn, cursor):
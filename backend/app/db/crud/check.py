@@ -1,5 +1,5 @@
 from typing import Optional, List, Dict
-from app.db.session import get_connection, ph, row_to_dict, DB_ENGINE
+from app.db.session import get_connection, ph, row_to_dict, sqlite_insert_returning_ids, DB_ENGINE
 
 def save_compliance_check(
     gstin: str,
@@ -35,6 +35,46 @@ def save_compliance_check(
     return check_id
 
 
+def save_compliance_checks(checks: List[Dict]) -> List:
+    """
+    Save many compliance check results in one transaction.
+    
+    Args:
+        checks: dicts with the save_compliance_check arguments as keys
+        
+    Returns:
+        Generated IDs, in input order
+    """
+    if not checks:
+        return []
+    
+    rows = [
+        (c["gstin"], c.get("vendor_name"), c.get("amount"), c["decision"], c.get("rule_id"),
+         c.get("reason"), c.get("risk_level"), c.get("data_source"), c.get("certificate_url"))
+        for c in checks
+    ]
+    
+    with get_connection() as (conn, cursor):
+        if DB_ENGINE == "postgres":
+            import psycopg2.extras
+            returned = psycopg2.extras.execute_values(cursor, """
+                INSERT INTO compliance_checks 
+                (gstin, vendor_name, amount, decision, rule_id, reason, risk_level, data_source, certificate_url)
+                VALUES %s
+                RETURNING id
+            """, rows, page_size=1000, fetch=True)
+            check_ids = [row_to_dict(row)["id"] for row in returned]
+        else:
+            check_ids = sqlite_insert_returning_ids(cursor, "compliance_checks", [
+                "gstin", "vendor_name", "amount", "decision", "rule_id", "reason", "risk_level",
+                "data_source", "certificate_url",
+            ], rows)
+        
+        conn.commit()
+    
+    return check_ids
+
+
 def get_recent_checks(limit: int = 50) -> List[Dict]:
     """Get recent compliance checks"""
     with get_connection() as (conn, cursor):
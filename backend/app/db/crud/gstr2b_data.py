@@ -2,63 +2,385 @@
 CRUD Operations for GSTR-2B Data
 Handles storing and retrieving GSTR-2B invoice data
 """
-import uuid
-from datetime import datetime
-from typing import Optional, Dict, List
-from app.db.session import get_connection, ph
+import csv
+import hashlib
+import io
+from typing import Optional, Dict, List, Iterable, Iterator, Callable
+from app.db.session import get_connection, ph, DB_ENGINE
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+# Upsert key - UNIQUE (user_id, gstin_supplier, invoice_no, return_period)
+_KEY_COLUMNS = ("gstin_supplier", "invoice_no", "return_period")
+# Invoice fields covered by content_hash
+_HASHED_COLUMNS = ("invoice_date", "invoice_value", "taxable_value", "tax_amount", "filing_status")
+_DATA_COLUMNS = _HASHED_COLUMNS + ("source", "content_hash")
+_STAGING_COLUMNS = _KEY_COLUMNS + _DATA_COLUMNS
+
+# Invoices staged per COPY / executemany call; bounds memory for streamed payloads
+STAGING_CHUNK_SIZE = 5000
+# Values per IN (...) list in incremental sync deletes
+LOOKUP_CHUNK_SIZE = 500
+
+# Supplier hashes are the sum of per-invoice hashes of (gstin, invoice_no,
+# content_hash) (128-bit), so they can be built while streaming and do not
+# depend on invoice order
+_HASH_BITS = 128
+_HASH_MOD = 1 << _HASH_BITS
+
+
+def _content_hash(values) -> str:
+    joined = "\x1f".join("" if value is None else str(value) for value in values)
+    return hashlib.blake2b(joined.encode(), digest_size=_HASH_BITS // 8).hexdigest()
+
+
+def _staging_rows(invoices: List[Dict], return_period: Optional[str] = None) -> List[tuple]:
+    """
+    Invoice dicts from the GSP -> staging rows (_STAGING_COLUMNS order),
+    de-duplicated on the upsert key (last one wins). return_period, if given,
+    overrides the invoices' own period.
+    """
+    rows = {}
+    for inv in invoices:
+        key = (inv.get("supplier_gstin"), inv.get("invoice_no"), return_period or inv.get("return_period"))
+        data = (
+            inv.get("invoice_date"),
+            inv.get("invoice_value"),
+            inv.get("taxable_value"),
+            inv.get("tax_amount"),
+            inv.get("filing_status", "Y"),
+        )
+        rows[key] = key + data + ("GSTR-2B", _content_hash(data))
+    return list(rows.values())
+
+
+def _chunks(items: Iterable, size: int = LOOKUP_CHUNK_SIZE) -> Iterator[List]:
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _stage_invoices(cursor, invoices: Iterable[Dict], return_period: Optional[str] = None,
+                    on_rows: Optional[Callable[[List[tuple]], None]] = None) -> int:
+    """
+    Load invoices into the gstr_2b_staging temp table, STAGING_CHUNK_SIZE at a
+    time (COPY on PostgreSQL, executemany on SQLite). invoices may be any
+    iterable, e.g. a streaming parser; on_rows sees every chunk of staging rows.
+    Staging ends up unique on the invoice key (last one wins).
+    
+    Returns:
+        Number of rows staged (before cross-chunk de-duplication)
+    """
+    staged = 0
+    if DB_ENGINE == "postgres":
+        cursor.execute("""
+            CREATE TEMP TABLE gstr_2b_staging (
+                gstin_supplier TEXT, invoice_no TEXT, return_period TEXT,
+                invoice_date TEXT, invoice_value REAL, taxable_value REAL,
+                tax_amount REAL, filing_status TEXT, source TEXT, content_hash TEXT,
+                seq BIGSERIAL
+            ) ON COMMIT DROP
+        """)
+        copy = f"COPY gstr_2b_staging ({', '.join(_STAGING_COLUMNS)}) FROM STDIN WITH (FORMAT csv)"
+        for chunk in _chunks(invoices, STAGING_CHUNK_SIZE):
+            rows = _staging_rows(chunk, return_period)
+            if on_rows:
+                on_rows(rows)
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(
+                tuple("" if value is None else value for value in row) for row in rows
+            )
+            buffer.seek(0)
+            cursor.copy_expert(copy, buffer)
+            staged += len(rows)
+        
+        cursor.execute("CREATE INDEX ON gstr_2b_staging (gstin_supplier, invoice_no, return_period)")
+        # Keys repeated across chunks: keep the last copy
+        cursor.execute("""
+            DELETE FROM gstr_2b_staging a USING gstr_2b_staging b
+            WHERE a.gstin_supplier = b.gstin_supplier AND a.invoice_no = b.invoice_no
+              AND a.return_period = b.return_period AND a.seq < b.seq
+        """)
+        cursor.execute("ANALYZE gstr_2b_staging")
+    else:
+        # The primary key also serves the delete-missing anti-join, which would
+        # otherwise scan staging once per stored row
+        cursor.execute("""
+            CREATE TEMP TABLE IF NOT EXISTS gstr_2b_staging (
+                gstin_supplier TEXT, invoice_no TEXT, return_period TEXT,
+                invoice_date TEXT, invoice_value REAL, taxable_value REAL,
+                tax_amount REAL, filing_status TEXT, source TEXT, content_hash TEXT,
+                PRIMARY KEY (gstin_supplier, invoice_no, return_period)
+            )
+        """)
+        cursor.execute("DELETE FROM gstr_2b_staging")
+        insert = (f"INSERT OR REPLACE INTO gstr_2b_staging ({', '.join(_STAGING_COLUMNS)}) "
+                  f"VALUES ({ph(len(_STAGING_COLUMNS))})")
+        for chunk in _chunks(invoices, STAGING_CHUNK_SIZE):
+            rows = _staging_rows(chunk, return_period)
+            if on_rows:
+                on_rows(rows)
+            cursor.executemany(insert, rows)
+            staged += len(rows)
+    return staged
+
+
+def _clear_staging(cursor):
+    # The PostgreSQL table drops itself on commit; the SQLite one lives with the connection
+    if DB_ENGINE != "postgres":
+        cursor.execute("DELETE FROM gstr_2b_staging")
+
+
+def _upsert_sql() -> str:
+    columns = ", ".join(_STAGING_COLUMNS)
+    updates = ", ".join(f"{column} = EXCLUDED.{column}" for column in _DATA_COLUMNS)
+    new_id = "gen_random_uuid()::text" if DB_ENGINE == "postgres" else "lower(hex(randomblob(16)))"
+    # "WHERE true" keeps SQLite from parsing ON CONFLICT as a join constraint
+    return f"""
+        INSERT INTO gstr_2b_data (id, user_id, {columns})
+        SELECT {new_id}, {ph()}, {columns} FROM gstr_2b_staging WHERE true
+        ON CONFLICT (user_id, gstin_supplier, invoice_no, return_period) DO UPDATE SET {updates}
+    """
+
+
+def _delete_missing_sql(suppliers: int = 0) -> str:
+    """Delete the period's stored invoices absent from staging (only for the given number of suppliers, if any)"""
+    return f"""
+        DELETE FROM gstr_2b_data
+        WHERE user_id = {ph()} AND return_period = {ph()}
+          {f"AND gstin_supplier IN ({ph(suppliers)})" if suppliers else ""}
+          AND NOT EXISTS (
+              SELECT 1 FROM gstr_2b_staging s
+              WHERE s.gstin_supplier = gstr_2b_data.gstin_supplier
+                AND s.invoice_no = gstr_2b_data.invoice_no
+                AND s.return_period = gstr_2b_data.return_period
+          )
+    """
+
+
+def _reset_supplier_hashes(cursor, user_id: str, periods) -> None:
+    """Forget the supplier hashes of periods changed outside incremental sync (next sync diffs them in full)"""
+    cursor.executemany(
+        f"DELETE FROM gstr_2b_supplier_hashes WHERE user_id = {ph()} AND return_period = {ph()}",
+        [(user_id, period) for period in periods if period]
+    )
+
+
+def _bump_period_versions(cursor, user_id: str, periods) -> None:
+    """Advance the data version of changed periods, invalidating cached reconciliations of them"""
+    cursor.executemany(f"""
+        INSERT INTO gstr_2b_period_versions (user_id, return_period, version) VALUES ({ph(3)})
+        ON CONFLICT (user_id, return_period) DO UPDATE SET
+            version = gstr_2b_period_versions.version + 1,
+            updated_at = CURRENT_TIMESTAMP
+    """, [(user_id, period, 1) for period in periods if period])
+
+
+def get_period_version(user_id: str, return_period: str) -> int:
+    """Data version of a period's GSTR-2B invoices (0 if never written)"""
+    with get_connection() as (conn, cursor):
+        cursor.execute(f"""
+            SELECT version FROM gstr_2b_period_versions
+            WHERE user_id = {ph()} AND return_period = {ph()}
+        """, (user_id, return_period))
+        row = cursor.fetchone()
+        return row["version"] if row else 0
+
+
+def bulk_upsert_gstr2b_invoices(
+    user_id: str,
+    invoices: Iterable[Dict],
+    return_period: Optional[str] = None
+) -> Dict[str, int]:
+    """
+    Set-based load of GSTR-2B invoices.
+    
+    Rows go into a staging table (COPY on PostgreSQL, chunked executemany on
+    SQLite) and are merged with one INSERT ... ON CONFLICT (user_id,
+    gstin_supplier, invoice_no, return_period) DO UPDATE. With return_period,
+    the load replaces that period: stored invoices missing from the payload
+    are deleted in the same transaction.
+    
+    Args:
+        user_id: User ID
+        invoices: Invoice dicts from GSP (list or streaming iterator)
+        return_period: Period being re-synced (MMYYYY), or None to only upsert
+        
+    Returns:
+        {"upserted": rows inserted or updated, "deleted": rows removed}
+    """
+    periods = {return_period}
+    
+    with get_connection() as (conn, cursor):
+        staged = _stage_invoices(cursor, invoices, return_period,
+                                 on_rows=lambda rows: periods.update(row[2] for row in rows))
+        
+        cursor.execute(_upsert_sql(), (user_id,))
+        upserted = cursor.rowcount if cursor.rowcount >= 0 else staged
+        
+        deleted = 0
+        if return_period:
+            cursor.execute(_delete_missing_sql(), (user_id, return_period))
+            deleted = cursor.rowcount
+        
+        _clear_staging(cursor)
+        _reset_supplier_hashes(cursor, user_id, periods)
+        _bump_period_versions(cursor, user_id, periods)
+        conn.commit()
+    
+    logger.info(f"Upserted {upserted} GSTR-2B invoices for user: {user_id}"
+                + (f", removed {deleted} no longer in period {return_period}" if return_period else ""))
+    return {"upserted": upserted, "deleted": deleted}
+
+
+def sync_gstr2b_period(user_id: str, return_period: str, invoices: Iterable[Dict]) -> Dict[str, int]:
+    """
+    Incrementally sync one GSTR-2B period against what is stored.
+    
+    The payload is staged in chunks, so invoices can come straight from a
+    streaming parser. Each supplier (ctin) block is hashed and compared with
+    the hash saved by the previous sync; unchanged suppliers are skipped
+    without touching their invoices. Within changed suppliers, per-invoice
+    content hashes decide what is inserted, updated or deleted, and only those
+    rows are written. Suppliers that disappeared from the payload have their
+    invoices deleted.
+    
+    If the period has no saved supplier hashes (first sync, or data loaded
+    through bulk_upsert_gstr2b_invoices), every supplier is diffed invoice by
+    invoice.
+    
+    Args:
+        user_id: User ID
+        return_period: Period being synced (MMYYYY)
+        invoices: Complete invoice list (or iterator) for the period from the GSP
+        
+    Returns:
+        {"inserted", "updated", "deleted", "unchanged", "suppliers_changed"}
+    """
+    sums = {}
+    
+    def add_rows(rows):
+        for row in rows:
+            # The invoice key is part of the term: a renamed invoice with the same amounts changes the sum
+            term = int(_content_hash((row[0], row[1], row[-1])), 16)
+            total, count = sums.get(row[0], (0, 0))
+            sums[row[0]] = ((total + term) % _HASH_MOD, count + 1)
+    
+    counts = {"inserted": 0, "updated": 0, "deleted": 0, "unchanged": 0, "suppliers_changed": 0}
+    stored_match = f"""
+        d.user_id = {ph()} AND d.gstin_supplier = gstr_2b_staging.gstin_supplier
+        AND d.invoice_no = gstr_2b_staging.invoice_no AND d.return_period = gstr_2b_staging.return_period
+    """
+    
+    with get_connection() as (conn, cursor):
+        cursor.execute(f"""
+            SELECT gstin_supplier, content_hash FROM gstr_2b_supplier_hashes
+            WHERE user_id = {ph()} AND return_period = {ph()}
+        """, (user_id, return_period))
+        saved = {row["gstin_supplier"]: row["content_hash"] for row in cursor.fetchall()}
+        
+        _stage_invoices(cursor, invoices, return_period, on_rows=add_rows)
+        suppliers = {gstin: (f"{total:032x}", count) for gstin, (total, count) in sums.items()}
+        
+        if saved:
+            changed = [gstin for gstin, (digest, _) in suppliers.items() if saved.get(gstin) != digest]
+            removed = [gstin for gstin in saved if gstin not in suppliers]
+            unchanged = [gstin for gstin in suppliers if saved.get(gstin) == suppliers[gstin][0]]
+            
+            for chunk in _chunks(unchanged):
+                cursor.execute(f"DELETE FROM gstr_2b_staging WHERE gstin_supplier IN ({ph(len(chunk))})", chunk)
+                counts["unchanged"] += sum(suppliers[gstin][1] for gstin in chunk)
+            for chunk in _chunks(changed):
+                cursor.execute(_delete_missing_sql(len(chunk)), (user_id, return_period, *chunk))
+                counts["deleted"] += cursor.rowcount
+            for chunk in _chunks(removed):
+                cursor.execute(f"""
+                    DELETE FROM gstr_2b_data
+                    WHERE user_id = {ph()} AND return_period = {ph()} AND gstin_supplier IN ({ph(len(chunk))})
+                """, (user_id, return_period, *chunk))
+                counts["deleted"] += cursor.rowcount
+                cursor.execute(f"""
+                    DELETE FROM gstr_2b_supplier_hashes
+                    WHERE user_id = {ph()} AND return_period = {ph()} AND gstin_supplier IN ({ph(len(chunk))})
+                """, (user_id, return_period, *chunk))
+            removed_count = len(removed)
+        else:
+            changed = list(suppliers)
+            cursor.execute(f"""
+                SELECT COUNT(DISTINCT gstin_supplier) AS n FROM gstr_2b_data
+                WHERE user_id = {ph()} AND return_period = {ph()}
+                  AND NOT EXISTS (SELECT 1 FROM gstr_2b_staging s WHERE s.gstin_supplier = gstr_2b_data.gstin_supplier)
+            """, (user_id, return_period))
+            removed_count = cursor.fetchone()["n"]
+            cursor.execute(_delete_missing_sql(), (user_id, return_period))
+            counts["deleted"] += cursor.rowcount
+        
+        # Invoices whose content hash matches the stored row need no write
+        cursor.execute(f"""
+            DELETE FROM gstr_2b_staging
+            WHERE EXISTS (SELECT 1 FROM gstr_2b_data d WHERE {stored_match}
+                          AND d.content_hash = gstr_2b_staging.content_hash)
+        """, (user_id,))
+        counts["unchanged"] += cursor.rowcount
+        
+        cursor.execute("SELECT COUNT(*) AS n FROM gstr_2b_staging")
+        pending = cursor.fetchone()["n"]
+        if pending:
+            cursor.execute(f"""
+                SELECT COUNT(*) AS n FROM gstr_2b_staging
+                WHERE NOT EXISTS (SELECT 1 FROM gstr_2b_data d WHERE {stored_match})
+            """, (user_id,))
+            counts["inserted"] = cursor.fetchone()["n"]
+            counts["updated"] = pending - counts["inserted"]
+            cursor.execute(_upsert_sql(), (user_id,))
+        _clear_staging(cursor)
+        
+        if changed:
+            cursor.executemany(f"""
+                INSERT INTO gstr_2b_supplier_hashes (user_id, return_period, gstin_supplier, content_hash, invoice_count)
+                VALUES ({ph(5)})
+                ON CONFLICT (user_id, return_period, gstin_supplier) DO UPDATE SET
+                    content_hash = EXCLUDED.content_hash,
+                    invoice_count = EXCLUDED.invoice_count,
+                    updated_at = CURRENT_TIMESTAMP
+            """, [(user_id, return_period, gstin, *suppliers[gstin]) for gstin in changed])
+        
+        # An unchanged payload keeps the version, so cached reconciliations stay valid
+        if counts["inserted"] or counts["updated"] or counts["deleted"]:
+            _bump_period_versions(cursor, user_id, [return_period])
+        
+        conn.commit()
+    
+    counts["suppliers_changed"] = len(changed) + removed_count
+    logger.info(f"Incremental GSTR-2B sync for user: {user_id}, period: {return_period} - "
+                f"{counts['inserted']} inserted, {counts['updated']} updated, {counts['deleted']} deleted, "
+                f"{counts['unchanged']} unchanged ({counts['suppliers_changed']} suppliers changed)")
+    return counts
+
+
 def bulk_insert_gstr2b_invoices(
     user_id: str,
     invoices: List[Dict]
 ) -> int:
     """
-    Bulk insert GSTR-2B invoices.
+    Bulk insert GSTR-2B invoices (upserting on the invoice key).
     
     Args:
         user_id: User ID
         invoices: List of invoice dicts from GSP
         
     Returns:
-        Number of invoices inserted
+        Number of invoices inserted or updated
     """
     try:
-        inserted_count = 0
-        
-        with get_connection() as (conn, cursor):
-            for inv in invoices:
-                invoice_id = str(uuid.uuid4())
-                
-                cursor.execute(f"""
-                    INSERT INTO gstr_2b_data (
-                        id, user_id, gstin_supplier, invoice_no, invoice_date,
-                        invoice_value, taxable_value, tax_amount, filing_status,
-                        return_period, source, created_at
-                    ) VALUES ({ph(12)})
-                """, (
-                    invoice_id,
-                    user_id,
-                    inv.get("supplier_gstin"),
-                    inv.get("invoice_no"),
-                    inv.get("invoice_date"),
-                    inv.get("invoice_value"),
-                    inv.get("taxable_value"),
-                    inv.get("tax_amount"),
-                    inv.get("filing_status", "Y"),
-                    inv.get("return_period"),
-                    "GSTR-2B",
-                    datetime.now().isoformat()
-                ))
-                inserted_count += 1
-            
-            conn.commit()
-        
-        logger.info(f"Inserted {inserted_count} GSTR-2B invoices for user: {user_id}")
-        return inserted_count
-        
+        return bulk_upsert_gstr2b_invoices(user_id, invoices)["upserted"]
     except Exception as e:
         logger.error(f"Error bulk inserting GSTR-2B invoices: {str(e)}")
         return 0
@@ -194,6 +516,8 @@ def delete_gstr2b_data(user_id: str, return_period: str) -> bool:
                 DELETE FROM gstr_2b_data
                 WHERE user_id = {ph()} AND return_period = {ph()}
             """, (user_id, return_period))
+            _reset_supplier_hashes(cursor, user_id, [return_period])
+            _bump_period_versions(cursor, user_id, [return_period])
             
             conn.commit()
             logger.info(f"Deleted GSTR-2B data for user: {user_id}, period: {return_period}")
@@ -243,6 +567,29 @@ def get_supplier_invoices(user_id: str, supplier_gstin: str) -> List[Dict]:
         logger.error(f"Error fetching supplier invoices: {str(e)}")
         return []
 
+_PERIOD_INVOICE_SQL = f"""
+    SELECT gstin_supplier, invoice_no, invoice_date, 
+           invoice_value, taxable_value, tax_amount, 
+           filing_status, source
+    FROM gstr_2b_data
+    WHERE user_id = {ph()} AND return_period = {ph()}
+"""
+
+
+def _period_invoice(row) -> Dict:
+    """gstr_2b_data row -> invoice dict in the reconciliation engines' shape"""
+    return {
+        "gstin": row['gstin_supplier'],
+        "invoice_number": row['invoice_no'],
+        "invoice_date": row['invoice_date'],
+        "invoice_value": row['invoice_value'],
+        "taxable_value": row['taxable_value'],
+        "tax_amount": row['tax_amount'],
+        "filing_status": row['filing_status'],
+        "source": row['source']
+    }
+
+
 def get_invoices_by_period(user_id: str, return_period: str) -> List[Dict]:
     """
     Get all GSTR-2B invoices for a specific return period.
@@ -256,30 +603,41 @@ def get_invoices_by_period(user_id: str, return_period: str) -> List[Dict]:
     """
     try:
         with get_connection() as (conn, cursor):
-            cursor.execute(f"""
-                SELECT gstin_supplier, invoice_no, invoice_date, 
-                       invoice_value, taxable_value, tax_amount, 
-                       filing_status, source
-                FROM gstr_2b_data
-                WHERE user_id = {ph()} AND return_period = {ph()}
-            """, (user_id, return_period))
-            
-            invoices = []
-            for row in cursor.fetchall():
-                invoices.append({
-                    "gstin": row.get('gstin_supplier'),
-                    "invoice_number": row.get('invoice_no'),
-                    "invoice_date": row.get('invoice_date'),
-                    "invoice_value": row.get('invoice_value'),
-                    "taxable_value": row.get('taxable_value'),
-                    "tax_amount": row.get('tax_amount'),
-                    "filing_status": row.get('filing_status'),
-                    "source": row.get('source')
-                })
-            
-            return invoices
+            cursor.execute(_PERIOD_INVOICE_SQL, (user_id, return_period))
+            return [_period_invoice(row) for row in cursor.fetchall()]
             
     except Exception as e:
         import traceback
         logger.error(f"Error fetching period invoices: {str(e)}\n{traceback.format_exc()}")
         return []
+
+
+def iter_invoices_by_period(user_id: str, return_period: str,
+                            batch_size: int = STAGING_CHUNK_SIZE) -> Iterator[Dict]:
+    """
+    Stream a period's GSTR-2B invoices (same dicts as get_invoices_by_period)
+    without loading them all: a server-side cursor on PostgreSQL, fetchmany on
+    SQLite. Errors are logged and re-raised - a silently truncated stream would
+    turn into bogus "missing" results downstream.
+    """
+    try:
+        with get_connection() as (conn, cursor):
+            if DB_ENGINE == "postgres":
+                import psycopg2.extras
+                cursor = conn.cursor(name="gstr2b_period_stream", cursor_factory=psycopg2.extras.RealDictCursor)
+                cursor.itersize = batch_size
+            try:
+                cursor.execute(_PERIOD_INVOICE_SQL, (user_id, return_period))
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    for row in rows:
+                        yield _period_invoice(row)
+            finally:
+                if DB_ENGINE == "postgres":
+                    cursor.close()
+                    conn.rollback()
+    except Exception as e:
+        logger.error(f"Error streaming period invoices: {str(e)}")
+        raise
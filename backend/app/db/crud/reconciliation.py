@@ -0,0 +1,271 @@
+"""
+CRUD Operations for Reconciliation Runs
+Persists runs and their results so results can be paged, filtered and exported per category
+"""
+import json
+import uuid
+from datetime import datetime
+from typing import Optional, Dict, List, Tuple, Any
+from app.db.session import get_connection, ph, row_to_dict, DB_ENGINE
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# Result fields stored per row; "amount" is derived (see _result_row)
+_RESULT_FIELDS = (
+    "gstin", "vendor_name", "invoice_number", "invoice_date", "pr_amount", "gstr2b_amount",
+    "difference", "status", "message", "gstr2b_invoice_number", "gstr2b_invoice_date", "confidence",
+)
+_TEXT_FIELDS = {"vendor_name", "invoice_number", "invoice_date", "status", "message",
+                "gstr2b_invoice_number", "gstr2b_invoice_date"}
+_INSERT_COLUMNS = ("run_id", "category", "seq", "amount") + _RESULT_FIELDS
+
+# ?sort= values -> (column, descending); seq is the order the engine produced
+RESULT_SORTS = {
+    "seq": ("seq", False),
+    "amount": ("amount", False),
+    "-amount": ("amount", True),
+    "gstin": ("gstin", False),
+    "-gstin": ("gstin", True),
+    "difference": ("difference", False),
+    "-difference": ("difference", True),
+}
+
+_RUN_COLUMNS = ("id, user_id, return_period, filename, mode, status, summary, result_key, "
+                "result_format, error_message, created_at, completed_at")
+
+
+def _result_row(run_id: str, category: str, seq: int, result: Dict) -> tuple:
+    """
+    Engine result dict -> reconciliation_results row. amount is the invoice's
+    own amount (the GSTR-2B one for missing_in_pr), gstin is never NULL so
+    it can take part in keyset comparisons.
+    """
+    amount = result.get("gstr2b_amount") if category == "missing_in_pr" else result.get("pr_amount")
+    values = []
+    for field in _RESULT_FIELDS:
+        value = result.get(field)
+        if field == "gstin":
+            value = "" if value is None else str(value)
+        elif field in _TEXT_FIELDS and value is not None and not isinstance(value, str):
+            value = str(value)
+        values.append(value)
+    return (run_id, category, seq, float(amount or 0)) + tuple(values)
+
+
+def _run_dict(row) -> Optional[Dict]:
+    run = row_to_dict(row)
+    if run is None:
+        return None
+    run = dict(run)
+    run["summary"] = json.loads(run["summary"]) if run.get("summary") else None
+    for field in ("user_id", "created_at", "completed_at"):
+        if run.get(field) is not None and not isinstance(run[field], str):
+            run[field] = str(run[field])
+    return run
+
+
+def create_run(user_id: str, return_period: str, filename: str = None, mode: str = "inline",
+               fingerprint: str = None) -> str:
+    """Register a reconciliation run (status RUNNING) and return its id"""
+    run_id = str(uuid.uuid4())
+    with get_connection() as (conn, cursor):
+        cursor.execute(f"""
+            INSERT INTO reconciliation_runs (id, user_id, return_period, filename, mode, status, fingerprint, created_at)
+            VALUES ({ph(8)})
+        """, (run_id, user_id, return_period, filename, mode, "RUNNING", fingerprint, datetime.now().isoformat()))
+        conn.commit()
+    return run_id
+
+
+def find_cached_run(user_id: str, fingerprint: str) -> Optional[Dict]:
+    """
+    The user's latest COMPLETED run with this fingerprint
+    (services.reconciliation.reconciliation_fingerprint), or None
+    """
+    try:
+        with get_connection() as (conn, cursor):
+            cursor.execute(f"""
+                SELECT {_RUN_COLUMNS} FROM reconciliation_runs
+                WHERE user_id = {ph()} AND fingerprint = {ph()} AND status = 'COMPLETED'
+                ORDER BY created_at DESC
+                LIMIT 1
+            """, (user_id, fingerprint))
+            return _run_dict(cursor.fetchone())
+    except Exception as e:
+        logger.error(f"Error looking up cached reconciliation run: {str(e)}")
+        return None
+
+
+def add_results(run_id: str, category: str, results: List[Dict], first_seq: int = 0) -> int:
+    """
+    Store one category's results (seq first_seq, first_seq + 1, ...) in one transaction.
+
+    Returns:
+        Number of rows stored
+    """
+    if not results:
+        return 0
+    rows = [_result_row(run_id, category, first_seq + i, result) for i, result in enumerate(results)]
+
+    with get_connection() as (conn, cursor):
+        if DB_ENGINE == "postgres":
+            import psycopg2.extras
+            psycopg2.extras.execute_values(cursor, f"""
+                INSERT INTO reconciliation_results ({', '.join(_INSERT_COLUMNS)}) VALUES %s
+            """, rows, page_size=1000)
+        else:
+            cursor.executemany(f"""
+                INSERT INTO reconciliation_results ({', '.join(_INSERT_COLUMNS)})
+                VALUES ({ph(len(_INSERT_COLUMNS))})
+            """, rows)
+        conn.commit()
+    return len(rows)
+
+
+def complete_run(run_id: str, summary: Dict, result_key: str = None, result_format: str = None) -> None:
+    """Mark a run COMPLETED with its summary (and result file, for partitioned runs)"""
+    with get_connection() as (conn, cursor):
+        cursor.execute(f"""
+            UPDATE reconciliation_runs
+            SET status = 'COMPLETED', summary = {ph()}, result_key = {ph()}, result_format = {ph()},
+                completed_at = {ph()}
+            WHERE id = {ph()}
+        """, (json.dumps(summary), result_key, result_format, datetime.now().isoformat(), run_id))
+        conn.commit()
+
+
+def fail_run(run_id: str, error_message: str) -> None:
+    """Mark a run FAILED and drop the results it stored before failing (partitioned runs store as they go)"""
+    try:
+        with get_connection() as (conn, cursor):
+            cursor.execute(f"DELETE FROM reconciliation_results WHERE run_id = {ph()}", (run_id,))
+            cursor.execute(f"""
+                UPDATE reconciliation_runs
+                SET status = 'FAILED', error_message = {ph()}, completed_at = {ph()}
+                WHERE id = {ph()}
+            """, (error_message, datetime.now().isoformat(), run_id))
+            conn.commit()
+    except Exception as e:
+        logger.error(f"Error marking reconciliation run {run_id} failed: {str(e)}")
+
+
+def get_run(user_id: str, run_id: str) -> Optional[Dict]:
+    """A user's run (summary decoded), or None"""
+    with get_connection() as (conn, cursor):
+        cursor.execute(f"""
+            SELECT {_RUN_COLUMNS} FROM reconciliation_runs
+            WHERE id = {ph()} AND user_id = {ph()}
+        """, (run_id, user_id))
+        return _run_dict(cursor.fetchone())
+
+
+def list_runs(user_id: str, limit: int = 50, offset: int = 0) -> Tuple[List[Dict], int]:
+    """A user's runs, newest first, and their total count"""
+    with get_connection() as (conn, cursor):
+        cursor.execute(f"SELECT COUNT(*) AS total FROM reconciliation_runs WHERE user_id = {ph()}", (user_id,))
+        total = row_to_dict(cursor.fetchone())["total"]
+        cursor.execute(f"""
+            SELECT {_RUN_COLUMNS} FROM reconciliation_runs
+            WHERE user_id = {ph()}
+            ORDER BY created_at DESC
+            LIMIT {ph()} OFFSET {ph()}
+        """, (user_id, limit, offset))
+        return [_run_dict(row) for row in cursor.fetchall()], total
+
+
+def delete_run(user_id: str, run_id: str) -> bool:
+    """Delete a user's run and its results"""
+    with get_connection() as (conn, cursor):
+        cursor.execute(f"SELECT 1 FROM reconciliation_runs WHERE id = {ph()} AND user_id = {ph()}",
+                       (run_id, user_id))
+        if cursor.fetchone() is None:
+            return False
+        cursor.execute(f"DELETE FROM reconciliation_results WHERE run_id = {ph()}", (run_id,))
+        cursor.execute(f"DELETE FROM reconciliation_runs WHERE id = {ph()}", (run_id,))
+        conn.commit()
+    return True
+
+
+def get_results(run_id: str, categories: List[str]) -> Dict[str, List[Dict]]:
+    """All of a run's results in the given categories, in engine order (the match_invoices() shape)"""
+    results = {}
+    with get_connection() as (conn, cursor):
+        for category in categories:
+            cursor.execute(f"""
+                SELECT {', '.join(_RESULT_FIELDS)} FROM reconciliation_results
+                WHERE run_id = {ph()} AND category = {ph()}
+                ORDER BY seq
+            """, (run_id, category))
+            results[category] = [dict(row_to_dict(row)) for row in cursor.fetchall()]
+    return results
+
+
+def get_results_page(
+    run_id: str,
+    category: str,
+    sort: str = "seq",
+    limit: int = 50,
+    after: Optional[List[Any]] = None,
+    gstin: Optional[str] = None,
+    min_amount: Optional[float] = None,
+    max_amount: Optional[float] = None,
+    with_total: bool = True
+) -> Tuple[List[Dict], Optional[int], Optional[List[Any]]]:
+    """
+    One keyset page of a run's results in a category.
+
+    Args:
+        sort: a RESULT_SORTS key
+        after: position of the previous page's last row ([sort value, seq];
+            [seq] for sort="seq"), None for the first page
+        gstin / min_amount / max_amount: filters (exact GSTIN, amount range)
+        with_total: also count all rows matching the filters
+
+    Returns:
+        (rows, total or None, position of the last row or None)
+    """
+    column, descending = RESULT_SORTS[sort]
+    where = [f"run_id = {ph()}", f"category = {ph()}"]
+    params: List[Any] = [run_id, category]
+    if gstin:
+        where.append(f"gstin = {ph()}")
+        params.append(gstin.strip().upper())
+    if min_amount is not None:
+        where.append(f"amount >= {ph()}")
+        params.append(min_amount)
+    if max_amount is not None:
+        where.append(f"amount <= {ph()}")
+        params.append(max_amount)
+    filters, filter_params = " AND ".join(where), list(params)
+
+    comparison = "<" if descending else ">"
+    if after is not None:
+        if column == "seq":
+            where.append(f"seq {comparison} {ph()}")
+        else:
+            where.append(f"({column}, seq) {comparison} ({ph()}, {ph()})")
+        params.extend(after)
+    direction = "DESC" if descending else "ASC"
+    order = f"seq {direction}" if column == "seq" else f"{column} {direction}, seq {direction}"
+
+    with get_connection() as (conn, cursor):
+        total = None
+        if with_total:
+            cursor.execute(f"SELECT COUNT(*) AS total FROM reconciliation_results WHERE {filters}", filter_params)
+            total = row_to_dict(cursor.fetchone())["total"]
+        cursor.execute(f"""
+            SELECT seq, amount, {', '.join(_RESULT_FIELDS)} FROM reconciliation_results
+            WHERE {' AND '.join(where)}
+            ORDER BY {order}
+            LIMIT {ph()}
+        """, params + [limit])
+        rows = [dict(row_to_dict(row)) for row in cursor.fetchall()]
+
+    last = None
+    if rows:
+        last = [rows[-1]["seq"]] if column == "seq" else [rows[-1][column], rows[-1]["seq"]]
+    for row in rows:
+        del row["seq"], row["amount"]
+    return rows, total, last
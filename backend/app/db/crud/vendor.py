@@ -1,8 +1,12 @@
 import json
 from datetime import datetime
-from typing import Optional, Dict
+from typing import Optional, Dict, List
 from app.db.session import get_connection, ph, row_to_dict, DB_ENGINE
 
+# GSTINs per IN (...) list in bulk lookups (same as CacheService.BATCH_CHUNK_SIZE)
+LOOKUP_CHUNK_SIZE = 500
+
+
 def save_vendor(vendor_data: Dict):
     """Save or update vendor data"""
     with get_connection() as (conn, cursor):
@@ -45,6 +49,51 @@ def save_vendor(vendor_data: Dict):
         conn.commit()
 
 
+def save_vendors(vendors: List[Dict]):
+    """Save or update many vendors in one transaction (multi-row upsert)"""
+    if not vendors:
+        return
+    
+    now = datetime.now().isoformat()
+    rows = [
+        (
+            vendor_data.get("gstin"),
+            vendor_data.get("legal_name"),
+            vendor_data.get("trade_name"),
+            vendor_data.get("gst_status"),
+            vendor_data.get("registration_date"),
+            now,
+            json.dumps(vendor_data)
+        )
+        # Last write wins for duplicate GSTINs (ON CONFLICT can't touch a row twice)
+        for vendor_data in {v.get("gstin"): v for v in vendors}.values()
+    ]
+    
+    with get_connection() as (conn, cursor):
+        if DB_ENGINE == "postgres":
+            import psycopg2.extras
+            psycopg2.extras.execute_values(cursor, """
+                INSERT INTO vendors 
+                (gstin, legal_name, trade_name, gst_status, registration_date, last_synced_at, raw_data)
+                VALUES %s
+                ON CONFLICT (gstin) DO UPDATE SET
+                    legal_name = EXCLUDED.legal_name,
+                    trade_name = EXCLUDED.trade_name,
+                    gst_status = EXCLUDED.gst_status,
+                    registration_date = EXCLUDED.registration_date,
+                    last_synced_at = EXCLUDED.last_synced_at,
+                    raw_data = EXCLUDED.raw_data
+            """, rows, page_size=500)
+        else:
+            cursor.executemany(f"""
+                INSERT OR REPLACE INTO vendors 
+                (gstin, legal_name, trade_name, gst_status, registration_date, last_synced_at, raw_data)
+                VALUES ({ph(7)})
+            """, rows)
+        
+        conn.commit()
+
+
 def get_cached_vendor(gstin: str, max_age_hours: int = 24) -> Optional[Dict]:
     """Get cached vendor data if fresh enough"""
     with get_connection() as (conn, cursor):
@@ -63,3 +112,33 @@ def get_cached_vendor(gstin: str, max_age_hours: int = 24) -> Optional[Dict]:
             return json.loads(row["raw_data"])
     
     return None
+
+
+def get_cached_vendors(gstins: List[str], max_age_hours: int = 24) -> Dict[str, Dict]:
+    """
+    Get cached vendor data for many GSTINs (fresh entries only), one query per
+    LOOKUP_CHUNK_SIZE GSTINs so a 10k-vendor batch stays within SQLite's
+    variable limit and keeps PostgreSQL statements small.
+    """
+    gstins = list(dict.fromkeys(gstins))
+    if not gstins:
+        return {}
+    
+    rows = []
+    with get_connection() as (conn, cursor):
+        for start in range(0, len(gstins), LOOKUP_CHUNK_SIZE):
+            chunk = gstins[start:start + LOOKUP_CHUNK_SIZE]
+            cursor.execute(f"""
+                SELECT gstin, last_synced_at, raw_data FROM vendors WHERE gstin IN ({ph(len(chunk))})
+            """, tuple(chunk))
+            rows.extend(cursor.fetchall())
+    
+    vendors = {}
+    now = datetime.now()
+    for row in rows:
+        row = row_to_dict(row)
+        last_synced = datetime.fromisoformat(str(row["last_synced_at"]))
+        if (now - last_synced).total_seconds() / 3600 <= max_age_hours:
+            vendors[row["gstin"]] = json.loads(row["raw_data"])
+    
+    return vendors
@@ -1,7 +1,14 @@
 import os
 import json
+import time
+import asyncio
+import functools
+import threading
+import weakref
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Any, Callable
 from contextlib import contextmanager
 from app.core.config import settings
 
@@ -12,35 +19,348 @@ DB_ENGINE = "postgres" if DATABASE_URL else "sqlite"
 
 # Connection pool (PostgreSQL only)
 _pg_pool = None
+_pg_pool_lock = threading.Lock()
+
+
+class PoolTimeout(TimeoutError):
+    """No pooled connection became available within the checkout timeout"""
+
+
+class PGConnectionPool:
+    """
+    Thread-safe PostgreSQL connection pool.
+    
+    - getconn() blocks (up to checkout_timeout) when all maxconn connections
+      are checked out, instead of raising like psycopg2's SimpleConnectionPool
+    - connections idle for longer than validate_after seconds are checked with
+      SELECT 1 on checkout and replaced if dead
+    - session settings (search_path, statement_timeout) go in the connection
+      options, so they are applied once per physical connection
+    - putconn() rolls back any open transaction and drops broken connections
+    """
+    
+    # Checkouts/sec is reported over this trailing window
+    RATE_WINDOW = 60
+    
+    def __init__(self, minconn: int, maxconn: int, dsn: str, checkout_timeout: float,
+                 validate_after: float, **connect_kwargs):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.dsn = dsn
+        self.checkout_timeout = checkout_timeout
+        self.validate_after = validate_after
+        self.connect_kwargs = connect_kwargs
+        
+        self._cond = threading.Condition()
+        self._idle = deque()  # (conn, last_used) - used LIFO to keep hot connections warm
+        self._size = 0
+        self._in_use = 0
+        self._closed = False
+        
+        self._checkouts = 0
+        self._checkout_buckets = deque()  # [second, count]
+        self._waits = 0
+        self._wait_seconds = 0.0
+        self._max_wait_seconds = 0.0
+        self._timeouts = 0
+        self._opened = 0
+        self._discarded = 0
+        
+        for _ in range(minconn):
+            conn = self._connect()
+            with self._cond:
+                self._size += 1
+                self._idle.append((conn, time.monotonic()))
+    
+    def _connect(self):
+        import psycopg2
+        conn = psycopg2.connect(self.dsn, **self.connect_kwargs)
+        with self._cond:
+            self._opened += 1
+        return conn
+    
+    def _is_alive(self, conn) -> bool:
+        if conn.closed:
+            return False
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+    
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._discarded += 1
+    
+    def getconn(self, timeout: float = None):
+        """Check out a connection, waiting up to timeout (default checkout_timeout) seconds"""
+        timeout = self.checkout_timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+        conn, last_used, waited = None, None, False
+        
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise PoolTimeout("Connection pool is closed")
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    break
+                if self._size < self.maxconn:
+                    self._size += 1  # reserve a slot, connect outside the lock
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeout(f"No database connection available after {timeout}s "
+                                      f"({self.maxconn} in use)")
+                waited = True
+                self._cond.wait(remaining)
+            self._in_use += 1
+        
+        try:
+            if conn is not None and (conn.closed or (
+                    time.monotonic() - last_used > self.validate_after and not self._is_alive(conn))):
+                self._discard(conn)
+                conn = None
+            if conn is None:
+                conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        
+        self._record_checkout(time.monotonic() - start if waited else 0.0, waited)
+        return conn
+    
+    def putconn(self, conn, close: bool = False):
+        """Return a connection to the pool (rolled back; closed instead if broken or close=True)"""
+        import psycopg2.extensions
+        
+        if not close and not conn.closed:
+            try:
+                status = conn.info.transaction_status
+                if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+                    close = True
+                elif status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except Exception:
+                close = True
+        
+        if close or conn.closed or self._closed:
+            self._discard(conn)
+            with self._cond:
+                self._size -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            return
+        
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            self._in_use -= 1
+            self._cond.notify()
+    
+    def closeall(self):
+        """Close idle connections; checked-out ones are closed when returned"""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = list(self._idle), deque()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn, _ in idle:
+            self._discard(conn)
+    
+    def _record_checkout(self, wait_seconds: float, waited: bool):
+        now = int(time.monotonic())
+        with self._cond:
+            self._checkouts += 1
+            if self._checkout_buckets and self._checkout_buckets[-1][0] == now:
+                self._checkout_buckets[-1][1] += 1
+            else:
+                self._checkout_buckets.append([now, 1])
+                while self._checkout_buckets[0][0] <= now - self.RATE_WINDOW:
+                    self._checkout_buckets.popleft()
+            if waited:
+                self._waits += 1
+                self._wait_seconds += wait_seconds
+                self._max_wait_seconds = max(self._max_wait_seconds, wait_seconds)
+    
+    def stats(self) -> Dict:
+        """In-use / idle connections, checkout rate and wait times"""
+        now = int(time.monotonic())
+        with self._cond:
+            recent = sum(count for second, count in self._checkout_buckets if second > now - self.RATE_WINDOW)
+            return {
+                "engine": "postgres",
+                "max_connections": self.maxconn,
+                "open_connections": self._size,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "checkouts": self._checkouts,
+                "checkouts_per_sec": round(recent / self.RATE_WINDOW, 2),
+                "waits": self._waits,
+                "avg_wait_ms": round(self._wait_seconds / self._waits * 1000, 2) if self._waits else 0.0,
+                "max_wait_ms": round(self._max_wait_seconds * 1000, 2),
+                "timeouts": self._timeouts,
+                "connections_opened": self._opened,
+                "connections_discarded": self._discarded,
+            }
 
 
 def _init_pg_pool():
     """Initialize PostgreSQL connection pool"""
     global _pg_pool
-    if _pg_pool is None:
-        import psycopg2
-        import psycopg2.pool
-        
-        # Get pool settings from config
+    if _pg_pool is not None:
+        return _pg_pool
+    
+    with _pg_pool_lock:
+        if _pg_pool is None:
+            # Get pool settings from config
+            from app.core.config import settings
+            
+            _pg_pool = PGConnectionPool(
+                minconn=settings.DB_POOL_MIN_CONN,  # Increased from 1 to 5
+                maxconn=settings.DB_POOL_MAX_CONN,  # Increased from 10 to 50
+                dsn=DATABASE_URL,
+                checkout_timeout=settings.DB_POOL_CHECKOUT_TIMEOUT,
+                validate_after=settings.DB_POOL_VALIDATE_AFTER,
+                connect_timeout=settings.DB_CONNECT_TIMEOUT,  # 10 seconds
+                # Session state, set once per physical connection (Supabase schema + 30s statement timeout)
+                options=f"-c statement_timeout={settings.DB_STATEMENT_TIMEOUT} -c search_path=itc_gaurd,public"
+            )
+            
+            import logging
+            logger = logging.getLogger(__name__)
+            logger.info(
+                f"PostgreSQL connection pool initialized: "
+                f"min={settings.DB_POOL_MIN_CONN}, max={settings.DB_POOL_MAX_CONN}, "
+                f"checkout_timeout={settings.DB_POOL_CHECKOUT_TIMEOUT}s, "
+                f"connect_timeout={settings.DB_CONNECT_TIMEOUT}s, "
+                f"statement_timeout={settings.DB_STATEMENT_TIMEOUT}ms"
+            )
+    return _pg_pool
+
+
+def get_pool_stats() -> Dict:
+    """Connection pool metrics for the active engine"""
+    if DB_ENGINE == "postgres":
+        return _init_pg_pool().stats()
+    return _sqlite_connections.stats()
+
+
+def close_pg_pool():
+    """Close the PostgreSQL pool (on shutdown)"""
+    global _pg_pool
+    if _pg_pool is not None:
+        _pg_pool.closeall()
+        _pg_pool = None
+
+
+def close_connections():
+    """Close pooled / persistent connections for the active engine (on shutdown)"""
+    if DB_ENGINE == "postgres":
+        close_pg_pool()
+    else:
+        _sqlite_connections.close_all()
+
+
+# Persistent per-thread connections (SQLite only)
+
+class _SQLiteConnectionHolder:
+    """Owns one thread's connection; closes it when the thread (and its thread-local) goes away"""
+    
+    def __init__(self, conn):
+        self.conn = conn
+    
+    def close(self):
+        if self.conn is not None:
+            try:
+                self.conn.close()
+            except Exception:
+                pass
+            self.conn = None
+    
+    def __del__(self):
+        self.close()
+
+
+class SQLiteConnectionManager:
+    """
+    One persistent SQLite connection per thread instead of connect/close per CRUD call.
+    
+    Connections run in WAL mode (readers don't block the writer), with a busy
+    timeout so concurrent writers wait for the lock instead of failing with
+    "database is locked", and with tuned synchronous / cache_size / mmap_size.
+    """
+    
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._holders = weakref.WeakSet()
+        self._lock = threading.Lock()
+        self._opened = 0
+    
+    def _connect(self):
+        import sqlite3
         from app.core.config import settings
         
-        _pg_pool = psycopg2.pool.SimpleConnectionPool(
-            minconn=settings.DB_POOL_MIN_CONN,  # Increased from 1 to 5
-            maxconn=settings.DB_POOL_MAX_CONN,  # Increased from 10 to 50
-            dsn=DATABASE_URL,
-            connect_timeout=settings.DB_CONNECT_TIMEOUT,  # 10 seconds
-            options=f"-c statement_timeout={settings.DB_STATEMENT_TIMEOUT} -c search_path=itc_gaurd,public"  # 30 seconds
-        )
-        
-        import logging
-        logger = logging.getLogger(__name__)
-        logger.info(
-            f"PostgreSQL connection pool initialized: "
-            f"min={settings.DB_POOL_MIN_CONN}, max={settings.DB_POOL_MAX_CONN}, "
-            f"connect_timeout={settings.DB_CONNECT_TIMEOUT}s, "
-            f"statement_timeout={settings.DB_STATEMENT_TIMEOUT}ms"
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=settings.SQLITE_BUSY_TIMEOUT_MS / 1000,
+            # Only ever used by its own thread; close_all() may close it from another
+            check_same_thread=False
         )
-    return _pg_pool
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}")
+        conn.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+        conn.execute(f"PRAGMA cache_size=-{int(settings.SQLITE_CACHE_SIZE_KB)}")
+        conn.execute(f"PRAGMA mmap_size={int(settings.SQLITE_MMAP_SIZE)}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
+    
+    def get(self):
+        """This thread's connection, opened on first use"""
+        holder = getattr(self._local, "holder", None)
+        if holder is None or holder.conn is None:
+            holder = _SQLiteConnectionHolder(self._connect())
+            self._local.holder = holder
+            with self._lock:
+                self._holders.add(holder)
+                self._opened += 1
+        return holder.conn
+    
+    def close_all(self):
+        """Close every thread's connection (on shutdown); threads reconnect on next use"""
+        with self._lock:
+            holders = list(self._holders)
+        for holder in holders:
+            holder.close()
+    
+    def stats(self) -> Dict:
+        with self._lock:
+            open_connections = sum(1 for holder in self._holders if holder.conn is not None)
+            opened = self._opened
+        return {
+            "engine": "sqlite",
+            "open_connections": open_connections,
+            "connections_opened": opened,
+            "journal_mode": "wal",
+        }
+
+
+# In modular structure, we'll keep the DB in the root backend folder or app folder
+# For compatibility with existing data, we target the one in 'backend/'
+SQLITE_DB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "itc_shield.db")
+_sqlite_connections = SQLiteConnectionManager(SQLITE_DB_PATH)
 
 
 # ============ CONNECTION HELPER ============
@@ -60,27 +380,65 @@ def get_connection():
         import psycopg2.extras
         pool = _init_pg_pool()
         conn = pool.getconn()
+        cursor = None
         try:
+            # search_path is part of the pooled connection's options - no per-checkout SET
             cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-            # Ensure we use the correct schema for Supabase
-            cursor.execute("SET search_path TO itc_gaurd, public")
             yield conn, cursor
         finally:
-            cursor.close()
+            if cursor is not None and not cursor.closed:
+                try:
+                    cursor.close()
+                except psycopg2.Error:
+                    pass
             pool.putconn(conn)
     else:
-        import sqlite3
-        # In modular structure, we'll keep the DB in the root backend folder or app folder
-        # For compatibility with existing data, we target the one in 'backend/'
-        base_dir = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
-        db_path = os.path.join(base_dir, "itc_shield.db")
-        conn = sqlite3.connect(db_path)
-        conn.row_factory = sqlite3.Row
+        conn = _sqlite_connections.get()
+        cursor = conn.cursor()
         try:
-            cursor = conn.cursor()
             yield conn, cursor
         finally:
-            conn.close()
+            cursor.close()
+            # The connection outlives this block - drop anything left uncommitted
+            if conn.in_transaction:
+                conn.rollback()
+
+
+# ============ ASYNC OFFLOAD ============
+
+# Neither psycopg2 nor sqlite3 is async, so async endpoints run CRUD calls on a
+# bounded thread pool instead of blocking the event loop.
+_db_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_db_executor() -> ThreadPoolExecutor:
+    """Get or create the bounded executor used for blocking DB calls"""
+    global _db_executor
+    if _db_executor is None:
+        _db_executor = ThreadPoolExecutor(
+            max_workers=settings.DB_EXECUTOR_MAX_WORKERS,
+            thread_name_prefix="db"
+        )
+    return _db_executor
+
+
+async def run_in_db_executor(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    Run a blocking CRUD function on the DB executor and await its result.
+    
+    Usage:
+        vendor = await run_in_db_executor(vendor_crud.get_cached_vendor, gstin)
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_db_executor(), functools.partial(func, *args, **kwargs))
+
+
+def shutdown_db_executor():
+    """Stop the DB executor, waiting for in-flight calls to finish"""
+    global _db_executor
+    if _db_executor is not None:
+        _db_executor.shutdown(wait=True)
+        _db_executor = None
 
 
 def ph(count=1):
@@ -100,6 +458,40 @@ def row_to_dict(row):
     return dict(row)
 
 
+# Rows per multi-row INSERT in sqlite_insert_returning_ids (at most a few
+# thousand bound variables; the limit is 32766 on SQLite >= 3.32)
+SQLITE_INSERT_CHUNK_ROWS = 500
+
+
+def sqlite_insert_returning_ids(cursor, table: str, columns: List[str], rows: List[tuple]) -> List[int]:
+    """
+    Insert rows into a SQLite table with an AUTOINCREMENT id and return the
+    generated ids in input order.
+
+    Uses multi-row INSERT ... RETURNING id (SQLite >= 3.35). Ids are assigned
+    in VALUES order but SQLite emits RETURNING rows in no guaranteed order, so
+    each statement's ids are sorted. Older SQLite falls back to executemany
+    and the ids ending at last_insert_rowid(), which the write transaction
+    keeps consecutive.
+    """
+    import sqlite3
+
+    insert = f"INSERT INTO {table} ({', '.join(columns)}) VALUES "
+    if sqlite3.sqlite_version_info < (3, 35, 0):
+        cursor.executemany(insert + f"({ph(len(columns))})", rows)
+        cursor.execute("SELECT last_insert_rowid()")
+        last_id = cursor.fetchone()[0]
+        return list(range(last_id - len(rows) + 1, last_id + 1))
+
+    ids = []
+    for start in range(0, len(rows), SQLITE_INSERT_CHUNK_ROWS):
+        chunk = rows[start:start + SQLITE_INSERT_CHUNK_ROWS]
+        values = ", ".join([f"({ph(len(columns))})"] * len(chunk))
+        cursor.execute(insert + values + " RETURNING id", [value for row in chunk for value in row])
+        ids.extend(sorted(row[0] for row in cursor.fetchall()))
+    return ids
+
+
 # ============ INITIALIZATION ============
 
 def init_database():
@@ -238,10 +630,90 @@ def _init_postgres_tables():
                 filing_status TEXT,
                 return_period TEXT,
                 source TEXT,
+                content_hash TEXT,
                 created_at TIMESTAMP DEFAULT NOW(),
                 UNIQUE(user_id, gstin_supplier, invoice_no, return_period)
             )
         """)
+        # Tables created before incremental sync lack the per-invoice hash
+        cursor.execute("ALTER TABLE gstr_2b_data ADD COLUMN IF NOT EXISTS content_hash TEXT")
+        
+        # Per-supplier content hash of the last synced GSTR-2B payload (incremental sync)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS gstr_2b_supplier_hashes (
+                user_id UUID NOT NULL REFERENCES users(id),
+                return_period TEXT NOT NULL,
+                gstin_supplier TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                invoice_count INTEGER,
+                updated_at TIMESTAMP DEFAULT NOW(),
+                PRIMARY KEY (user_id, return_period, gstin_supplier)
+            )
+        """)
+        
+        # Bumped by every write to a period's GSTR-2B data (reconciliation cache key)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS gstr_2b_period_versions (
+                user_id UUID NOT NULL REFERENCES users(id),
+                return_period TEXT NOT NULL,
+                version INTEGER NOT NULL DEFAULT 0,
+                updated_at TIMESTAMP DEFAULT NOW(),
+                PRIMARY KEY (user_id, return_period)
+            )
+        """)
+        
+        # Reconciliation runs and their results (paged per category by keyset)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS reconciliation_runs (
+                id TEXT PRIMARY KEY,
+                user_id UUID NOT NULL REFERENCES users(id),
+                return_period TEXT NOT NULL,
+                filename TEXT,
+                mode TEXT,
+                status TEXT DEFAULT 'RUNNING',
+                summary TEXT,
+                result_key TEXT,
+                result_format TEXT,
+                error_message TEXT,
+                fingerprint TEXT,
+                created_at TIMESTAMP DEFAULT NOW(),
+                completed_at TIMESTAMP
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_reconciliation_runs_user ON reconciliation_runs (user_id, created_at)")
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_reconciliation_runs_fingerprint
+            ON reconciliation_runs (user_id, fingerprint)
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS reconciliation_results (
+                run_id TEXT NOT NULL REFERENCES reconciliation_runs(id) ON DELETE CASCADE,
+                category TEXT NOT NULL,
+                seq BIGINT NOT NULL,
+                gstin TEXT NOT NULL,
+                vendor_name TEXT,
+                invoice_number TEXT,
+                invoice_date TEXT,
+                amount DOUBLE PRECISION NOT NULL,
+                pr_amount DOUBLE PRECISION,
+                gstr2b_amount DOUBLE PRECISION,
+                difference DOUBLE PRECISION NOT NULL,
+                status TEXT,
+                message TEXT,
+                gstr2b_invoice_number TEXT,
+                gstr2b_invoice_date TEXT,
+                confidence DOUBLE PRECISION,
+                PRIMARY KEY (run_id, category, seq)
+            )
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_reconciliation_results_amount
+            ON reconciliation_results (run_id, category, amount, seq)
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_reconciliation_results_gstin
+            ON reconciliation_results (run_id, category, gstin, seq)
+        """)
 
         conn.commit()
 
@@ -370,9 +842,110 @@ def _init_sqlite_tables():
                 filing_status TEXT,
                 return_period TEXT,
                 source TEXT,
+                content_hash TEXT,
                 created_at TEXT DEFAULT CURRENT_TIMESTAMP,
                 FOREIGN KEY (user_id) REFERENCES users(id)
             )
         """)
+        # Tables created before incremental sync lack the per-invoice hash
+        cursor.execute("PRAGMA table_info(gstr_2b_data)")
+        if "content_hash" not in [row["name"] for row in cursor.fetchall()]:
+            cursor.execute("ALTER TABLE gstr_2b_data ADD COLUMN content_hash TEXT")
+        
+        # Per-supplier content hash of the last synced GSTR-2B payload (incremental sync)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS gstr_2b_supplier_hashes (
+                user_id TEXT NOT NULL,
+                return_period TEXT NOT NULL,
+                gstin_supplier TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                invoice_count INTEGER,
+                updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (user_id, return_period, gstin_supplier),
+                FOREIGN KEY (user_id) REFERENCES users(id)
+            )
+        """)
+        
+        # Bumped by every write to a period's GSTR-2B data (reconciliation cache key)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS gstr_2b_period_versions (
+                user_id TEXT NOT NULL,
+                return_period TEXT NOT NULL,
+                version INTEGER NOT NULL DEFAULT 0,
+                updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (user_id, return_period),
+                FOREIGN KEY (user_id) REFERENCES users(id)
+            )
+        """)
+        
+        # Reconciliation runs and their results (paged per category by keyset)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS reconciliation_runs (
+                id TEXT PRIMARY KEY,
+                user_id TEXT NOT NULL,
+                return_period TEXT NOT NULL,
+                filename TEXT,
+                mode TEXT,
+                status TEXT DEFAULT 'RUNNING',
+                summary TEXT,
+                result_key TEXT,
+                result_format TEXT,
+                error_message TEXT,
+                fingerprint TEXT,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                completed_at TEXT,
+                FOREIGN KEY (user_id) REFERENCES users(id)
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_reconciliation_runs_user ON reconciliation_runs (user_id, created_at)")
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_reconciliation_runs_fingerprint
+            ON reconciliation_runs (user_id, fingerprint)
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS reconciliation_results (
+                run_id TEXT NOT NULL,
+                category TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                gstin TEXT NOT NULL,
+                vendor_name TEXT,
+                invoice_number TEXT,
+                invoice_date TEXT,
+                amount REAL NOT NULL,
+                pr_amount REAL,
+                gstr2b_amount REAL,
+                difference REAL NOT NULL,
+                status TEXT,
+                message TEXT,
+                gstr2b_invoice_number TEXT,
+                gstr2b_invoice_date TEXT,
+                confidence REAL,
+                PRIMARY KEY (run_id, category, seq),
+                FOREIGN KEY (run_id) REFERENCES reconciliation_runs(id)
+            )
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_reconciliation_results_amount
+            ON reconciliation_results (run_id, category, amount, seq)
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_reconciliation_results_gstin
+            ON reconciliation_results (run_id, category, gstin, seq)
+        """)
+        
+        # Upsert key (matches the PostgreSQL UNIQUE constraint). Databases created
+        # before it existed may hold duplicates - keep the latest row of each.
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_gstr_2b_upsert_key'")
+        if cursor.fetchone() is None:
+            cursor.execute("""
+                DELETE FROM gstr_2b_data WHERE rowid NOT IN (
+                    SELECT MAX(rowid) FROM gstr_2b_data
+                    GROUP BY user_id, gstin_supplier, invoice_no, return_period
+                )
+            """)
+            cursor.execute("""
+                CREATE UNIQUE INDEX idx_gstr_2b_upsert_key
+                ON gstr_2b_data (user_id, gstin_supplier, invoice_no, return_period)
+            """)
         
         conn.commit()
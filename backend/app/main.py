@@ -10,7 +10,9 @@ from app.core.middleware import setup_middleware
 from app.core.security import setup_security_headers
 from app.core.errors import setup_error_handlers
 from app.api.deps import limiter
-from app.db.session import init_database
+from app.db.session import init_database, shutdown_db_executor, close_connections
+from app.services.gsp_async import close_async_gsp_provider
+from app.services.result_sink import close_result_sinks
 
 # Configure logging
 logging.basicConfig(
@@ -53,8 +55,13 @@ def startup_db_client():
     logger.info(f"API ready at {settings.API_V1_STR}")
 
 @app.on_event("shutdown")
-def shutdown():
+async def shutdown():
     logger.info("Shutting down ITC Shield API...")
+    await close_async_gsp_provider()
+    shutdown_db_executor()
+    # Flush queued batch results before the connections go away
+    close_result_sinks()
+    close_connections()
 
 # Add rate limiter
 app.state.limiter = limiter
@@ -1,43 +1,83 @@
 import os
 import uuid
+import logging
 import zipfile
 from datetime import datetime
-from typing import Dict, List
+from typing import BinaryIO, Dict, List
 from app.core.config import settings
 from app.db.crud import batch as batch_crud
-from app.db.crud import check as check_crud
-from app.db.crud.vendor import save_vendor, get_cached_vendor  # Import vendor CRUD
+from app.services.vendor_cache import vendor_cache
+from app.services.result_sink import BatchResultSink
 from app.services.gsp import get_gsp_provider
 from app.services.decision import DecisionEngine
 from app.services.pdf import generate_certificate
+from app.utils.csv_parser import iter_csv_vendors
 
 # Configuration
 BATCH_OUTPUT_DIR = settings.BATCH_OUTPUT_DIR
 os.makedirs(BATCH_OUTPUT_DIR, exist_ok=True)
+# Parse errors kept per upload (the response shows the first few)
+MAX_PARSE_ERRORS = 100
 
 engine = DecisionEngine()
+logger = logging.getLogger(__name__)
 
-def create_batch(items: List[Dict], input_filename: str, user_id: str = None) -> Dict:
-    """Create a new batch job from parsed CSV items."""
+def create_batch_from_upload(file: BinaryIO, input_filename: str, user_id: str = None,
+                             max_vendors: int = None) -> Dict:
+    """
+    Create a batch job straight from an uploaded vendor CSV (file object).
+    
+    Rows are parsed and stored chunk by chunk (INGEST_CHUNK_ROWS), so the file
+    is never held in memory. Parse errors beyond MAX_PARSE_ERRORS are dropped.
+    
+    Returns:
+        {"job_id", "total_vendors", "status", "errors", "items"} - items are the
+        created rows with their ids, to pass to process_batch_sync so it does
+        not re-read them - or {"job_id", "error",
+        "errors"} when the file has no valid vendor or ("limit_exceeded": True)
+        more than max_vendors; the job is then marked FAILED and the items
+        already stored are deleted
+    """
     job_id = str(uuid.uuid4())
-    batch_crud.create_batch_job(job_id, len(items), input_filename)
-    batch_crud.add_batch_items(job_id, items)
+    batch_crud.create_batch_job(job_id, 0, input_filename)
+    
+    total, errors, batch_items = 0, [], []
+    for items, chunk_errors in iter_csv_vendors(file):
+        errors.extend(chunk_errors[:MAX_PARSE_ERRORS - len(errors)])
+        total += len(items)
+        if max_vendors and total > max_vendors:
+            error = f"Maximum {max_vendors} vendors allowed"
+            batch_crud.fail_batch_job(job_id, error)
+            return {"job_id": job_id, "error": error, "errors": errors, "limit_exceeded": True}
+        batch_items.extend(batch_crud.add_batch_items(job_id, items))
     
+    if not total:
+        batch_crud.fail_batch_job(job_id, "No valid vendors found")
+        return {"job_id": job_id, "error": "No valid vendors found", "errors": errors}
+    
+    batch_crud.set_batch_total_count(job_id, total)
     return {
         "job_id": job_id,
-        "total_vendors": len(items),
+        "total_vendors": total,
         "status": "PENDING",
-        "message": "Batch job created. Processing will begin shortly."
+        "errors": errors,
+        "items": batch_items
     }
 
-def process_batch_sync(job_id: str) -> Dict:
-    """Process a batch job synchronously (for small batches)."""
+def process_batch_sync(job_id: str, items: List[Dict] = None) -> Dict:
+    """
+    Process a batch job synchronously (for small batches).
+    
+    items: the job's PENDING items if the caller already has them (as returned
+    by create_batch_from_upload); otherwise they are loaded from the database.
+    """
     job = batch_crud.get_batch_job(job_id)
     if not job:
         return {"error": "Job not found"}
     
     batch_crud.update_batch_job_status(job_id, "PROCESSING")
-    items = batch_crud.get_batch_items(job_id, status="PENDING")
+    if items is None:
+        items = batch_crud.get_batch_items(job_id, status="PENDING")
     
     processed = 0
     success = 0
@@ -52,65 +92,59 @@ def process_batch_sync(job_id: str) -> Dict:
     # Target: 500 vendors in ~30 seconds = ~16 vendors/second
     # Using 30 workers to maximize throughput
     from concurrent.futures import ThreadPoolExecutor, as_completed
-    import logging
     
-    logger = logging.getLogger(__name__)
     max_workers = min(30, len(items))  # Up to 30 parallel workers
     
     # Instantiate provider once for the entire batch to reuse token
     provider = get_gsp_provider()
     
+    # Fetch all vendors up front: one cache round trip, bounded GSP fan-out for misses
+    vendor_map = provider.get_vendor_data_many([item['gstin'] for item in items])
+    
+    # OPTIMIZATION: Save vendor data to DB for on-demand PDF generation later
+    # (one bulk write; versions the provider already wrote through are skipped)
+    vendor_cache.set_many([vendor_data for vendor_data in vendor_map.values() if vendor_data])
+    
     logger.info(f"Starting parallel batch processing with {max_workers} workers")
     
+    # Results are written behind by a single writer in multi-row statements
+    sink = BatchResultSink()
+    succeeded_ids = set()
+    
     def process_single_vendor(item: Dict) -> Dict:
         """Process a single vendor (thread-safe)"""
         try:
-            # Reuse the same provider instance (uses cached token)
-            vendor_data = provider.get_vendor_data(item['gstin'])
+            vendor_data = vendor_map.get(item['gstin'])
             
             if not vendor_data:
                 raise Exception("Failed to fetch vendor data from GSP")
 
-            # OPTIMIZATION: Save vendor data to DB for on-demand PDF generation later
-            save_vendor(vendor_data)
-
             decision_result = engine.check_vendor(vendor_data)
             
-            check_id = check_crud.save_compliance_check(
-                gstin=item['gstin'],
-                vendor_name=vendor_data.get('legal_name', item.get('vendor_name', '')),
-                amount=item.get('amount', 0),
-                decision=decision_result['decision'],
-                rule_id=decision_result['rule_id'],
-                reason=decision_result['reason'],
-                risk_level=decision_result['risk_level'],
-                data_source="BATCH"
-            )
-
             # OPTIMIZATION: Skip PDF generation for now (On-Demand)
             # PDF will be generated only when user requests download
             
-            batch_crud.update_batch_item(
-                item_id=item['id'],
-                status="SUCCESS",
-                decision=decision_result['decision'],
-                check_id=check_id,
-                risk_level=decision_result['risk_level'],
-                reason=decision_result['reason']
-            )
+            sink.submit({
+                'item_id': item['id'],
+                'status': 'SUCCESS',
+                'gstin': item['gstin'],
+                'vendor_name': vendor_data.get('legal_name', item.get('vendor_name', '')),
+                'amount': item.get('amount', 0),
+                'decision': decision_result['decision'],
+                'rule_id': decision_result['rule_id'],
+                'reason': decision_result['reason'],
+                'risk_level': decision_result['risk_level'],
+                'data_source': "BATCH"
+            })
             
             return {'status': 'SUCCESS', 'item_id': item['id']}
             
         except Exception as e:
-            batch_crud.update_batch_item(
-                item_id=item['id'],
-                status="FAILED",
-                error_message=str(e)
-            )
+            sink.submit({'item_id': item['id'], 'status': 'FAILED', 'error_message': str(e)})
             return {'status': 'FAILED', 'item_id': item['id'], 'error': str(e)}
     
     # Process vendors in parallel
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+    with sink, ThreadPoolExecutor(max_workers=max_workers) as executor:
         # Submit all tasks
         future_to_item = {
             executor.submit(process_single_vendor, item): item 
@@ -123,6 +157,7 @@ def process_batch_sync(job_id: str) -> Dict:
             
             if result['status'] == 'SUCCESS':
                 success += 1
+                succeeded_ids.add(result['item_id'])
             else:
                 failed += 1
             
@@ -133,6 +168,14 @@ def process_batch_sync(job_id: str) -> Dict:
                 batch_crud.update_batch_job_progress(job_id, processed, success, failed)
                 logger.info(f"Batch {job_id}: {processed}/{len(items)} processed ({success} success, {failed} failed)")
     
+    # Items that were processed but whose result could not be saved
+    if sink.failures:
+        write_failed = sum(1 for f in sink.failures if f['item_id'] in succeeded_ids)
+        success -= write_failed
+        failed += write_failed
+        batch_crud.update_batch_job_progress(job_id, processed, success, failed)
+        logger.error(f"Batch {job_id}: {len(sink.failures)} results could not be saved")
+    
     # Generate Results CSV
     import csv
     results_csv_path = os.path.join(batch_dir, "results.csv")
@@ -184,6 +227,19 @@ def process_batch_sync(job_id: str) -> Dict:
         "output_file": zip_path
     }
 
+def run_batch_job(job_id: str, items: List[Dict] = None) -> Dict:
+    """
+    process_batch_sync for a job processed in the background (after the upload
+    response went out): an error marks the job FAILED instead of leaving it
+    PROCESSING, since there is no caller left to report it to.
+    """
+    try:
+        return process_batch_sync(job_id, items)
+    except Exception as e:
+        logger.error(f"Batch processing failed for job {job_id}: {str(e)}", exc_info=True)
+        batch_crud.update_batch_job_status(job_id, "FAILED", str(e))
+        return {"job_id": job_id, "status": "FAILED", "error": str(e)}
+
 def get_batch_status(job_id: str) -> Dict:
     """Get current status of a batch job."""
     job = batch_crud.get_batch_job(job_id)
@@ -231,14 +287,13 @@ def generate_certificates_zip(job_id: str) -> str:
     ]
     
     if items_to_generate:
-        from app.db.crud.vendor import get_cached_vendor
         from concurrent.futures import ThreadPoolExecutor
         
         # Helper for parallel generation
         def generate_single_pdf(item):
             try:
                 # Get cached vendor data
-                vendor_data = get_cached_vendor(item['gstin'])
+                vendor_data = vendor_cache.get(item['gstin'])
                 if not vendor_data:
                     return False
                     
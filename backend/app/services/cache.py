@@ -2,11 +2,12 @@
 Redis Cache Service for ITC Shield
 Provides caching for vendor data and GSP responses
 """
-import json
 import logging
-from typing import Optional, Any
+import uuid
+from typing import Optional, Any, Dict, List, Tuple
 from datetime import timedelta
 from functools import wraps
+from app.services.cache_serializer import get_cache_serializer
 
 logger = logging.getLogger(__name__)
 
@@ -29,9 +30,10 @@ def get_cache_client():
             logger.warning("Redis not configured. Caching disabled.")
             return None
         
+        # Raw bytes: values carry their own encoding (see cache_serializer)
         _cache_client = redis.from_url(
             settings.REDIS_URL,
-            decode_responses=True,
+            decode_responses=False,
             socket_connect_timeout=2,
             socket_timeout=2,
             retry_on_timeout=True
@@ -51,13 +53,20 @@ class CacheService:
     """Service for caching vendor data and API responses"""
     
     # Cache TTL configurations (in seconds)
-    VENDOR_DATA_TTL = 24 * 60 * 60  # 24 hours
+    VENDOR_DATA_TTL = 24 * 60 * 60  # 24 hours (fresh)
+    VENDOR_STALE_TTL = 7 * 24 * 60 * 60  # served stale (and revalidated) for 7 more days
+    VENDOR_NOT_FOUND_TTL = 15 * 60  # 15 minutes for invalid / not-found GSTINs
+    VENDOR_ERROR_TTL = 60  # 1 minute for upstream errors (403, timeouts, 5xx)
     GSP_TOKEN_TTL = 50 * 60  # 50 minutes (tokens valid for 1 hour)
     COMPLIANCE_CHECK_TTL = 7 * 24 * 60 * 60  # 7 days
     
+    # Keys per MGET / pipeline round trip in the *_many methods
+    BATCH_CHUNK_SIZE = 500
+    
     def __init__(self):
         self.client = get_cache_client()
         self.enabled = self.client is not None
+        self.serializer = get_cache_serializer()
     
     def _make_key(self, prefix: str, identifier: str) -> str:
         """Generate cache key with prefix"""
@@ -71,7 +80,7 @@ class CacheService:
         try:
             value = self.client.get(key)
             if value:
-                return json.loads(value)
+                return self.serializer.loads(value)
             return None
         except Exception as e:
             logger.error(f"Cache get error for key {key}: {e}")
@@ -83,7 +92,7 @@ class CacheService:
             return False
         
         try:
-            serialized = json.dumps(value)
+            serialized = self.serializer.dumps(value)
             if ttl:
                 self.client.setex(key, ttl, serialized)
             else:
@@ -105,32 +114,191 @@ class CacheService:
             logger.error(f"Cache delete error for key {key}: {e}")
             return False
     
+    def _chunks(self, items: List) -> List[List]:
+        size = self.BATCH_CHUNK_SIZE
+        return [items[i:i + size] for i in range(0, len(items), size)]
+    
+    def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        """
+        Get many values - one MGET round trip per chunk of keys.
+        
+        Returns:
+            Dict of the keys that were found (a value that fails to decode is a miss, as in get)
+        """
+        if not self.enabled or not keys:
+            return {}
+        
+        found = {}
+        try:
+            for chunk in self._chunks(keys):
+                for key, value in zip(chunk, self.client.mget(chunk)):
+                    if not value:
+                        continue
+                    try:
+                        found[key] = self.serializer.loads(value)
+                    except Exception as e:
+                        logger.error(f"Cache get error for key {key}: {e}")
+            return found
+        except Exception as e:
+            logger.error(f"Cache mget error for {len(keys)} keys: {e}")
+            return found
+    
+    def set_many(self, mapping: Dict[str, Any], ttl: int = None) -> bool:
+        """Set many values with an optional TTL - one pipeline round trip per chunk of keys"""
+        if not self.enabled or not mapping:
+            return False
+        
+        try:
+            for chunk in self._chunks(list(mapping.items())):
+                pipe = self.client.pipeline(transaction=False)
+                for key, value in chunk:
+                    serialized = self.serializer.dumps(value)
+                    if ttl:
+                        pipe.setex(key, ttl, serialized)
+                    else:
+                        pipe.set(key, serialized)
+                pipe.execute()
+            return True
+        except Exception as e:
+            logger.error(f"Cache pipeline set error for {len(mapping)} keys: {e}")
+            return False
+    
+    def delete_many(self, keys: List[str]) -> int:
+        """Delete many keys - one DEL round trip per chunk of keys. Returns the number deleted."""
+        if not self.enabled or not keys:
+            return 0
+        
+        deleted = 0
+        try:
+            for chunk in self._chunks(keys):
+                deleted += self.client.delete(*chunk)
+            return deleted
+        except Exception as e:
+            logger.error(f"Cache delete error for {len(keys)} keys: {e}")
+            return deleted
+    
     def get_vendor_data(self, gstin: str) -> Optional[dict]:
         """Get cached vendor data"""
         key = self._make_key("vendor", gstin)
         return self.get(key)
     
+    def get_vendor_data_many(self, gstins: List[str]) -> Dict[str, dict]:
+        """Get cached vendor data for many GSTINs (MGET per chunk)"""
+        keys = {self._make_key("vendor", gstin): gstin for gstin in gstins}
+        return {keys[key]: value for key, value in self.get_many(list(keys)).items()}
+
+    def get_vendor_entries(self, gstins: List[str]) -> Tuple[Dict[str, dict], Dict[str, dict]]:
+        """
+        Get cached vendor data and negative entries for many GSTINs (MGET per chunk).
+        
+        Returns:
+            (vendor data by GSTIN, negative entries by GSTIN)
+        """
+        data_keys = {self._make_key("vendor", gstin): gstin for gstin in gstins}
+        miss_keys = {self._make_key("vendor_miss", gstin): gstin for gstin in gstins}
+        found = self.get_many(list(data_keys) + list(miss_keys))
+        return (
+            {gstin: found[key] for key, gstin in data_keys.items() if key in found},
+            {gstin: found[key] for key, gstin in miss_keys.items() if key in found},
+        )
+    
     def set_vendor_data(self, gstin: str, data: dict) -> bool:
-        """Cache vendor data for 24 hours"""
+        """Cache vendor data for 24 hours, plus the stale-while-revalidate window"""
         key = self._make_key("vendor", gstin)
-        return self.set(key, data, self.VENDOR_DATA_TTL)
+        return self.set(key, data, self.VENDOR_DATA_TTL + self.VENDOR_STALE_TTL)
+    
+    def set_vendor_data_many(self, vendors: Dict[str, dict]) -> bool:
+        """Cache vendor data for many GSTINs (pipeline per chunk), same TTL as set_vendor_data"""
+        return self.set_many(
+            {self._make_key("vendor", gstin): data for gstin, data in vendors.items()},
+            self.VENDOR_DATA_TTL + self.VENDOR_STALE_TTL
+        )
+    
+    def get_vendor_miss(self, gstin: str) -> Optional[dict]:
+        """Get the negative cache entry for a GSTIN (lookup recently failed)"""
+        key = self._make_key("vendor_miss", gstin)
+        return self.get(key)
+    
+    def set_vendor_miss(self, gstin: str, reason: str, ttl: int) -> bool:
+        """Remember a failed vendor lookup for a short TTL"""
+        key = self._make_key("vendor_miss", gstin)
+        return self.set(key, {"reason": reason}, ttl)
     
     def invalidate_vendor(self, gstin: str) -> bool:
         """Invalidate cached vendor data"""
         key = self._make_key("vendor", gstin)
         return self.delete(key)
     
+    def invalidate_vendors(self, gstins: List[str]) -> int:
+        """Invalidate cached vendor data and negative entries for many GSTINs"""
+        keys = [self._make_key(prefix, gstin) for gstin in gstins for prefix in ("vendor", "vendor_miss")]
+        return self.delete_many(keys)
+    
     def get_gsp_token(self, provider: str) -> Optional[str]:
         """Get cached GSP access token"""
-        key = self._make_key("gsp_token", provider)
-        data = self.get(key)
+        data = self.get_gsp_token_info(provider)
         return data.get("token") if data else None
     
-    def set_gsp_token(self, provider: str, token: str, expires_in: int = None) -> bool:
-        """Cache GSP access token"""
+    def get_gsp_token_info(self, provider: str) -> Optional[dict]:
+        """Get cached GSP access token entry ({"token", "expires_at"})"""
+        key = self._make_key("gsp_token", provider)
+        return self.get(key)
+    
+    def set_gsp_token(self, provider: str, token: str, expires_in: int = None, expires_at: str = None) -> bool:
+        """Cache GSP access token (expires_at is the token's own expiry, ISO format)"""
         key = self._make_key("gsp_token", provider)
         ttl = expires_in if expires_in else self.GSP_TOKEN_TTL
-        return self.set(key, {"token": token}, ttl)
+        return self.set(key, {"token": token, "expires_at": expires_at}, ttl)
+    
+    # Compare-and-delete so a lock is only released by the holder that set it
+    _RELEASE_LOCK_SCRIPT = """
+        if redis.call("get", KEYS[1]) == ARGV[1] then
+            return redis.call("del", KEYS[1])
+        end
+        return 0
+    """
+    
+    def acquire_lock(self, name: str, ttl: int) -> Optional[str]:
+        """
+        Try to take a cross-process lock (SET NX EX).
+        
+        Returns:
+            Owner token to pass to release_lock, or None if the lock is held
+            elsewhere or Redis is unavailable (check self.enabled)
+        """
+        if not self.enabled:
+            return None
+        
+        try:
+            owner = uuid.uuid4().hex
+            if self.client.set(self._make_key("lock", name), owner, nx=True, ex=ttl):
+                return owner
+            return None
+        except Exception as e:
+            logger.error(f"Cache lock error for {name}: {e}")
+            return None
+    
+    def lock_held(self, name: str) -> bool:
+        """Whether a lock taken with acquire_lock is held (False if Redis is unavailable)"""
+        if not self.enabled:
+            return False
+        
+        try:
+            return bool(self.client.exists(self._make_key("lock", name)))
+        except Exception as e:
+            logger.error(f"Cache lock check error for {name}: {e}")
+            return False
+    
+    def release_lock(self, name: str, owner: str) -> bool:
+        """Release a lock taken with acquire_lock"""
+        if not self.enabled or not owner:
+            return False
+        
+        try:
+            return bool(self.client.eval(self._RELEASE_LOCK_SCRIPT, 1, self._make_key("lock", name), owner))
+        except Exception as e:
+            logger.error(f"Cache unlock error for {name}: {e}")
+            return False
 
 
 # Singleton instance
@@ -0,0 +1,134 @@
+"""
+Cache Serializers for ITC Shield
+Compact, versioned encoding for values stored in Redis
+
+Encoded values start with a 4-byte header:
+    MAGIC (0xC1) | VERSION | format ('j' JSON, 'm' msgpack) | compression ('-', 'z' zlib, '4' lz4)
+
+0xC1 never starts valid UTF-8 text (nor a msgpack value), so anything without
+the header is a legacy plain-JSON entry and is decoded as such.
+"""
+import json
+import logging
+import zlib
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+MAGIC = 0xC1
+VERSION = 1
+HEADER_SIZE = 4
+
+FORMAT_JSON = ord("j")
+FORMAT_MSGPACK = ord("m")
+
+COMPRESSION_NONE = ord("-")
+COMPRESSION_ZLIB = ord("z")
+COMPRESSION_LZ4 = ord("4")
+
+
+def _load_msgpack():
+    try:
+        import msgpack
+        return msgpack
+    except ImportError:
+        return None
+
+
+def _load_lz4():
+    try:
+        import lz4.frame
+        return lz4.frame
+    except ImportError:
+        return None
+
+
+class CacheSerializer:
+    """
+    Encode/decode cache values with a versioned header.
+
+    Args:
+        format: "json" (compact separators) or "msgpack" (falls back to JSON if
+            msgpack isn't installed)
+        compression: "none", "zlib" or "lz4" (falls back to zlib if lz4 isn't installed)
+        compress_min_bytes: only payloads at least this large are compressed
+    """
+
+    def __init__(self, format: str = "json", compression: str = "none", compress_min_bytes: int = 1024):
+        self._msgpack = _load_msgpack()
+        self._lz4 = _load_lz4()
+
+        if format == "msgpack" and self._msgpack is None:
+            logger.warning("msgpack not installed. Cache serializer falling back to JSON.")
+            format = "json"
+        if compression == "lz4" and self._lz4 is None:
+            logger.warning("lz4 not installed. Cache compression falling back to zlib.")
+            compression = "zlib"
+
+        self.format = FORMAT_MSGPACK if format == "msgpack" else FORMAT_JSON
+        self.compression = {
+            "zlib": COMPRESSION_ZLIB,
+            "lz4": COMPRESSION_LZ4,
+        }.get(compression, COMPRESSION_NONE)
+        self.compress_min_bytes = compress_min_bytes
+
+    def dumps(self, value: Any) -> bytes:
+        """Encode a value, with header"""
+        if self.format == FORMAT_MSGPACK:
+            payload = self._msgpack.packb(value, use_bin_type=True)
+        else:
+            payload = json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+        compression = COMPRESSION_NONE
+        if self.compression != COMPRESSION_NONE and len(payload) >= self.compress_min_bytes:
+            if self.compression == COMPRESSION_LZ4:
+                compressed = self._lz4.compress(payload)
+            else:
+                compressed = zlib.compress(payload, 6)
+            # Keep the plain payload when compression doesn't pay off
+            if len(compressed) < len(payload):
+                payload, compression = compressed, self.compression
+
+        return bytes((MAGIC, VERSION, self.format, compression)) + payload
+
+    def loads(self, data: Optional[bytes]) -> Any:
+        """Decode a value written by dumps() - or a legacy plain-JSON entry"""
+        if data is None:
+            return None
+        if isinstance(data, str):
+            return json.loads(data)
+        if not data or data[0] != MAGIC:
+            return json.loads(data)
+
+        version, format, compression = data[1], data[2], data[3]
+        if version != VERSION:
+            raise ValueError(f"Unsupported cache entry version: {version}")
+
+        payload = data[HEADER_SIZE:]
+        if compression == COMPRESSION_ZLIB:
+            payload = zlib.decompress(payload)
+        elif compression == COMPRESSION_LZ4:
+            if self._lz4 is None:
+                raise ValueError("Cache entry is lz4-compressed but lz4 is not installed")
+            payload = self._lz4.decompress(payload)
+        elif compression != COMPRESSION_NONE:
+            raise ValueError(f"Unknown cache entry compression: {compression!r}")
+
+        if format == FORMAT_MSGPACK:
+            if self._msgpack is None:
+                raise ValueError("Cache entry is msgpack-encoded but msgpack is not installed")
+            return self._msgpack.unpackb(payload, raw=False)
+        if format == FORMAT_JSON:
+            return json.loads(payload)
+        raise ValueError(f"Unknown cache entry format: {format!r}")
+
+
+def get_cache_serializer() -> CacheSerializer:
+    """Serializer configured from settings (CACHE_SERIALIZER, CACHE_COMPRESSION, ...)"""
+    from app.core.config import settings
+
+    return CacheSerializer(
+        format=settings.CACHE_SERIALIZER,
+        compression=settings.CACHE_COMPRESSION,
+        compress_min_bytes=settings.CACHE_COMPRESS_MIN_BYTES
+    )
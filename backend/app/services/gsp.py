@@ -3,15 +3,397 @@ ITC Shield - GSP Data Providers
 Handles fetching GST data from various providers (Mock, Sandbox.co.in, etc.)
 """
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional, Dict, List
+from functools import partial
+from typing import Callable, Iterator, Optional, Dict, List, Tuple
+import threading
+import time
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
 import logging
 from app.core.config import settings
 from app.services.cache import cache
+from app.services.gstr2b_parser import iter_gstr2b_stream, parse_gstr2b_invoices
+from app.services.vendor_cache import vendor_cache
 
 logger = logging.getLogger(__name__)
 
+
+# ============ SHARED HTTP SESSION ============
+
+class _PoolWaitStats:
+    """Process-wide counters for time spent waiting on an exhausted connection pool"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.waits = 0
+        self.wait_seconds = 0.0
+    
+    def record(self, seconds: float):
+        with self._lock:
+            self.waits += 1
+            self.wait_seconds += seconds
+
+
+_pool_wait_stats = _PoolWaitStats()
+
+
+class _TrackedPoolMixin:
+    """Counts checkouts that had to block because every pooled connection was busy"""
+    
+    def _get_conn(self, timeout=None):
+        if self.block and self.pool is not None and self.pool.empty():
+            started = time.monotonic()
+            conn = super()._get_conn(timeout=timeout)
+            _pool_wait_stats.record(time.monotonic() - started)
+            return conn
+        return super()._get_conn(timeout=timeout)
+
+
+class _TrackedHTTPConnectionPool(_TrackedPoolMixin, HTTPConnectionPool):
+    pass
+
+
+class _TrackedHTTPSConnectionPool(_TrackedPoolMixin, HTTPSConnectionPool):
+    pass
+
+
+class _TrackedHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter whose connection pools record pool waits"""
+    
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _TrackedHTTPConnectionPool,
+            "https": _TrackedHTTPSConnectionPool,
+        }
+
+
+_http_session: Optional[requests.Session] = None
+_http_session_lock = threading.Lock()
+
+
+def get_http_session() -> requests.Session:
+    """
+    Get the process-wide keep-alive session used for GSP calls.
+    
+    Connections to the GSP host are pooled (GSP_HTTP_POOL_SIZE) so repeated
+    calls skip the TCP+TLS handshake. When every connection is busy, callers
+    block for a free one instead of opening throwaway connections.
+    """
+    global _http_session
+    
+    if _http_session is not None:
+        return _http_session
+    
+    with _http_session_lock:
+        if _http_session is None:
+            adapter = _TrackedHTTPAdapter(
+                pool_connections=4,
+                pool_maxsize=settings.GSP_HTTP_POOL_SIZE,
+                pool_block=True
+            )
+            session = requests.Session()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _http_session = session
+            logger.info(f"GSP HTTP session initialized: pool_maxsize={settings.GSP_HTTP_POOL_SIZE}")
+    return _http_session
+
+
+def get_http_pool_stats() -> Dict:
+    """Connection reuse and pool wait statistics for the shared GSP session"""
+    stats = {
+        "pool_maxsize": settings.GSP_HTTP_POOL_SIZE,
+        "connections_opened": 0,
+        "requests_sent": 0,
+        "connections_reused": 0,
+        "idle_connections": 0,
+        "pool_waits": _pool_wait_stats.waits,
+        "pool_wait_seconds": round(_pool_wait_stats.wait_seconds, 3),
+    }
+    if _http_session is None:
+        return stats
+    
+    adapter = _http_session.get_adapter("https://")
+    pools = adapter.poolmanager.pools
+    for key in list(pools.keys()):
+        pool = pools.get(key)
+        if pool is None:
+            continue
+        stats["connections_opened"] += pool.num_connections
+        stats["requests_sent"] += pool.num_requests
+        stats["idle_connections"] += sum(1 for conn in list(pool.pool.queue) if conn is not None) if pool.pool else 0
+    stats["connections_reused"] = max(0, stats["requests_sent"] - stats["connections_opened"])
+    return stats
+
+
+# Background refreshes of stale vendor entries (stale-while-revalidate).
+# Small on purpose: revalidation must never crowd out foreground lookups.
+_revalidate_executor: Optional[ThreadPoolExecutor] = None
+_revalidate_executor_lock = threading.Lock()
+
+
+def get_revalidate_executor() -> ThreadPoolExecutor:
+    """Process-wide executor for background vendor revalidation"""
+    global _revalidate_executor
+    
+    if _revalidate_executor is not None:
+        return _revalidate_executor
+    
+    with _revalidate_executor_lock:
+        if _revalidate_executor is None:
+            _revalidate_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="vendor-revalidate")
+    
+    return _revalidate_executor
+
+# ============ RESPONSE PARSING ============
+# Shared by the sync and async Sandbox providers.
+
+def current_financial_year() -> str:
+    """
+    Current financial year in Track GST Returns format (Apr-Mar).
+    For example: if current date is Feb 2026, FY is "2025-26"
+    """
+    current_date = datetime.now()
+    if current_date.month >= 4:  # April or later
+        fy_start = current_date.year
+    else:  # Jan-Mar
+        fy_start = current_date.year - 1
+    return f"{fy_start}-{str(fy_start + 1)[-2:]}"
+
+
+def parse_filing_history(response_json: Dict, months: int = 3) -> List[Dict]:
+    """
+    Extract GSTR-3B, GSTR-1 and IFF filing records from a Track GST Returns response.
+    
+    Returns:
+        Up to months * 2 records (GSTR-1 + GSTR-3B per month), most recent first
+    """
+    # Extract nested data (same structure as GSTIN search)
+    outer_data = response_json.get("data", {})
+    inner_data = outer_data.get("data", {}) if isinstance(outer_data, dict) else {}
+    filed_list = inner_data.get("EFiledlist", [])
+    
+    filing_records = []
+    
+    for record in filed_list:
+        rtn_type = record.get("rtntype", "")
+        
+        # Only include GSTR-3B, GSTR-1, and IFF
+        if rtn_type not in ["GSTR3B", "GSTR1", "IFF"]:
+            continue
+        
+        # Parse return period (MMYYYY format)
+        ret_period = record.get("ret_prd", "")
+        if len(ret_period) == 6:
+            month = ret_period[:2]
+            year = ret_period[2:]
+            period_display = f"{month}/{year}"
+        else:
+            period_display = ret_period
+        
+        # Get filing details
+        filed_date = record.get("dof", "N/A")
+        status = record.get("status", "Unknown")
+        
+        # Determine delay status (simplified - can be enhanced later)
+        delay = "On Time" if status == "Filed" else "Late"
+        
+        filing_records.append({
+            "period": period_display,
+            "filed_date": filed_date,
+            "status": status,
+            "delay": delay,
+            "return_type": rtn_type
+        })
+    
+    # Sort by period (most recent first) and limit to requested months
+    filing_records.sort(key=lambda x: x["period"], reverse=True)
+    
+    return filing_records[:months * 2]
+
+
+def map_vendor_data(gstin: str, data: Dict, filing_history: List[Dict]) -> Dict:
+    """Map a GSTIN search payload plus filing history to our internal vendor schema"""
+    return {
+        "gstin": gstin,
+        "gst_status": data.get("sts") or data.get("status") or "Active",
+        "registration_date": data.get("rgdt") or data.get("registration_date") or "N/A",
+        "legal_name": data.get("lgnm") or data.get("legal_name") or "Unknown",
+        "trade_name": data.get("tradeNam") or data.get("trade_name") or data.get("lgnm") or "Unknown",
+        "filing_history": filing_history,
+        "last_updated": datetime.now().isoformat(),
+        "source": "GSP_LIVE"
+    }
+
+
+# ============ GSP ACCESS TOKEN ============
+
+class GSPTokenManager:
+    """
+    Single-flight access token holder shared by every provider in the process.
+    
+    - Only one caller refreshes at a time: an in-process lock serializes threads,
+      and a Redis lock elects one refresher across Celery workers/API processes.
+      Everyone else waits for the token the refresher publishes to Redis.
+    - A background timer refreshes the token REFRESH_AHEAD before it expires,
+      so request paths normally never pay authentication latency.
+    """
+    EXPIRY_BUFFER = timedelta(minutes=5)     # treat the token as expired this early
+    REFRESH_AHEAD = timedelta(minutes=10)    # proactive refresh this long before expiry
+    LOCK_TTL = 15                            # seconds a refresher may hold the Redis lock
+    WAIT_TIMEOUT = 15                        # seconds to wait for another refresher
+    RETRY_DELAY = 30                         # seconds between failed proactive refreshes
+    
+    def __init__(self, provider: str, authenticate: Callable[[], Optional[Tuple[str, int]]]):
+        self.provider = provider
+        self._authenticate = authenticate
+        self._lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+        self.access_token: Optional[str] = None
+        self.token_expiry: Optional[datetime] = None
+    
+    def peek(self) -> Optional[str]:
+        """Return the in-memory token if still valid, without blocking"""
+        token, expiry = self.access_token, self.token_expiry
+        if token and expiry and datetime.now() < expiry - self.EXPIRY_BUFFER:
+            return token
+        return None
+    
+    def get_token(self) -> Optional[str]:
+        """Return a valid token, refreshing it (single-flight) if needed"""
+        token = self.peek()
+        if token:
+            return token
+        
+        with self._lock:
+            # Another thread may have refreshed while we waited for the lock
+            token = self.peek()
+            if token:
+                return token
+            return self._refresh(min_remaining=self.EXPIRY_BUFFER)
+    
+    def _adopt_shared(self, min_remaining: timedelta) -> bool:
+        """Adopt the token in Redis if it stays valid for at least min_remaining"""
+        info = cache.get_gsp_token_info(self.provider)
+        if not info or not info.get("token") or not info.get("expires_at"):
+            return False
+        
+        expires_at = datetime.fromisoformat(info["expires_at"])
+        if datetime.now() >= expires_at - min_remaining:
+            return False
+        
+        self._set_token(info["token"], expires_at)
+        return True
+    
+    def _refresh(self, min_remaining: timedelta) -> Optional[str]:
+        """Refresh the token. Caller must hold self._lock."""
+        if self._adopt_shared(min_remaining):
+            logger.debug("Using cached GSP token")
+            return self.access_token
+        
+        lock_name = f"gsp_token:{self.provider}"
+        lock_owner = cache.acquire_lock(lock_name, self.LOCK_TTL)
+        if lock_owner is None and cache.enabled:
+            # Another process is authenticating - wait for its token while it holds the lock
+            deadline = time.monotonic() + self.WAIT_TIMEOUT
+            while time.monotonic() < deadline:
+                time.sleep(0.1)
+                if self._adopt_shared(min_remaining):
+                    return self.access_token
+                if not cache.lock_held(lock_name):
+                    # Released without publishing a token, or Redis is unreachable
+                    lock_owner = cache.acquire_lock(lock_name, self.LOCK_TTL)
+                    break
+            else:
+                logger.warning("Timed out waiting for another worker to refresh the GSP token")
+        
+        try:
+            result = self._authenticate()
+            if not result:
+                return None
+            
+            token, expires_in = result
+            expires_at = datetime.now() + timedelta(seconds=expires_in)
+            # Cache token in Redis (5 min buffer)
+            if expires_in > 300:
+                cache.set_gsp_token(self.provider, token, expires_in - 300, expires_at=expires_at.isoformat())
+            self._set_token(token, expires_at)
+            return token
+        finally:
+            if lock_owner:
+                cache.release_lock(lock_name, lock_owner)
+    
+    def _set_token(self, token: str, expires_at: datetime):
+        self.access_token = token
+        self.token_expiry = expires_at
+        self._schedule((expires_at - self.REFRESH_AHEAD - datetime.now()).total_seconds())
+    
+    def _schedule(self, delay: float):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if delay <= 0:
+            return  # Short-lived token; refresh on demand
+        
+        self._timer = threading.Timer(delay, self._refresh_in_background)
+        self._timer.daemon = True
+        self._timer.start()
+    
+    def _refresh_in_background(self):
+        with self._lock:
+            try:
+                token = self._refresh(min_remaining=self.REFRESH_AHEAD)
+            except Exception as e:
+                logger.error(f"Background GSP token refresh failed: {e}")
+                token = None
+            
+            if token is None and self.peek():
+                # Current token is still usable - try again shortly
+                self._schedule(self.RETRY_DELAY)
+
+
+_token_managers: Dict[str, GSPTokenManager] = {}
+_token_managers_lock = threading.Lock()
+
+
+def get_token_manager(client_id: str, secret: str, base_url: str = "https://api.sandbox.co.in") -> GSPTokenManager:
+    """Get the process-wide token manager for a Sandbox API key"""
+    with _token_managers_lock:
+        manager = _token_managers.get(client_id)
+        if manager is None:
+            manager = GSPTokenManager("sandbox", lambda: _sandbox_authenticate(base_url, client_id, secret))
+            _token_managers[client_id] = manager
+        return manager
+
+
+def _sandbox_authenticate(base_url: str, client_id: str, secret: str) -> Optional[Tuple[str, int]]:
+    """Call Sandbox /authenticate. Returns (access_token, expires_in seconds)."""
+    try:
+        auth_url = f"{base_url}/authenticate"
+        headers = {
+            "x-api-key": client_id,
+            "x-api-secret": secret,
+            "x-api-version": "1.0",
+            "Content-Type": "application/json"
+        }
+        logger.info(f"Authenticating with GSP API at {auth_url}")
+        response = get_http_session().post(auth_url, headers=headers, timeout=10)
+        response.raise_for_status()
+        auth_data = response.json()
+        logger.info(f"GSP Authentication Success. Token obtained.")
+        
+        # Assume 1 hour validity if not provided
+        # Sandbox typically returns 'expires_in' (seconds)
+        return auth_data.get("access_token"), int(auth_data.get("expires_in", 3600))
+    except Exception as e:
+        logger.error(f"GSP Authentication Failed: {str(e)}")
+        return None
+
+
 class BaseGSPProvider(ABC):
     """Abstract base class for GSP providers."""
     
@@ -20,6 +402,14 @@ class BaseGSPProvider(ABC):
         """Fetch vendor data based on GSTIN."""
         pass
 
+    def get_vendor_data_many(self, gstins: List[str], max_concurrency: int = None) -> Dict[str, Optional[Dict]]:
+        """Fetch vendor data for many GSTINs. Default: one lookup per unique GSTIN."""
+        return {gstin: self.get_vendor_data(gstin) for gstin in dict.fromkeys(gstins)}
+
+    def revalidate(self, gstin: str) -> None:
+        """Refresh a stale cached entry in the background. Default: nothing is cached, nothing to do."""
+        pass
+
 class MockGSPProvider(BaseGSPProvider):
     """
     Simulates GSP API responses for different vendor scenarios.
@@ -132,49 +522,13 @@ class SandboxGSPProvider(BaseGSPProvider):
     def __init__(self, client_id: str, secret: str):
         self.client_id = client_id
         self.secret = secret
-        self.access_token = None
-        self.token_expiry = None
+        # Shared keep-alive session (connection pool is process-wide)
+        self.session = get_http_session()
+        self._token_manager = get_token_manager(client_id, secret, self.BASE_URL)
 
     def _get_access_token(self) -> Optional[str]:
-        """Authenticate and get access token with Redis caching."""
-        try:
-            # Try Redis cache first
-            cached_token = cache.get_gsp_token("sandbox")
-            if cached_token:
-                logger.debug("Using cached GSP token")
-                return cached_token
-            
-            # Return in-memory cached token if valid (buffer of 5 minutes)
-            if self.access_token and self.token_expiry:
-                if datetime.now() < (self.token_expiry - timedelta(minutes=5)):
-                    return self.access_token
-            
-            auth_url = f"{self.BASE_URL}/authenticate"
-            headers = {
-                "x-api-key": self.client_id,
-                "x-api-secret": self.secret,
-                "x-api-version": "1.0",
-                "Content-Type": "application/json"
-            }
-            logger.info(f"Authenticating with GSP API at {auth_url}")
-            response = requests.post(auth_url, headers=headers, timeout=10)
-            response.raise_for_status()
-            auth_data = response.json()
-            logger.info(f"GSP Authentication Success. Token obtained.")
-            
-            self.access_token = auth_data.get("access_token")
-            # Assume 1 hour validity if not provided, or parse from response if available
-            # Sandbox typically returns 'expires_in' (seconds)
-            expires_in = auth_data.get("expires_in", 3600) 
-            self.token_expiry = datetime.now() + timedelta(seconds=int(expires_in))
-            
-            # Cache token in Redis
-            cache.set_gsp_token("sandbox", self.access_token, expires_in - 300)  # 5 min buffer
-            
-            return self.access_token
-        except Exception as e:
-            logger.error(f"GSP Authentication Failed: {str(e)}")
-            return None
+        """Get a valid access token (shared, single-flight refresh)."""
+        return self._token_manager.get_token()
 
     def get_filing_history(self, gstin: str, months: int = 3) -> List[Dict]:
         """
@@ -205,15 +559,7 @@ class SandboxGSPProvider(BaseGSPProvider):
             
             track_url = f"{self.BASE_URL}/gst/compliance/public/gstrs/track"
             
-            # Get current financial year (Apr-Mar format)
-            # For example: if current date is Feb 2026, FY is 2025-26
-            from datetime import datetime
-            current_date = datetime.now()
-            if current_date.month >= 4:  # April or later
-                fy_start = current_date.year
-            else:  # Jan-Mar
-                fy_start = current_date.year - 1
-            financial_year = f"{fy_start}-{str(fy_start + 1)[-2:]}"  # e.g., "2025-26"
+            financial_year = current_financial_year()  # e.g., "2025-26"
             
             # Add financial_year as query parameter
             track_url_with_params = f"{track_url}?financial_year={financial_year}"
@@ -224,7 +570,7 @@ class SandboxGSPProvider(BaseGSPProvider):
             print(f"URL: {track_url_with_params}")
             print(f"Payload: {payload}")
             print(f"=================================")
-            response = requests.post(track_url_with_params, json=payload, headers=headers, timeout=10)
+            response = self.session.post(track_url_with_params, json=payload, headers=headers, timeout=10)
             response.raise_for_status()
             response_json = response.json()
             
@@ -233,54 +579,11 @@ class SandboxGSPProvider(BaseGSPProvider):
             print(f"===================================")
             logger.info(f"Filing History API Response: {response_json}")
             
-            # Step 3: Extract nested data (same structure as GSTIN search)
-            outer_data = response_json.get("data", {})
-            inner_data = outer_data.get("data", {}) if isinstance(outer_data, dict) else {}
-            filed_list = inner_data.get("EFiledlist", [])
-            
-            if not filed_list:
+            # Step 3: Extract and format GSTR-3B / GSTR-1 / IFF records
+            filing_records = parse_filing_history(response_json, months)
+            if not filing_records:
                 logger.warning(f"No filing history found for GSTIN: {gstin}")
-                return []
-            
-            # Step 4: Process and format filing records
-            filing_records = []
-            
-            for record in filed_list:
-                rtn_type = record.get("rtntype", "")
-                
-                # Only include GSTR-3B, GSTR-1, and IFF
-                if rtn_type not in ["GSTR3B", "GSTR1", "IFF"]:
-                    continue
-                
-                # Parse return period (MMYYYY format)
-                ret_period = record.get("ret_prd", "")
-                if len(ret_period) == 6:
-                    month = ret_period[:2]
-                    year = ret_period[2:]
-                    period_display = f"{month}/{year}"
-                else:
-                    period_display = ret_period
-                
-                # Get filing details
-                filed_date = record.get("dof", "N/A")
-                status = record.get("status", "Unknown")
-                
-                # Determine delay status (simplified - can be enhanced later)
-                delay = "On Time" if status == "Filed" else "Late"
-                
-                filing_records.append({
-                    "period": period_display,
-                    "filed_date": filed_date,
-                    "status": status,
-                    "delay": delay,
-                    "return_type": rtn_type
-                })
-            
-            # Sort by period (most recent first) and limit to requested months
-            filing_records.sort(key=lambda x: x["period"], reverse=True)
-            
-            # Return up to months * 2 records (GSTR-1 + GSTR-3B per month)
-            return filing_records[:months * 2]
+            return filing_records
             
         except requests.exceptions.HTTPError as e:
             # Log the actual error response for debugging
@@ -328,7 +631,7 @@ class SandboxGSPProvider(BaseGSPProvider):
             }
             
             logger.info(f"Requesting OTP for GSTIN: {gstin}")
-            response = requests.post(otp_url, json=payload, headers=headers, timeout=15)
+            response = self.session.post(otp_url, json=payload, headers=headers, timeout=15)
             response.raise_for_status()
             response_json = response.json()
             
@@ -391,7 +694,7 @@ class SandboxGSPProvider(BaseGSPProvider):
             }
             
             logger.info(f"Verifying OTP for GSTIN: {gstin}")
-            response = requests.post(verify_url, json=payload, headers=headers, timeout=15)
+            response = self.session.post(verify_url, json=payload, headers=headers, timeout=15)
             response.raise_for_status()
             response_json = response.json()
             
@@ -422,10 +725,35 @@ class SandboxGSPProvider(BaseGSPProvider):
             logger.error(f"Error verifying OTP: {str(e)}")
             return None
 
+    def _gstr2b_request(self, gstin: str, return_period: str, auth_token: str) -> Optional[Dict]:
+        """Request kwargs for the GSTR-2B fetch endpoint (None if no access token)"""
+        token = self._get_access_token()
+        if not token:
+            logger.error("Failed to obtain GSP access token for GSTR-2B fetch")
+            return None
+        
+        return {
+            "url": f"{self.BASE_URL}/gst/compliance/v2/returns/gstr2b",
+            "json": {
+                "gstin": gstin,
+                "return_period": return_period,
+                "auth_token": auth_token
+            },
+            "headers": {
+                "authorization": token,
+                "x-api-key": self.client_id,
+                "x-api-version": "1.0.0",
+                "Content-Type": "application/json",
+                "Accept": "application/json"
+            }
+        }
+
     def fetch_gstr2b(self, gstin: str, return_period: str, auth_token: str) -> Optional[Dict]:
         """
         Fetch GSTR-2B data for a specific return period.
         
+        Loads the whole period into memory; use stream_gstr2b for large periods.
+        
         Args:
             gstin: The GSTIN
             return_period: Period in MMYYYY format (e.g., "022026" for Feb 2026)
@@ -435,29 +763,12 @@ class SandboxGSPProvider(BaseGSPProvider):
             Dict with GSTR-2B invoice data if successful, None otherwise
         """
         try:
-            token = self._get_access_token()
-            if not token:
-                logger.error("Failed to obtain GSP access token for GSTR-2B fetch")
+            request = self._gstr2b_request(gstin, return_period, auth_token)
+            if not request:
                 return None
-
-            headers = {
-                "authorization": token,
-                "x-api-key": self.client_id,
-                "x-api-version": "1.0.0",
-                "Content-Type": "application/json",
-                "Accept": "application/json"
-            }
-            
-            # GSTR-2B Fetch endpoint
-            gstr2b_url = f"{self.BASE_URL}/gst/compliance/v2/returns/gstr2b"
-            payload = {
-                "gstin": gstin,
-                "return_period": return_period,
-                "auth_token": auth_token
-            }
             
             logger.info(f"Fetching GSTR-2B for GSTIN: {gstin}, Period: {return_period}")
-            response = requests.post(gstr2b_url, json=payload, headers=headers, timeout=30)
+            response = self.session.post(**request, timeout=30)
             response.raise_for_status()
             response_json = response.json()
             
@@ -486,6 +797,52 @@ class SandboxGSPProvider(BaseGSPProvider):
             logger.error(f"Error fetching GSTR-2B: {str(e)}")
             return None
 
+    def stream_gstr2b(self, gstin: str, return_period: str, auth_token: str) -> Optional[Iterator[Dict]]:
+        """
+        Start a GSTR-2B download and return its invoices as an iterator.
+        
+        Invoices are parsed from the response body as it arrives (one supplier
+        block in memory at a time). The HTTP connection is released when the
+        iterator is exhausted or closed; errors while reading the body are
+        raised from the iterator.
+        
+        Args:
+            gstin: The GSTIN
+            return_period: Period in MMYYYY format
+            auth_token: Auth token from verify_otp
+            
+        Returns:
+            Iterator of normalized invoice dicts, or None if the request failed
+        """
+        try:
+            request = self._gstr2b_request(gstin, return_period, auth_token)
+            if not request:
+                return None
+            
+            logger.info(f"Streaming GSTR-2B for GSTIN: {gstin}, Period: {return_period}")
+            response = self.session.post(**request, timeout=30, stream=True)
+            response.raise_for_status()
+            return self._iter_gstr2b_response(response, gstin, return_period)
+            
+        except requests.exceptions.HTTPError as e:
+            error_response = e.response.text if hasattr(e.response, 'text') else str(e)
+            logger.error(f"HTTP Error fetching GSTR-2B: Status {e.response.status_code}, Response: {error_response}")
+            return None
+        except Exception as e:
+            logger.error(f"Error fetching GSTR-2B: {str(e)}")
+            return None
+
+    def _iter_gstr2b_response(self, response, gstin: str, return_period: str) -> Iterator[Dict]:
+        count = 0
+        try:
+            response.raw.decode_content = True  # undo gzip/deflate transfer encoding
+            for invoice in iter_gstr2b_stream(response.raw, gstin, return_period):
+                count += 1
+                yield invoice
+            logger.info(f"Parsed {count} invoices from GSTR-2B stream for {gstin}")
+        finally:
+            response.close()
+
     def _parse_gstr2b_invoices(self, data: Dict, gstin: str, return_period: str) -> List[Dict]:
         """
         Parse GSTR-2B response and extract invoice details.
@@ -501,45 +858,7 @@ class SandboxGSPProvider(BaseGSPProvider):
         invoices = []
         
         try:
-            # B2B Invoices (Regular)
-            b2b_data = data.get("b2b", [])
-            for supplier in b2b_data:
-                supplier_gstin = supplier.get("ctin", "")
-                inv_list = supplier.get("inv", [])
-                
-                for inv in inv_list:
-                    invoices.append({
-                        "supplier_gstin": supplier_gstin,
-                        "invoice_no": inv.get("inum", ""),
-                        "invoice_date": inv.get("dt", ""),
-                        "invoice_value": float(inv.get("val", 0)),
-                        "taxable_value": float(inv.get("txval", 0)),
-                        "tax_amount": float(inv.get("igst", 0)) + float(inv.get("cgst", 0)) + float(inv.get("sgst", 0)),
-                        "filing_status": inv.get("flag", "Y"),
-                        "return_period": return_period,
-                        "buyer_gstin": gstin
-                    })
-            
-            # B2BA Invoices (Amended)
-            b2ba_data = data.get("b2ba", [])
-            for supplier in b2ba_data:
-                supplier_gstin = supplier.get("ctin", "")
-                inv_list = supplier.get("inv", [])
-                
-                for inv in inv_list:
-                    invoices.append({
-                        "supplier_gstin": supplier_gstin,
-                        "invoice_no": inv.get("inum", ""),
-                        "invoice_date": inv.get("dt", ""),
-                        "invoice_value": float(inv.get("val", 0)),
-                        "taxable_value": float(inv.get("txval", 0)),
-                        "tax_amount": float(inv.get("igst", 0)) + float(inv.get("cgst", 0)) + float(inv.get("sgst", 0)),
-                        "filing_status": inv.get("flag", "Y"),
-                        "return_period": return_period,
-                        "buyer_gstin": gstin,
-                        "is_amended": True
-                    })
-            
+            invoices = parse_gstr2b_invoices(data, gstin, return_period)
             logger.info(f"Parsed {len(invoices)} invoices from GSTR-2B data")
             
         except Exception as e:
@@ -549,15 +868,81 @@ class SandboxGSPProvider(BaseGSPProvider):
 
     def get_vendor_data(self, gstin: str) -> Optional[Dict]:
         """Fetch real data from Sandbox.co.in with Redis caching"""
+        # Check cache first
+        cached_data, status = vendor_cache.lookup(gstin)
+        return self._from_cache(gstin, cached_data, status)
+
+    def _from_cache(self, gstin: str, cached_data: Optional[Dict], status: str) -> Optional[Dict]:
+        """Resolve a vendor cache lookup: serve hits, revalidate stale entries, fetch misses"""
+        if status == vendor_cache.FRESH:
+            logger.info(f"Cache HIT for vendor: {gstin}")
+            return cached_data
+        
+        if status == vendor_cache.STALE:
+            logger.info(f"Cache STALE for vendor: {gstin}. Serving stale data and revalidating...")
+            self.revalidate(gstin)
+            return vendor_cache.mark_stale(cached_data)
+        
+        if status == vendor_cache.NEGATIVE:
+            logger.info(f"Negative cache HIT for vendor: {gstin}. Skipping GSP call")
+            return None
+        
+        logger.info(f"Cache MISS for vendor: {gstin}. Fetching from GSP...")
+        return self._fetch_vendor_data(gstin)
+
+    def revalidate(self, gstin: str) -> None:
+        """Refresh a stale cached entry on the background executor (one refresh per GSTIN at a time)"""
+        if vendor_cache.begin_revalidation(gstin):
+            get_revalidate_executor().submit(self._revalidate, gstin)
+
+    def _revalidate(self, gstin: str) -> None:
+        try:
+            self._fetch_vendor_data(gstin)
+        finally:
+            vendor_cache.end_revalidation(gstin)
+
+    def get_vendor_data_many(self, gstins: List[str], max_concurrency: int = None) -> Dict[str, Optional[Dict]]:
+        """
+        Fetch vendor data for many GSTINs.
+        
+        Duplicates are collapsed, the vendor cache is checked for all GSTINs
+        at once (one MGET, one SELECT), and only the misses are fetched from the GSP - at most
+        max_concurrency at a time (defaults to settings.GSP_MAX_CONCURRENCY). Stale hits are
+        served and revalidated in the background; negative hits return None without a GSP call.
+        
+        Returns:
+            Dict mapping each requested GSTIN to its vendor data (None on failure)
+        """
+        unique_gstins = list(dict.fromkeys(gstins))
+        if not unique_gstins:
+            return {}
+        
+        results: Dict[str, Optional[Dict]] = {
+            gstin: self._from_cache(gstin, cached_data, status)
+            for gstin, (cached_data, status) in vendor_cache.lookup_many(unique_gstins).items()
+        }
+        misses = [gstin for gstin in unique_gstins if gstin not in results]
+        logger.info(f"Bulk vendor lookup: {len(unique_gstins)} unique GSTINs, "
+                    f"{len(results)} cache hits, {len(misses)} to fetch from GSP")
+        
+        if misses:
+            limit = max(1, min(max_concurrency or settings.GSP_MAX_CONCURRENCY, len(misses)))
+            fetch = partial(self._fetch_vendor_data, write_through=False)
+            with ThreadPoolExecutor(max_workers=limit) as executor:
+                fetched = list(executor.map(fetch, misses))
+            results.update(zip(misses, fetched))
+            # Write all fetched vendors through in one Redis pipeline
+            vendor_cache.set_many([vendor_data for vendor_data in fetched if vendor_data])
+        
+        return results
+
+    def _fetch_vendor_data(self, gstin: str, write_through: bool = True) -> Optional[Dict]:
+        """
+        Fetch vendor data from Sandbox.co.in (bypassing the cache) and cache the result
+        (write_through=False leaves that to the caller, e.g. to batch the writes).
+        Failures are negatively cached: not-found / invalid GSTINs for longer than upstream errors.
+        """
         try:
-            # Check cache first
-            cached_data = cache.get_vendor_data(gstin)
-            if cached_data:
-                logger.info(f"Cache HIT for vendor: {gstin}")
-                return cached_data
-            
-            logger.info(f"Cache MISS for vendor: {gstin}. Fetching from GSP...")
-            
             # Step 1: Get Access Token
             token = self._get_access_token()
             if not token:
@@ -577,13 +962,20 @@ class SandboxGSPProvider(BaseGSPProvider):
             gst_url = f"{self.BASE_URL}/gst/compliance/public/gstin/search"
             payload = {"gstin": gstin}
             
-            response = requests.post(gst_url, json=payload, headers=headers, timeout=10)
+            response = self.session.post(gst_url, json=payload, headers=headers, timeout=10)
             
             # Handle 403 specifically to warn user
             if response.status_code == 403:
                 logger.error(f"GSP Permission Denied: {response.text}")
                 # Return a special mock indicating permission issue? 
                 # Or just None for now.
+                vendor_cache.set_negative(gstin, "PERMISSION_DENIED")
+                return None
+            
+            # Invalid / unknown GSTIN
+            if response.status_code in (400, 404, 422):
+                logger.warning(f"GSP rejected GSTIN {gstin}: HTTP {response.status_code}")
+                vendor_cache.set_negative(gstin, f"HTTP_{response.status_code}", not_found=True)
                 return None
             
             response.raise_for_status()
@@ -600,6 +992,7 @@ class SandboxGSPProvider(BaseGSPProvider):
             
             if not outer_data:
                 logger.warning(f"No outer data returned from GSP for GSTIN: {gstin}")
+                vendor_cache.set_negative(gstin, "NOT_FOUND", not_found=True)
                 return None
             
             # The actual GSTIN details are in the nested 'data' field
@@ -611,6 +1004,7 @@ class SandboxGSPProvider(BaseGSPProvider):
             
             if not data:
                 logger.warning(f"No inner data returned from GSP for GSTIN: {gstin}")
+                vendor_cache.set_negative(gstin, "NOT_FOUND", not_found=True)
                 return None
 
             # Step 3: Get Filing History from Track GST Returns API
@@ -618,24 +1012,21 @@ class SandboxGSPProvider(BaseGSPProvider):
             logger.info(f"Retrieved {len(filing_data)} filing records for GSTIN: {gstin}")
 
             # Map to our internal schema
-            vendor_data = {
-                "gstin": gstin,
-                "gst_status": data.get("sts") or data.get("status") or "Active",
-                "registration_date": data.get("rgdt") or data.get("registration_date") or "N/A",
-                "legal_name": data.get("lgnm") or data.get("legal_name") or "Unknown",
-                "trade_name": data.get("tradeNam") or data.get("trade_name") or data.get("lgnm") or "Unknown",
-                "filing_history": filing_data,
-                "last_updated": datetime.now().isoformat(),
-                "source": "GSP_LIVE"
-            }
+            vendor_data = map_vendor_data(gstin, data, filing_data)
             
-            # Cache the vendor data for 24 hours
-            cache.set_vendor_data(gstin, vendor_data)
-            logger.info(f"Cached vendor data for: {gstin}")
+            # Write through to memory, Redis (24 hours) and the vendors table
+            if write_through:
+                vendor_cache.set(vendor_data)
+                logger.info(f"Cached vendor data for: {gstin}")
             
             return vendor_data
+        except requests.exceptions.Timeout as e:
+            logger.error(f"Timed out fetching data from Sandbox GSP: {str(e)}")
+            vendor_cache.set_negative(gstin, "TIMEOUT")
+            return None
         except Exception as e:
             logger.error(f"Error fetching data from Sandbox GSP: {str(e)}")
+            vendor_cache.set_negative(gstin, "UPSTREAM_ERROR")
             return None
 
 def get_gsp_provider() -> BaseGSPProvider:
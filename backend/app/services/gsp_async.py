@@ -2,13 +2,14 @@
 Async GSP Provider for improved performance
 Uses httpx for async HTTP requests
 """
-from abc import ABC, abstractmethod
-from datetime import datetime, timedelta
+import asyncio
 from typing import Optional, Dict, List
 import httpx
 import logging
 from app.core.config import settings
-from app.services.cache import cache
+from app.services.vendor_cache import vendor_cache
+from app.db.session import run_in_db_executor
+from app.services.gsp import current_financial_year, parse_filing_history, map_vendor_data, get_token_manager
 
 logger = logging.getLogger(__name__)
 
@@ -23,84 +24,171 @@ class AsyncSandboxGSPProvider:
     def __init__(self, client_id: str, secret: str):
         self.client_id = client_id
         self.secret = secret
-        self.access_token = None
-        self.token_expiry = None
+        self._token_manager = get_token_manager(client_id, secret, self.BASE_URL)
         # Reusable async HTTP client
         self.client = httpx.AsyncClient(timeout=10.0)
+        # Strong references to background revalidation tasks
+        self._revalidations = set()
     
     async def _get_access_token(self) -> Optional[str]:
-        """Authenticate and get access token with Redis caching."""
+        """Get a valid access token (shared with the sync provider, single-flight refresh)."""
+        token = self._token_manager.peek()
+        if token:
+            return token
+        return await asyncio.to_thread(self._token_manager.get_token)
+    
+    async def get_vendor_data(self, gstin: str) -> Optional[Dict]:
+        """Fetch vendor data asynchronously with caching"""
+        # Check cache first
+        cached_data, status = vendor_cache.lookup_local(gstin) or await run_in_db_executor(vendor_cache.lookup, gstin)
+        return await self._from_cache(gstin, cached_data, status)
+    
+    async def _from_cache(self, gstin: str, cached_data: Optional[Dict], status: str) -> Optional[Dict]:
+        """Resolve a vendor cache lookup: serve hits, revalidate stale entries, fetch misses"""
+        if status == vendor_cache.FRESH:
+            logger.info(f"Cache HIT for vendor: {gstin}")
+            return cached_data
+        
+        if status == vendor_cache.STALE:
+            logger.info(f"Cache STALE for vendor: {gstin}. Serving stale data and revalidating...")
+            self.revalidate(gstin)
+            return vendor_cache.mark_stale(cached_data)
+        
+        if status == vendor_cache.NEGATIVE:
+            logger.info(f"Negative cache HIT for vendor: {gstin}. Skipping GSP call")
+            return None
+        
+        logger.info(f"Cache MISS for vendor: {gstin}. Fetching from GSP (async)...")
+        return await self._fetch_vendor_data(gstin)
+    
+    def revalidate(self, gstin: str) -> None:
+        """Refresh a stale cached entry in a background task (one refresh per GSTIN at a time)"""
+        if vendor_cache.begin_revalidation(gstin):
+            task = asyncio.get_running_loop().create_task(self._revalidate(gstin))
+            self._revalidations.add(task)
+            task.add_done_callback(self._revalidations.discard)
+    
+    async def _revalidate(self, gstin: str) -> None:
         try:
-            # Try Redis cache first
-            cached_token = cache.get_gsp_token("sandbox")
-            if cached_token:
-                logger.debug("Using cached GSP token")
-                return cached_token
-            
-            # Return in-memory cached token if valid
-            if self.access_token and self.token_expiry:
-                if datetime.now() < (self.token_expiry - timedelta(minutes=5)):
-                    return self.access_token
-            
-            auth_url = f"{self.BASE_URL}/authenticate"
-            headers = {
-                "x-api-key": self.client_id,
-                "x-api-secret": self.secret,
-                "x-api-version": "1.0",
-                "Content-Type": "application/json"
-            }
-            
-            logger.info(f"Authenticating with GSP API (async)")
-            response = await self.client.post(auth_url, headers=headers)
-            response.raise_for_status()
-            auth_data = response.json()
-            
-            self.access_token = auth_data.get("access_token")
-            expires_in = auth_data.get("expires_in", 3600)
-            self.token_expiry = datetime.now() + timedelta(seconds=int(expires_in))
+            await self._fetch_vendor_data(gstin)
+        finally:
+            vendor_cache.end_revalidation(gstin)
+    
+    async def get_vendor_data_many(self, gstins: List[str], max_concurrency: int = None) -> Dict[str, Optional[Dict]]:
+        """
+        Fetch vendor data for many GSTINs concurrently.
+        
+        Duplicates are collapsed, the vendor cache is checked for all GSTINs
+        at once (one MGET, one SELECT), and only the misses are fetched from the GSP - at most
+        max_concurrency in flight (defaults to settings.GSP_MAX_CONCURRENCY). Stale hits are
+        served and revalidated in the background; negative hits return None without a GSP call.
+        """
+        unique_gstins = list(dict.fromkeys(gstins))
+        if not unique_gstins:
+            return {}
+        
+        cached = await run_in_db_executor(vendor_cache.lookup_many, unique_gstins)
+        results: Dict[str, Optional[Dict]] = {
+            gstin: await self._from_cache(gstin, cached_data, status)
+            for gstin, (cached_data, status) in cached.items()
+        }
+        misses = [gstin for gstin in unique_gstins if gstin not in results]
+        logger.info(f"Bulk vendor lookup (async): {len(unique_gstins)} unique GSTINs, "
+                    f"{len(results)} cache hits, {len(misses)} to fetch from GSP")
+        
+        if misses:
+            semaphore = asyncio.Semaphore(max(1, max_concurrency or settings.GSP_MAX_CONCURRENCY))
             
-            # Cache token in Redis
-            cache.set_gsp_token("sandbox", self.access_token, expires_in - 300)
-            logger.info("GSP Authentication Success (async)")
+            async def fetch(gstin: str) -> Optional[Dict]:
+                async with semaphore:
+                    return await self._fetch_vendor_data(gstin, write_through=False)
             
-            return self.access_token
-        except Exception as e:
-            logger.error(f"GSP Authentication Failed (async): {str(e)}")
-            return None
+            fetched = await asyncio.gather(*(fetch(gstin) for gstin in misses))
+            results.update(zip(misses, fetched))
+            # Write all fetched vendors through in one Redis pipeline
+            await run_in_db_executor(vendor_cache.set_many, [vendor_data for vendor_data in fetched if vendor_data])
+        
+        return results
     
-    async def get_vendor_data(self, gstin: str) -> Optional[Dict]:
-        """Fetch vendor data asynchronously with caching"""
+    def _headers(self, token: str) -> Dict[str, str]:
+        return {
+            "authorization": token,
+            "x-api-key": self.client_id,
+            "x-api-version": "1.0.0",
+            "Content-Type": "application/json",
+            "Accept": "application/json"
+        }
+    
+    async def get_filing_history(self, gstin: str, months: int = 3, token: str = None) -> List[Dict]:
+        """
+        Fetch GSTR-3B, GSTR-1, and IFF filing history for a vendor (async).
+        
+        Args:
+            gstin: Vendor's GSTIN
+            months: Number of months to analyze (default 3)
+            token: Access token, if the caller already holds one
+            
+        Returns:
+            List of filing records with period, filed_date, status, delay
+        """
         try:
-            # Check cache first
-            cached_data = cache.get_vendor_data(gstin)
-            if cached_data:
-                logger.info(f"Cache HIT for vendor: {gstin}")
-                return cached_data
+            token = token or await self._get_access_token()
+            if not token:
+                logger.error("Failed to get access token for filing history")
+                return []
             
-            logger.info(f"Cache MISS for vendor: {gstin}. Fetching from GSP (async)...")
+            financial_year = current_financial_year()
+            track_url = f"{self.BASE_URL}/gst/compliance/public/gstrs/track"
             
+            response = await self.client.post(
+                track_url,
+                params={"financial_year": financial_year},
+                json={"gstin": gstin},
+                headers=self._headers(token)
+            )
+            response.raise_for_status()
+            
+            filing_records = parse_filing_history(response.json(), months)
+            if not filing_records:
+                logger.warning(f"No filing history found for GSTIN: {gstin}")
+            return filing_records
+            
+        except httpx.HTTPStatusError as e:
+            logger.error(f"HTTP Error fetching filing history (async): Status {e.response.status_code}, Response: {e.response.text}")
+            return []
+        except Exception as e:
+            logger.error(f"Error fetching filing history from Sandbox GSP (async): {str(e)}")
+            return []
+    
+    async def _fetch_vendor_data(self, gstin: str, write_through: bool = True) -> Optional[Dict]:
+        """
+        Fetch vendor data from the GSP (bypassing the cache) and cache the result
+        (write_through=False leaves that to the caller, e.g. to batch the writes).
+        Failures are negatively cached: not-found / invalid GSTINs for longer than upstream errors.
+        """
+        try:
             # Get access token
             token = await self._get_access_token()
             if not token:
                 logger.error("Failed to obtain GSP access token")
                 return None
             
-            headers = {
-                "authorization": token,
-                "x-api-key": self.client_id,
-                "x-api-version": "1.0.0",
-                "Content-Type": "application/json",
-                "Accept": "application/json"
-            }
-            
-            # Fetch GSTIN details
+            # GSTIN search and Track GST Returns are independent - run them concurrently
             gst_url = f"{self.BASE_URL}/gst/compliance/public/gstin/search"
-            payload = {"gstin": gstin}
-            
-            response = await self.client.post(gst_url, json=payload, headers=headers)
+            response, filing_data = await asyncio.gather(
+                self.client.post(gst_url, json={"gstin": gstin}, headers=self._headers(token)),
+                self.get_filing_history(gstin, months=3, token=token)
+            )
             
             if response.status_code == 403:
                 logger.error(f"GSP Permission Denied: {response.text}")
+                await run_in_db_executor(vendor_cache.set_negative, gstin, "PERMISSION_DENIED")
+                return None
+            
+            # Invalid / unknown GSTIN
+            if response.status_code in (400, 404, 422):
+                logger.warning(f"GSP rejected GSTIN {gstin}: HTTP {response.status_code}")
+                await run_in_db_executor(vendor_cache.set_negative, gstin, f"HTTP_{response.status_code}", True)
                 return None
             
             response.raise_for_status()
@@ -113,28 +201,28 @@ class AsyncSandboxGSPProvider:
             
             if not data:
                 logger.warning(f"No data returned from GSP for GSTIN: {gstin}")
+                await run_in_db_executor(vendor_cache.set_negative, gstin, "NOT_FOUND", True)
                 return None
             
+            logger.info(f"Retrieved {len(filing_data)} filing records for GSTIN: {gstin}")
+            
             # Map to internal schema
-            vendor_data = {
-                "gstin": gstin,
-                "gst_status": data.get("sts") or data.get("status") or "Active",
-                "registration_date": data.get("rgdt") or data.get("registration_date") or "N/A",
-                "legal_name": data.get("lgnm") or data.get("legal_name") or "Unknown",
-                "trade_name": data.get("tradeNam") or data.get("trade_name") or data.get("lgnm") or "Unknown",
-                "filing_history": [],  # Simplified - can fetch separately if needed
-                "last_updated": datetime.now().isoformat(),
-                "source": "GSP_LIVE"
-            }
-            
-            # Cache the vendor data
-            cache.set_vendor_data(gstin, vendor_data)
-            logger.info(f"Cached vendor data for: {gstin}")
+            vendor_data = map_vendor_data(gstin, data, filing_data)
+            
+            # Write through to memory, Redis and the vendors table
+            if write_through:
+                await run_in_db_executor(vendor_cache.set, vendor_data)
+                logger.info(f"Cached vendor data for: {gstin}")
             
             return vendor_data
             
+        except httpx.TimeoutException as e:
+            logger.error(f"Timed out fetching data from Sandbox GSP (async): {str(e)}")
+            await run_in_db_executor(vendor_cache.set_negative, gstin, "TIMEOUT")
+            return None
         except Exception as e:
             logger.error(f"Error fetching data from Sandbox GSP (async): {str(e)}")
+            await run_in_db_executor(vendor_cache.set_negative, gstin, "UPSTREAM_ERROR")
             return None
     
     async def close(self):
@@ -142,14 +230,55 @@ class AsyncSandboxGSPProvider:
         await self.client.aclose()
 
 
+class AsyncGSPProviderAdapter:
+    """
+    Async facade over a sync provider (e.g. MockGSPProvider) so async callers
+    can treat every provider the same way. Calls run in a worker thread.
+    """
+    
+    def __init__(self, provider):
+        self.provider = provider
+    
+    async def get_vendor_data(self, gstin: str) -> Optional[Dict]:
+        return await asyncio.to_thread(self.provider.get_vendor_data, gstin)
+    
+    async def get_vendor_data_many(self, gstins: List[str], max_concurrency: int = None) -> Dict[str, Optional[Dict]]:
+        return await asyncio.to_thread(self.provider.get_vendor_data_many, gstins, max_concurrency)
+    
+    def revalidate(self, gstin: str) -> None:
+        # Sync providers schedule their own background refresh - this never blocks
+        self.provider.revalidate(gstin)
+    
+    async def close(self):
+        pass
+
+
+# Process-wide async provider (keeps one httpx connection pool alive)
+_async_provider = None
+
+
 # Async provider factory
 async def get_async_gsp_provider():
-    """Factory function to get async GSP provider"""
+    """Factory function to get the shared async GSP provider"""
+    global _async_provider
+    if _async_provider is not None:
+        return _async_provider
+    
     if settings.GSP_MODE.lower() == "sandbox" and settings.SANDBOX_CLIENT_ID:
-        return AsyncSandboxGSPProvider(
+        _async_provider = AsyncSandboxGSPProvider(
             client_id=settings.SANDBOX_CLIENT_ID,
             secret=settings.SANDBOX_SECRET
         )
-    # For mock mode, use sync provider (already fast)
-    from app.services.gsp import get_gsp_provider
-    return get_gsp_provider()
+    else:
+        # For mock mode, wrap the sync provider (already fast)
+        from app.services.gsp import get_gsp_provider
+        _async_provider = AsyncGSPProviderAdapter(get_gsp_provider())
+    return _async_provider
+
+
+async def close_async_gsp_provider():
+    """Close the shared async provider's HTTP client (call on shutdown)"""
+    global _async_provider
+    if _async_provider is not None:
+        await _async_provider.close()
+        _async_provider = None
@@ -0,0 +1,173 @@
+"""
+GSTR-2B Response Parser
+Parses the B2B and B2BA sections of a GSTR-2B response into the invoice dicts
+stored in gstr_2b_data (iter_gstr2b_invoices, iter_gstr2b_stream).
+
+The streaming variant reads the HTTP body incrementally with ijson, one
+supplier (ctin) block at a time, so peak memory is bounded by the largest
+supplier block instead of the whole period. Without ijson installed it falls
+back to json.load() (same output, whole response in memory).
+
+Taxes come from the invoice's item list ("items", or GSTR-2A style
+"itms"/"itm_det") when present, otherwise from the invoice itself. Other
+sections (CDNR, ISD, IMPG, ...) are skipped: gstr_2b_data only holds invoices.
+"""
+import json
+import logging
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+# Sections stored in gstr_2b_data by GSTR-2B sync -> whether they hold amendments
+SECTIONS = {"b2b": False, "b2ba": True}
+
+
+def _load_ijson():
+    try:
+        import ijson
+        return ijson
+    except ImportError:
+        return None
+
+
+def _num(value) -> float:
+    return float(value) if value not in (None, "") else 0.0
+
+
+def _taxes(doc: Dict) -> Tuple[float, float]:
+    """
+    (taxable value, tax amount) - summed over the item list when there is one.
+    The tax amount is IGST + CGST + SGST + cess, so taxable value + tax amount
+    is the invoice value.
+    """
+    items = doc.get("items")
+    if items is None and "itms" in doc:
+        items = [item.get("itm_det", item) for item in doc["itms"]]
+    if not items:
+        items = [doc]
+
+    txval = tax = 0.0
+    for item in items:
+        txval += _num(item.get("txval"))
+        tax += _num(item.get("igst")) + _num(item.get("cgst")) + _num(item.get("sgst")) + _num(item.get("cess"))
+    return txval, tax
+
+
+def _sections_root(data: Dict) -> Dict:
+    # The GSTN payload nests sections under "docdata"; some GSPs flatten them
+    return data.get("docdata", data)
+
+
+def _iter_blocks(stream, sections: Iterable[str], prefix: str) -> Iterator[Tuple[str, Dict]]:
+    """(section, entry) pairs read from a JSON stream - one section entry in memory at a time"""
+    ijson = _load_ijson()
+    if ijson is None:
+        logger.warning("ijson not installed - decoding the full GSTR-2B response in memory")
+        data = json.load(stream)
+        for key in prefix.split(".") if prefix else []:
+            data = data.get(key, {})
+        root = _sections_root(data)
+        for section in sections:
+            for block in root.get(section, []):
+                yield section, block
+        return
+
+    base = f"{prefix}." if prefix else ""
+    targets = {}
+    for section in sections:
+        targets[f"{base}{section}.item"] = section
+        targets[f"{base}docdata.{section}.item"] = section
+
+    # Entries are rebuilt from parse events with an inline container stack;
+    # ijson.ObjectBuilder costs a method call per event and is ~2x slower here
+    stack, keys, entry, section = None, None, None, None
+    for path, event, value in ijson.parse(stream, use_float=True):
+        if stack is None:
+            if event == "start_map" and path in targets:
+                entry, section = {}, targets[path]
+                stack, keys = [entry], [None]
+            continue
+
+        if event == "map_key":
+            keys[-1] = value
+            continue
+        if event == "start_map" or event == "start_array":
+            container = {} if event == "start_map" else []
+            parent = stack[-1]
+            if keys[-1] is None:
+                parent.append(container)
+            else:
+                parent[keys[-1]] = container
+            stack.append(container)
+            keys.append(None)
+            continue
+        if event == "end_map" or event == "end_array":
+            stack.pop()
+            keys.pop()
+            if not stack:
+                yield section, entry
+                stack = None
+            continue
+
+        parent = stack[-1]
+        if keys[-1] is None:
+            parent.append(value)
+        else:
+            parent[keys[-1]] = value
+
+
+def normalize_invoice(inv: Dict, supplier_gstin: str, buyer_gstin: str,
+                      return_period: str, amended: bool = False) -> Dict:
+    """One GSTR-2B "inv" entry -> normalized invoice record"""
+    txval, tax = _taxes(inv)
+    invoice = {
+        "supplier_gstin": supplier_gstin,
+        "invoice_no": inv.get("inum", ""),
+        "invoice_date": inv.get("dt", ""),
+        "invoice_value": _num(inv.get("val")),
+        "taxable_value": txval,
+        "tax_amount": tax,
+        "filing_status": inv.get("flag", "Y"),
+        "return_period": return_period,
+        "buyer_gstin": buyer_gstin
+    }
+    if amended:
+        invoice["is_amended"] = True
+    return invoice
+
+
+def iter_supplier_invoices(supplier: Dict, buyer_gstin: str, return_period: str,
+                           amended: bool = False) -> Iterator[Dict]:
+    """Normalized invoices of one supplier (ctin) block"""
+    supplier_gstin = supplier.get("ctin", "")
+    for inv in supplier.get("inv", []):
+        yield normalize_invoice(inv, supplier_gstin, buyer_gstin, return_period, amended)
+
+
+def iter_gstr2b_invoices(data: Dict, buyer_gstin: str, return_period: str) -> Iterator[Dict]:
+    """Normalized invoices of an already decoded GSTR-2B "data" object"""
+    root = _sections_root(data)
+    for section, amended in SECTIONS.items():
+        for supplier in root.get(section, []):
+            yield from iter_supplier_invoices(supplier, buyer_gstin, return_period, amended)
+
+
+def parse_gstr2b_invoices(data: Dict, buyer_gstin: str, return_period: str) -> List[Dict]:
+    """Normalized invoices of a decoded GSTR-2B "data" object, as a list"""
+    return list(iter_gstr2b_invoices(data, buyer_gstin, return_period))
+
+
+def iter_gstr2b_stream(stream, buyer_gstin: str, return_period: str,
+                       prefix: str = "data") -> Iterator[Dict]:
+    """
+    Yield normalized invoices while reading a GSTR-2B JSON response.
+
+    Args:
+        stream: Binary file-like object with the response body (e.g. response.raw)
+        buyer_gstin: Buyer GSTIN
+        return_period: Return period (MMYYYY)
+        prefix: Path of the object holding the sections ("data" in the GSP response)
+    """
+    for section, supplier in _iter_blocks(stream, SECTIONS, prefix):
+        yield from iter_supplier_invoices(supplier, buyer_gstin, return_period, SECTIONS[section])
@@ -1,9 +1,29 @@
-import re
+import hashlib
+import json
 from typing import List, Dict, Any
+from app.core.config import settings
+from app.services.reconciliation_fuzzy import apply_fuzzy_pass
+
+# Every byte except A-Z and 0-9: dropped from invoice numbers by bytes.translate
+_INVOICE_JUNK = bytes(c for c in range(256) if not (48 <= c <= 57 or 65 <= c <= 90))
+
+
+def _amount(row: Dict) -> float:
+    return float(row.get('taxable_value', 0) or 0) + float(row.get('tax_amount', 0) or 0)
+
 
 class ReconciliationEngine:
     """
     Engine for matching Purchase Register entries against GSTR-2B data.
+    
+    Duplicate handling:
+    - PR and GSTR-2B rows are keyed on (GSTIN, normalized invoice number)
+    - each PR row takes the first GSTR-2B row of its key (in GSTR-2B order)
+      whose amount is within tolerance -> MATCHED; if none is, it is compared
+      with the key's first GSTR-2B row -> MISMATCH
+    - GSTR-2B rows are not consumed: duplicate PR rows can match the same one
+    - GSTR-2B rows no PR row matched or mismatched are MISSING_IN_PR, ordered by
+      the first appearance of their key, then GSTR-2B order
     """
     
     def __init__(self, tolerance: float = 1.0):
@@ -17,16 +37,13 @@ class ReconciliationEngine:
         if not invoice_num:
             return ""
         
-        # Convert to string and uppercase
-        norm = str(invoice_num).strip().upper()
-        
-        # Remove special characters (keep only alphanumeric)
-        norm = re.sub(r'[^A-Z0-9]', '', norm)
+        # Uppercase, then keep only A-Z/0-9: anything non-ASCII left after upper()
+        # is dropped by the ASCII encode, the rest by the translate table
+        # (same output as re.sub(r'[^A-Z0-9]', '', ...), several times faster)
+        norm = str(invoice_num).upper().encode("ascii", "ignore").translate(None, _INVOICE_JUNK)
         
         # Remove leading zeros
-        norm = norm.lstrip('0')
-        
-        return norm
+        return norm.decode("ascii").lstrip('0')
 
     def match_invoices(self, pr_data: List[Dict], gstr2b_data: List[Dict]) -> Dict[str, List[Dict]]:
         """
@@ -37,75 +54,56 @@ class ReconciliationEngine:
         - mismatch: Partial match (GSTIN + Invoice match, but Amount mismatch)
         - missing_in_2b: Present in PR but not in GSTR-2B (Ineligible ITC)
         - missing_in_pr: Present in GSTR-2B but not in PR (Unclaimed ITC)
+        - probable_match: Residuals paired by the fuzzy second pass (see reconciliation_fuzzy)
+        
+        See the class docstring for how duplicate keys are handled.
         """
+        normalize = self.normalize_invoice_number
+        tolerance = self.tolerance
         
         # Index GSTR-2B data for O(1) lookup
-        # Key: (GSTIN, Normalized Invoice Number) -> List of invoices (in case of duplicates)
+        # Key: (GSTIN, Normalized Invoice Number) -> [(row, amount)] (in case of duplicates);
+        # each row's amount is computed once here, not per PR row that looks at it
         gstr2b_index = {}
-        processed_gstr2b_ids = set()
-        
         for item in gstr2b_data:
-            gstin = item.get('gstin', '').strip().upper()
-            inv_num = self.normalize_invoice_number(item.get('invoice_number', ''))
-            key = (gstin, inv_num)
-            
-            if key not in gstr2b_index:
-                gstr2b_index[key] = []
-            gstr2b_index[key].append(item)
-
-        results = {
-            "matched": [],
-            "mismatch": [],
-            "missing_in_2b": [],
-            "missing_in_pr": []
-        }
+            key = ((item.get('gstin') or '').strip().upper(), normalize(item.get('invoice_number', '')))
+            candidates = gstr2b_index.get(key)
+            if candidates is None:
+                gstr2b_index[key] = [(item, _amount(item))]
+            else:
+                candidates.append((item, _amount(item)))
+        
+        # Claimed GSTR-2B rows, by row identity: stored rows carry no "id", and an
+        # invoice number can repeat across suppliers
+        processed_gstr2b_rows = set()
+        matched, mismatch, missing_in_2b = [], [], []
 
         # Iterate through Purchase Register
         for pr_item in pr_data:
-            gstin = pr_item.get('gstin', '').strip().upper()
-            inv_num = self.normalize_invoice_number(pr_item.get('invoice_number', ''))
-            pr_amount = float(pr_item.get('taxable_value', 0) or 0) + float(pr_item.get('tax_amount', 0) or 0)
-            
-            key = (gstin, inv_num)
-            
-            # Find candidate matches in GSTR-2B
-            candidates = gstr2b_index.get(key, [])
+            gstin = (pr_item.get('gstin') or '').strip().upper()
+            pr_amount = _amount(pr_item)
+            candidates = gstr2b_index.get((gstin, normalize(pr_item.get('invoice_number', ''))))
             
-            match_found = False
+            if not candidates:
+                # No match found in GSTR-2B
+                missing_in_2b.append({
+                    "gstin": gstin,
+                    "vendor_name": pr_item.get('vendor_name'),
+                    "invoice_number": pr_item.get('invoice_number'),
+                    "invoice_date": pr_item.get('invoice_date'),
+                    "pr_amount": pr_amount,
+                    "gstr2b_amount": 0,
+                    "difference": pr_amount,
+                    "status": "MISSING_IN_2B",
+                    "message": "Invoice not found in GSTR-2B"
+                })
+                continue
             
-            if candidates:
-                # Candidates found (GSTIN + Invoice Number matched)
-                # Check Amount
-                for candidate in candidates:
-                    gstr2b_amount = float(candidate.get('taxable_value', 0) or 0) + float(candidate.get('tax_amount', 0) or 0)
-                    
-                    diff = abs(pr_amount - gstr2b_amount)
-                    
-                    if diff <= self.tolerance:
-                        # Exact Match
-                        results["matched"].append({
-                            "gstin": gstin,
-                            "vendor_name": candidate.get('vendor_name') or pr_item.get('vendor_name'),
-                            "invoice_number": pr_item.get('invoice_number'),
-                            "invoice_date": pr_item.get('invoice_date'),
-                            "pr_amount": pr_amount,
-                            "gstr2b_amount": gstr2b_amount,
-                            "difference": diff,
-                            "status": "MATCHED",
-                            "message": "Fully Reconciled"
-                        })
-                        processed_gstr2b_ids.add(candidate.get('id', candidate.get('invoice_number'))) # Track as processed
-                        match_found = True
-                        break # Stop checking candidates
-                
-                if not match_found:
-                    # Found invoice number but amount mismatch
-                    # Take the first candidate for comparison
-                    candidate = candidates[0] 
-                    gstr2b_amount = float(candidate.get('taxable_value', 0) or 0) + float(candidate.get('tax_amount', 0) or 0)
-                    diff = pr_amount - gstr2b_amount
-                    
-                    results["mismatch"].append({
+            # Candidates found (GSTIN + Invoice Number matched): first one within tolerance
+            for candidate, gstr2b_amount in candidates:
+                diff = abs(pr_amount - gstr2b_amount)
+                if diff <= tolerance:
+                    matched.append({
                         "gstin": gstin,
                         "vendor_name": candidate.get('vendor_name') or pr_item.get('vendor_name'),
                         "invoice_number": pr_item.get('invoice_number'),
@@ -113,41 +111,92 @@ class ReconciliationEngine:
                         "pr_amount": pr_amount,
                         "gstr2b_amount": gstr2b_amount,
                         "difference": diff,
-                        "status": "MISMATCH",
-                        "message": f"Amount Mismatch (Diff: ₹{diff:.2f})"
+                        "status": "MATCHED",
+                        "message": "Fully Reconciled"
                     })
-                    processed_gstr2b_ids.add(candidate.get('id', candidate.get('invoice_number')))
-            
+                    processed_gstr2b_rows.add(id(candidate))
+                    break
             else:
-                # No match found in GSTR-2B
-                results["missing_in_2b"].append({
+                # Found invoice number but amount mismatch: compare with the first candidate
+                candidate, gstr2b_amount = candidates[0]
+                diff = pr_amount - gstr2b_amount
+                mismatch.append({
                     "gstin": gstin,
-                    "vendor_name": pr_item.get('vendor_name'),
+                    "vendor_name": candidate.get('vendor_name') or pr_item.get('vendor_name'),
                     "invoice_number": pr_item.get('invoice_number'),
                     "invoice_date": pr_item.get('invoice_date'),
                     "pr_amount": pr_amount,
-                    "gstr2b_amount": 0,
-                    "difference": pr_amount,
-                    "status": "MISSING_IN_2B",
-                    "message": "Invoice not found in GSTR-2B"
+                    "gstr2b_amount": gstr2b_amount,
+                    "difference": diff,
+                    "status": "MISMATCH",
+                    "message": f"Amount Mismatch (Diff: ₹{diff:.2f})"
                 })
+                processed_gstr2b_rows.add(id(candidate))
 
         # Identify items in GSTR-2B that were NOT in PR
-        for key, items in gstr2b_index.items():
-            for item in items:
-                # Check if this item's ID (or unique key) has been processed
-                if item.get('id', item.get('invoice_number')) not in processed_gstr2b_ids:
-                     gstr2b_amount = float(item.get('taxable_value', 0) or 0) + float(item.get('tax_amount', 0) or 0)
-                     results["missing_in_pr"].append({
-                        "gstin": item.get('gstin'),
-                        "vendor_name": item.get('vendor_name'),
-                        "invoice_number": item.get('invoice_number'),
-                        "invoice_date": item.get('invoice_date'),
-                        "pr_amount": 0,
-                        "gstr2b_amount": gstr2b_amount,
-                        "difference": -gstr2b_amount,
-                        "status": "MISSING_IN_PR",
-                        "message": "ITC Available but not claimed"
-                    })
+        missing_in_pr = [
+            {
+                "gstin": item.get('gstin'),
+                "vendor_name": item.get('vendor_name'),
+                "invoice_number": item.get('invoice_number'),
+                "invoice_date": item.get('invoice_date'),
+                "pr_amount": 0,
+                "gstr2b_amount": gstr2b_amount,
+                "difference": -gstr2b_amount,
+                "status": "MISSING_IN_PR",
+                "message": "ITC Available but not claimed"
+            }
+            for candidates in gstr2b_index.values()
+            for item, gstr2b_amount in candidates
+            if id(item) not in processed_gstr2b_rows
+        ]
 
-        return results
+        results = {
+            "matched": matched,
+            "mismatch": mismatch,
+            "missing_in_2b": missing_in_2b,
+            "missing_in_pr": missing_in_pr
+        }
+        return apply_fuzzy_pass(results, self.tolerance, self.normalize_invoice_number)
+
+
+RESULT_CATEGORIES = ("matched", "mismatch", "probable_match", "missing_in_2b", "missing_in_pr")
+
+
+def summarize_results(results: Dict[str, List[Dict]]) -> Dict[str, Any]:
+    """
+    Per-category counts plus the amounts the reconciliation screen shows:
+    matched_amount (PR amount of matched invoices) and disputed_amount (PR
+    amount missing in GSTR-2B plus the absolute mismatch differences).
+    Every value is additive, so partition summaries can simply be summed.
+    """
+    summary = {category: len(results.get(category, [])) for category in RESULT_CATEGORIES}
+    summary["matched_amount"] = sum(item["pr_amount"] for item in results.get("matched", []))
+    summary["disputed_amount"] = (
+        sum(item["pr_amount"] for item in results.get("missing_in_2b", []))
+        + sum(abs(item["difference"]) for item in results.get("mismatch", []))
+    )
+    return summary
+
+
+# Bump when parsing or matching changes what a run produces (invalidates cached runs)
+RECONCILIATION_CACHE_VERSION = 3
+
+
+def reconciliation_fingerprint(file_hash: str, filename: str, return_period: str,
+                               gstr2b_version: int, partitioned: bool, tolerance: float) -> str:
+    """
+    Cache key of a reconciliation run: the register file's SHA-256
+    (utils.ingest.file_sha256), the period and the version of its GSTR-2B data
+    (see crud.gstr2b_data.get_period_version), and every setting that changes
+    the results.
+    """
+    extension = filename.lower().rsplit('.', 1)[-1] if filename else ''
+    inputs = json.dumps([
+        RECONCILIATION_CACHE_VERSION, extension, return_period, gstr2b_version, partitioned, tolerance,
+        settings.RECONCILIATION_FUZZY_MATCH,
+        settings.RECONCILIATION_FUZZY_MIN_CONFIDENCE, settings.RECONCILIATION_FUZZY_MAX_EDITS,
+        settings.RECONCILIATION_FUZZY_DATE_WINDOW_DAYS, settings.RECONCILIATION_PARTITION_THRESHOLD,
+        settings.RECONCILIATION_RESULT_FORMAT.lower(),
+    ])
+    return hashlib.sha256(f"{file_hash}:{inputs}".encode()).hexdigest()
@@ -0,0 +1,212 @@
+"""
+Fuzzy second pass over reconciliation residuals.
+
+The engine matches on exact (GSTIN, normalized invoice number); a typo in the
+invoice number leaves the PR row in missing_in_2b and the GSTR-2B row in
+missing_in_pr. This pass pairs those residuals up as probable matches:
+
+- blocking: candidates share the GSTIN and sit in the same or a neighbouring
+  amount band (band width = amount tolerance), so each PR residual is only
+  compared with the few GSTR-2B residuals of its supplier at about the same
+  amount - near-linear instead of all pairs
+- scoring: invoice-number edit distance (with transpositions), date
+  proximity and amount closeness, combined into a 0-1 confidence. The edits
+  allowed grow with the invoice number's length, so short numbers ("123" vs
+  "124") - where one edit is a different invoice, not a typo - never pair
+- assignment: best confidence first, each residual used at most once
+"""
+import math
+from collections import defaultdict
+from functools import lru_cache
+from datetime import date, datetime
+from typing import Callable, Dict, List, Optional
+
+from app.core.config import settings
+
+# Confidence weights: invoice number similarity, date proximity, amount closeness
+INVOICE_WEIGHT = 0.6
+DATE_WEIGHT = 0.25
+AMOUNT_WEIGHT = 0.15
+# Date score when either side has no (parseable) date
+UNKNOWN_DATE_SCORE = 0.5
+# One edit allowed per this many characters of the shorter normalized invoice
+# number (capped at max_edits): under 4 characters nothing pairs, 4-7 allow 1 edit
+CHARS_PER_EDIT = 4
+
+_DATE_FORMATS = ("%Y-%m-%d", "%d-%m-%Y", "%d/%m/%Y", "%Y/%m/%d", "%d.%m.%Y")
+
+
+def edit_distance(a: str, b: str, max_distance: int) -> int:
+    """
+    Optimal string alignment distance (Levenshtein plus adjacent transpositions).
+    Returns max_distance + 1 as soon as the distance is known to exceed max_distance.
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous2: List[int] = []
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+@lru_cache(maxsize=4096)
+def _parse_date_text(text: str) -> Optional[date]:
+    for fmt in _DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def parse_invoice_date(value) -> Optional[date]:
+    """PR dates are YYYY-MM-DD, GSTR-2B dates DD-MM-YYYY; None if neither parses"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if not value or not isinstance(value, str):
+        return None
+    # A register has a few hundred distinct dates at most, hence the cache
+    return _parse_date_text(value.strip()[:10])
+
+
+class FuzzyResidualMatcher:
+    """Pairs missing_in_2b with missing_in_pr rows as PROBABLE_MATCH"""
+
+    def __init__(self, amount_tolerance: float, normalize: Callable[[str], str],
+                 min_confidence: float = 0.75, max_edits: int = 3, date_window_days: int = 30):
+        self.amount_tolerance = amount_tolerance
+        self.band_width = max(amount_tolerance, 1.0)
+        self.normalize = normalize
+        self.min_confidence = min_confidence
+        self.max_edits = max_edits
+        self.date_window_days = max(date_window_days, 1)
+
+    def _band(self, amount: float) -> int:
+        return math.floor(amount / self.band_width)
+
+    @staticmethod
+    def _blocking_keys(rows: List[Dict], amount_field: str) -> List[tuple]:
+        return [((row.get('gstin') or '').strip().upper(), float(row.get(amount_field) or 0)) for row in rows]
+
+    def _details(self, row: Dict) -> tuple:
+        """(normalized invoice number, date) - only computed for rows that have candidates"""
+        return self.normalize(row.get('invoice_number') or ''), parse_invoice_date(row.get('invoice_date'))
+
+    def _score(self, pr: tuple, b2: tuple, amount_diff: float) -> Optional[float]:
+        """Confidence for one candidate pair, None if it is not a candidate at all"""
+        pr_invoice, pr_date = pr
+        b2_invoice, b2_date = b2
+        allowed_edits = min(self.max_edits, min(len(pr_invoice), len(b2_invoice)) // CHARS_PER_EDIT)
+        if not allowed_edits:
+            return None
+        distance = edit_distance(pr_invoice, b2_invoice, allowed_edits)
+        if distance > allowed_edits:
+            return None
+
+        invoice_score = 1 - distance / max(len(pr_invoice), len(b2_invoice))
+        if pr_date is None or b2_date is None:
+            date_score = UNKNOWN_DATE_SCORE
+        else:
+            date_score = max(0.0, 1 - abs((pr_date - b2_date).days) / self.date_window_days)
+        amount_score = 1 - amount_diff / self.amount_tolerance if self.amount_tolerance else 1.0
+        return INVOICE_WEIGHT * invoice_score + DATE_WEIGHT * date_score + AMOUNT_WEIGHT * amount_score
+
+    def match(self, missing_in_2b: List[Dict], missing_in_pr: List[Dict]) -> List[tuple]:
+        """[(pr index, GSTR-2B index, confidence)], each index used at most once"""
+        pr_keys = self._blocking_keys(missing_in_2b, 'pr_amount')
+        b2_keys = self._blocking_keys(missing_in_pr, 'gstr2b_amount')
+
+        blocks = defaultdict(list)
+        for j, (gstin, amount) in enumerate(b2_keys):
+            blocks[(gstin, self._band(amount))].append(j)
+
+        b2_details: Dict[int, tuple] = {}
+        pairs = []
+        for i, (gstin, amount) in enumerate(pr_keys):
+            band, pr_details = self._band(amount), None
+            for neighbour in (band - 1, band, band + 1):
+                for j in blocks.get((gstin, neighbour), ()):
+                    amount_diff = abs(amount - b2_keys[j][1])
+                    if amount_diff > self.amount_tolerance:
+                        continue
+                    if pr_details is None:
+                        pr_details = self._details(missing_in_2b[i])
+                    if j not in b2_details:
+                        b2_details[j] = self._details(missing_in_pr[j])
+                    confidence = self._score(pr_details, b2_details[j], amount_diff)
+                    if confidence is not None and confidence >= self.min_confidence:
+                        pairs.append((-confidence, i, j))
+
+        # Best pairs first; ties resolved by input order so results are deterministic
+        pairs.sort()
+        used_pr, used_2b, chosen = set(), set(), []
+        for negative_confidence, i, j in pairs:
+            if i in used_pr or j in used_2b:
+                continue
+            used_pr.add(i)
+            used_2b.add(j)
+            chosen.append((i, j, -negative_confidence))
+        chosen.sort()
+        return chosen
+
+    def apply(self, results: Dict[str, List[Dict]]) -> Dict[str, List[Dict]]:
+        """Move probable pairs out of missing_in_2b / missing_in_pr into probable_match"""
+        missing_in_2b, missing_in_pr = results["missing_in_2b"], results["missing_in_pr"]
+        chosen = self.match(missing_in_2b, missing_in_pr)
+
+        probable = []
+        for i, j, confidence in chosen:
+            pr_row, b2_row = missing_in_2b[i], missing_in_pr[j]
+            confidence = round(confidence, 3)
+            probable.append({
+                "gstin": pr_row.get('gstin'),
+                "vendor_name": b2_row.get('vendor_name') or pr_row.get('vendor_name'),
+                "invoice_number": pr_row.get('invoice_number'),
+                "invoice_date": pr_row.get('invoice_date'),
+                "pr_amount": pr_row['pr_amount'],
+                "gstr2b_amount": b2_row['gstr2b_amount'],
+                "difference": pr_row['pr_amount'] - b2_row['gstr2b_amount'],
+                "status": "PROBABLE_MATCH",
+                "message": f"Probable match with GSTR-2B invoice {b2_row.get('invoice_number')} "
+                           f"(confidence {confidence:.0%})",
+                "gstr2b_invoice_number": b2_row.get('invoice_number'),
+                "gstr2b_invoice_date": b2_row.get('invoice_date'),
+                "confidence": confidence,
+            })
+
+        used_pr = {i for i, _, _ in chosen}
+        used_2b = {j for _, j, _ in chosen}
+        results["probable_match"] = probable
+        results["missing_in_2b"] = [row for i, row in enumerate(missing_in_2b) if i not in used_pr]
+        results["missing_in_pr"] = [row for j, row in enumerate(missing_in_pr) if j not in used_2b]
+        return results
+
+
+def apply_fuzzy_pass(results: Dict[str, List[Dict]], tolerance: float,
+                     normalize: Callable[[str], str]) -> Dict[str, List[Dict]]:
+    """
+    Second pass of ReconciliationEngine.match_invoices (RECONCILIATION_FUZZY_* settings).
+    Always adds a probable_match list, empty when the pass is disabled.
+    """
+    if not settings.RECONCILIATION_FUZZY_MATCH:
+        results["probable_match"] = []
+        return results
+    matcher = FuzzyResidualMatcher(
+        amount_tolerance=tolerance,
+        normalize=normalize,
+        min_confidence=settings.RECONCILIATION_FUZZY_MIN_CONFIDENCE,
+        max_edits=settings.RECONCILIATION_FUZZY_MAX_EDITS,
+        date_window_days=settings.RECONCILIATION_FUZZY_DATE_WINDOW_DAYS,
+    )
+    return matcher.apply(results)
@@ -0,0 +1,235 @@
+"""
+Partitioned (spill-to-disk) reconciliation for registers too large to match in memory.
+
+Both sides are hash-partitioned on the normalized GSTIN into spill files, then
+reconciled one partition at a time with the reconciliation engine; each
+partition's results are appended to one columnar result file (Parquet or Arrow
+IPC, CSV if pyarrow is not installed) that is uploaded to storage. Memory is
+bounded by the largest partition, not by the register.
+
+Matching only ever pairs rows with the same GSTIN (exact and fuzzy pass), so
+per-partition results are the same rows the in-memory run produces; only the
+order differs - results come partition by partition.
+"""
+import csv
+import logging
+import os
+import pickle
+import shutil
+import tempfile
+import uuid
+import zlib
+from typing import Callable, Dict, Iterable, List, Optional
+
+from app.core.config import settings
+from app.services.reconciliation import RESULT_CATEGORIES, ReconciliationEngine, summarize_results
+from app.services.storage import storage
+
+logger = logging.getLogger(__name__)
+
+# (column, arrow type) of the result file; one row per result, tagged with its category
+RESULT_COLUMNS = (
+    ("category", "string"),
+    ("gstin", "string"),
+    ("vendor_name", "string"),
+    ("invoice_number", "string"),
+    ("invoice_date", "string"),
+    ("pr_amount", "float64"),
+    ("gstr2b_amount", "float64"),
+    ("difference", "float64"),
+    ("status", "string"),
+    ("message", "string"),
+    ("gstr2b_invoice_number", "string"),
+    ("gstr2b_invoice_date", "string"),
+    ("confidence", "float64"),
+)
+_STRING_COLUMNS = {name for name, kind in RESULT_COLUMNS if kind == "string"}
+
+FORMAT_EXTENSIONS = {"parquet": "parquet", "arrow": "arrow", "csv": "csv"}
+
+# Rows buffered per partition before they are appended to its spill file
+SPILL_BATCH_ROWS = 1000
+# Rows per Parquet row group / Arrow record batch
+RESULT_BATCH_ROWS = 50000
+
+
+def _load_pyarrow():
+    """pyarrow, or None when it is not installed"""
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+        return pyarrow
+    except ImportError:
+        return None
+
+
+def partition_of(gstin, partitions: int) -> int:
+    """Stable partition for a GSTIN, normalized the way the engine keys it"""
+    normalized = str(gstin).strip().upper() if gstin is not None else ''
+    return zlib.crc32(normalized.encode()) % partitions
+
+
+def result_key(user_id: str, run_id: str, result_format: str) -> str:
+    """Storage key of a partitioned run's result file"""
+    return f"reconciliation/{user_id}/{run_id}.{FORMAT_EXTENSIONS[result_format]}"
+
+
+class _Spill:
+    """Per-partition append-only spill files of pickled row batches"""
+
+    def __init__(self, directory: str, name: str, partitions: int):
+        self.paths = [os.path.join(directory, f"{name}-{p:04d}.pkl") for p in range(partitions)]
+        self.buffers: List[List[Dict]] = [[] for _ in range(partitions)]
+        self.rows = 0
+
+    def add(self, rows: Iterable[Dict]) -> int:
+        partitions = len(self.paths)
+        for row in rows:
+            p = partition_of(row.get('gstin'), partitions)
+            buffer = self.buffers[p]
+            buffer.append(row)
+            self.rows += 1
+            if len(buffer) >= SPILL_BATCH_ROWS:
+                self._flush(p)
+        for p in range(partitions):
+            self._flush(p)
+        return self.rows
+
+    def _flush(self, p: int):
+        if self.buffers[p]:
+            with open(self.paths[p], "ab") as f:
+                pickle.dump(self.buffers[p], f, protocol=pickle.HIGHEST_PROTOCOL)
+            self.buffers[p] = []
+
+    def load(self, p: int) -> List[Dict]:
+        rows = []
+        if os.path.exists(self.paths[p]):
+            with open(self.paths[p], "rb") as f:
+                while True:
+                    try:
+                        rows.extend(pickle.load(f))
+                    except EOFError:
+                        break
+            os.remove(self.paths[p])
+        return rows
+
+
+class ResultWriter:
+    """Appends result rows to one Parquet / Arrow IPC / CSV file in RESULT_BATCH_ROWS batches"""
+
+    def __init__(self, path: str, result_format: str):
+        self.path = path
+        self.format = result_format
+        self.rows = 0
+        self._pending: List[Dict] = []
+        self._writer = None
+        self._file = None
+        self._pa = _load_pyarrow() if result_format != "csv" else None
+        if self._pa is not None:
+            self._schema = self._pa.schema([(name, getattr(self._pa, kind)()) for name, kind in RESULT_COLUMNS])
+            if result_format == "parquet":
+                self._writer = self._pa.parquet.ParquetWriter(path, self._schema, compression="zstd")
+            else:
+                self._writer = self._pa.ipc.new_file(path, self._schema)
+        else:
+            self._file = open(path, "w", newline="", encoding="utf-8")
+            self._writer = csv.writer(self._file)
+            self._writer.writerow([name for name, _ in RESULT_COLUMNS])
+
+    def write(self, category: str, rows: List[Dict]):
+        for row in rows:
+            self._pending.append(dict(row, category=category))
+        if len(self._pending) >= RESULT_BATCH_ROWS:
+            self._flush()
+
+    def _flush(self):
+        if not self._pending:
+            return
+        columns = {}
+        for name, _ in RESULT_COLUMNS:
+            values = [row.get(name) for row in self._pending]
+            if name in _STRING_COLUMNS:
+                # Excel cells / DB values can be numbers or dates; the file column is text
+                values = [value if value is None or isinstance(value, str) else str(value) for value in values]
+            columns[name] = values
+
+        if self._pa is not None:
+            self._writer.write_batch(
+                self._pa.record_batch([columns[name] for name, _ in RESULT_COLUMNS], schema=self._schema)
+            )
+        else:
+            self._writer.writerows(zip(*(columns[name] for name, _ in RESULT_COLUMNS)))
+        self.rows += len(self._pending)
+        self._pending = []
+
+    def close(self):
+        self._flush()
+        if self._pa is not None:
+            self._writer.close()
+        else:
+            self._file.close()
+
+
+def reconcile_partitioned(user_id: str, pr_items: Iterable[Dict], gstr2b_items: Iterable[Dict],
+                          tolerance: float = 2.0, partitions: Optional[int] = None,
+                          result_format: Optional[str] = None, run_id: Optional[str] = None,
+                          on_results: Optional[Callable[[str, List[Dict]], None]] = None) -> Dict:
+    """
+    Reconcile partition by partition and store the results as one columnar file.
+
+    pr_items / gstr2b_items can be any iterables (e.g. crud.gstr2b_data.iter_invoices_by_period);
+    they are consumed once, into the spill files. on_results(category, rows), if
+    given, also sees every partition's results (e.g. to persist them).
+
+    Returns:
+        {"run_id", "summary": summarize_results() totals plus total_pr / total_2b / partitions,
+         "result": {"key", "location", "format", "rows"}}
+    """
+    partitions = max(1, partitions or settings.RECONCILIATION_PARTITIONS)
+    result_format = (result_format or settings.RECONCILIATION_RESULT_FORMAT).lower()
+    if result_format not in FORMAT_EXTENSIONS:
+        logger.warning(f"Unknown RECONCILIATION_RESULT_FORMAT '{result_format}', using parquet")
+        result_format = "parquet"
+    if result_format != "csv" and _load_pyarrow() is None:
+        logger.warning(f"pyarrow is not installed - writing {result_format} reconciliation results as CSV")
+        result_format = "csv"
+
+    run_id = run_id or str(uuid.uuid4())
+    engine = ReconciliationEngine(tolerance=tolerance)
+    work_dir = tempfile.mkdtemp(prefix=f"reconciliation-{run_id}-")
+    try:
+        pr_spill = _Spill(work_dir, "pr", partitions)
+        b2_spill = _Spill(work_dir, "2b", partitions)
+        total_pr = pr_spill.add(pr_items)
+        total_2b = b2_spill.add(gstr2b_items)
+
+        totals = summarize_results({})
+        result_path = os.path.join(work_dir, f"results.{FORMAT_EXTENSIONS[result_format]}")
+        writer = ResultWriter(result_path, result_format)
+        try:
+            for p in range(partitions):
+                pr_rows, b2_rows = pr_spill.load(p), b2_spill.load(p)
+                if not pr_rows and not b2_rows:
+                    continue
+                results = engine.match_invoices(pr_rows, b2_rows)
+                for name, value in summarize_results(results).items():
+                    totals[name] += value
+                for category in RESULT_CATEGORIES:
+                    writer.write(category, results[category])
+                    if on_results:
+                        on_results(category, results[category])
+        finally:
+            writer.close()
+
+        key = result_key(user_id, run_id, result_format)
+        location = storage.upload_file(result_path, key)
+        logger.info(f"Partitioned reconciliation {run_id}: {total_pr} PR / {total_2b} GSTR-2B rows, "
+                     f"{partitions} partitions, {writer.rows} results -> {location}")
+        return {
+            "run_id": run_id,
+            "summary": {"total_pr": total_pr, "total_2b": total_2b, "partitions": partitions, **totals},
+            "result": {"key": key, "location": location, "format": result_format, "rows": writer.rows},
+        }
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
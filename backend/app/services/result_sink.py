@@ -0,0 +1,180 @@
+"""
+Write-behind Result Sink for ITC Shield batches
+Batch workers queue their results; a single writer thread persists them in
+multi-row statements instead of one transaction per write per item.
+"""
+import logging
+import queue
+import threading
+import time
+import weakref
+from typing import Dict, List, Tuple
+
+from app.core.config import settings
+from app.db.crud import batch as batch_crud
+from app.db.crud import check as check_crud
+
+logger = logging.getLogger(__name__)
+
+# Fields of a successful result that go into compliance_checks
+CHECK_FIELDS = ("gstin", "vendor_name", "amount", "decision", "rule_id", "reason", "risk_level", "data_source")
+
+_STOP = object()
+
+# Open sinks, so application shutdown can flush whatever is still queued
+_open_sinks = weakref.WeakSet()
+_open_sinks_lock = threading.Lock()
+
+
+class BatchResultSink:
+    """
+    Queue of batch item results flushed by one writer thread.
+
+    Each flush is two transactions whatever its size: one multi-row INSERT
+    into compliance_checks (successful items), one bulk UPDATE of batch_items
+    (all items). If a bulk statement fails, the flush falls back to per-item
+    writes so only the offending items fail; those are listed in .failures.
+
+    Usage:
+        with BatchResultSink() as sink:
+            sink.submit({"item_id": ..., "status": "SUCCESS", "gstin": ..., "decision": ..., ...})
+            sink.submit({"item_id": ..., "status": "FAILED", "error_message": ...})
+        sink.failures  # [{"item_id", "error"}] - items whose result could not be saved
+    """
+
+    def __init__(self, flush_items: int = None, flush_interval_ms: int = None):
+        self.flush_items = max(1, flush_items or settings.BATCH_WRITE_FLUSH_ITEMS)
+        self.flush_interval = (flush_interval_ms or settings.BATCH_WRITE_FLUSH_MS) / 1000
+        self.failures: List[Dict] = []
+        self.written = 0
+        self.flushes = 0
+        self._queue = queue.Queue()
+        self._closed = False
+        self._writer = threading.Thread(target=self._run, name="batch-result-writer", daemon=True)
+        self._writer.start()
+        with _open_sinks_lock:
+            _open_sinks.add(self)
+
+    def submit(self, result: Dict) -> None:
+        """
+        Queue one item result.
+
+        result: item_id and status ("SUCCESS" or "FAILED"); SUCCESS results carry
+        the compliance check fields (gstin, vendor_name, amount, decision, rule_id,
+        reason, risk_level, data_source), FAILED ones an error_message.
+        """
+        if self._closed:
+            raise RuntimeError("BatchResultSink is closed")
+        self._queue.put(result)
+
+    def close(self) -> List[Dict]:
+        """Flush everything queued, stop the writer and return the per-item failures"""
+        if not self._closed:
+            self._closed = True
+            self._queue.put(_STOP)
+            self._writer.join()
+            with _open_sinks_lock:
+                _open_sinks.discard(self)
+        return self.failures
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _run(self):
+        pending: List[Dict] = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                entry = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                entry = None
+
+            if entry is _STOP:
+                self._flush(pending)
+                return
+            if entry is not None:
+                if not pending:
+                    deadline = time.monotonic() + self.flush_interval
+                pending.append(entry)
+
+            if pending and (len(pending) >= self.flush_items or time.monotonic() >= deadline):
+                self._flush(pending)
+                pending, deadline = [], None
+
+    def _flush(self, results: List[Dict]):
+        if not results:
+            return
+        start = time.monotonic()
+
+        succeeded = [r for r in results if r["status"] == "SUCCESS"]
+        check_ids, errors = self._save_checks(succeeded)
+
+        updates = []
+        for result in results:
+            if result["status"] == "SUCCESS":
+                check_id = check_ids.get(result["item_id"])
+                if check_id is None:
+                    updates.append({"item_id": result["item_id"], "status": "FAILED",
+                                    "error_message": errors.get(result["item_id"])})
+                    continue
+                updates.append({"item_id": result["item_id"], "status": "SUCCESS", "check_id": check_id,
+                                "decision": result.get("decision"), "risk_level": result.get("risk_level"),
+                                "reason": result.get("reason")})
+            else:
+                updates.append({"item_id": result["item_id"], "status": "FAILED",
+                                "error_message": result.get("error_message")})
+        self._save_updates(updates)
+
+        self.written += len(results)
+        self.flushes += 1
+        logger.debug(f"Flushed {len(results)} batch results in {(time.monotonic() - start) * 1000:.1f}ms")
+
+    def _save_checks(self, results: List[Dict]) -> Tuple[Dict, Dict]:
+        """Insert compliance checks; returns ({item_id: check_id}, {item_id: error})"""
+        if not results:
+            return {}, {}
+        checks = [{field: r.get(field) for field in CHECK_FIELDS} for r in results]
+        try:
+            check_ids = check_crud.save_compliance_checks(checks)
+            return {r["item_id"]: check_id for r, check_id in zip(results, check_ids)}, {}
+        except Exception as e:
+            logger.error(f"Bulk compliance check insert failed ({len(results)} items), retrying per item: {e}")
+
+        saved, errors = {}, {}
+        for result, check in zip(results, checks):
+            try:
+                saved[result["item_id"]] = check_crud.save_compliance_check(**check)
+            except Exception as e:
+                errors[result["item_id"]] = f"Failed to save compliance check: {e}"
+                self._fail(result["item_id"], errors[result["item_id"]])
+        return saved, errors
+
+    def _save_updates(self, updates: List[Dict]):
+        try:
+            batch_crud.update_batch_items(updates)
+            return
+        except Exception as e:
+            logger.error(f"Bulk batch item update failed ({len(updates)} items), retrying per item: {e}")
+
+        for update in updates:
+            try:
+                batch_crud.update_batch_item(**update)
+            except Exception as e:
+                self._fail(update["item_id"], f"Failed to save batch item: {e}")
+
+    def _fail(self, item_id, error: str):
+        logger.error(f"Batch item {item_id}: {error}")
+        if not any(f["item_id"] == item_id for f in self.failures):
+            self.failures.append({"item_id": item_id, "error": error})
+
+
+def close_result_sinks():
+    """Flush and close every open sink (on application shutdown)"""
+    with _open_sinks_lock:
+        sinks = list(_open_sinks)
+    for sink in sinks:
+        sink.close()
@@ -91,6 +91,13 @@ class StorageService:
             logger.error(f"Failed to generate download URL: {e}")
             raise
     
+    def local_path(self, key: str) -> Optional[Path]:
+        """Path of a stored file on local storage (None with S3 or if it doesn't exist)"""
+        if self.use_s3:
+            return None
+        file_path = self.local_base_path / key
+        return file_path if file_path.is_file() else None
+    
     def delete_file(self, key: str) -> bool:
         """Delete file from storage"""
         try:
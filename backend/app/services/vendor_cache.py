@@ -0,0 +1,412 @@
+"""
+Unified Vendor Cache for ITC Shield
+Tiered lookup for vendor data: in-process LRU -> Redis -> vendors table
+"""
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional, Dict, List, Tuple
+
+from app.core.config import settings
+from app.db.crud import vendor as vendor_crud
+from app.services.cache import cache
+
+logger = logging.getLogger(__name__)
+
+
+class LocalLRUCache:
+    """
+    Thread-safe in-process LRU with a per-entry TTL.
+    Bounded by both entry count and (approximate, JSON-encoded) byte size.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[dict, int, float]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, size, expires_at = entry
+            if time.monotonic() >= expires_at:
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: dict, size: int = None, ttl: int = None):
+        if size is None:
+            size = len(json.dumps(value))
+        if size > self.max_bytes:
+            return  # Never let one entry flush the whole cache
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, time.monotonic() + (ttl or self.ttl))
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+
+    def delete(self, key: str):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _remove(self, key: str):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        """(entries, bytes) currently held"""
+        return len(self._entries), self._bytes
+
+
+class VendorCache:
+    """
+    Read-through / write-through vendor cache.
+
+    Lookups go memory -> Redis -> vendors table and back-fill the faster tiers
+    on the way out. Writes go to all three tiers. Each tier keeps hit/miss
+    counters (see stats()).
+
+    Entries are FRESH for VENDOR_DATA_TTL after their last_updated and STALE
+    for VENDOR_STALE_TTL after that: stale entries are still served, and the
+    caller is expected to revalidate them in the background. Failed lookups
+    are remembered as NEGATIVE entries for a short TTL so retries don't
+    hammer the GSP.
+    """
+
+    TIERS = ("memory", "redis", "database")
+
+    FRESH = "FRESH"
+    STALE = "STALE"
+    NEGATIVE = "NEGATIVE"
+    MISS = "MISS"
+
+    # Negative entries are tiny - keep them out of the data LRU's byte budget
+    NEGATIVE_MAX_ENTRIES = 10000
+
+    def __init__(self):
+        self.local = LocalLRUCache(
+            max_entries=settings.VENDOR_CACHE_MAX_ENTRIES,
+            max_bytes=settings.VENDOR_CACHE_MAX_BYTES,
+            ttl=settings.VENDOR_CACHE_TTL
+        )
+        self.local_negative = LocalLRUCache(
+            max_entries=self.NEGATIVE_MAX_ENTRIES,
+            max_bytes=settings.VENDOR_CACHE_MAX_BYTES,
+            ttl=cache.VENDOR_ERROR_TTL
+        )
+        self.fresh_for = timedelta(seconds=cache.VENDOR_DATA_TTL)
+        self.max_age_hours = (cache.VENDOR_DATA_TTL + cache.VENDOR_STALE_TTL) // 3600
+        self._stats_lock = threading.Lock()
+        self._hits = dict.fromkeys(self.TIERS, 0)
+        self._misses = dict.fromkeys(self.TIERS, 0)
+        self._stale_hits = 0
+        self._negative_hits = 0
+        self._revalidating = set()
+        self._revalidate_lock = threading.Lock()
+
+    def _count(self, tier: str, hits: int = 0, misses: int = 0):
+        with self._stats_lock:
+            self._hits[tier] += hits
+            self._misses[tier] += misses
+
+    @staticmethod
+    def _last_updated(vendor_data: dict) -> Optional[datetime]:
+        """The entry's last_updated as a naive local datetime, or None if missing / unparsable"""
+        try:
+            last_updated = datetime.fromisoformat(vendor_data["last_updated"])
+        except (KeyError, TypeError, ValueError):
+            return None
+        if last_updated.tzinfo is not None:
+            last_updated = last_updated.astimezone().replace(tzinfo=None)
+        return last_updated
+
+    def _status(self, vendor_data: dict) -> str:
+        """FRESH or STALE, from the entry's last_updated (entries without one count as fresh)"""
+        last_updated = self._last_updated(vendor_data)
+        if last_updated is None:
+            return self.FRESH
+        return self.FRESH if datetime.now() - last_updated <= self.fresh_for else self.STALE
+
+    def _is_outdated(self, vendor_data: dict) -> bool:
+        """
+        Whether a write can be skipped: it is a stale copy served from the cache,
+        or the memory tier already holds this version (same last_updated) or a newer one
+        """
+        if vendor_data.get("data_source") == self.STALE:
+            return True
+        current = self.local.get(vendor_data["gstin"])
+        if current is None:
+            return False
+        if current.get("last_updated") == vendor_data.get("last_updated"):
+            return True
+        held, incoming = self._last_updated(current), self._last_updated(vendor_data)
+        return held is not None and incoming is not None and held > incoming
+
+    def _found(self, vendor_data: dict) -> Tuple[dict, str]:
+        status = self._status(vendor_data)
+        if status == self.STALE:
+            with self._stats_lock:
+                self._stale_hits += 1
+        return vendor_data, status
+
+    def _negative(self) -> Tuple[None, str]:
+        with self._stats_lock:
+            self._negative_hits += 1
+        return None, self.NEGATIVE
+
+    def lookup_local(self, gstin: str) -> Optional[Tuple[Optional[dict], str]]:
+        """
+        Memory tier only - never blocks on I/O (safe on the event loop).
+
+        Returns:
+            (vendor data, status), or None if the memory tier has nothing
+        """
+        vendor_data = self.local.get(gstin)
+        if vendor_data is not None:
+            self._count("memory", hits=1)
+            return self._found(vendor_data)
+        if self.local_negative.get(gstin) is not None:
+            return self._negative()
+        return None
+
+    def lookup(self, gstin: str) -> Tuple[Optional[dict], str]:
+        """
+        Get vendor data from the fastest tier that has it.
+
+        Returns:
+            (vendor data, status) - status is FRESH or STALE with data,
+            NEGATIVE or MISS without
+        """
+        found = self.lookup_local(gstin)
+        if found is not None:
+            return found
+        self._count("memory", misses=1)
+
+        from_redis, negatives = cache.get_vendor_entries([gstin])
+        vendor_data = from_redis.get(gstin)
+        if vendor_data:
+            self._count("redis", hits=1)
+            self.local.set(gstin, vendor_data)
+            return self._found(vendor_data)
+        self._count("redis", misses=1)
+        if gstin in negatives:
+            self.local_negative.set(gstin, negatives[gstin])
+            return self._negative()
+
+        try:
+            vendor_data = vendor_crud.get_cached_vendor(gstin, max_age_hours=self.max_age_hours)
+        except Exception as e:
+            logger.error(f"Vendor cache DB lookup failed for {gstin}: {e}")
+            vendor_data = None
+        if vendor_data:
+            self._count("database", hits=1)
+            cache.set_vendor_data(gstin, vendor_data)
+            self.local.set(gstin, vendor_data)
+            return self._found(vendor_data)
+        self._count("database", misses=1)
+        return None, self.MISS
+
+    def lookup_many(self, gstins: List[str]) -> Dict[str, Tuple[Optional[dict], str]]:
+        """
+        lookup() for many GSTINs: one MGET and one SELECT for the misses.
+
+        Returns:
+            {gstin: (vendor data, status)} - GSTINs found nowhere are left out
+        """
+        found: Dict[str, Tuple[Optional[dict], str]] = {}
+        pending = []
+        for gstin in dict.fromkeys(gstins):
+            entry = self.lookup_local(gstin)
+            if entry is not None:
+                found[gstin] = entry
+            else:
+                pending.append(gstin)
+        self._count("memory", misses=len(pending))
+        if not pending:
+            return found
+
+        from_redis, negatives = cache.get_vendor_entries(pending)
+        self._count("redis", hits=len(from_redis), misses=len(pending) - len(from_redis))
+        for gstin, vendor_data in from_redis.items():
+            self.local.set(gstin, vendor_data)
+            found[gstin] = self._found(vendor_data)
+        for gstin, entry in negatives.items():
+            if gstin not in from_redis:
+                self.local_negative.set(gstin, entry)
+                found[gstin] = self._negative()
+        pending = [gstin for gstin in pending if gstin not in found]
+        if not pending:
+            return found
+
+        try:
+            from_db = vendor_crud.get_cached_vendors(pending, max_age_hours=self.max_age_hours)
+        except Exception as e:
+            logger.error(f"Vendor cache DB lookup failed for {len(pending)} vendors: {e}")
+            from_db = {}
+        self._count("database", hits=len(from_db), misses=len(pending) - len(from_db))
+        cache.set_vendor_data_many(from_db)
+        for gstin, vendor_data in from_db.items():
+            self.local.set(gstin, vendor_data)
+            found[gstin] = self._found(vendor_data)
+        return found
+
+    def get(self, gstin: str) -> Optional[dict]:
+        """Get vendor data (fresh or stale) from the fastest tier that has it"""
+        vendor_data, _ = self.lookup(gstin)
+        return vendor_data
+
+    def get_many(self, gstins: List[str]) -> Dict[str, dict]:
+        """Get vendor data (fresh or stale) for many GSTINs"""
+        return {
+            gstin: vendor_data
+            for gstin, (vendor_data, _) in self.lookup_many(gstins).items()
+            if vendor_data
+        }
+
+    def set(self, vendor_data: dict) -> None:
+        """
+        Write vendor data through to every tier.
+
+        A no-op if the memory tier already holds this version (same
+        last_updated), i.e. it was already written through, or a newer one
+        (e.g. a slow refresh finishing after a faster one), or if the data is a
+        stale copy served from the cache itself.
+        """
+        gstin = vendor_data.get("gstin")
+        if not gstin or self._is_outdated(vendor_data):
+            return
+
+        self.local.set(gstin, vendor_data)
+        self.local_negative.delete(gstin)
+        cache.set_vendor_data(gstin, vendor_data)
+        vendor_crud.save_vendor(vendor_data)
+
+    def set_many(self, vendors: List[dict]) -> None:
+        """
+        set() for many vendors: one Redis pipeline for the whole lot.
+        Versions the memory tier already holds (or has newer ones of) are skipped, as in set().
+        """
+        changed = {}
+        for vendor_data in vendors:
+            gstin = vendor_data.get("gstin") if vendor_data else None
+            if not gstin or self._is_outdated(vendor_data):
+                continue
+            changed[gstin] = vendor_data
+        if not changed:
+            return
+
+        for gstin, vendor_data in changed.items():
+            self.local.set(gstin, vendor_data)
+            self.local_negative.delete(gstin)
+        cache.set_vendor_data_many(changed)
+        vendor_crud.save_vendors(list(changed.values()))
+
+    def set_negative(self, gstin: str, reason: str, not_found: bool = False) -> None:
+        """
+        Remember a failed lookup in the memory and Redis tiers.
+
+        not_found=True (invalid / unknown GSTIN) is kept for VENDOR_NOT_FOUND_TTL;
+        upstream errors only for VENDOR_ERROR_TTL.
+        """
+        ttl = cache.VENDOR_NOT_FOUND_TTL if not_found else cache.VENDOR_ERROR_TTL
+        self.local_negative.set(gstin, {"reason": reason}, ttl=ttl)
+        cache.set_vendor_miss(gstin, reason, ttl)
+
+    def begin_revalidation(self, gstin: str) -> bool:
+        """
+        Claim the background refresh of a stale entry.
+
+        Returns False if a refresh is already in flight in this process or the
+        last attempt failed recently (negative entry); call end_revalidation
+        when a claimed refresh finishes.
+        """
+        if self.local_negative.get(gstin) is not None:
+            return False
+        with self._revalidate_lock:
+            if gstin in self._revalidating:
+                return False
+            self._revalidating.add(gstin)
+            return True
+
+    def end_revalidation(self, gstin: str) -> None:
+        with self._revalidate_lock:
+            self._revalidating.discard(gstin)
+
+    @classmethod
+    def mark_stale(cls, vendor_data: dict) -> dict:
+        """Copy of a stale entry tagged with data_source=STALE for the caller"""
+        return {**vendor_data, "data_source": cls.STALE}
+
+    def invalidate(self, gstin: str) -> None:
+        """Drop vendor data from the memory and Redis tiers"""
+        self.local.delete(gstin)
+        self.local_negative.delete(gstin)
+        cache.invalidate_vendor(gstin)
+
+    def invalidate_many(self, gstins: List[str]) -> None:
+        """invalidate() for many GSTINs in one Redis round trip (also drops negative entries)"""
+        for gstin in gstins:
+            self.local.delete(gstin)
+            self.local_negative.delete(gstin)
+        cache.invalidate_vendors(gstins)
+
+    def stats(self) -> Dict:
+        """Per-tier hit/miss counters plus memory tier occupancy"""
+        with self._stats_lock:
+            tiers = {
+                tier: {
+                    "hits": self._hits[tier],
+                    "misses": self._misses[tier],
+                    "hit_rate_percent": round(self._hits[tier] / (self._hits[tier] + self._misses[tier]) * 100, 2)
+                    if self._hits[tier] + self._misses[tier] else 0.0
+                }
+                for tier in self.TIERS
+            }
+        entries, size_bytes = self.local.size
+        tiers["memory"].update({
+            "entries": entries,
+            "bytes": size_bytes,
+            "max_entries": self.local.max_entries,
+            "max_bytes": self.local.max_bytes,
+            "ttl_seconds": self.local.ttl,
+            "negative_entries": self.local_negative.size[0],
+        })
+        tiers["redis"]["enabled"] = cache.enabled
+        return tiers
+
+    def freshness_stats(self) -> Dict:
+        """Stale / negative hit counters and in-flight background refreshes"""
+        with self._stats_lock:
+            stats = {"stale_hits": self._stale_hits, "negative_hits": self._negative_hits}
+        with self._revalidate_lock:
+            stats["revalidating"] = len(self._revalidating)
+        stats.update({
+            "fresh_seconds": cache.VENDOR_DATA_TTL,
+            "stale_seconds": cache.VENDOR_STALE_TTL,
+            "not_found_ttl_seconds": cache.VENDOR_NOT_FOUND_TTL,
+            "error_ttl_seconds": cache.VENDOR_ERROR_TTL,
+        })
+        return stats
+
+
+# Singleton instance
+vendor_cache = VendorCache()
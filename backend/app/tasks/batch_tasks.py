@@ -14,7 +14,7 @@ from app.services.pdf import generate_certificate
 from app.services.storage import storage
 from app.db.crud import batch as batch_crud
 from app.db.crud import check as check_crud
-from app.db.crud import vendor as vendor_crud
+from app.services.vendor_cache import vendor_cache
 import os
 import zipfile
 
@@ -40,12 +40,14 @@ def process_single_vendor_task(self, item: Dict, job_id: str) -> Dict:
         party_name = item.get("party_name", "")
         
         # Fetch vendor data
-        vendor_data = vendor_crud.get_cached_vendor(gstin, max_age_hours=24)
-        if not vendor_data:
+        vendor_data, status = vendor_cache.lookup(gstin)
+        if status == vendor_cache.STALE:
+            get_gsp_provider().revalidate(gstin)
+        elif status == vendor_cache.MISS:
             provider = get_gsp_provider()
             vendor_data = provider.get_vendor_data(gstin)
             if vendor_data:
-                vendor_crud.save_vendor(vendor_data)
+                vendor_cache.set(vendor_data)
         
         # Run decision engine
         result = engine.check_vendor(vendor_data, amount)
@@ -135,7 +137,7 @@ def generate_batch_output_task(job_id: str, results: List[Dict]) -> Dict:
                     # Generate PDF certificate
                     check = check_crud.get_check_by_id(item["check_id"])
                     if check:
-                        vendor_data = vendor_crud.get_cached_vendor(item["gstin"])
+                        vendor_data = vendor_cache.get(item["gstin"])
                         check_data = {
                             **check,
                             "filing_history": vendor_data.get("filing_history", []) if vendor_data else [],
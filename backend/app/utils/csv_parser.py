@@ -2,10 +2,12 @@
 TaxPay Guard - CSV Parser for Batch Processing
 Parses and validates CSV files containing vendor GSTINs
 """
-import csv
 import io
 import re
-from typing import List, Dict, Tuple
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+from app.core.config import settings
+from app.utils.ingest import iter_csv_dicts
 
 
 def validate_gstin(gstin: str) -> bool:
@@ -17,69 +19,90 @@ def validate_gstin(gstin: str) -> bool:
     return bool(re.match(pattern, gstin.upper()))
 
 
-def parse_csv_content(content: bytes) -> Tuple[List[Dict], List[str]]:
+def _parse_vendor_row(row_num: int, row: Dict) -> Tuple[Optional[Dict], Optional[str]]:
+    """One CSV row -> (item, None) or (None, error)"""
+    # Extract GSTIN (try multiple column name variations)
+    gstin = None
+    for col in ['gstin', 'gst', 'gst_number', 'gstin_number', 'vendor_gstin']:
+        if col in row and row[col]:
+            gstin = row[col].strip().upper()
+            break
+    
+    if not gstin:
+        return None, f"Row {row_num}: Missing GSTIN"
+    
+    if not validate_gstin(gstin):
+        return None, f"Row {row_num}: Invalid GSTIN format '{gstin}'"
+    
+    # Extract optional vendor name
+    vendor_name = ""
+    for col in ['vendor_name', 'name', 'party_name', 'vendor', 'supplier', 'party_nam']:
+        if col in row and row[col]:
+            vendor_name = row[col].strip()
+            break
+    
+    # Extract optional amount
+    amount = 0.0
+    for col in ['amount', 'value', 'invoice_amount', 'payment_amount']:
+        if col in row and row[col]:
+            try:
+                amount = float(row[col].replace(',', '').strip())
+            except ValueError:
+                pass
+            break
+    
+    return {
+        'gstin': gstin,
+        'vendor_name': vendor_name,  # Changed from party_name to match DB schema
+        'amount': amount
+    }, None
+
+
+def iter_csv_vendors(file: BinaryIO, chunk_rows: int = None) -> Iterator[Tuple[List[Dict], List[str]]]:
     """
-    Parse CSV content and extract vendor data.
+    Parse a vendor CSV from a file object (e.g. UploadFile.file), decoding it
+    as it is read.
     
     Expected columns: GSTIN, Vendor Name (optional), Amount (optional)
     
-    Returns:
-        Tuple of (valid_items, errors)
+    Yields:
+        (valid_items, errors) for every chunk_rows rows (INGEST_CHUNK_ROWS by default)
     """
-    valid_items = []
-    errors = []
+    chunk_rows = chunk_rows or settings.INGEST_CHUNK_ROWS
+    valid_items, errors, rows = [], [], 0
     
     try:
-        # Decode and parse CSV
-        text_content = content.decode('utf-8-sig')  # Handle BOM
-        reader = csv.DictReader(io.StringIO(text_content))
-        
-        # Normalize column headers (case-insensitive)
-        if reader.fieldnames:
-            reader.fieldnames = [f.strip().lower() for f in reader.fieldnames]
-        
-        for row_num, row in enumerate(reader, start=2):  # Start from 2 (after header)
-            # Extract GSTIN (try multiple column name variations)
-            gstin = None
-            for col in ['gstin', 'gst', 'gst_number', 'gstin_number', 'vendor_gstin']:
-                if col in row and row[col]:
-                    gstin = row[col].strip().upper()
-                    break
-            
-            if not gstin:
-                errors.append(f"Row {row_num}: Missing GSTIN")
-                continue
+        for row_num, row in enumerate(iter_csv_dicts(file), start=2):  # Start from 2 (after header)
+            item, error = _parse_vendor_row(row_num, row)
+            if item:
+                valid_items.append(item)
+            else:
+                errors.append(error)
             
-            if not validate_gstin(gstin):
-                errors.append(f"Row {row_num}: Invalid GSTIN format '{gstin}'")
-                continue
-            
-            # Extract optional vendor name
-            vendor_name = ""
-            for col in ['vendor_name', 'name', 'party_name', 'vendor', 'supplier', 'party_nam']:
-                if col in row and row[col]:
-                    vendor_name = row[col].strip()
-                    break
-            
-            # Extract optional amount
-            amount = 0.0
-            for col in ['amount', 'value', 'invoice_amount', 'payment_amount']:
-                if col in row and row[col]:
-                    try:
-                        amount = float(row[col].replace(',', '').strip())
-                    except ValueError:
-                        pass
-                    break
-            
-            valid_items.append({
-                'gstin': gstin,
-                'vendor_name': vendor_name,  # Changed from party_name to match DB schema
-                'amount': amount
-            })
+            rows += 1
+            if rows == chunk_rows:
+                yield valid_items, errors
+                valid_items, errors, rows = [], [], 0
     
     except Exception as e:
         errors.append(f"Failed to parse CSV: {str(e)}")
     
+    if valid_items or errors:
+        yield valid_items, errors
+
+
+def parse_csv_content(content: bytes) -> Tuple[List[Dict], List[str]]:
+    """
+    Parse CSV content held in memory and extract vendor data (see iter_csv_vendors).
+    
+    Returns:
+        Tuple of (valid_items, errors)
+    """
+    valid_items = []
+    errors = []
+    for items, chunk_errors in iter_csv_vendors(io.BytesIO(content)):
+        valid_items.extend(items)
+        errors.extend(chunk_errors)
     return valid_items, errors
 
 
@@ -1,124 +1,214 @@
 """
 TaxPay Guard - Purchase Register (PR) Parser
 Parses Excel/CSV files for GSTR-2B Reconciliation.
+
+Parsing is column-at-a-time: every cell is read as text, then each column is
+validated / converted with one vectorized operation, and row-level errors are
+collected from boolean masks. Files are read in chunks (app.utils.ingest),
+so a register is parsed one chunk of rows at a time.
 """
 import io
-import csv
 import logging
-from typing import List, Dict, Any, Tuple
+from typing import BinaryIO, List, Dict, Any, Iterator, Optional, Tuple
+import numpy as np
 import pandas as pd
-from datetime import datetime
+
+from app.utils.ingest import iter_frames
+from app.utils.validation import InputValidator
 
 logger = logging.getLogger(__name__)
 
-def parse_purchase_register(file_content: bytes, filename: str) -> Tuple[List[Dict[str, Any]], List[str]]:
+# Invoice date formats tried on a sample of the column; the first one that parses
+# the whole sample wins, so day-first is preferred when every day is <= 12
+DATE_FORMATS = (
+    "%Y-%m-%d", "%d-%m-%Y", "%d/%m/%Y", "%d.%m.%Y", "%Y/%m/%d",
+    "%d-%b-%Y", "%d %b %Y", "%d-%b-%y", "%d/%m/%y", "%d-%m-%y",
+    "%m/%d/%Y", "%m-%d-%Y",
+    "%Y-%m-%d %H:%M:%S",  # Excel date cells read as text
+)
+DATE_SAMPLE_ROWS = 1000
+
+_OUTPUT_FIELDS = ("gstin", "invoice_number", "invoice_date", "taxable_value", "tax_amount", "vendor_name")
+
+
+def detect_date_format(values: pd.Series) -> Optional[str]:
+    """
+    Pick the DATE_FORMATS entry that parses the most of an evenly spaced sample
+    of the non-blank values (None if nothing parses).
+    """
+    values = values[values != ""]
+    if values.empty:
+        return None
+    sample = values.iloc[::max(1, len(values) // DATE_SAMPLE_ROWS)]
+
+    best_format, best_count = None, 0
+    for fmt in DATE_FORMATS:
+        count = int(pd.to_datetime(sample, format=fmt, errors="coerce").notna().sum())
+        if count > best_count:
+            best_format, best_count = fmt, count
+        if count == len(sample):
+            break
+    return best_format
+
+
+def parse_dates(values: pd.Series, date_format: Optional[str] = None) -> pd.Series:
+    """
+    Text dates -> YYYY-MM-DD strings, in date_format (detected from the values
+    if not given). Values in another format go through the remaining
+    DATE_FORMATS in order; what still doesn't parse is kept as given, blanks
+    become None.
     """
-    Parse uploaded Purchase Register (Excel/CSV).
-    
+    fmt = date_format or detect_date_format(values)
+    parsed = pd.Series(pd.NaT, index=values.index, dtype="datetime64[ns]")
+    for candidate in ((fmt,) if fmt else ()) + tuple(f for f in DATE_FORMATS if f != fmt):
+        leftover = parsed.isna() & (values != "")
+        if not leftover.any():
+            break
+        parsed[leftover] = pd.to_datetime(values[leftover], format=candidate, errors="coerce")
+
+    dates = parsed.dt.strftime("%Y-%m-%d").astype(object)
+    unparsed = parsed.isna()
+    dates[unparsed] = values[unparsed].astype(object)
+    dates[values == ""] = None
+    return dates
+
+
+def parse_amounts(values: pd.Series) -> Tuple[pd.Series, pd.Series]:
+    """
+    Text amounts ("1,23,456.78") -> floats, blanks as 0.0.
+
     Returns:
-        Tuple[List[Dict], List[str]]: (valid_items, errors)
+        (amounts, mask of non-blank values that are not numbers)
     """
-    valid_items = []
+    text = values.str.replace(",", "", regex=False).str.strip()
+    amounts = pd.to_numeric(text, errors="coerce")
+    invalid = amounts.isna() & (text != "")
+    return amounts.fillna(0.0).astype(float), invalid
+
+
+def _map_columns(columns: List[str]) -> Tuple[Dict[str, str], Optional[str]]:
+    """Standard key -> file column, or the error for a missing required column"""
+    column_map = {}
+
+    # Map known variations to standard keys
+    variations = {
+        'gstin': ['gstin', 'gst_number', 'gstin_of_supplier', 'supplier_gstin'],
+        'invoice_number': ['invoice_number', 'invoice_no', 'inv_no', 'document_number', 'doc_no'],
+        'invoice_date': ['invoice_date', 'inv_date', 'document_date', 'doc_date'],
+        'taxable_value': ['taxable_value', 'taxable_amount', 'net_amount', 'base_amount'],
+        'tax_amount': ['tax_amount', 'total_tax', 'igst+cgst+sgst', 'gst_amount'],
+        'vendor_name': ['vendor_name', 'party_name', 'supplier_name', 'name_of_supplier']
+    }
+
+    # Find matching columns
+    for key, aliases in variations.items():
+        found = False
+        for col in columns:
+            if col in aliases or any(alias in col for alias in aliases):
+                column_map[key] = col
+                found = True
+                break
+        # Optional columns
+        if not found and key not in ['vendor_name']:
+            return column_map, f"Missing required column for '{key}'. Found columns: {list(columns)}"
+    return column_map, None
+
+
+def _normalize_headers(df: pd.DataFrame) -> pd.DataFrame:
+    # Lowercase, strip, replace spaces with underscores
+    df.columns = df.columns.astype(str).str.lower().str.strip().str.replace(' ', '_').str.replace('/', '_').str.replace('.', '')
+    return df
+
+
+def _parse_frame(df: pd.DataFrame, column_map: Dict[str, str],
+                 date_format: Optional[str]) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """One chunk of text rows -> (valid_items, errors); df.index + 2 is the file row"""
+    def text(key: str) -> pd.Series:
+        if key not in column_map:
+            return pd.Series("", index=df.index, dtype=object)
+        return df[column_map[key]].fillna("").astype(str).str.strip()
+
+    gstin = text('gstin').str.upper()
+    blank = gstin == ""
+    bad_gstin = ~blank & ~gstin.str.match(InputValidator.GSTIN_PATTERN.pattern)
+    taxable_raw, tax_raw = text('taxable_value'), text('tax_amount')
+    taxable_value, bad_taxable = parse_amounts(taxable_raw)
+    tax_amount, bad_tax = parse_amounts(tax_raw)
+
+    # Row-level errors: only the flagged rows are visited
+    checks = ((bad_gstin, "invalid GSTIN", gstin),
+              (bad_taxable, "invalid taxable value", taxable_raw),
+              (bad_tax, "invalid tax amount", tax_raw))
+    rejected = ~blank & (bad_gstin | bad_taxable | bad_tax)
     errors = []
-    
+    for position in np.flatnonzero(rejected.to_numpy()):
+        problems = [f"{label} '{raw.iat[position]}'" for mask, label, raw in checks if mask.iat[position]]
+        errors.append(f"Row {df.index[position] + 2}: {', '.join(problems)}")
+
+    keep = ~(blank | rejected)
+    columns = (
+        gstin[keep],
+        text('invoice_number')[keep],
+        parse_dates(text('invoice_date')[keep], date_format),
+        taxable_value[keep],
+        tax_amount[keep],
+        text('vendor_name')[keep],
+    )
+    valid_items = [dict(zip(_OUTPUT_FIELDS, row)) for row in zip(*(column.tolist() for column in columns))]
+    return valid_items, errors
+
+
+def iter_purchase_register(file: BinaryIO, filename: str,
+                           chunk_rows: Optional[int] = None) -> Iterator[Tuple[List[Dict[str, Any]], List[str]]]:
+    """
+    Parse an uploaded Purchase Register (Excel/CSV) chunk by chunk.
+
+    Rows without a GSTIN (blank / total lines) are skipped silently; rows with
+    an invalid GSTIN or a non-numeric amount are skipped and reported. The
+    invoice date format is detected on the first chunk with dates and kept
+    for the rest of the file.
+
+    Args:
+        file: binary file object (e.g. UploadFile.file), read from the start
+        chunk_rows: rows per chunk (INGEST_CHUNK_ROWS by default)
+
+    Yields:
+        (valid_items, errors) per chunk; a missing column or unreadable file
+        yields one ([], [error]) and stops
+    """
+    if not filename.lower().endswith(('.csv', '.xlsx', '.xls')):
+        yield [], ["Unsupported file format. Please upload .csv, .xlsx, or .xls"]
+        return
+
+    column_map, date_format = None, None
     try:
-        df = None
-        
-        # Determine file type and load into DataFrame
-        if filename.lower().endswith(('.xlsx', '.xls')):
-            df = pd.read_excel(io.BytesIO(file_content))
-        elif filename.lower().endswith('.csv'):
-            # Try to infer separator (comma or semicolon)
-            try:
-                df = pd.read_csv(io.BytesIO(file_content))
-            except Exception:
-                # Fallback to semicolon if simple comma parse fails
-                df = pd.read_csv(io.BytesIO(file_content), sep=';')
-        else:
-            return [], ["Unsupported file format. Please upload .csv, .xlsx, or .xls"]
-
-        # Normalize column headers: lowercase, strip, replace spaces with underscores
-        df.columns = df.columns.astype(str).str.lower().str.strip().str.replace(' ', '_').str.replace('/', '_').str.replace('.', '')
-        
-        # Required columns (flexible matching)
-        # We need: GSTIN, Invoice Number, Invoice Date, Taxable Value, Tax Amount
-        
-        column_map = {}
-        
-        # Map known variations to standard keys
-        variations = {
-            'gstin': ['gstin', 'gst_number', 'gstin_of_supplier', 'supplier_gstin'],
-            'invoice_number': ['invoice_number', 'invoice_no', 'inv_no', 'document_number', 'doc_no'],
-            'invoice_date': ['invoice_date', 'inv_date', 'document_date', 'doc_date'],
-            'taxable_value': ['taxable_value', 'taxable_amount', 'net_amount', 'base_amount'],
-            'tax_amount': ['tax_amount', 'total_tax', 'igst+cgst+sgst', 'gst_amount'],
-            'vendor_name': ['vendor_name', 'party_name', 'supplier_name', 'name_of_supplier']
-        }
-        
-        # Find matching columns
-        for key, aliases in variations.items():
-            found = False
-            for col in df.columns:
-                if col in aliases or any(alias in col for alias in aliases):
-                    column_map[key] = col
-                    found = True
-                    break
-            # Optional columns
-            if not found and key not in ['vendor_name']:
-                errors.append(f"Missing required column for '{key}'. Found columns: {list(df.columns)}")
-                return [], errors
-
-        # Process rows
-        for index, row in df.iterrows():
-            try:
-                item = {}
-                
-                # GSTIN
-                gstin = str(row.get(column_map.get('gstin'), '')).strip().upper()
-                if not gstin or len(gstin) != 15:
-                    continue # Skip invalid rows silently? Or log error? For large files, skip empty rows.
-                    
-                item['gstin'] = gstin
-                
-                # Invoice Number
-                item['invoice_number'] = str(row.get(column_map.get('invoice_number'), '')).strip()
-                
-                # Invoice Date (Format YYYY-MM-DD or DD-MM-YYYY)
-                raw_date = row.get(column_map.get('invoice_date'))
-                if pd.notna(raw_date):
-                    try:
-                        dt = pd.to_datetime(raw_date)
-                        item['invoice_date'] = dt.strftime('%Y-%m-%d')
-                    except:
-                        item['invoice_date'] = str(raw_date) # Keep as string if parsing fails
-                        
-                # Amounts
-                try:
-                    t_val = float(str(row.get(column_map.get('taxable_value'), 0)).replace(',', '')) if pd.notna(row.get(column_map.get('taxable_value'))) else 0.0
-                    item['taxable_value'] = t_val
-                except:
-                    item['taxable_value'] = 0.0
-                    
-                try:
-                    tax = float(str(row.get(column_map.get('tax_amount'), 0)).replace(',', '')) if pd.notna(row.get(column_map.get('tax_amount'))) else 0.0
-                    item['tax_amount'] = tax
-                except:
-                   # If distinct column not found, maybe calculate? Or assume 0.
-                   item['tax_amount'] = 0.0
-                
-                # Vendor Name (Optional)
-                if 'vendor_name' in column_map:
-                    item['vendor_name'] = str(row.get(column_map.get('vendor_name'), '')).strip()
-                else:
-                    item['vendor_name'] = ""
-                
-                valid_items.append(item)
-                
-            except Exception as e:
-                errors.append(f"Row {index+2}: Error parsing - {str(e)}")
-                
-        return valid_items, errors
+        for df in iter_frames(file, filename, chunk_rows):
+            _normalize_headers(df)
+            if column_map is None:
+                # We need: GSTIN, Invoice Number, Invoice Date, Taxable Value, Tax Amount
+                column_map, missing = _map_columns(list(df.columns))
+                if missing:
+                    yield [], [missing]
+                    return
+            if date_format is None:
+                date_format = detect_date_format(df[column_map['invoice_date']].fillna("").astype(str).str.strip())
+            yield _parse_frame(df, column_map, date_format)
 
     except Exception as e:
         logger.error(f"File parsing error: {e}")
-        return [], [f"File parsing failed: {str(e)}"]
+        yield [], [f"File parsing failed: {str(e)}"]
+
+
+def parse_purchase_register(file_content: bytes, filename: str) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """
+    Parse uploaded Purchase Register (Excel/CSV) held in memory
+    (see iter_purchase_register for the rules).
+
+    Returns:
+        Tuple[List[Dict], List[str]]: (valid_items, errors)
+    """
+    valid_items, errors = [], []
+    for items, chunk_errors in iter_purchase_register(io.BytesIO(file_content), filename):
+        valid_items.extend(items)
+        errors.extend(chunk_errors)
+    return valid_items, errors
@@ -0,0 +1,153 @@
+"""
+Streaming upload ingestion.
+
+Uploads are read from the UploadFile's spooled file (upload.file) instead of
+being pulled into one bytes object: CSV through a text wrapper that decodes
+as it reads, .xlsx through openpyxl's read-only row iterator. Rows come out in
+fixed-size chunks from generators, so the next chunk is only read when the
+consumer asks for it - memory holds one chunk whatever the file size.
+"""
+import csv
+import hashlib
+import io
+import logging
+from contextlib import contextmanager
+from typing import BinaryIO, Iterable, Iterator, List, Optional
+
+import pandas as pd
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Bytes per read while hashing / sniffing
+READ_BLOCK_SIZE = 1024 * 1024
+
+
+def file_sha256(file: BinaryIO) -> str:
+    """SHA-256 of a file object's content, read block by block (the position is restored)"""
+    position = file.tell()
+    file.seek(0)
+    digest = hashlib.sha256()
+    for block in iter(lambda: file.read(READ_BLOCK_SIZE), b""):
+        digest.update(block)
+    file.seek(position)
+    return digest.hexdigest()
+
+
+def file_size(file: BinaryIO) -> int:
+    """Size of a file object in bytes (the position is restored)"""
+    position = file.tell()
+    size = file.seek(0, 2)
+    file.seek(position)
+    return size
+
+
+@contextmanager
+def open_text(file: BinaryIO):
+    """
+    The file as text (UTF-8, BOM stripped), decoded as it is read. The
+    underlying file stays open - it belongs to the UploadFile.
+    """
+    file.seek(0)
+    text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+    try:
+        yield text
+    finally:
+        text.detach()
+
+
+def sniff_delimiter(file: BinaryIO) -> str:
+    """"," or ";" - whichever the header line uses more"""
+    file.seek(0)
+    header = file.readline(READ_BLOCK_SIZE).decode("utf-8-sig", errors="replace")
+    file.seek(0)
+    return ";" if header.count(";") > header.count(",") else ","
+
+
+def chunked(items: Iterable, size: int) -> Iterator[List]:
+    """Lists of up to size items"""
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def iter_csv_frames(file: BinaryIO, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    """CSV as DataFrames of up to chunk_rows text rows (pandas' chunked reader)"""
+    with open_text(file) as text:
+        reader = pd.read_csv(text, sep=sniff_delimiter(file), dtype=str, chunksize=chunk_rows)
+        for frame in reader:
+            yield frame
+
+
+def _cell_text(value) -> Optional[str]:
+    if value is None or value == "":
+        return None
+    return value if isinstance(value, str) else str(value)
+
+
+def iter_excel_frames(file: BinaryIO, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    """
+    First sheet of an .xlsx as DataFrames of up to chunk_rows text rows, read
+    row by row (openpyxl read-only mode never loads the whole sheet)
+    """
+    from openpyxl import load_workbook
+
+    file.seek(0)
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [str(name) if name is not None else f"unnamed_{i}" for i, name in enumerate(header)]
+        width = len(columns)
+        for chunk in chunked(enumerate(rows), chunk_rows):
+            positions, records = [], []
+            for position, row in chunk:
+                record = [_cell_text(value) for value in row[:width]]
+                # Blank rows (often thousands of formatted but empty ones) are not data
+                if any(value is not None for value in record):
+                    positions.append(position)
+                    records.append(record + [None] * (width - len(record)))
+            if records:
+                yield pd.DataFrame(records, columns=columns, index=positions, dtype=object)
+    finally:
+        workbook.close()
+
+
+def iter_frames(file: BinaryIO, filename: str, chunk_rows: Optional[int] = None) -> Iterator[pd.DataFrame]:
+    """
+    An uploaded .csv / .xlsx / .xls as DataFrames of text cells (blanks as
+    NaN / None), up to chunk_rows rows each (INGEST_CHUNK_ROWS by default).
+    The index is each row's position after the header (file row = index + 2).
+
+    .xls has no streaming reader; it is loaded whole (xlrd) and then chunked.
+    """
+    chunk_rows = chunk_rows or settings.INGEST_CHUNK_ROWS
+    name = filename.lower()
+    if name.endswith(".csv"):
+        yield from iter_csv_frames(file, chunk_rows)
+    elif name.endswith(".xlsx"):
+        yield from iter_excel_frames(file, chunk_rows)
+    elif name.endswith(".xls"):
+        file.seek(0)
+        frame = pd.read_excel(file, dtype=str)
+        for start in range(0, len(frame), chunk_rows):
+            yield frame.iloc[start:start + chunk_rows]
+    else:
+        raise ValueError("Unsupported file format. Please upload .csv, .xlsx, or .xls")
+
+
+def iter_csv_dicts(file: BinaryIO) -> Iterator[dict]:
+    """CSV rows as dicts keyed by the lowercased, stripped header"""
+    with open_text(file) as text:
+        reader = csv.DictReader(text)
+        if reader.fieldnames:
+            reader.fieldnames = [f.strip().lower() for f in reader.fieldnames]
+        yield from reader
@@ -1,7 +1,10 @@
 """
 Pagination utilities for API endpoints
 """
-from typing import TypeVar, Generic, List, Optional
+import base64
+import binascii
+import json
+from typing import TypeVar, Generic, List, Optional, Dict, Any
 from pydantic import BaseModel
 from math import ceil
 
@@ -25,7 +28,12 @@ class PaginationParams(BaseModel):
 
 
 class PaginatedResponse(BaseModel, Generic[T]):
-    """Standard paginated response format"""
+    """
+    Standard paginated response format.
+    
+    Keyset-paginated endpoints also return next_cursor: pass it back as
+    ?cursor= to get the following page (None on the last page).
+    """
     items: List[T]
     total: int
     page: int
@@ -33,6 +41,7 @@ class PaginatedResponse(BaseModel, Generic[T]):
     total_pages: int
     has_next: bool
     has_prev: bool
+    next_cursor: Optional[str] = None
     
     @classmethod
     def create(
@@ -40,7 +49,8 @@ class PaginatedResponse(BaseModel, Generic[T]):
         items: List[T],
         total: int,
         page: int,
-        page_size: int
+        page_size: int,
+        next_cursor: Optional[str] = None
     ) -> "PaginatedResponse[T]":
         """Create paginated response from query results"""
         total_pages = ceil(total / page_size) if page_size > 0 else 0
@@ -52,10 +62,26 @@ class PaginatedResponse(BaseModel, Generic[T]):
             page_size=page_size,
             total_pages=total_pages,
             has_next=page < total_pages,
-            has_prev=page > 1
+            has_prev=page > 1,
+            next_cursor=next_cursor if page < total_pages else None
         )
 
 
+def encode_cursor(position: Dict[str, Any]) -> str:
+    """Opaque cursor for keyset pagination (URL-safe base64 of the JSON position)"""
+    return base64.urlsafe_b64encode(json.dumps(position, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Optional[Dict[str, Any]]:
+    """Position encoded by encode_cursor, or None if the cursor is malformed"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        position = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (binascii.Error, ValueError, UnicodeDecodeError):
+        return None
+    return position if isinstance(position, dict) else None
+
+
 def paginate_query(
     query_results: List[T],
     total_count: int,
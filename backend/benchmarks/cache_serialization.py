@@ -0,0 +1,103 @@
+"""
+Benchmark for cached vendor payload encodings
+
+Compares the previous Redis format (plain json.dumps text) with the
+CacheSerializer variants on vendor records as produced by map_vendor_data,
+at a few filing history lengths. Reports bytes per entry and encode/decode
+time per entry. msgpack / lz4 rows are skipped when those packages aren't
+installed.
+
+Usage (from backend/):
+    python benchmarks/cache_serialization.py --filings 6 24 120 --rounds 20000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.cache_serializer import CacheSerializer, _load_lz4, _load_msgpack  # noqa: E402
+from app.services.gsp import map_vendor_data  # noqa: E402
+
+
+def build_vendor(filings: int) -> dict:
+    """A vendor record with `filings` filing history rows (GSTR-1/3B alternating, monthly)"""
+    history = []
+    for i in range(filings):
+        month, year = 12 - (i // 2) % 12, 2025 - i // 24
+        history.append({
+            "period": f"{month:02d}/{year}",
+            "filed_date": f"{(i % 28) + 1:02d}-{month:02d}-{year}",
+            "status": "Filed",
+            "delay": "On Time" if i % 5 else "Late",
+            "return_type": "GSTR1" if i % 2 else "GSTR3B",
+        })
+    data = {
+        "sts": "Active",
+        "rgdt": "01/07/2017",
+        "lgnm": "SHREE GANESH TRADING COMPANY PRIVATE LIMITED",
+        "tradeNam": "SHREE GANESH TRADERS",
+    }
+    return map_vendor_data("27AAACS1234A1Z5", data, history)
+
+
+def legacy_dumps(value) -> bytes:
+    return json.dumps(value).encode("utf-8")
+
+
+def legacy_loads(data: bytes):
+    return json.loads(data)
+
+
+def time_per_call(func, arg, rounds: int) -> float:
+    """Microseconds per call"""
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func(arg)
+    return (time.perf_counter() - start) / rounds * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filings", type=int, nargs="+", default=[6, 24, 120],
+                        help="filing history lengths to test")
+    parser.add_argument("--rounds", type=int, default=20000)
+    parser.add_argument("--min-bytes", type=int, default=1024, help="compression threshold")
+    args = parser.parse_args()
+
+    variants = [("legacy json (current)", None), ("json", ("json", "none")), ("json+zlib", ("json", "zlib"))]
+    if _load_lz4():
+        variants.append(("json+lz4", ("json", "lz4")))
+    if _load_msgpack():
+        variants += [("msgpack", ("msgpack", "none")), ("msgpack+zlib", ("msgpack", "zlib"))]
+        if _load_lz4():
+            variants.append(("msgpack+lz4", ("msgpack", "lz4")))
+
+    print(f"{'filings':>7}  {'format':<22} {'bytes':>7} {'ratio':>6} {'encode us':>10} {'decode us':>10}")
+    for filings in args.filings:
+        vendor = build_vendor(filings)
+        baseline = None
+        for name, config in variants:
+            if config is None:
+                dumps, loads = legacy_dumps, legacy_loads
+            else:
+                serializer = CacheSerializer(config[0], config[1], args.min_bytes)
+                dumps, loads = serializer.dumps, serializer.loads
+            encoded = dumps(vendor)
+            assert loads(encoded) == vendor
+            baseline = baseline or len(encoded)
+            print(f"{filings:>7}  {name:<22} {len(encoded):>7} {len(encoded) / baseline:>6.2f} "
+                  f"{time_per_call(dumps, vendor, args.rounds):>10.2f} "
+                  f"{time_per_call(loads, encoded, args.rounds):>10.2f}")
+        print()
+
+    # Legacy entries written before the serializer change must still decode
+    vendor = build_vendor(6)
+    assert CacheSerializer("json", "zlib").loads(legacy_dumps(vendor)) == vendor
+    print("legacy plain-JSON entries decode: ok")
+
+
+if __name__ == "__main__":
+    main()
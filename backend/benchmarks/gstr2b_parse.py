@@ -0,0 +1,142 @@
+"""
+Benchmark for GSTR-2B response parsing
+
+Builds a synthetic GSTR-2B response (GSTN schema: sections under
+data.docdata, taxes in per-document item lists) with --documents documents
+spread over B2B, B2BA, CDNR, CDNRA, ISD, IMPG and IMPGSEZ, then times the
+invoice dicts GSTR-2B sync stores (B2B/B2BA; the other sections are skipped):
+
+- decoded   json.loads of the body, then parse_gstr2b_invoices
+- stream    iter_gstr2b_stream straight from the bytes (ijson; skipped when
+            ijson isn't installed)
+
+Usage (from backend/):
+    python benchmarks/gstr2b_parse.py --documents 200000
+    python benchmarks/gstr2b_parse.py --documents 200000 --write /tmp/gstr2b_200k.json
+"""
+import argparse
+import io
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.gstr2b_parser import _load_ijson, iter_gstr2b_stream, parse_gstr2b_invoices  # noqa: E402
+
+# Share of documents per section (roughly what a trading buyer's 2B looks like)
+SECTION_MIX = {"b2b": 0.80, "b2ba": 0.03, "cdnr": 0.10, "cdnra": 0.01, "isd": 0.02,
+               "impg": 0.02, "impgsez": 0.02}
+# Key of the document list in a supplier block (IMPG entries are documents themselves)
+DOCUMENT_LISTS = {"b2b": "inv", "b2ba": "inv", "cdnr": "nt", "cdnra": "nt", "isd": "doclist",
+                  "impgsez": "boe"}
+INVOICES_PER_SUPPLIER = 40
+
+
+def _items(rng: random.Random, interstate: bool):
+    items = []
+    for num in range(1, rng.randint(1, 3) + 1):
+        rate = rng.choice((5, 12, 18, 28))
+        txval = round(rng.uniform(1000, 200000), 2)
+        tax = round(txval * rate / 100, 2)
+        if interstate:
+            items.append({"num": num, "rt": rate, "txval": txval, "igst": tax, "cgst": 0, "sgst": 0, "cess": 0})
+        else:
+            items.append({"num": num, "rt": rate, "txval": txval, "igst": 0,
+                          "cgst": round(tax / 2, 2), "sgst": round(tax / 2, 2), "cess": 0})
+    return items
+
+
+def _document(rng: random.Random, section: str, seq: int):
+    interstate = rng.random() < 0.4
+    items = _items(rng, interstate)
+    value = round(sum(i["txval"] + i["igst"] + i["cgst"] + i["sgst"] for i in items), 2)
+    date = f"{rng.randint(1, 28):02d}-01-2026"
+    if section in ("b2b", "b2ba"):
+        doc = {"inum": f"INV/{seq:07d}", "typ": "R", "dt": date, "val": value, "pos": "27",
+               "rev": "N", "itcavl": "Y", "rsn": "", "diffprcnt": 1, "srctyp": "e-Invoice",
+               "irn": f"{seq:064x}", "irngendate": date, "items": items}
+        if section == "b2ba":
+            doc.update({"oinum": f"INV/{seq - 1:07d}", "oidt": date})
+        return doc
+    if section in ("cdnr", "cdnra"):
+        doc = {"ntnum": f"CN/{seq:07d}", "typ": rng.choice("CCCD"), "suptyp": "R", "dt": date,
+               "val": value, "pos": "27", "rev": "N", "itcavl": "Y", "items": items}
+        if section == "cdnra":
+            doc.update({"ontnum": f"CN/{seq - 1:07d}", "ontdt": date})
+        return doc
+    if section == "isd":
+        return {"doctyp": "ISDI", "docnum": f"ISD/{seq:07d}", "docdt": date, "itcelg": "Y",
+                "igst": items[0]["igst"], "cgst": items[0]["cgst"], "sgst": items[0]["sgst"], "cess": 0}
+    # impg / impgsez
+    return {"refdt": date, "portcd": "INNSA1", "boenum": f"{seq:07d}", "boedt": date, "isamd": "N",
+            "txval": items[0]["txval"], "igst": round(items[0]["txval"] * 0.18, 2), "cess": 0}
+
+
+def build_gstr2b_payload(documents: int, seed: int = 7) -> dict:
+    """Synthetic GSTR-2B response with about `documents` documents"""
+    rng = random.Random(seed)
+    docdata, seq = {}, 0
+    for section, share in SECTION_MIX.items():
+        count = int(documents * share)
+        if section == "impg":
+            docdata[section] = [_document(rng, section, seq + i) for i in range(count)]
+            seq += count
+            continue
+        blocks, key = [], DOCUMENT_LISTS[section]
+        for start in range(0, count, INVOICES_PER_SUPPLIER):
+            docs = [_document(rng, section, seq + i) for i in range(min(INVOICES_PER_SUPPLIER, count - start))]
+            seq += len(docs)
+            blocks.append({"ctin": f"27AAACS{len(blocks):04d}A1Z5", "trdnm": f"SUPPLIER {len(blocks)}",
+                           "supfildt": "11-02-2026", "supprd": "012026", key: docs})
+        docdata[section] = blocks
+    return {"data": {"gstin": "27AABCU9603R1ZM", "rtnprd": "012026", "version": "1.0",
+                     "gendt": "14-02-2026", "docdata": docdata}}
+
+
+def timed(func, rounds: int):
+    best, result = None, None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=200000)
+    parser.add_argument("--rounds", type=int, default=3, help="best of N")
+    parser.add_argument("--write", metavar="PATH", help="also save the fixture JSON here")
+    args = parser.parse_args()
+
+    body = json.dumps(build_gstr2b_payload(args.documents)).encode()
+    if args.write:
+        with open(args.write, "wb") as f:
+            f.write(body)
+    print(f"fixture: {args.documents} documents, {len(body) / 1e6:.1f} MB")
+
+    decode_s, decoded = timed(lambda: json.loads(body), args.rounds)
+    rows_s, invoices = timed(lambda: parse_gstr2b_invoices(decoded["data"], "27AABCU9603R1ZM", "012026"),
+                             args.rounds)
+
+    print(f"{'path':<20} {'invoices':>10} {'seconds':>8} {'inv/sec':>10}")
+    print(f"{'decode (json)':<20} {'':>10} {decode_s:>8.2f}")
+    print(f"{'invoice dicts':<20} {len(invoices):>10} {rows_s:>8.2f} {len(invoices) / rows_s:>10,.0f}")
+    decoded_s = decode_s + rows_s
+    print(f"{'decoded total':<20} {len(invoices):>10} {decoded_s:>8.2f} {len(invoices) / decoded_s:>10,.0f}")
+
+    if _load_ijson():
+        def stream():
+            return list(iter_gstr2b_stream(io.BytesIO(body), "27AABCU9603R1ZM", "012026"))
+        stream_s, streamed = timed(stream, args.rounds)
+        assert streamed == invoices
+        print(f"{'stream':<20} {len(streamed):>10} {stream_s:>8.2f} {len(streamed) / stream_s:>10,.0f}")
+    else:
+        print("stream: skipped (ijson not installed)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Load test for POST /api/v1/compliance/check
+
+Fires N concurrent Tally-style clients at the app in-process (ASGI transport)
+and reports p50/p99 latency for:
+  - blocking: the previous handler (sync GSP + DB calls on the event loop)
+  - async:    the current handler (async provider + DB executor)
+
+The mock GSP is slowed down by --gsp-latency-ms to emulate the real
+Sandbox API (a blocking sleep for the old path, an awaited one for the async
+provider); every request uses a fresh GSTIN so it misses the vendor cache.
+Writes go to the local SQLite database (backend/itc_shield.db).
+
+Usage (from backend/):
+    python benchmarks/loadtest_compliance_check.py --clients 200 --requests 5
+"""
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("DATABASE_URL", "")
+os.environ.setdefault("GSP_MODE", "mock")
+os.environ.setdefault("JWT_SECRET_KEY", "loadtest_secret_key_minimum_32_characters_long")
+os.environ.setdefault("BATCH_OUTPUT_DIR", tempfile.mkdtemp())
+# app.database builds a Supabase client at import time; it is never called here
+for _name in ("SUPABASE_URL", "SUPABASE_ANON_KEY", "SUPABASE_SERVICE_KEY", "SANDBOX_CLIENT_ID", "SANDBOX_SECRET"):
+    os.environ.setdefault(_name, "http://localhost" if _name == "SUPABASE_URL" else "loadtest")
+
+
+def build_app(gsp_latency: float):
+    import httpx  # noqa: F401 - fail early if missing
+    from fastapi import Request
+    from app.main import app
+    from app.api.deps import limiter
+    from app.api.v1.endpoints import check as check_module
+    from app.db.crud import vendor as vendor_crud
+    from app.db.crud import check as check_crud
+    from app.schemas.check import CheckRequest
+    from app.services import gsp_async
+    from app.services.gsp import MockGSPProvider, get_gsp_provider
+
+    limiter.enabled = False
+    logging.disable(logging.WARNING)
+
+    original = MockGSPProvider.get_vendor_data
+
+    def slow_get_vendor_data(self, gstin):
+        time.sleep(gsp_latency)
+        return original(self, gstin)
+
+    MockGSPProvider.get_vendor_data = slow_get_vendor_data
+
+    class SlowAsyncProvider(gsp_async.AsyncGSPProviderAdapter):
+        # Stands in for AsyncSandboxGSPProvider: the GSP wait is non-blocking I/O
+        async def get_vendor_data(self, gstin):
+            await asyncio.sleep(gsp_latency)
+            return original(self.provider, gstin)
+
+    gsp_async._async_provider = SlowAsyncProvider(MockGSPProvider())
+
+    @app.post("/loadtest/blocking-check")
+    async def blocking_check(request: Request, check_request: CheckRequest):
+        # Previous implementation: blocking calls directly on the event loop
+        gstin = check_request.gstin.strip().upper()
+        vendor_data = vendor_crud.get_cached_vendor(gstin, max_age_hours=24)
+        if not vendor_data:
+            vendor_data = get_gsp_provider().get_vendor_data(gstin)
+            if vendor_data:
+                vendor_crud.save_vendor(vendor_data)
+        result = check_module.engine.check_vendor(vendor_data, check_request.amount)
+        check_crud.save_compliance_check(
+            gstin=gstin, vendor_name=vendor_data.get("legal_name", ""), amount=check_request.amount,
+            decision=result["decision"], rule_id=result["rule_id"], reason=result["reason"],
+            risk_level=result["risk_level"], data_source="GSP_LIVE"
+        )
+        return {"decision": result["decision"]}
+
+    return app
+
+
+def make_gstin(n: int) -> str:
+    # State code 33 -> COMPLIANT mock scenario; PAN digits carry the sequence number
+    return f"33ABCDE{n % 10000:04d}{chr(65 + (n // 10000) % 26)}1Z{n % 10}"
+
+
+async def run_scenario(app, path: str, clients: int, requests_per_client: int, offset: int):
+    import httpx
+
+    latencies = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=120) as client:
+        async def tally_client(client_no: int):
+            for i in range(requests_per_client):
+                gstin = make_gstin(offset + client_no * requests_per_client + i)
+                started = time.perf_counter()
+                response = await client.post(path, json={"gstin": gstin, "amount": 1000, "party_name": "LOADTEST"})
+                latencies.append(time.perf_counter() - started)
+                response.raise_for_status()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(tally_client(c) for c in range(clients)))
+        wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[max(0, int(len(latencies) * 0.99) - 1)] * 1000,
+        "throughput_rps": len(latencies) / wall,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=5, help="Requests per client")
+    parser.add_argument("--gsp-latency-ms", type=float, default=150)
+    args = parser.parse_args()
+
+    app = build_app(args.gsp_latency_ms / 1000)
+    from app.db.session import init_database
+    init_database()
+
+    total = args.clients * args.requests
+    print(f"{args.clients} clients x {args.requests} requests, simulated GSP latency {args.gsp_latency_ms:.0f}ms")
+    print(f"{'path':<10} {'p50 (ms)':>10} {'p99 (ms)':>10} {'req/s':>10}")
+    for offset, (name, path) in enumerate([
+        ("blocking", "/loadtest/blocking-check"),
+        ("async", "/api/v1/compliance/check"),
+    ]):
+        stats = asyncio.run(run_scenario(app, path, args.clients, args.requests, offset * total + int(time.time()) % 1000 * total))
+        print(f"{name:<10} {stats['p50_ms']:>10.1f} {stats['p99_ms']:>10.1f} {stats['throughput_rps']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
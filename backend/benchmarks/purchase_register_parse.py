@@ -0,0 +1,153 @@
+"""
+Benchmark for purchase register parsing
+
+Builds a synthetic purchase register (--rows rows, CSV and optionally .xlsx)
+in the shapes registers exported from Tally / Excel take - Indian digit
+grouping ("1,23,456.78"), day-first dates in a few formats, zero-padded and
+free-text invoice numbers, blank and total lines, a small share of invalid
+GSTINs and amounts - and times:
+
+- row loop      the iterrows() parser parse_purchase_register used before
+                (per-cell pd.to_datetime / float(str().replace()), kept
+                below as legacy_parse_purchase_register)
+- vectorized    app.utils.file_parser.parse_purchase_register
+
+Both keep the same rows apart from the invalid ones the vectorized parser
+now rejects (and reports); the row counts are printed for comparison.
+
+Usage (from backend/):
+    python benchmarks/purchase_register_parse.py --rows 200000
+    python benchmarks/purchase_register_parse.py --rows 200000 --skip-legacy --excel
+"""
+import argparse
+import io
+import os
+import random
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.file_parser import parse_purchase_register  # noqa: E402
+
+HEADER = ["GSTIN of Supplier", "Party Name", "Invoice No.", "Invoice Date", "Taxable Value", "Total Tax"]
+
+
+def _indian_grouping(amount: float) -> str:
+    whole, fraction = f"{amount:.2f}".split(".")
+    if len(whole) <= 3:
+        return f"{whole}.{fraction}"
+    head, tail = whole[:-3], whole[-3:]
+    groups = []
+    while len(head) > 2:
+        groups.insert(0, head[-2:])
+        head = head[:-2]
+    return ",".join(([head] if head else []) + groups + [tail]) + f".{fraction}"
+
+
+def build_register(rows: int, seed: int = 7) -> pd.DataFrame:
+    rng = random.Random(seed)
+    suppliers = [f"27AAACS{i:04d}A1Z{rng.randint(1, 9)}" for i in range(max(5, rows // 40))]
+    date_format = rng.choice(("%d/%m/%Y", "%d-%m-%Y", "%d-%b-%Y"))
+    records = []
+    for i in range(rows):
+        r = rng.random()
+        gstin = rng.choice(suppliers)
+        if r < 0.005:
+            gstin = "NOT-A-GSTIN"
+        elif r < 0.01:
+            gstin = ""
+        taxable = round(rng.uniform(100, 500000), 2)
+        day = pd.Timestamp(2026, 1, 1) + pd.Timedelta(days=rng.randint(0, 58))
+        records.append([
+            gstin if rng.random() < 0.9 else f" {gstin.lower()} ",
+            rng.choice((f"Supplier {gstin[-6:]}", "")),
+            rng.choice((f"INV/25-26/{i:06d}", f"{i:07d}", f"T-{i}")),
+            day.strftime(date_format) if rng.random() < 0.98 else "",
+            _indian_grouping(taxable) if r > 0.012 else "N.A.",
+            f"{taxable * 0.18:.2f}",
+        ])
+    records.append(["Total", "", "", "", "", ""])
+    return pd.DataFrame(records, columns=HEADER)
+
+
+def legacy_parse_purchase_register(file_content: bytes, filename: str):
+    """The iterrows() parser parse_purchase_register used before (column mapping condensed)"""
+    valid_items, errors = [], []
+    if filename.lower().endswith(('.xlsx', '.xls')):
+        df = pd.read_excel(io.BytesIO(file_content))
+    else:
+        df = pd.read_csv(io.BytesIO(file_content))
+    df.columns = df.columns.astype(str).str.lower().str.strip().str.replace(' ', '_').str.replace('/', '_').str.replace('.', '')
+    column_map = {'gstin': 'gstin_of_supplier', 'invoice_number': 'invoice_no', 'invoice_date': 'invoice_date',
+                  'taxable_value': 'taxable_value', 'tax_amount': 'total_tax', 'vendor_name': 'party_name'}
+
+    for index, row in df.iterrows():
+        try:
+            item = {}
+            gstin = str(row.get(column_map.get('gstin'), '')).strip().upper()
+            if not gstin or len(gstin) != 15:
+                continue
+            item['gstin'] = gstin
+            item['invoice_number'] = str(row.get(column_map.get('invoice_number'), '')).strip()
+            raw_date = row.get(column_map.get('invoice_date'))
+            if pd.notna(raw_date):
+                try:
+                    item['invoice_date'] = pd.to_datetime(raw_date).strftime('%Y-%m-%d')
+                except Exception:
+                    item['invoice_date'] = str(raw_date)
+            try:
+                value = row.get(column_map.get('taxable_value'))
+                item['taxable_value'] = float(str(value).replace(',', '')) if pd.notna(value) else 0.0
+            except Exception:
+                item['taxable_value'] = 0.0
+            try:
+                value = row.get(column_map.get('tax_amount'))
+                item['tax_amount'] = float(str(value).replace(',', '')) if pd.notna(value) else 0.0
+            except Exception:
+                item['tax_amount'] = 0.0
+            item['vendor_name'] = str(row.get(column_map.get('vendor_name'), '')).strip()
+            valid_items.append(item)
+        except Exception as e:
+            errors.append(f"Row {index+2}: Error parsing - {str(e)}")
+    return valid_items, errors
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--excel", action="store_true", help="also time an .xlsx copy (slow to generate)")
+    parser.add_argument("--skip-legacy", action="store_true", help="don't time the row loop")
+    args = parser.parse_args()
+
+    frame = build_register(args.rows)
+    files = [("register.csv", frame.to_csv(index=False).encode())]
+    if args.excel:
+        buffer = io.BytesIO()
+        frame.to_excel(buffer, index=False)
+        files.append(("register.xlsx", buffer.getvalue()))
+
+    print(f"{'file':>14} {'MB':>6} {'rows':>8} {'row loop s':>11} {'vectorized s':>13} {'speedup':>8}  kept (loop / vectorized), errors")
+    for filename, content in files:
+        vector_s, (items, errors) = timed(lambda: parse_purchase_register(content, filename))
+        if args.skip_legacy:
+            legacy_s, legacy_items = None, None
+        else:
+            legacy_s, (legacy_items, _) = timed(lambda: legacy_parse_purchase_register(content, filename))
+        loop = f"{legacy_s:>11.2f}" if legacy_s is not None else f"{'-':>11}"
+        speedup = f"{legacy_s / vector_s:>7.1f}x" if legacy_s is not None else f"{'-':>8}"
+        kept = f"{len(legacy_items) if legacy_items is not None else '-'} / {len(items)}"
+        print(f"{filename:>14} {len(content) / 1e6:>6.1f} {len(frame):>8} {loop} {vector_s:>13.2f} {speedup}  "
+              f"{kept}, {len(errors)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Benchmark: reconciliation engine match_invoices()
+
+Generates purchase register / GSTR-2B datasets in the shapes the matching
+rules care about - duplicate keys on both sides, amounts on and around the
+tolerance edge, GSTIN case/whitespace and invoice-number formatting variants,
+blank or absent vendor names and dates, rows missing on either side - and
+times match_invoices() with and without the fuzzy second pass.
+
+Results are checked against a reference implementation by
+tests/test_reconciliation.py.
+
+Usage (from backend/):
+    python benchmarks/reconciliation_match.py --rows 1000 10000 --seeds 5
+    python benchmarks/reconciliation_match.py --rows 100000 --seeds 1
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.config import settings  # noqa: E402
+from app.services.reconciliation import ReconciliationEngine  # noqa: E402
+
+TOLERANCE = 2.0
+
+
+def _invoice_variant(rng: random.Random, number: int) -> str:
+    return rng.choice((
+        f"INV/{number:05d}",
+        f"inv-{number:05d}",
+        f"INV {number}",
+        f"{number:07d}",
+        f"inv{number}",
+    ))
+
+
+def build_datasets(rows: int, seed: int):
+    """(pr_rows, gstr2b_rows) with about `rows` PR rows"""
+    rng = random.Random(seed)
+    suppliers = [f"27AAACS{i:04d}A1Z{rng.randint(0, 9)}" for i in range(max(5, rows // 20))]
+    gstr2b, pr = [], []
+
+    for i in range(rows):
+        gstin = rng.choice(suppliers)
+        number = rng.randint(1, rows * 2)
+        taxable = round(rng.uniform(100, 100000), 2)
+        tax = round(taxable * 0.18, 2)
+        roll = rng.random()
+
+        row_2b = {
+            "gstin": gstin,
+            "invoice_number": _invoice_variant(rng, number),
+            "invoice_date": rng.choice(("2026-01-05", "05-01-2026", None)),
+            "taxable_value": taxable,
+            "tax_amount": tax,
+        }
+        vendor_roll = rng.random()
+        if vendor_roll < 0.6:
+            row_2b["vendor_name"] = f"SUPPLIER {gstin[-6:]}"
+        elif vendor_roll < 0.8:
+            row_2b["vendor_name"] = ""
+
+        pr_row = {
+            "gstin": rng.choice((gstin, gstin.lower(), f" {gstin} ")),
+            "invoice_number": _invoice_variant(rng, number),
+            "taxable_value": taxable,
+            "tax_amount": tax,
+            "vendor_name": rng.choice((f"Vendor {i}", "")),
+        }
+        if rng.random() < 0.9:
+            pr_row["invoice_date"] = "2026-01-05"
+
+        if roll < 0.55:      # match, sometimes right at the tolerance edge
+            pr_row["taxable_value"] = taxable + rng.choice((0, 0, 1.5, TOLERANCE, -TOLERANCE))
+            gstr2b.append(row_2b)
+            pr.append(pr_row)
+        elif roll < 0.70:    # amount mismatch
+            pr_row["taxable_value"] = taxable + rng.choice((TOLERANCE + 0.01, 50, -500))
+            gstr2b.append(row_2b)
+            pr.append(pr_row)
+        elif roll < 0.78:    # duplicate key in GSTR-2B; the second one may be the one within tolerance
+            gstr2b.append(dict(row_2b, taxable_value=taxable + 300))
+            gstr2b.append(dict(row_2b))
+            pr.append(pr_row)
+        elif roll < 0.84:    # duplicate PR rows against one GSTR-2B row
+            gstr2b.append(row_2b)
+            pr.append(pr_row)
+            pr.append(dict(pr_row, taxable_value=taxable + rng.choice((0, 1000))))
+        elif roll < 0.92:    # only in PR
+            pr.append(pr_row)
+        else:                # only in GSTR-2B
+            gstr2b.append(row_2b)
+
+    rng.shuffle(gstr2b)
+    rng.shuffle(pr)
+    return pr, gstr2b
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--seeds", type=int, default=3)
+    args = parser.parse_args()
+
+    engine = ReconciliationEngine(tolerance=TOLERANCE)
+
+    print(f"{'rows':>8} {'seeds':>6} {'exact s':>8} {'with fuzzy s':>13} {'rows/s':>10}")
+    for rows in args.rows:
+        exact_s = fuzzy_s = 0.0
+        for seed in range(args.seeds):
+            pr, gstr2b = build_datasets(rows, seed)
+
+            settings.RECONCILIATION_FUZZY_MATCH = False
+            start = time.perf_counter()
+            engine.match_invoices(pr, gstr2b)
+            exact_s += time.perf_counter() - start
+
+            settings.RECONCILIATION_FUZZY_MATCH = True
+            start = time.perf_counter()
+            engine.match_invoices(pr, gstr2b)
+            fuzzy_s += time.perf_counter() - start
+        print(f"{rows:>8} {args.seeds:>6} {exact_s:>8.2f} {fuzzy_s:>13.2f} {rows * args.seeds / fuzzy_s:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Benchmark for invoice-number normalization in the reconciliation engine
+
+Compares the regex implementation match_invoices used before
+(re.sub(r'[^A-Z0-9]', '', ...)) with the bytes-translate one in
+ReconciliationEngine.normalize_invoice_number on synthetic invoice numbers,
+and checks both give identical output. The values mix typical formats
+("INV/2025-26/00123", zero-padded numbers, spaces and dashes, numeric cells
+from Excel, blanks/None/NaN) with unicode edge cases ("ß", ligatures,
+full-width digits).
+
+Usage (from backend/):
+    python benchmarks/reconciliation_normalize.py --rows 10000 100000 1000000
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.reconciliation import ReconciliationEngine  # noqa: E402
+
+
+def regex_normalize(invoice_num) -> str:
+    if not invoice_num:
+        return ""
+    return re.sub(r'[^A-Z0-9]', '', str(invoice_num).strip().upper()).lstrip('0')
+
+
+def build_invoice_numbers(rows: int, seed: int = 11) -> list:
+    rng = random.Random(seed)
+    values = []
+    for _ in range(rows):
+        r = rng.random()
+        if r < 0.50:
+            values.append(f"INV/2025-26/{rng.randint(0, 99999):05d}")
+        elif r < 0.70:
+            values.append(f"{rng.randint(0, 999):06d}")
+        elif r < 0.80:
+            values.append(f" gst-{rng.randint(0, 9999)} a ")
+        elif r < 0.85:
+            values.append(rng.randint(0, 5000))
+        elif r < 0.88:
+            values.append(float(rng.randint(0, 50)))
+        elif r < 0.90:
+            values.append(None)
+        elif r < 0.92:
+            values.append(float("nan"))
+        elif r < 0.94:
+            values.append("straße-ﬁ/0ſ")
+        elif r < 0.95:
+            values.append("")
+        elif r < 0.96:
+            values.append("000")
+        else:
+            values.append("Ｉｎｖ１２")
+    return values
+
+
+def timed(func, rounds: int):
+    best, result = None, None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--rounds", type=int, default=3, help="best of N")
+    args = parser.parse_args()
+
+    normalize = ReconciliationEngine().normalize_invoice_number
+    print(f"{'rows':>9} {'regex s':>9} {'translate s':>12} {'speedup':>8}  identical")
+    for rows in args.rows:
+        values = build_invoice_numbers(rows)
+        regex_s, expected = timed(lambda: [regex_normalize(value) for value in values], args.rounds)
+        translate_s, actual = timed(lambda: [normalize(value) for value in values], args.rounds)
+        identical = expected == actual
+        print(f"{rows:>9} {regex_s:>9.3f} {translate_s:>12.3f} {regex_s / translate_s:>7.1f}x  {identical}")
+        assert identical
+
+
+if __name__ == "__main__":
+    main()
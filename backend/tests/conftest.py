@@ -4,6 +4,7 @@ Test configuration and fixtures for ITC Shield
 import pytest
 import os
 import sys
+import tempfile
 
 # Add app directory to path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -13,6 +14,11 @@ os.environ["DATABASE_URL"] = ""  # Use SQLite for tests
 os.environ["REDIS_URL"] = "redis://localhost:6379/15"  # Separate test DB
 os.environ["JWT_SECRET_KEY"] = "test_secret_key_for_testing_only_minimum_32_characters_long"
 os.environ["GSP_MODE"] = "mock"  # Use mock GSP for tests
+os.environ["BATCH_OUTPUT_DIR"] = os.path.join(tempfile.gettempdir(), "itc_shield_test_outputs")  # Local storage
+# Required by app.config; placeholders unless the environment provides them
+for name, value in (("SUPABASE_URL", "http://localhost:54321"), ("SUPABASE_ANON_KEY", "test"),
+                    ("SUPABASE_SERVICE_KEY", "test"), ("SANDBOX_CLIENT_ID", "test"), ("SANDBOX_SECRET", "test")):
+    os.environ.setdefault(name, value)
 
 from fastapi.testclient import TestClient
 
@@ -44,6 +50,33 @@ def test_db():
     except Exception:
         pass  # Ignore cleanup errors
 
+@pytest.fixture
+def test_user(test_db):
+    """User ID of a fresh user row; its GSTR-2B data and runs are removed afterwards"""
+    import uuid
+    from app.db.session import get_connection, ph
+
+    user_id = str(uuid.uuid4())
+    with get_connection() as (conn, cursor):
+        cursor.execute(f"INSERT INTO users (id, email, password_hash) VALUES ({ph(3)})",
+                       (user_id, f"{user_id}@test.local", "x"))
+        conn.commit()
+
+    yield user_id
+
+    try:
+        with get_connection() as (conn, cursor):
+            cursor.execute(f"""
+                DELETE FROM reconciliation_results WHERE run_id IN
+                    (SELECT id FROM reconciliation_runs WHERE user_id = {ph()})
+            """, (user_id,))
+            for table in ("reconciliation_runs", "gstr_2b_data", "gstr_2b_supplier_hashes",
+                          "gstr_2b_period_versions"):
+                cursor.execute(f"DELETE FROM {table} WHERE user_id = {ph()}", (user_id,))
+            conn.commit()
+    except Exception:
+        pass  # Ignore cleanup errors
+
 @pytest.fixture
 def sample_gstin():
     """Valid GSTIN for testing"""
@@ -0,0 +1,140 @@
+"""
+Tests for creating batch jobs from streamed vendor CSV uploads
+"""
+import asyncio
+import io
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.v1.endpoints import batch as batch_endpoints
+from app.core.config import settings
+from app.db.crud import batch as batch_crud
+from app.services import batch as batch_service
+
+
+def vendor_csv(count, invalid=()):
+    rows = [f"27AAACS{i:04d}A1Z5,Vendor {i},{1000 + i}" for i in range(count)]
+    for position in invalid:
+        rows[position] = f"NOT-A-GSTIN,Vendor {position},0"
+    return io.BytesIO(("GSTIN,Vendor Name,Amount\n" + "\n".join(rows) + "\n").encode())
+
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(settings, "INGEST_CHUNK_ROWS", 10)
+
+
+class TestCreateBatchFromUpload:
+
+    def test_vendors_stored_chunk_by_chunk(self, test_db, small_chunks):
+        result = batch_service.create_batch_from_upload(vendor_csv(25, invalid=[3]), "vendors.csv", max_vendors=100)
+
+        assert result["total_vendors"] == 24
+        assert result["errors"] == ["Row 5: Invalid GSTIN format 'NOT-A-GSTIN'"]
+        assert batch_crud.get_batch_job(result["job_id"])["total_count"] == 24
+        items = batch_crud.get_batch_items(result["job_id"], status="PENDING")
+        assert len(items) == 24
+        assert items[0]["gstin"] == "27AAACS0000A1Z5"
+        assert [(item["id"], item["gstin"]) for item in result["items"]] == \
+            [(item["id"], item["gstin"]) for item in items]
+
+    def test_over_limit_fails_the_job(self, test_db, small_chunks):
+        """The limit is checked as chunks arrive: the rest of the file is never read"""
+        upload = vendor_csv(3000)
+
+        result = batch_service.create_batch_from_upload(upload, "vendors.csv", max_vendors=15)
+
+        assert result["limit_exceeded"] is True
+        assert result["error"] == "Maximum 15 vendors allowed"
+        job = batch_crud.get_batch_job(result["job_id"])
+        assert job["status"] == "FAILED"
+        assert job["error_message"] == "Maximum 15 vendors allowed"
+        assert upload.tell() < len(upload.getvalue())
+        assert batch_crud.get_batch_items(result["job_id"]) == []
+
+    def test_exactly_at_limit(self, test_db, small_chunks):
+        result = batch_service.create_batch_from_upload(vendor_csv(20), "vendors.csv", max_vendors=20)
+
+        assert "error" not in result
+        assert result["total_vendors"] == 20
+
+    def test_no_valid_vendors_fails_the_job(self, test_db):
+        result = batch_service.create_batch_from_upload(vendor_csv(2, invalid=[0, 1]), "vendors.csv", max_vendors=10)
+
+        assert result["error"] == "No valid vendors found"
+        assert len(result["errors"]) == 2
+        assert batch_crud.get_batch_job(result["job_id"])["status"] == "FAILED"
+
+
+@pytest.fixture
+def api(test_db):
+    app = FastAPI()
+    app.include_router(batch_endpoints.router, prefix="/batch")
+    return TestClient(app)
+
+
+def upload(api, content):
+    return api.post("/batch/upload", files={"file": ("vendors.csv", content, "text/csv")})
+
+
+class TestUploadEndpoint:
+
+    def test_returns_job_id_and_processes_in_background(self, api, monkeypatch):
+        process_batch_sync = batch_service.process_batch_sync
+        on_event_loop = []
+
+        def process(job_id, items=None):
+            try:
+                asyncio.get_running_loop()
+                on_event_loop.append(True)
+            except RuntimeError:
+                on_event_loop.append(False)
+            return process_batch_sync(job_id, items)
+
+        monkeypatch.setattr(batch_service, "process_batch_sync", process)
+        get_batch_items = batch_crud.get_batch_items
+        pending_reads = []
+
+        def read_items(batch_id, status=None):
+            if status == "PENDING":
+                pending_reads.append(batch_id)
+            return get_batch_items(batch_id, status)
+
+        monkeypatch.setattr(batch_crud, "get_batch_items", read_items)
+
+        response = upload(api, vendor_csv(5).getvalue())
+
+        assert response.status_code == 200
+        body = response.json()
+        assert body["status"] == "PENDING"
+        assert body["total_vendors"] == 5
+        # TestClient runs background tasks before returning
+        assert on_event_loop == [False]
+        # The items created by the upload are handed over, not re-read
+        assert pending_reads == []
+        status = api.get(f"/batch/status/{body['job_id']}").json()
+        assert status["status"] == "COMPLETED"
+        assert status["processed"] == 5
+
+    def test_processing_error_fails_the_job(self, api, monkeypatch):
+        def explode(job_id, items=None):
+            batch_crud.update_batch_job_status(job_id, "PROCESSING")
+            raise RuntimeError("GSP unavailable")
+
+        monkeypatch.setattr(batch_service, "process_batch_sync", explode)
+
+        body = upload(api, vendor_csv(3).getvalue()).json()
+
+        job = batch_crud.get_batch_job(body["job_id"])
+        assert job["status"] == "FAILED"
+        assert job["error_message"] == "GSP unavailable"
+
+    def test_over_limit_is_rejected(self, api, monkeypatch):
+        monkeypatch.setattr(batch_endpoints, "MAX_VENDORS_PER_BATCH", 2)
+
+        response = upload(api, vendor_csv(3).getvalue())
+
+        assert response.status_code == 400
+        assert response.json()["detail"] == "Maximum 2 vendors allowed"
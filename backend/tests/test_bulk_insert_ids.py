@@ -0,0 +1,75 @@
+"""
+Tests for the ids returned by the bulk inserts (batch items, compliance checks) on SQLite
+"""
+import sqlite3
+import uuid
+
+import pytest
+
+from app.db import session
+from app.db.crud import batch as batch_crud
+from app.db.crud import check as check_crud
+from app.db.session import get_connection, ph
+
+
+@pytest.fixture(params=["returning", "last_insert_rowid"])
+def insert_path(request, monkeypatch):
+    """Run each test with small multi-row INSERT ... RETURNING chunks, and with the pre-3.35 fallback"""
+    if request.param == "returning":
+        monkeypatch.setattr(session, "SQLITE_INSERT_CHUNK_ROWS", 3)
+    else:
+        monkeypatch.setattr(sqlite3, "sqlite_version_info", (3, 34, 1))
+    return request.param
+
+
+def make_job():
+    job_id = str(uuid.uuid4())
+    batch_crud.create_batch_job(job_id, 0, "vendors.csv")
+    return job_id
+
+
+def vendors(count, offset=0):
+    return [{"gstin": f"27AAACS{offset + i:04d}A1Z5", "vendor_name": f"Vendor {offset + i}", "amount": 100 + i}
+            for i in range(count)]
+
+
+class TestAddBatchItems:
+
+    def test_ids_match_stored_rows(self, test_db, insert_path):
+        job_id = make_job()
+        # Leave gaps in the id sequence before the bulk insert
+        earlier = batch_crud.add_batch_items(job_id, vendors(4, offset=100))
+        with get_connection() as (conn, cursor):
+            cursor.execute(f"DELETE FROM batch_items WHERE id IN ({ph(2)})", (earlier[1]["id"], earlier[3]["id"]))
+            conn.commit()
+
+        created = batch_crud.add_batch_items(job_id, vendors(10))
+
+        assert [item["gstin"] for item in created] == [v["gstin"] for v in vendors(10)]
+        assert len({item["id"] for item in created}) == 10
+        for item in created:
+            with get_connection() as (conn, cursor):
+                cursor.execute(f"SELECT gstin, vendor_name, amount, status FROM batch_items WHERE id = {ph()}",
+                               (item["id"],))
+                stored = dict(cursor.fetchone())
+            assert stored == {key: item[key] for key in ("gstin", "vendor_name", "amount", "status")}
+
+    def test_empty(self, test_db):
+        assert batch_crud.add_batch_items(make_job(), []) == []
+
+
+class TestSaveComplianceChecks:
+
+    def test_ids_match_stored_rows(self, test_db, insert_path):
+        check_crud.save_compliance_checks([{"gstin": "27AAACS9999A1Z5", "decision": "HOLD"}])
+        checks = [{"gstin": v["gstin"], "vendor_name": v["vendor_name"], "amount": v["amount"],
+                   "decision": "RELEASE" if i % 2 else "HOLD", "rule_id": f"R{i}"}
+                  for i, v in enumerate(vendors(7))]
+
+        ids = check_crud.save_compliance_checks(checks)
+
+        assert len(set(ids)) == 7
+        for check_id, check in zip(ids, checks):
+            stored = check_crud.get_check_by_id(check_id)
+            assert (stored["gstin"], stored["decision"], stored["rule_id"]) == \
+                (check["gstin"], check["decision"], check["rule_id"])
@@ -0,0 +1,150 @@
+"""
+Tests for the Redis cache service (batched reads and writes)
+"""
+import pytest
+
+from app.services.cache import CacheService
+from app.services.cache_serializer import get_cache_serializer
+
+
+class DictClient:
+    """The slice of the redis client CacheService.get / get_many use, over a dict"""
+
+    def __init__(self):
+        self.data = {}
+        self.mget_calls = 0
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def mget(self, keys):
+        self.mget_calls += 1
+        return [self.data.get(key) for key in keys]
+
+
+@pytest.fixture
+def cache():
+    service = CacheService()
+    service.client = DictClient()
+    service.enabled = True
+    return service
+
+
+def store(cache, key, value):
+    cache.client.data[key] = get_cache_serializer().dumps(value)
+
+
+class TestGetMany:
+
+    def test_found_keys_only(self, cache):
+        store(cache, "a", {"n": 1})
+        store(cache, "c", [1, 2])
+
+        assert cache.get_many(["a", "b", "c"]) == {"a": {"n": 1}, "c": [1, 2]}
+
+    def test_one_mget_per_chunk(self, cache, monkeypatch):
+        monkeypatch.setattr(CacheService, "BATCH_CHUNK_SIZE", 2)
+        for key in "abcde":
+            store(cache, key, key)
+
+        assert cache.get_many(list("abcde")) == {key: key for key in "abcde"}
+        assert cache.client.mget_calls == 3
+
+    @pytest.mark.parametrize("corrupt", [b"not json", b"\xff\x09\x00\x00garbage", "{truncated"])
+    def test_undecodable_value_is_a_miss(self, cache, corrupt):
+        """Like get(): only the bad key is dropped, not the rest of its chunk"""
+        store(cache, "a", {"n": 1})
+        cache.client.data["b"] = corrupt
+        store(cache, "c", {"n": 3})
+
+        assert cache.get("b") is None
+        assert cache.get_many(["a", "b", "c"]) == {"a": {"n": 1}, "c": {"n": 3}}
+
+    def test_disabled(self, cache):
+        cache.enabled = False
+
+        assert cache.get_many(["a"]) == {}
+
+
+class Pipeline:
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def set(self, key, value):
+        self.commands.append((key, value, None))
+
+    def setex(self, key, ttl, value):
+        self.commands.append((key, value, ttl))
+
+    def execute(self):
+        self.client.executes += 1
+        for key, value, ttl in self.commands:
+            self.client.data[key] = value
+            self.client.ttls[key] = ttl
+
+
+class WriteClient(DictClient):
+    """DictClient plus the pipeline and DEL calls set_many / delete_many use"""
+
+    def __init__(self):
+        super().__init__()
+        self.ttls = {}
+        self.executes = 0
+        self.delete_calls = 0
+
+    def pipeline(self, transaction=True):
+        assert transaction is False
+        return Pipeline(self)
+
+    def delete(self, *keys):
+        self.delete_calls += 1
+        return sum(self.data.pop(key, None) is not None for key in keys)
+
+
+@pytest.fixture
+def writable(cache):
+    cache.client = WriteClient()
+    return cache
+
+
+class TestSetMany:
+
+    def test_round_trip(self, writable):
+        assert writable.set_many({"a": {"n": 1}, "b": [1, 2]}, ttl=60) is True
+
+        assert writable.get_many(["a", "b"]) == {"a": {"n": 1}, "b": [1, 2]}
+        assert writable.client.ttls == {"a": 60, "b": 60}
+
+    def test_one_pipeline_per_chunk(self, writable, monkeypatch):
+        monkeypatch.setattr(CacheService, "BATCH_CHUNK_SIZE", 2)
+
+        writable.set_many({key: key for key in "abcde"})
+
+        assert writable.client.executes == 3
+        assert set(writable.client.ttls.values()) == {None}
+
+    def test_empty_or_disabled(self, writable):
+        assert writable.set_many({}) is False
+        writable.enabled = False
+        assert writable.set_many({"a": 1}) is False
+        assert writable.client.executes == 0
+
+
+class TestDeleteMany:
+
+    def test_counts_deleted_keys(self, writable, monkeypatch):
+        monkeypatch.setattr(CacheService, "BATCH_CHUNK_SIZE", 2)
+        for key in "abc":
+            store(writable, key, key)
+
+        assert writable.delete_many(["a", "b", "c", "missing"]) == 3
+        assert writable.client.data == {}
+        assert writable.client.delete_calls == 2
+
+    def test_disabled(self, writable):
+        store(writable, "a", 1)
+        writable.enabled = False
+
+        assert writable.delete_many(["a"]) == 0
+        assert "a" in writable.client.data
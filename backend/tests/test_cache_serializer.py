@@ -0,0 +1,57 @@
+"""
+Tests for the versioned cache value serializer
+"""
+import json
+
+import pytest
+
+from app.services.cache_serializer import (
+    CacheSerializer, COMPRESSION_NONE, COMPRESSION_ZLIB, FORMAT_JSON, HEADER_SIZE, MAGIC, VERSION
+)
+
+VALUE = {"gstin": "27AABCU9603R1ZM", "legal_name": "TEST COMPANY PVT LTD", "filings": [{"period": "022026", "status": "Filed"}],
+         "amount": 1180.5, "active": True, "note": None, "city": "मुंबई"}
+LARGE_VALUE = {"invoices": [dict(VALUE, invoice_no=f"INV{i}") for i in range(100)]}
+
+
+class TestCacheSerializer:
+
+    @pytest.mark.parametrize("format", ["json", "msgpack"])
+    @pytest.mark.parametrize("compression", ["none", "zlib", "lz4"])
+    def test_round_trip(self, format, compression):
+        serializer = CacheSerializer(format=format, compression=compression)
+
+        for value in (VALUE, LARGE_VALUE, [], "text", 0):
+            assert serializer.loads(serializer.dumps(value)) == value
+
+    def test_header(self):
+        data = CacheSerializer(format="json", compression="none").dumps(VALUE)
+
+        assert data[:HEADER_SIZE] == bytes((MAGIC, VERSION, FORMAT_JSON, COMPRESSION_NONE))
+        assert json.loads(data[HEADER_SIZE:]) == VALUE
+
+    def test_only_large_payloads_are_compressed(self):
+        serializer = CacheSerializer(format="json", compression="zlib", compress_min_bytes=1024)
+
+        assert serializer.dumps(VALUE)[3] == COMPRESSION_NONE
+        assert serializer.dumps(LARGE_VALUE)[3] == COMPRESSION_ZLIB
+
+    def test_entries_decode_whatever_the_current_settings(self):
+        """Settings can change between writing and reading an entry; the header says how to decode it"""
+        written = CacheSerializer(format="msgpack", compression="zlib", compress_min_bytes=0).dumps(LARGE_VALUE)
+
+        assert CacheSerializer(format="json", compression="none").loads(written) == LARGE_VALUE
+
+    @pytest.mark.parametrize("legacy", [json.dumps(VALUE), json.dumps(VALUE).encode("utf-8")])
+    def test_legacy_plain_json(self, legacy):
+        assert CacheSerializer(format="msgpack", compression="zlib").loads(legacy) == VALUE
+
+    def test_none_is_a_miss(self):
+        assert CacheSerializer().loads(None) is None
+
+    def test_unknown_version_is_rejected(self):
+        data = bytearray(CacheSerializer().dumps(VALUE))
+        data[1] = VERSION + 1
+
+        with pytest.raises(ValueError):
+            CacheSerializer().loads(bytes(data))
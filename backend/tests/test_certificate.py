@@ -0,0 +1,114 @@
+"""
+Tests for the certificate download endpoint
+"""
+import threading
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.v1.endpoints import check as check_endpoints
+
+GSTIN = "27AABCU9603R1ZM"
+
+
+class RecordingVendorCache:
+    """The vendor cache calls the endpoint makes, recording the thread each one runs on"""
+
+    STALE = "STALE"
+
+    def __init__(self, local=None, vendor_data=None):
+        self.local = local
+        self.vendor_data = vendor_data
+        self.threads = {}
+
+    def lookup_local(self, gstin):
+        self.threads["lookup_local"] = threading.current_thread().name
+        return self.local
+
+    def lookup(self, gstin):
+        self.threads["lookup"] = threading.current_thread().name
+        return (self.vendor_data, "FRESH" if self.vendor_data else "MISS")
+
+    def get(self, gstin):
+        raise AssertionError("blocking get() called from the event loop")
+
+
+class RecordingCheckCrud:
+    def __init__(self):
+        self.threads = []
+
+    def get_check_by_id(self, check_id):
+        self.threads.append(threading.current_thread().name)
+        if check_id != 7:
+            return None
+        return {"id": 7, "gstin": GSTIN, "decision": "HOLD", "reason": "Late filer"}
+
+
+@pytest.fixture
+def certificates(monkeypatch):
+    """Rendered certificate data, in place of the PDF"""
+    rendered = []
+
+    def render(check_data):
+        rendered.append(check_data)
+        return b"%PDF-1.4 certificate"
+
+    monkeypatch.setattr(check_endpoints, "generate_certificate", render)
+    return rendered
+
+
+@pytest.fixture
+def checks(monkeypatch):
+    crud = RecordingCheckCrud()
+    monkeypatch.setattr(check_endpoints, "check_crud", crud)
+    return crud
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(check_endpoints.router, prefix="/compliance")
+    return TestClient(app)
+
+
+def use_cache(monkeypatch, cache):
+    monkeypatch.setattr(check_endpoints, "vendor_cache", cache)
+    return cache
+
+
+class TestDownloadCertificate:
+
+    def test_lookups_run_off_the_event_loop(self, monkeypatch, client, checks, certificates):
+        cache = use_cache(monkeypatch, RecordingVendorCache(
+            vendor_data={"gst_status": "Active", "registration_date": "2019-04-01", "filing_history": ["GSTR-1"]}))
+
+        response = client.get("/compliance/certificate/7")
+
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/pdf"
+        assert checks.threads[0].startswith("db")
+        assert cache.threads["lookup"].startswith("db")
+        assert certificates[0]["gst_status"] == "Active"
+        assert certificates[0]["filing_history"] == ["GSTR-1"]
+        assert certificates[0]["rule_37a_status"] == "Review Required"
+
+    def test_memory_tier_hit_skips_the_executor(self, monkeypatch, client, checks, certificates):
+        cache = use_cache(monkeypatch, RecordingVendorCache(local=({"gst_status": "Cancelled"}, "FRESH")))
+
+        assert client.get("/compliance/certificate/7").status_code == 200
+        assert "lookup" not in cache.threads
+        assert certificates[0]["gst_status"] == "Cancelled"
+
+    def test_vendor_not_cached(self, monkeypatch, client, checks, certificates):
+        use_cache(monkeypatch, RecordingVendorCache())
+
+        assert client.get("/compliance/certificate/7").status_code == 200
+        assert certificates[0]["filing_history"] == []
+        assert certificates[0]["gst_status"] == ""
+
+    def test_unknown_check(self, monkeypatch, client, checks, certificates):
+        use_cache(monkeypatch, RecordingVendorCache())
+
+        assert client.get("/compliance/certificate/8").status_code == 404
+        assert certificates == []
@@ -0,0 +1,141 @@
+"""
+Tests for the purchase register parser
+"""
+import io
+
+import pandas as pd
+import pytest
+
+from app.utils.file_parser import iter_purchase_register, parse_purchase_register
+
+HEADER = "GSTIN of Supplier,Party Name,Invoice No.,Invoice Date,Taxable Value,Total Tax\n"
+REGISTER = HEADER + (
+    "27AABCU9603R1ZM,Acme Traders,INV/25-26/001,2026-02-05,\"1,23,456.78\",22222.22\n"
+    " 29aaacs1234a1z5 ,Beta Supplies,T-17,2026-02-28,1000,180\n"
+    "27AABCU9603R1ZM,Acme Traders,INV/25-26/002,2026-01-31,999.5,\"1,000\"\n"
+    ",,,,,\n"
+    "Total,,,,\"1,25,456.28\",23402.22\n"
+)
+
+
+def legacy_parse_purchase_register(file_content: bytes, filename: str):
+    """The row-by-row parser parse_purchase_register replaced (column mapping condensed)"""
+    valid_items = []
+    if filename.lower().endswith(('.xlsx', '.xls')):
+        df = pd.read_excel(io.BytesIO(file_content))
+    else:
+        df = pd.read_csv(io.BytesIO(file_content))
+    df.columns = df.columns.astype(str).str.lower().str.strip().str.replace(' ', '_').str.replace('/', '_').str.replace('.', '')
+    column_map = {'gstin': 'gstin_of_supplier', 'invoice_number': 'invoice_no', 'invoice_date': 'invoice_date',
+                  'taxable_value': 'taxable_value', 'tax_amount': 'total_tax', 'vendor_name': 'party_name'}
+
+    for _, row in df.iterrows():
+        item = {}
+        gstin = str(row.get(column_map['gstin'], '')).strip().upper()
+        if not gstin or len(gstin) != 15:
+            continue
+        item['gstin'] = gstin
+        item['invoice_number'] = str(row.get(column_map['invoice_number'], '')).strip()
+        raw_date = row.get(column_map['invoice_date'])
+        if pd.notna(raw_date):
+            item['invoice_date'] = pd.to_datetime(raw_date).strftime('%Y-%m-%d')
+        for key in ('taxable_value', 'tax_amount'):
+            value = row.get(column_map[key])
+            item[key] = float(str(value).replace(',', '')) if pd.notna(value) else 0.0
+        item['vendor_name'] = str(row.get(column_map['vendor_name'], '')).strip()
+        valid_items.append(item)
+    return valid_items
+
+
+def register(rows, header=HEADER):
+    return (header + "".join(f"{row}\n" for row in rows)).encode()
+
+
+class TestParsePurchaseRegister:
+
+    def test_same_rows_as_row_parser(self):
+        items, errors = parse_purchase_register(REGISTER.encode(), "register.csv")
+
+        assert items == legacy_parse_purchase_register(REGISTER.encode(), "register.csv")
+        assert [item["gstin"] for item in items] == ["27AABCU9603R1ZM", "29AAACS1234A1Z5", "27AABCU9603R1ZM"]
+        assert items[0]["taxable_value"] == 123456.78
+        assert items[2]["tax_amount"] == 1000.0
+        assert errors == ["Row 6: invalid GSTIN 'TOTAL'"]
+
+    def test_excel_same_as_csv(self):
+        frame = pd.read_csv(io.StringIO(REGISTER), dtype=str)
+        buffer = io.BytesIO()
+        frame.to_excel(buffer, index=False)
+
+        assert parse_purchase_register(buffer.getvalue(), "register.xlsx") == \
+            parse_purchase_register(REGISTER.encode(), "register.csv")
+
+    @pytest.mark.parametrize("dates, expected", [
+        (["05/02/2026", "28/02/2026"], ["2026-02-05", "2026-02-28"]),
+        (["05-02-2026", "01-02-2026"], ["2026-02-05", "2026-02-01"]),
+        (["05-Feb-2026", "1-Mar-2026"], ["2026-02-05", "2026-03-01"]),
+        (["2026-02-05", "01/02/2026"], ["2026-02-05", "2026-02-01"]),
+    ])
+    def test_dates_are_day_first(self, dates, expected):
+        content = register(f"27AABCU9603R1ZM,Acme,INV{i},{date},100,18" for i, date in enumerate(dates))
+
+        items, _ = parse_purchase_register(content, "register.csv")
+
+        assert [item["invoice_date"] for item in items] == expected
+
+    def test_blank_and_unparseable_dates(self):
+        content = register(["27AABCU9603R1ZM,Acme,INV1,,100,18", "27AABCU9603R1ZM,Acme,INV2,sometime,100,18"])
+
+        items, _ = parse_purchase_register(content, "register.csv")
+
+        assert [item["invoice_date"] for item in items] == [None, "sometime"]
+
+    def test_invoice_numbers_kept_as_text(self):
+        items, _ = parse_purchase_register(register(["27AABCU9603R1ZM,Acme,0001234,2026-02-05,100,18"]), "register.csv")
+
+        assert items[0]["invoice_number"] == "0001234"
+
+    def test_invalid_rows_are_reported(self):
+        content = register([
+            "27AABCU9603R1ZM,Acme,INV1,2026-02-05,100,18",
+            "27AABCU9603R1Z,Acme,INV2,2026-02-05,N.A.,18",
+            "27AABCU9603R1ZM,Acme,INV3,2026-02-05,100,tbd",
+        ])
+
+        items, errors = parse_purchase_register(content, "register.csv")
+
+        assert [item["invoice_number"] for item in items] == ["INV1"]
+        assert errors == ["Row 3: invalid GSTIN '27AABCU9603R1Z', invalid taxable value 'N.A.'",
+                          "Row 4: invalid tax amount 'tbd'"]
+
+    def test_missing_required_column(self):
+        items, errors = parse_purchase_register(b"GSTIN,Invoice No.\n27AABCU9603R1ZM,INV1\n", "register.csv")
+
+        assert items == []
+        assert errors[0].startswith("Missing required column for 'invoice_date'")
+
+    def test_unsupported_file_type(self):
+        items, errors = parse_purchase_register(REGISTER.encode(), "register.txt")
+
+        assert items == [] and len(errors) == 1
+
+
+class TestIterPurchaseRegister:
+
+    def test_chunks_match_whole_file(self):
+        rows = [f"27AABCU9603R1ZM,Acme,INV{i},05/02/2026,{i},18" for i in range(25)]
+        rows[12] = "BAD,Acme,INV12,05/02/2026,12,18"
+        content = register(rows)
+
+        chunks = list(iter_purchase_register(io.BytesIO(content), "register.csv", chunk_rows=10))
+
+        assert [len(items) for items, _ in chunks] == [10, 9, 5]
+        assert chunks[1][1] == ["Row 14: invalid GSTIN 'BAD'"]
+        assert sum((items for items, _ in chunks), []) == parse_purchase_register(content, "register.csv")[0]
+
+    def test_semicolon_delimited(self):
+        content = register(["27AABCU9603R1ZM;Acme;INV1;2026-02-05;100;18"], header=HEADER.replace(",", ";"))
+
+        items, errors = parse_purchase_register(content, "register.csv")
+
+        assert len(items) == 1 and not errors
@@ -0,0 +1,256 @@
+"""
+Tests for the single-flight GSP access token manager
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.services import gsp
+from app.services.cache import CacheService
+from app.services.gsp import GSPTokenManager, _sandbox_authenticate
+
+BASE_URL = "https://sandbox.test"
+
+
+class FakeRedis:
+    """The slice of the redis client the token manager's cache calls use, over a dict"""
+
+    def __init__(self):
+        self.data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def setex(self, key, ttl, value):
+        self.data[key] = value
+
+    def set(self, key, value, nx=False, ex=None):
+        with self._lock:
+            if nx and key in self.data:
+                return None
+            self.data[key] = value
+            return True
+
+    def exists(self, key):
+        return int(key in self.data)
+
+    def eval(self, script, numkeys, key, owner):
+        with self._lock:
+            if self.data.get(key) == owner:
+                del self.data[key]
+                return 1
+            return 0
+
+
+class DownRedis:
+    """A client whose every call fails, like Redis going away after start-up"""
+
+    def __getattr__(self, name):
+        def fail(*args, **kwargs):
+            raise ConnectionError("Connection refused")
+        return fail
+
+
+class AuthEndpoint:
+    """Sandbox /authenticate stand-in counting calls; each call takes a little while"""
+
+    def __init__(self, expires_in=3600, delay=0.05):
+        self.expires_in = expires_in
+        self.delay = delay
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def post(self, url, headers, timeout):
+        assert url == f"{BASE_URL}/authenticate"
+        with self._lock:
+            self.calls += 1
+            token = f"token-{self.calls}"
+        time.sleep(self.delay)
+        return AuthResponse({"access_token": token, "expires_in": self.expires_in})
+
+
+class AuthResponse:
+    def __init__(self, payload):
+        self.payload = payload
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.payload
+
+
+def make_cache(client):
+    cache = CacheService()
+    cache.client = client
+    cache.enabled = client is not None
+    return cache
+
+
+@pytest.fixture
+def endpoint(monkeypatch):
+    endpoint = AuthEndpoint()
+    monkeypatch.setattr(gsp, "get_http_session", lambda: endpoint)
+    return endpoint
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    cache = make_cache(FakeRedis())
+    monkeypatch.setattr(gsp, "cache", cache)
+    return cache
+
+
+@pytest.fixture
+def managers():
+    """Token managers created by a test; their refresh timers are cancelled afterwards"""
+    created = []
+
+    def make():
+        manager = GSPTokenManager("sandbox", lambda: _sandbox_authenticate(BASE_URL, "client", "secret"))
+        created.append(manager)
+        return manager
+
+    yield make
+    for manager in created:
+        if manager._timer is not None:
+            manager._timer.cancel()
+
+
+def concurrent_tokens(managers, callers=16):
+    """get_token() from `callers` threads released together, spread over the given managers"""
+    barrier = threading.Barrier(callers)
+    tokens = [None] * callers
+
+    def call(i):
+        barrier.wait()
+        tokens[i] = managers[i % len(managers)].get_token()
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(callers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=10)
+    return tokens
+
+
+class TestSingleFlight:
+
+    def test_concurrent_callers_share_one_refresh(self, endpoint, redis, managers):
+        tokens = concurrent_tokens([managers()])
+
+        assert endpoint.calls == 1
+        assert set(tokens) == {"token-1"}
+
+    def test_processes_share_one_refresh_through_redis(self, endpoint, redis, managers):
+        """Two managers stand in for two worker processes: one authenticates, the other adopts its token"""
+        tokens = concurrent_tokens([managers(), managers()])
+
+        assert endpoint.calls == 1
+        assert set(tokens) == {"token-1"}
+
+    def test_valid_token_is_reused(self, endpoint, redis, managers):
+        manager = managers()
+        manager.get_token()
+        manager.get_token()
+
+        assert endpoint.calls == 1
+
+    def test_waits_for_token_from_lock_holder(self, endpoint, redis, managers):
+        owner = redis.acquire_lock("gsp_token:sandbox", 15)
+
+        def publish():
+            time.sleep(0.3)
+            expires_at = datetime.now() + timedelta(hours=1)
+            redis.set_gsp_token("sandbox", "other-process", 3300, expires_at=expires_at.isoformat())
+            redis.release_lock("gsp_token:sandbox", owner)
+
+        threading.Thread(target=publish).start()
+
+        assert managers().get_token() == "other-process"
+        assert endpoint.calls == 0
+
+    def test_lock_released_without_token(self, endpoint, redis, managers):
+        """A refresher that fails to authenticate does not leave others waiting for WAIT_TIMEOUT"""
+        owner = redis.acquire_lock("gsp_token:sandbox", 15)
+        threading.Timer(0.2, redis.release_lock, ("gsp_token:sandbox", owner)).start()
+
+        start = time.monotonic()
+        assert managers().get_token() == "token-1"
+        assert time.monotonic() - start < 2
+        assert endpoint.calls == 1
+
+    def test_failed_authentication(self, monkeypatch, redis, managers):
+        def refuse(url, headers, timeout):
+            raise ConnectionError("refused")
+
+        monkeypatch.setattr(gsp, "get_http_session", lambda: type("Session", (), {"post": staticmethod(refuse)}))
+
+        assert managers().get_token() is None
+
+
+class TestRedisDown:
+
+    @pytest.mark.parametrize("cache", [
+        pytest.param(lambda: make_cache(DownRedis()), id="unreachable"),
+        pytest.param(lambda: make_cache(None), id="disabled"),
+    ])
+    def test_falls_back_to_in_process_refresh(self, monkeypatch, endpoint, managers, cache):
+        monkeypatch.setattr(gsp, "cache", cache())
+
+        start = time.monotonic()
+        tokens = concurrent_tokens([managers()])
+
+        # Still one refresh per process, and no waiting for a lock nobody holds
+        assert endpoint.calls == 1
+        assert set(tokens) == {"token-1"}
+        assert time.monotonic() - start < GSPTokenManager.WAIT_TIMEOUT / 5
+
+
+class TestRefreshTimer:
+
+    def test_scheduled_ahead_of_expiry(self, endpoint, redis, managers):
+        manager = managers()
+        manager.get_token()
+
+        assert manager._timer.is_alive()
+        expected = 3600 - GSPTokenManager.REFRESH_AHEAD.total_seconds()
+        assert expected - 5 < manager._timer.interval <= expected
+
+    def test_new_token_cancels_previous_timer(self, endpoint, redis, managers):
+        manager = managers()
+        manager.get_token()
+        first = manager._timer
+
+        manager._set_token("token-2", datetime.now() + timedelta(hours=2))
+
+        assert first.finished.is_set()
+        first.join(timeout=1)
+        assert not first.is_alive()
+        assert manager._timer is not first and manager._timer.is_alive()
+
+    def test_short_lived_token_cancels_timer(self, endpoint, redis, managers):
+        manager = managers()
+        manager.get_token()
+        first = manager._timer
+
+        manager._set_token("short", datetime.now() + timedelta(minutes=8))
+
+        assert first.finished.is_set()
+        assert manager._timer is None
+
+    def test_background_refresh(self, endpoint, redis, managers):
+        manager = managers()
+        # Due for refresh 0.1s after the first token is issued
+        manager.REFRESH_AHEAD = timedelta(seconds=endpoint.expires_in - 0.1)
+        manager.get_token()
+
+        deadline = time.monotonic() + 2
+        while manager.access_token == "token-1" and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        assert endpoint.calls >= 2
+        assert manager.access_token.startswith("token-") and manager.access_token != "token-1"
@@ -0,0 +1,231 @@
+"""
+Tests for the GSTR-2B response parser
+"""
+import io
+import json
+
+import pytest
+
+from app.services.gsp import SandboxGSPProvider
+from app.services.gstr2b_parser import _load_ijson, iter_gstr2b_stream, parse_gstr2b_invoices
+
+BUYER = "27AABCU9603R1ZM"
+PERIOD = "012026"
+SUPPLIER_A = "27AAACS0001A1Z5"
+SUPPLIER_B = "29AAACS0002A1Z5"
+
+
+def item(txval, igst=0, cgst=0, sgst=0, cess=0):
+    return {"txval": txval, "igst": igst, "cgst": cgst, "sgst": sgst, "cess": cess}
+
+
+# One of each section: the B2B/B2BA invoices are stored, the rest is skipped
+DOCDATA = {
+    "b2b": [
+        {"ctin": SUPPLIER_A, "trdnm": "SUPPLIER A", "inv": [
+            {"inum": "INV/1", "dt": "05-01-2026", "val": 2410, "items": [
+                item(1000, igst=180), item(1000, igst=180, cess=50)]},
+            {"inum": "INV/2", "dt": "06-01-2026", "val": 1180,
+             "itms": [{"num": 1, "itm_det": item(1000, cgst=90, sgst=90)}]},
+        ]},
+        {"ctin": SUPPLIER_B, "trdnm": "SUPPLIER B", "inv": [
+            {"inum": "INV/3", "dt": "07-01-2026", "val": "590", "flag": "N", "txval": "500", "igst": "90",
+             "cgst": "", "sgst": None},
+        ]},
+    ],
+    "b2ba": [
+        {"ctin": SUPPLIER_A, "inv": [
+            {"inum": "INV/4", "dt": "08-01-2026", "oinum": "INV/04", "oidt": "08-12-2025", "val": 1200,
+             "items": [item(1000, igst=180, cess=20)]},
+        ]},
+    ],
+    "cdnr": [
+        {"ctin": SUPPLIER_A, "nt": [
+            {"ntnum": "CN/1", "typ": "C", "dt": "10-01-2026", "val": 118, "items": [item(100, igst=18)]},
+            {"ntnum": "DN/1", "typ": "D", "dt": "11-01-2026", "val": 236, "items": [item(200, igst=36)]},
+        ]},
+    ],
+    "cdnra": [
+        {"ctin": SUPPLIER_B, "nt": [
+            {"ntnum": "CN/2", "typ": "C", "dt": "12-01-2026", "ontnum": "CN/02", "ontdt": "12-12-2025",
+             "val": 59, "items": [item(50, igst=9)]},
+        ]},
+    ],
+    "isd": [
+        {"ctin": SUPPLIER_B, "doclist": [{"doctyp": "ISDI", "docnum": "ISD/1", "docdt": "13-01-2026", "igst": 10}]},
+    ],
+    "impg": [
+        {"boenum": "1234567", "boedt": "14-01-2026", "txval": 1000, "igst": 180},
+    ],
+}
+
+EXPECTED = [
+    # (supplier, invoice_no, invoice_value, taxable_value, tax_amount, filing_status, amended)
+    (SUPPLIER_A, "INV/1", 2410.0, 2000.0, 410.0, "Y", False),
+    (SUPPLIER_A, "INV/2", 1180.0, 1000.0, 180.0, "Y", False),
+    (SUPPLIER_B, "INV/3", 590.0, 500.0, 90.0, "N", False),
+    (SUPPLIER_A, "INV/4", 1200.0, 1000.0, 200.0, "Y", True),
+]
+
+
+def summary(invoices):
+    return [(inv["supplier_gstin"], inv["invoice_no"], inv["invoice_value"], inv["taxable_value"],
+             inv["tax_amount"], inv["filing_status"], inv.get("is_amended", False)) for inv in invoices]
+
+
+def response_body(data):
+    return json.dumps({"status_cd": "1", "data": data}).encode()
+
+
+class TrickleStream(io.RawIOBase):
+    """A response body that arrives at most `size` bytes per read, like a socket"""
+
+    def __init__(self, body: bytes, size: int):
+        self.body, self.size, self.pos = body, size, 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        chunk = self.body[self.pos:self.pos + min(self.size, len(buffer))]
+        buffer[:len(chunk)] = chunk
+        self.pos += len(chunk)
+        return len(chunk)
+
+
+class FakeResponse:
+    def __init__(self, raw):
+        self.raw = raw
+        self.closed = False
+
+    def raise_for_status(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+class FakeSession:
+    def __init__(self, response):
+        self.response = response
+
+    def post(self, **kwargs):
+        assert kwargs["stream"] is True
+        return self.response
+
+
+@pytest.fixture
+def provider(monkeypatch):
+    provider = SandboxGSPProvider("client", "secret")
+    monkeypatch.setattr(provider, "_get_access_token", lambda: "token")
+    return provider
+
+
+def truncated(body: bytes) -> bytes:
+    """Cut the body inside the CDNR section - after every B2B/B2BA invoice"""
+    return body[:body.index(b'"CN/1"')]
+
+
+def malformed(body: bytes) -> bytes:
+    """Break the second B2B supplier block"""
+    return body.replace(b'"INV/3"', b'"INV/3" "oops"', 1)
+
+
+class TestParseInvoices:
+
+    @pytest.mark.parametrize("data", [{"docdata": DOCDATA}, DOCDATA], ids=["docdata", "flat"])
+    def test_b2b_and_amendments_only(self, data):
+        invoices = parse_gstr2b_invoices(data, BUYER, PERIOD)
+
+        assert summary(invoices) == EXPECTED
+        assert all(inv["buyer_gstin"] == BUYER and inv["return_period"] == PERIOD for inv in invoices)
+
+    def test_tax_includes_cess(self):
+        """taxable value + tax amount is the invoice value, as in the invoice's "val" """
+        for inv in parse_gstr2b_invoices({"docdata": DOCDATA}, BUYER, PERIOD):
+            assert inv["taxable_value"] + inv["tax_amount"] == inv["invoice_value"]
+
+    def test_missing_sections(self):
+        assert parse_gstr2b_invoices({"docdata": {"cdnr": DOCDATA["cdnr"]}}, BUYER, PERIOD) == []
+        assert parse_gstr2b_invoices({}, BUYER, PERIOD) == []
+
+
+class TestStream:
+
+    @pytest.mark.parametrize("data", [{"docdata": DOCDATA}, DOCDATA], ids=["docdata", "flat"])
+    def test_same_as_decoded(self, data):
+        invoices = list(iter_gstr2b_stream(io.BytesIO(response_body(data)), BUYER, PERIOD))
+
+        assert invoices == parse_gstr2b_invoices(data, BUYER, PERIOD)
+
+    def test_without_ijson(self, monkeypatch):
+        monkeypatch.setattr("app.services.gstr2b_parser._load_ijson", lambda: None)
+
+        invoices = list(iter_gstr2b_stream(io.BytesIO(response_body({"docdata": DOCDATA})), BUYER, PERIOD))
+
+        assert summary(invoices) == EXPECTED
+
+    @pytest.mark.parametrize("size", [1, 7, 100])
+    def test_split_across_reads(self, size):
+        """Tokens (numbers, strings, keys) cut between two reads are put back together"""
+        body = response_body({"docdata": DOCDATA})
+
+        invoices = list(iter_gstr2b_stream(TrickleStream(body, size), BUYER, PERIOD))
+
+        assert summary(invoices) == EXPECTED
+
+    def test_truncated_document(self):
+        body = truncated(response_body({"docdata": DOCDATA}))
+        invoices = []
+
+        with pytest.raises(_load_ijson().IncompleteJSONError):
+            for invoice in iter_gstr2b_stream(TrickleStream(body, 64), BUYER, PERIOD):
+                invoices.append(invoice)
+        # Blocks are only yielded once complete
+        assert summary(invoices) == EXPECTED
+
+    def test_malformed_document(self):
+        body = malformed(response_body({"docdata": DOCDATA}))
+        invoices = []
+
+        with pytest.raises(_load_ijson().JSONError):
+            for invoice in iter_gstr2b_stream(io.BytesIO(body), BUYER, PERIOD):
+                invoices.append(invoice)
+        assert summary(invoices) == EXPECTED[:2]
+
+    @pytest.mark.parametrize("corrupt", [truncated, malformed])
+    def test_without_ijson_invalid_document(self, monkeypatch, corrupt):
+        monkeypatch.setattr("app.services.gstr2b_parser._load_ijson", lambda: None)
+        body = corrupt(response_body({"docdata": DOCDATA}))
+
+        with pytest.raises(ValueError):
+            list(iter_gstr2b_stream(io.BytesIO(body), BUYER, PERIOD))
+
+
+class TestStreamGSTR2B:
+    """SandboxGSPProvider.stream_gstr2b over a streamed HTTP body"""
+
+    def test_invoices_and_connection_released(self, provider):
+        response = FakeResponse(TrickleStream(response_body({"docdata": DOCDATA}), 5))
+        provider.session = FakeSession(response)
+
+        invoices = provider.stream_gstr2b(BUYER, PERIOD, "auth")
+
+        assert not response.closed
+        assert summary(list(invoices)) == EXPECTED
+        assert response.closed
+
+    def test_truncated_body_raises_from_iterator(self, provider):
+        response = FakeResponse(TrickleStream(truncated(response_body({"docdata": DOCDATA})), 64))
+        provider.session = FakeSession(response)
+
+        invoices = provider.stream_gstr2b(BUYER, PERIOD, "auth")
+
+        with pytest.raises(_load_ijson().IncompleteJSONError):
+            list(invoices)
+        assert response.closed
+
+    def test_no_access_token(self, provider, monkeypatch):
+        monkeypatch.setattr(provider, "_get_access_token", lambda: None)
+
+        assert provider.stream_gstr2b(BUYER, PERIOD, "auth") is None
@@ -0,0 +1,198 @@
+"""
+Tests for GSTR-2B bulk upsert and incremental sync (SQLite)
+"""
+import threading
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.deps import get_current_user
+from app.api.v1.endpoints import gstr2b as gstr2b_endpoints
+from app.db.crud import gst_credentials, gstr2b_data
+from app.db.session import get_connection, ph
+
+PERIOD = "022026"
+SUPPLIER_A = "27AABCU9603R1ZM"
+SUPPLIER_B = "29AAACS1234A1Z5"
+
+
+def invoice(gstin, invoice_no, taxable_value=1000.0, tax_amount=180.0):
+    return {
+        "supplier_gstin": gstin,
+        "invoice_no": invoice_no,
+        "invoice_date": "2026-02-05",
+        "invoice_value": taxable_value + tax_amount,
+        "taxable_value": taxable_value,
+        "tax_amount": tax_amount,
+        "return_period": PERIOD,
+    }
+
+
+def stored_invoices(user_id):
+    with get_connection() as (conn, cursor):
+        cursor.execute(f"""
+            SELECT gstin_supplier, invoice_no, taxable_value FROM gstr_2b_data
+            WHERE user_id = {ph()} AND return_period = {ph()}
+        """, (user_id, PERIOD))
+        return {(row["gstin_supplier"], row["invoice_no"]): row["taxable_value"] for row in cursor.fetchall()}
+
+
+class TestBulkUpsert:
+    """Set-based upsert through the staging table"""
+
+    def test_insert_then_update(self, test_user):
+        gstr2b_data.bulk_upsert_gstr2b_invoices(test_user, [invoice(SUPPLIER_A, "A1"), invoice(SUPPLIER_B, "B1")])
+
+        result = gstr2b_data.bulk_upsert_gstr2b_invoices(test_user, [invoice(SUPPLIER_A, "A1", 5000.0)])
+
+        assert result == {"upserted": 1, "deleted": 0}
+        assert stored_invoices(test_user) == {(SUPPLIER_A, "A1"): 5000.0, (SUPPLIER_B, "B1"): 1000.0}
+
+    def test_duplicate_keys_in_payload_last_wins(self, test_user):
+        gstr2b_data.bulk_upsert_gstr2b_invoices(test_user, [invoice(SUPPLIER_A, "A1", 100.0),
+                                                             invoice(SUPPLIER_A, "A1", 200.0)])
+
+        assert stored_invoices(test_user) == {(SUPPLIER_A, "A1"): 200.0}
+
+    def test_replacing_a_period_deletes_missing_invoices(self, test_user):
+        gstr2b_data.bulk_upsert_gstr2b_invoices(test_user, [invoice(SUPPLIER_A, "A1"), invoice(SUPPLIER_A, "A2")])
+
+        result = gstr2b_data.bulk_upsert_gstr2b_invoices(test_user, [invoice(SUPPLIER_A, "A1")], return_period=PERIOD)
+
+        assert result["deleted"] == 1
+        assert set(stored_invoices(test_user)) == {(SUPPLIER_A, "A1")}
+
+    def test_replacing_a_period_with_invoices_without_their_own_period(self, test_user):
+        """The return_period argument applies to invoices that carry none"""
+        gstr2b_data.bulk_upsert_gstr2b_invoices(test_user, [invoice(SUPPLIER_A, "A1"), invoice(SUPPLIER_A, "A2")])
+        payload = [{k: v for k, v in invoice(SUPPLIER_A, "A1").items() if k != "return_period"}]
+
+        result = gstr2b_data.bulk_upsert_gstr2b_invoices(test_user, payload, return_period=PERIOD)
+
+        assert result["deleted"] == 1
+        assert set(stored_invoices(test_user)) == {(SUPPLIER_A, "A1")}
+
+    def test_upsert_bumps_period_version(self, test_user):
+        before = gstr2b_data.get_period_version(test_user, PERIOD)
+
+        gstr2b_data.bulk_upsert_gstr2b_invoices(test_user, [invoice(SUPPLIER_A, "A1")])
+
+        assert gstr2b_data.get_period_version(test_user, PERIOD) == before + 1
+
+
+class TestSyncGstr2bPeriod:
+    """Incremental sync with per-supplier change detection"""
+
+    def test_renamed_invoice_replaces_old_row(self, test_user):
+        """Same amounts under a new invoice number still change the supplier hash"""
+        gstr2b_data.sync_gstr2b_period(test_user, PERIOD, [invoice(SUPPLIER_A, "A1"), invoice(SUPPLIER_A, "A2")])
+
+        counts = gstr2b_data.sync_gstr2b_period(test_user, PERIOD, [invoice(SUPPLIER_A, "A1"), invoice(SUPPLIER_A, "B2")])
+
+        assert counts["inserted"] == 1
+        assert counts["deleted"] == 1
+        assert counts["suppliers_changed"] == 1
+        assert set(stored_invoices(test_user)) == {(SUPPLIER_A, "A1"), (SUPPLIER_A, "B2")}
+
+    def test_swapped_invoice_numbers_are_updated(self, test_user):
+        """Two invoices trading amounts keep the same multiset of content hashes"""
+        gstr2b_data.sync_gstr2b_period(test_user, PERIOD, [invoice(SUPPLIER_A, "A1", 100.0), invoice(SUPPLIER_A, "A2", 200.0)])
+
+        counts = gstr2b_data.sync_gstr2b_period(test_user, PERIOD, [invoice(SUPPLIER_A, "A1", 200.0), invoice(SUPPLIER_A, "A2", 100.0)])
+
+        assert counts["updated"] == 2
+        assert stored_invoices(test_user) == {(SUPPLIER_A, "A1"): 200.0, (SUPPLIER_A, "A2"): 100.0}
+
+    def test_first_sync_inserts_everything(self, test_user):
+        counts = gstr2b_data.sync_gstr2b_period(test_user, PERIOD, [invoice(SUPPLIER_A, "A1"), invoice(SUPPLIER_B, "B1")])
+
+        assert counts == {"inserted": 2, "updated": 0, "deleted": 0, "unchanged": 0, "suppliers_changed": 2}
+
+    def test_unchanged_payload_writes_nothing(self, test_user):
+        payload = [invoice(SUPPLIER_A, "A1"), invoice(SUPPLIER_A, "A2"), invoice(SUPPLIER_B, "B1")]
+        gstr2b_data.sync_gstr2b_period(test_user, PERIOD, payload)
+        version = gstr2b_data.get_period_version(test_user, PERIOD)
+
+        counts = gstr2b_data.sync_gstr2b_period(test_user, PERIOD, list(reversed(payload)))
+
+        assert counts == {"inserted": 0, "updated": 0, "deleted": 0, "unchanged": 3, "suppliers_changed": 0}
+        assert gstr2b_data.get_period_version(test_user, PERIOD) == version
+
+    def test_only_changed_supplier_is_diffed(self, test_user):
+        gstr2b_data.sync_gstr2b_period(test_user, PERIOD, [invoice(SUPPLIER_A, "A1"), invoice(SUPPLIER_A, "A2"),
+                                                            invoice(SUPPLIER_B, "B1")])
+        version = gstr2b_data.get_period_version(test_user, PERIOD)
+
+        counts = gstr2b_data.sync_gstr2b_period(test_user, PERIOD, [invoice(SUPPLIER_A, "A1"), invoice(SUPPLIER_A, "A2", 7000.0),
+                                                                     invoice(SUPPLIER_B, "B1")])
+
+        assert counts == {"inserted": 0, "updated": 1, "deleted": 0, "unchanged": 2, "suppliers_changed": 1}
+        assert stored_invoices(test_user)[(SUPPLIER_A, "A2")] == 7000.0
+        assert gstr2b_data.get_period_version(test_user, PERIOD) == version + 1
+
+    def test_removed_supplier_is_deleted(self, test_user):
+        gstr2b_data.sync_gstr2b_period(test_user, PERIOD, [invoice(SUPPLIER_A, "A1"), invoice(SUPPLIER_B, "B1"),
+                                                            invoice(SUPPLIER_B, "B2")])
+
+        counts = gstr2b_data.sync_gstr2b_period(test_user, PERIOD, [invoice(SUPPLIER_A, "A1")])
+
+        assert counts == {"inserted": 0, "updated": 0, "deleted": 2, "unchanged": 1, "suppliers_changed": 1}
+        assert set(stored_invoices(test_user)) == {(SUPPLIER_A, "A1")}
+
+    def test_sync_after_bulk_upsert_diffs_every_invoice(self, test_user):
+        """bulk upsert leaves no supplier hashes, so each invoice is compared with its stored row"""
+        gstr2b_data.bulk_upsert_gstr2b_invoices(test_user, [invoice(SUPPLIER_A, "A1"), invoice(SUPPLIER_A, "A2"),
+                                                             invoice(SUPPLIER_B, "B1")])
+
+        counts = gstr2b_data.sync_gstr2b_period(test_user, PERIOD, [invoice(SUPPLIER_A, "A1"), invoice(SUPPLIER_A, "A3"),
+                                                                     invoice(SUPPLIER_B, "B1", 50.0)])
+
+        assert counts == {"inserted": 1, "updated": 1, "deleted": 1, "unchanged": 1, "suppliers_changed": 2}
+        assert stored_invoices(test_user) == {(SUPPLIER_A, "A1"): 1000.0, (SUPPLIER_A, "A3"): 1000.0,
+                                              (SUPPLIER_B, "B1"): 50.0}
+
+
+class StreamingProvider:
+    """stream_gstr2b returning a lazy iterator, recording the threads that do the blocking work"""
+
+    def __init__(self, invoices):
+        self.invoices = invoices
+        self.threads = []
+
+    def stream_gstr2b(self, gstin, return_period, auth_token):
+        self.threads.append(threading.current_thread().name)
+        return self._iter()
+
+    def _iter(self):
+        for inv in self.invoices:
+            self.threads.append(threading.current_thread().name)
+            yield inv
+
+
+class TestSyncEndpoint:
+
+    @pytest.fixture
+    def provider(self, monkeypatch):
+        provider = StreamingProvider([invoice(SUPPLIER_A, "A1"), invoice(SUPPLIER_B, "B1")])
+        monkeypatch.setattr(gstr2b_endpoints, "get_gsp_provider", lambda: provider)
+        monkeypatch.setattr(gst_credentials, "get_gst_credential",
+                            lambda user_id, gstin: {"is_active": True, "auth_token": "auth"})
+        return provider
+
+    @pytest.fixture
+    def api(self, test_user):
+        app = FastAPI()
+        app.include_router(gstr2b_endpoints.router, prefix="/gstr2b")
+        app.dependency_overrides[get_current_user] = lambda: {"id": test_user, "email": "test@test.local"}
+        return TestClient(app)
+
+    def test_download_and_sync_run_off_the_event_loop(self, api, provider, test_user):
+        response = api.post("/gstr2b/sync", json={"gstin": SUPPLIER_A, "return_period": PERIOD})
+
+        assert response.status_code == 200
+        assert response.json()["inserted_invoices"] == 2
+        assert set(stored_invoices(test_user)) == {(SUPPLIER_A, "A1"), (SUPPLIER_B, "B1")}
+        # The request and the body reads happen on DB executor threads
+        assert len(provider.threads) == 3
+        assert all(name.startswith("db") for name in provider.threads)
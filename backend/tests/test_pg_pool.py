@@ -0,0 +1,255 @@
+"""
+Tests for the blocking PostgreSQL connection pool (no PostgreSQL server needed)
+"""
+import threading
+import time
+
+import psycopg2
+import psycopg2.extensions
+import pytest
+
+from app.db.session import PGConnectionPool, PoolTimeout
+
+IDLE = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+INTRANS = psycopg2.extensions.TRANSACTION_STATUS_INTRANS
+INERROR = psycopg2.extensions.TRANSACTION_STATUS_INERROR
+UNKNOWN = psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql):
+        if self.conn.dead:
+            raise psycopg2.OperationalError("server closed the connection unexpectedly")
+
+
+class FakeInfo:
+    def __init__(self):
+        self.transaction_status = IDLE
+
+
+class FakeConnection:
+    """The slice of a psycopg2 connection the pool uses"""
+
+    def __init__(self, number, dsn, kwargs):
+        self.number = number
+        self.dsn = dsn
+        self.kwargs = kwargs
+        self.closed = 0
+        self.dead = False  # the server went away; closed is not set until the next use fails
+        self.info = FakeInfo()
+        self.rollbacks = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def rollback(self):
+        if self.dead:
+            raise psycopg2.InterfaceError("connection already closed")
+        self.rollbacks += 1
+        self.info.transaction_status = IDLE
+
+    def close(self):
+        self.closed = 1
+
+
+class Connector:
+    """psycopg2.connect stand-in recording every connection it opens"""
+
+    def __init__(self):
+        self.opened = []
+        self.fail = False
+
+    def __call__(self, dsn, **kwargs):
+        if self.fail:
+            raise psycopg2.OperationalError("could not connect to server")
+        conn = FakeConnection(len(self.opened) + 1, dsn, kwargs)
+        self.opened.append(conn)
+        return conn
+
+
+@pytest.fixture
+def connect(monkeypatch):
+    connector = Connector()
+    monkeypatch.setattr(psycopg2, "connect", connector)
+    return connector
+
+
+@pytest.fixture
+def make_pool(connect):
+    created = []
+
+    def make(minconn=0, maxconn=2, checkout_timeout=0.2, validate_after=30):
+        pool = PGConnectionPool(minconn, maxconn, "postgresql://test", checkout_timeout, validate_after,
+                                connect_timeout=10, options="-c statement_timeout=30000")
+        created.append(pool)
+        return pool
+
+    yield make
+    for pool in created:
+        pool.closeall()
+
+
+class TestCheckout:
+
+    def test_minconn_opened_up_front(self, make_pool, connect):
+        pool = make_pool(minconn=2, maxconn=4)
+
+        assert len(connect.opened) == 2
+        assert connect.opened[0].dsn == "postgresql://test"
+        assert connect.opened[0].kwargs == {"connect_timeout": 10, "options": "-c statement_timeout=30000"}
+        assert pool.stats()["idle"] == 2
+
+    def test_idle_connection_reused(self, make_pool, connect):
+        pool = make_pool()
+        conn = pool.getconn()
+        pool.putconn(conn)
+
+        assert pool.getconn() is conn
+        assert len(connect.opened) == 1
+
+    def test_failed_connect_frees_the_slot(self, make_pool, connect):
+        pool = make_pool(maxconn=1)
+        connect.fail = True
+        with pytest.raises(psycopg2.OperationalError):
+            pool.getconn()
+
+        connect.fail = False
+        assert pool.getconn() is connect.opened[0]
+        assert pool.stats()["in_use"] == 1
+
+
+class TestExhaustion:
+
+    def test_times_out_when_all_connections_are_in_use(self, make_pool):
+        pool = make_pool(maxconn=2, checkout_timeout=0.1)
+        pool.getconn()
+        pool.getconn()
+
+        start = time.monotonic()
+        with pytest.raises(PoolTimeout):
+            pool.getconn()
+
+        assert time.monotonic() - start >= 0.1
+        stats = pool.stats()
+        assert stats["timeouts"] == 1
+        assert stats["in_use"] == stats["open_connections"] == 2
+
+    def test_waiter_gets_returned_connection(self, make_pool, connect):
+        pool = make_pool(maxconn=1, checkout_timeout=2)
+        conn = pool.getconn()
+        threading.Timer(0.1, pool.putconn, (conn,)).start()
+
+        assert pool.getconn() is conn
+        assert len(connect.opened) == 1
+        stats = pool.stats()
+        assert stats["waits"] == 1 and stats["max_wait_ms"] >= 50
+
+    def test_waiter_gets_slot_of_discarded_connection(self, make_pool, connect):
+        pool = make_pool(maxconn=1, checkout_timeout=2)
+        conn = pool.getconn()
+        threading.Timer(0.1, pool.putconn, (conn,), {"close": True}).start()
+
+        assert pool.getconn() is connect.opened[1]
+        assert conn.closed
+
+    def test_closed_pool(self, make_pool):
+        pool = make_pool()
+        pool.closeall()
+
+        with pytest.raises(PoolTimeout):
+            pool.getconn()
+
+
+class TestReturn:
+
+    @pytest.mark.parametrize("status", [INTRANS, INERROR])
+    def test_open_transaction_rolled_back(self, make_pool, status):
+        pool = make_pool()
+        conn = pool.getconn()
+        conn.info.transaction_status = status
+
+        pool.putconn(conn)
+
+        assert conn.rollbacks == 1 and not conn.closed
+        assert pool.stats()["idle"] == 1
+
+    def test_idle_connection_not_rolled_back(self, make_pool):
+        pool = make_pool()
+        conn = pool.getconn()
+
+        pool.putconn(conn)
+
+        assert conn.rollbacks == 0
+
+    def test_unknown_status_discarded(self, make_pool, connect):
+        pool = make_pool()
+        conn = pool.getconn()
+        conn.info.transaction_status = UNKNOWN
+
+        pool.putconn(conn)
+
+        assert conn.closed
+        assert pool.getconn() is connect.opened[1]
+
+    def test_failed_rollback_discarded(self, make_pool, connect):
+        pool = make_pool()
+        conn = pool.getconn()
+        conn.info.transaction_status = INTRANS
+        conn.dead = True
+
+        pool.putconn(conn)
+
+        assert conn.closed
+        stats = pool.stats()
+        assert stats["idle"] == stats["open_connections"] == 0
+        assert stats["connections_discarded"] == 1
+
+    def test_closed_connection_discarded(self, make_pool, connect):
+        pool = make_pool(maxconn=1)
+        conn = pool.getconn()
+        conn.closed = 2
+
+        pool.putconn(conn)
+
+        assert pool.getconn() is connect.opened[1]
+        assert pool.stats()["open_connections"] == 1
+
+    def test_returned_after_closeall(self, make_pool):
+        pool = make_pool()
+        conn = pool.getconn()
+        pool.closeall()
+
+        pool.putconn(conn)
+
+        assert conn.closed
+        assert pool.stats()["open_connections"] == 0
+
+
+class TestValidation:
+
+    def test_dead_idle_connection_replaced(self, make_pool, connect):
+        pool = make_pool(validate_after=0)
+        conn = pool.getconn()
+        pool.putconn(conn)
+        conn.dead = True
+
+        assert pool.getconn() is connect.opened[1]
+        assert conn.closed
+
+    def test_recently_used_connection_not_validated(self, make_pool, connect):
+        pool = make_pool(validate_after=30)
+        conn = pool.getconn()
+        pool.putconn(conn)
+        conn.dead = True
+
+        # Within validate_after the SELECT 1 round trip is skipped
+        assert pool.getconn() is conn
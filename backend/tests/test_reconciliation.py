@@ -0,0 +1,252 @@
+"""
+Tests for the GSTR-2B reconciliation engine
+"""
+import random
+import re
+
+import pytest
+
+from app.core.config import settings
+from app.services.reconciliation import ReconciliationEngine
+
+TOLERANCE = 2.0
+SUPPLIER_A = "27AABCU9603R1ZM"
+SUPPLIER_B = "29AAACS1234A1Z5"
+CATEGORIES = ("matched", "mismatch", "probable_match", "missing_in_2b", "missing_in_pr")
+
+
+def row(gstin, invoice_number, taxable_value, tax_amount=0.0, **fields):
+    return {"gstin": gstin, "invoice_number": invoice_number,
+            "taxable_value": taxable_value, "tax_amount": tax_amount, **fields}
+
+
+def invoice_numbers(results, category):
+    return [(item["gstin"], item["invoice_number"]) for item in results[category]]
+
+
+def reference_normalize(invoice_num):
+    """The regex normalization normalize_invoice_number replaced"""
+    if not invoice_num:
+        return ""
+    return re.sub(r'[^A-Z0-9]', '', str(invoice_num).strip().upper()).lstrip('0')
+
+
+def reference_match_invoices(pr_data, gstr2b_data, tolerance):
+    """The exact-match pass as the engine ran it before amounts were computed once per GSTR-2B row"""
+    def amount(row):
+        return float(row.get('taxable_value', 0) or 0) + float(row.get('tax_amount', 0) or 0)
+
+    def key(row):
+        return (row.get('gstin') or '').strip().upper(), reference_normalize(row.get('invoice_number', ''))
+
+    index, claimed = {}, set()
+    for item in gstr2b_data:
+        index.setdefault(key(item), []).append(item)
+    results = {"matched": [], "mismatch": [], "missing_in_2b": [], "missing_in_pr": []}
+    for pr_item in pr_data:
+        gstin, pr_amount = key(pr_item)[0], amount(pr_item)
+        candidates = index.get(key(pr_item), [])
+        base = {"gstin": gstin, "invoice_number": pr_item.get('invoice_number'),
+                "invoice_date": pr_item.get('invoice_date'), "pr_amount": pr_amount}
+        if not candidates:
+            results["missing_in_2b"].append(dict(base, vendor_name=pr_item.get('vendor_name'), gstr2b_amount=0,
+                                                 difference=pr_amount, status="MISSING_IN_2B"))
+            continue
+        candidate = next((c for c in candidates if abs(pr_amount - amount(c)) <= tolerance), None)
+        category = "matched" if candidate is not None else "mismatch"
+        candidate = candidate if candidate is not None else candidates[0]
+        difference = pr_amount - amount(candidate)
+        results[category].append(dict(
+            base, vendor_name=candidate.get('vendor_name') or pr_item.get('vendor_name'),
+            gstr2b_amount=amount(candidate), difference=abs(difference) if category == "matched" else difference,
+            status=category.upper()))
+        claimed.add(id(candidate))
+    for items in index.values():
+        for item in items:
+            if id(item) not in claimed:
+                results["missing_in_pr"].append({
+                    "gstin": item.get('gstin'), "vendor_name": item.get('vendor_name'),
+                    "invoice_number": item.get('invoice_number'), "invoice_date": item.get('invoice_date'),
+                    "pr_amount": 0, "gstr2b_amount": amount(item), "difference": -amount(item),
+                    "status": "MISSING_IN_PR"})
+    return results
+
+
+@pytest.fixture
+def engine():
+    return ReconciliationEngine(tolerance=TOLERANCE)
+
+
+def random_datasets(rows, seed):
+    """PR / GSTR-2B rows mixing matches, mismatches, duplicate keys and one-sided rows (no "id")"""
+    rng = random.Random(seed)
+    suppliers = [f"27AAACS{i:04d}A1Z5" for i in range(max(3, rows // 10))]
+    pr, gstr2b = [], []
+    for i in range(rows):
+        gstin = rng.choice(suppliers)
+        number = rng.randint(1, rows)
+        amount = round(rng.uniform(100, 10000), 2)
+        b2 = row(gstin, rng.choice((f"INV/{number:04d}", f"inv-{number}")), amount,
+                 vendor_name=rng.choice(("SUPPLIER", "", None)))
+        pr_row = row(rng.choice((gstin, gstin.lower(), f" {gstin} ")),
+                     rng.choice((f"INV{number}", f"{number:06d}")), amount, vendor_name="Vendor")
+        roll = rng.random()
+        if roll < 0.5:
+            pr_row["taxable_value"] = amount + rng.choice((0, TOLERANCE, -TOLERANCE, TOLERANCE + 0.01, 500))
+            pr.append(pr_row)
+            gstr2b.append(b2)
+        elif roll < 0.65:
+            gstr2b.extend([dict(b2, taxable_value=amount + 300), dict(b2)])
+            pr.append(pr_row)
+        elif roll < 0.75:
+            pr.extend([pr_row, dict(pr_row, taxable_value=amount + rng.choice((0, 1000)))])
+            gstr2b.append(b2)
+        elif roll < 0.9:
+            pr.append(pr_row)
+        else:
+            gstr2b.append(b2)
+    rng.shuffle(pr)
+    rng.shuffle(gstr2b)
+    return pr, gstr2b
+
+
+class TestNormalizeInvoiceNumber:
+
+    @pytest.mark.parametrize("value", [
+        "INV/2025-26/00123", " inv-0042 ", "000", "", None, 12345, 17.0, "straße-ﬁ/0ſ", "Ｉｎｖ１２", "İnv-ǅ7",
+    ])
+    def test_same_as_regex(self, engine, value):
+        assert engine.normalize_invoice_number(value) == reference_normalize(value)
+
+
+class TestMatchInvoices:
+    """Matching rules"""
+
+    @pytest.mark.parametrize("pr_invoice, b2_invoice", [("INV/001", "inv-001"), ("000123", "123")])
+    def test_normalized_invoice_numbers_match(self, engine, pr_invoice, b2_invoice):
+        results = engine.match_invoices([row(f" {SUPPLIER_A.lower()}", pr_invoice, 1000, 180)],
+                                        [row(SUPPLIER_A, b2_invoice, 1000, 180)])
+
+        assert invoice_numbers(results, "matched") == [(SUPPLIER_A, pr_invoice)]
+        assert not results["missing_in_pr"]
+
+    @pytest.mark.parametrize("difference, category", [
+        (TOLERANCE, "matched"),
+        (-TOLERANCE, "matched"),
+        (TOLERANCE + 0.01, "mismatch"),
+    ])
+    def test_tolerance_boundary(self, engine, difference, category):
+        results = engine.match_invoices([row(SUPPLIER_A, "INV1", 1000 + difference)],
+                                        [row(SUPPLIER_A, "INV1", 1000)])
+
+        assert len(results[category]) == 1
+        assert not results["missing_in_pr"]
+
+    def test_duplicate_invoice_numbers_in_gstr2b(self, engine):
+        """The first GSTR-2B row within tolerance is matched; the other is left unclaimed"""
+        results = engine.match_invoices([row(SUPPLIER_A, "INV1", 1000)],
+                                        [row(SUPPLIER_A, "INV1", 1300), row(SUPPLIER_A, "INV-1", 1000)])
+
+        assert results["matched"][0]["gstr2b_amount"] == 1000
+        assert [item["gstr2b_amount"] for item in results["missing_in_pr"]] == [1300]
+
+    def test_duplicate_invoice_numbers_in_pr(self, engine):
+        """GSTR-2B rows are not consumed: both PR rows pair with the same one"""
+        results = engine.match_invoices([row(SUPPLIER_A, "INV1", 1000), row(SUPPLIER_A, "INV1", 5000)],
+                                        [row(SUPPLIER_A, "INV1", 1000)])
+
+        assert len(results["matched"]) == 1
+        assert len(results["mismatch"]) == 1
+        assert not results["missing_in_pr"]
+
+    def test_same_invoice_number_across_suppliers(self, engine):
+        """Claiming INV1 of one supplier does not hide INV1 of another (rows have no "id")"""
+        results = engine.match_invoices([row(SUPPLIER_A, "INV1", 1000)],
+                                        [row(SUPPLIER_A, "INV1", 1000), row(SUPPLIER_B, "INV1", 2000)])
+
+        assert invoice_numbers(results, "matched") == [(SUPPLIER_A, "INV1")]
+        assert invoice_numbers(results, "missing_in_pr") == [(SUPPLIER_B, "INV1")]
+
+    @pytest.mark.parametrize("gstin", [None, "", "  "])
+    def test_missing_gstin(self, engine, gstin):
+        """Rows without a GSTIN only pair with each other, never with a supplier's invoice"""
+        results = engine.match_invoices([row(gstin, "INV1", 1000), row(SUPPLIER_A, "INV2", 500)],
+                                        [row(SUPPLIER_A, "INV1", 1000), row(None, "INV2", 500)])
+
+        assert not results["matched"] and not results["mismatch"]
+        assert len(results["missing_in_2b"]) == 2
+        assert len(results["missing_in_pr"]) == 2
+
+    def test_empty_inputs(self, engine):
+        results = engine.match_invoices([], [])
+
+        assert all(results[category] == [] for category in CATEGORIES)
+
+
+class TestFuzzyPass:
+    """Residuals paired as PROBABLE_MATCH; the edits allowed grow with the invoice number's length"""
+
+    @pytest.fixture(autouse=True)
+    def fuzzy_enabled(self, monkeypatch):
+        monkeypatch.setattr(settings, "RECONCILIATION_FUZZY_MATCH", True)
+        monkeypatch.setattr(settings, "RECONCILIATION_FUZZY_MIN_CONFIDENCE", 0.75)
+        monkeypatch.setattr(settings, "RECONCILIATION_FUZZY_MAX_EDITS", 3)
+
+    @pytest.mark.parametrize("pr_invoice, b2_invoice", [
+        ("INV/2026/00123", "INV/2026/00132"),
+        ("INV1234", "INV1243"),
+        ("1234", "1235"),
+        ("INV12345", "INV12399"),
+    ])
+    def test_typos_pair(self, engine, pr_invoice, b2_invoice):
+        results = engine.match_invoices([row(SUPPLIER_A, pr_invoice, 1000, invoice_date="2026-02-05")],
+                                        [row(SUPPLIER_A, b2_invoice, 1000, invoice_date="05-02-2026")])
+
+        assert [item["gstr2b_invoice_number"] for item in results["probable_match"]] == [b2_invoice]
+        assert not results["missing_in_2b"] and not results["missing_in_pr"]
+
+    @pytest.mark.parametrize("pr_invoice, b2_invoice", [
+        ("123", "124"),
+        ("7", "8"),
+        ("00123", "124"),
+        ("INV123", "INV199"),
+    ])
+    def test_short_numbers_do_not_pair(self, engine, pr_invoice, b2_invoice):
+        """One edit in a 3-character number is another invoice; 4-7 characters allow a single edit"""
+        results = engine.match_invoices([row(SUPPLIER_A, pr_invoice, 1000, invoice_date="2026-02-05")],
+                                        [row(SUPPLIER_A, b2_invoice, 1000, invoice_date="05-02-2026")])
+
+        assert not results["probable_match"]
+        assert len(results["missing_in_2b"]) == 1 and len(results["missing_in_pr"]) == 1
+
+    def test_other_supplier_does_not_pair(self, engine):
+        results = engine.match_invoices([row(SUPPLIER_A, "INV/2026/00123", 1000)],
+                                        [row(SUPPLIER_B, "INV/2026/00132", 1000)])
+
+        assert not results["probable_match"]
+
+    def test_disabled(self, engine, monkeypatch):
+        monkeypatch.setattr(settings, "RECONCILIATION_FUZZY_MATCH", False)
+
+        results = engine.match_invoices([row(SUPPLIER_A, "INV/2026/00123", 1000)],
+                                        [row(SUPPLIER_A, "INV/2026/00132", 1000)])
+
+        assert results["probable_match"] == []
+        assert len(results["missing_in_2b"]) == 1
+
+
+class TestReferenceParity:
+    """Same exact-match results as the reference implementation on generated datasets"""
+
+    @pytest.mark.parametrize("seed", range(5))
+    def test_random_datasets(self, engine, monkeypatch, seed):
+        monkeypatch.setattr(settings, "RECONCILIATION_FUZZY_MATCH", False)
+        pr, gstr2b = random_datasets(300, seed)
+
+        actual = engine.match_invoices(pr, gstr2b)
+        expected = reference_match_invoices(pr, gstr2b, TOLERANCE)
+
+        for category in expected:
+            assert len(actual[category]) == len(expected[category]), category
+            assert [{key: row[key] for key in expected_row} for row, expected_row
+                    in zip(actual[category], expected[category])] == expected[category], category
@@ -0,0 +1,147 @@
+"""
+Tests for the reconciliation run endpoints
+"""
+import threading
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.deps import get_current_user
+from app.api.v1.endpoints import reconciliation as reconciliation_endpoints
+from app.core.config import settings
+from app.db.crud import gstr2b_data
+from app.db.crud import reconciliation as recon_crud
+from app.services import reconciliation_partitioned
+from app.services.reconciliation import RESULT_CATEGORIES
+
+PERIOD = "022026"
+SUPPLIER = "27AABCU9603R1ZM"
+REGISTER = (
+    "GSTIN of Supplier,Party Name,Invoice No.,Invoice Date,Taxable Value,Total Tax\n"
+    f"{SUPPLIER},Acme,INV1,05/02/2026,1000,180\n"
+    f"{SUPPLIER},Acme,INV2,06/02/2026,2000,360\n"
+    f"{SUPPLIER},Acme,INV3,07/02/2026,500,90\n"
+).encode()
+
+
+@pytest.fixture
+def api(test_user):
+    app = FastAPI()
+    app.include_router(reconciliation_endpoints.router, prefix="/reconcile")
+    app.dependency_overrides[get_current_user] = lambda: {"id": test_user, "email": "test@test.local"}
+    gstr2b_data.bulk_upsert_gstr2b_invoices(test_user, [
+        {"supplier_gstin": SUPPLIER, "invoice_no": "INV1", "invoice_date": "05-02-2026",
+         "taxable_value": 1000, "tax_amount": 180, "return_period": PERIOD},
+        {"supplier_gstin": SUPPLIER, "invoice_no": "INV2", "invoice_date": "06-02-2026",
+         "taxable_value": 2500, "tax_amount": 450, "return_period": PERIOD},
+    ])
+    return TestClient(app)
+
+
+def run(api, content=REGISTER, **form):
+    return api.post("/reconcile/run", data={"return_period": PERIOD, **form},
+                    files={"file": ("register.csv", content, "text/csv")})
+
+
+class TestRunReconciliation:
+
+    def test_inline_run_is_stored(self, api, test_user):
+        response = run(api, include_results="true")
+
+        assert response.status_code == 200
+        body = response.json()
+        assert body["cached"] is False
+        assert {key: body["summary"][key] for key in ("matched", "mismatch", "missing_in_2b")} == \
+            {"matched": 1, "mismatch": 1, "missing_in_2b": 1}
+        assert [item["invoice_number"] for item in body["results"]["matched"]] == ["INV1"]
+        stored = recon_crud.get_run(test_user, body["run_id"])
+        assert stored["status"] == "COMPLETED"
+        page = api.get(f"/reconcile/runs/{body['run_id']}/results/mismatch").json()
+        assert [item["invoice_number"] for item in page["items"]] == ["INV2"]
+
+    def test_repeat_run_is_cached(self, api):
+        first = run(api).json()
+
+        second = run(api).json()
+
+        assert second["cached"] is True
+        assert second["run_id"] == first["run_id"]
+        assert second["summary"] == first["summary"]
+
+    def test_changed_gstr2b_data_misses_the_cache(self, api, test_user):
+        first = run(api).json()
+        gstr2b_data.bulk_upsert_gstr2b_invoices(test_user, [
+            {"supplier_gstin": SUPPLIER, "invoice_no": "INV3", "invoice_date": "07-02-2026",
+             "taxable_value": 500, "tax_amount": 90, "return_period": PERIOD},
+        ])
+
+        second = run(api).json()
+
+        assert second["cached"] is False
+        assert second["summary"]["matched"] == first["summary"]["matched"] + 1
+
+    def test_blocking_work_runs_off_the_event_loop(self, api, monkeypatch):
+        """DB calls and matching run on the DB executor's threads, not the request's event loop"""
+        threads = {}
+
+        def recorded(module, name):
+            original = getattr(module, name)
+
+            def wrapper(*args, **kwargs):
+                threads[name] = threading.current_thread().name
+                return original(*args, **kwargs)
+            monkeypatch.setattr(module, name, wrapper)
+
+        for name in ("get_period_version", "get_invoices_by_period"):
+            recorded(gstr2b_data, name)
+        for name in ("find_cached_run", "create_run", "complete_run"):
+            recorded(recon_crud, name)
+        recorded(reconciliation_endpoints, "ReconciliationEngine")
+
+        assert run(api).status_code == 200
+        assert len(threads) == 6
+        assert all(thread.startswith("db") for thread in threads.values()), threads
+
+    def test_partitioned_run(self, api, test_user):
+        body = run(api, partitioned="true").json()
+
+        assert body["summary"]["matched"] == 1
+        assert body["result"]["rows"] == 3
+        stored = recon_crud.get_results(body["run_id"], RESULT_CATEGORIES)
+        assert sum(len(rows) for rows in stored.values()) == 3
+
+    def test_failed_partitioned_run_drops_partial_results(self, api, test_user, monkeypatch):
+        """Results stored for earlier partitions do not outlive a run that fails later"""
+        monkeypatch.setattr(settings, "RECONCILIATION_PARTITIONS", 16)
+        register = REGISTER + b"".join(
+            f"{i:02d}AAACS1234A1Z5,Other,X{i},05/02/2026,100,18\n".encode() for i in range(10, 30)
+        )
+        engine = reconciliation_partitioned.ReconciliationEngine(tolerance=2.0)
+        match, calls = engine.match_invoices, []
+
+        def match_invoices(pr_rows, b2_rows):
+            calls.append(len(pr_rows))
+            if len(calls) == 3:
+                raise RuntimeError("partition failed")
+            return match(pr_rows, b2_rows)
+
+        monkeypatch.setattr(engine, "match_invoices", match_invoices)
+        monkeypatch.setattr(reconciliation_partitioned, "ReconciliationEngine", lambda tolerance: engine)
+
+        response = run(api, content=register, partitioned="true")
+
+        assert response.status_code == 500
+        runs, _ = recon_crud.list_runs(test_user)
+        assert runs[0]["status"] == "FAILED"
+        assert runs[0]["error_message"] == "partition failed"
+        stored = recon_crud.get_results(runs[0]["id"], RESULT_CATEGORIES)
+        assert all(rows == [] for rows in stored.values())
+
+    def test_no_valid_invoices(self, api):
+        response = run(api, content=b"GSTIN,Invoice No.\n")
+
+        assert response.status_code == 400
+
+    def test_unknown_run(self, api):
+        assert api.get("/reconcile/runs/does-not-exist").status_code == 404
@@ -0,0 +1,99 @@
+"""
+Tests for stored reconciliation runs and keyset paging of their results
+"""
+import pytest
+
+from app.db.crud import reconciliation as recon_crud
+from app.utils.pagination import decode_cursor, encode_cursor
+
+SUPPLIER_A = "27AABCU9603R1ZM"
+SUPPLIER_B = "29AAACS1234A1Z5"
+# (gstin, pr_amount): amount ties across and within suppliers
+RESULTS = [(SUPPLIER_A, 500.0), (SUPPLIER_B, 100.0), (SUPPLIER_A, 500.0), (SUPPLIER_B, 500.0),
+           (SUPPLIER_A, 100.0), (SUPPLIER_B, 900.0), (SUPPLIER_A, 900.0), (SUPPLIER_B, 500.0)]
+
+
+@pytest.fixture
+def run_id(test_user):
+    run_id = recon_crud.create_run(test_user, "022026", "register.csv")
+    recon_crud.add_results(run_id, "missing_in_2b", [
+        {"gstin": gstin, "invoice_number": f"INV{seq}", "pr_amount": amount, "gstr2b_amount": 0,
+         "difference": amount, "status": "MISSING_IN_2B", "message": "Invoice not found in GSTR-2B"}
+        for seq, (gstin, amount) in enumerate(RESULTS)
+    ])
+    return run_id
+
+
+def all_pages(run_id, page_size, **options):
+    """Page through with cursors the way GET /runs/{id}/results/{category} does"""
+    sort = options.pop("sort", "seq")
+    pages, after, page = [], None, 1
+    while True:
+        rows, _, last = recon_crud.get_results_page(run_id, "missing_in_2b", sort=sort, limit=page_size,
+                                                    after=after, **options)
+        if not rows:
+            return pages
+        pages.append([row["invoice_number"] for row in rows])
+        position = decode_cursor(encode_cursor({"sort": sort, "after": last, "page": page + 1}))
+        assert position == {"sort": sort, "after": last, "page": page + 1}
+        after, page = position["after"], position["page"]
+
+
+def expected(sort_key, reverse=False, keep=lambda gstin, amount: True):
+    """Invoice numbers in sort order, ties broken by seq in the same direction"""
+    rows = [(sort_key(gstin, amount), seq) for seq, (gstin, amount) in enumerate(RESULTS) if keep(gstin, amount)]
+    return [f"INV{seq}" for _, seq in sorted(rows, reverse=reverse)]
+
+
+class TestCursor:
+
+    def test_round_trip(self):
+        position = {"sort": "-amount", "after": [500.0, 7], "page": 3}
+
+        cursor = encode_cursor(position)
+
+        assert "=" not in cursor
+        assert decode_cursor(cursor) == position
+
+    @pytest.mark.parametrize("cursor", ["not a cursor!", encode_cursor({"a": 1})[:-2], "WzEsMl0"])
+    def test_malformed_cursor(self, cursor):
+        """Garbage, truncated JSON and JSON that is not an object all decode to None"""
+        assert decode_cursor(cursor) is None
+
+
+class TestGetResultsPage:
+
+    def test_engine_order(self, run_id):
+        pages = all_pages(run_id, 3)
+
+        assert pages == [["INV0", "INV1", "INV2"], ["INV3", "INV4", "INV5"], ["INV6", "INV7"]]
+
+    def test_descending_amount_with_ties(self, run_id):
+        """Rows tied on amount neither repeat nor go missing across page boundaries"""
+        pages = all_pages(run_id, 3, sort="-amount")
+
+        assert [len(page) for page in pages] == [3, 3, 2]
+        assert sum(pages, []) == expected(lambda gstin, amount: amount, reverse=True)
+
+    @pytest.mark.parametrize("sort", ["amount", "gstin", "-gstin", "difference"])
+    def test_other_sorts(self, run_id, sort):
+        column = sort.lstrip("-")
+        key = (lambda gstin, amount: gstin) if column == "gstin" else (lambda gstin, amount: amount)
+
+        pages = all_pages(run_id, 2, sort=sort)
+
+        assert sum(pages, []) == expected(key, reverse=sort.startswith("-"))
+
+    def test_filters_with_cursor(self, run_id):
+        pages = all_pages(run_id, 1, sort="-amount", gstin=f" {SUPPLIER_B.lower()} ", min_amount=200, max_amount=900)
+
+        assert sum(pages, []) == expected(lambda gstin, amount: amount, reverse=True,
+                                          keep=lambda gstin, amount: gstin == SUPPLIER_B and 200 <= amount <= 900)
+
+    def test_total_counts_filtered_rows(self, run_id):
+        rows, total, last = recon_crud.get_results_page(run_id, "missing_in_2b", limit=2, min_amount=500)
+
+        assert total == 6
+        assert len(rows) == 2
+        assert last == [2]
+        assert "seq" not in rows[0] and "amount" not in rows[0]
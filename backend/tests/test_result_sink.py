@@ -0,0 +1,265 @@
+"""
+Tests for the write-behind batch result sink
+"""
+import contextlib
+import re
+import threading
+import time
+
+import pytest
+
+from app.db.crud import batch as batch_crud
+from app.services import result_sink
+from app.services.result_sink import BatchResultSink, close_result_sinks
+
+# Flush thresholds no test reaches unless it means to
+NEVER_ITEMS = 10000
+NEVER_MS = 60000
+
+
+class FakeCheckCrud:
+    """check_crud stand-in; bulk and per-item inserts can be made to fail"""
+
+    def __init__(self, fail_bulk=False, fail_gstins=()):
+        self.fail_bulk = fail_bulk
+        self.fail_gstins = set(fail_gstins)
+        self.saved = []
+        self.threads = set()
+
+    def save_compliance_checks(self, checks):
+        self.threads.add(threading.current_thread().name)
+        if self.fail_bulk:
+            raise RuntimeError("bulk insert failed")
+        for check in checks:
+            self.saved.append(check)
+        return [f"check-{check['gstin']}" for check in checks]
+
+    def save_compliance_check(self, **check):
+        if check["gstin"] in self.fail_gstins:
+            raise RuntimeError("insert failed")
+        self.saved.append(check)
+        return f"check-{check['gstin']}"
+
+
+class FakeBatchCrud:
+    """batch_crud stand-in; bulk and per-item updates can be made to fail"""
+
+    def __init__(self, fail_bulk=False, fail_items=()):
+        self.fail_bulk = fail_bulk
+        self.fail_items = set(fail_items)
+        self.bulk_calls = []
+        self.updated = {}
+        self.threads = set()
+
+    def update_batch_items(self, updates):
+        self.threads.add(threading.current_thread().name)
+        self.bulk_calls.append(len(updates))
+        if self.fail_bulk:
+            raise RuntimeError("bulk update failed")
+        for update in updates:
+            self.updated[update["item_id"]] = update
+
+    def update_batch_item(self, item_id, **update):
+        if item_id in self.fail_items:
+            raise RuntimeError("update failed")
+        self.updated[item_id] = dict(update, item_id=item_id)
+
+
+@pytest.fixture
+def checks(monkeypatch):
+    fake = FakeCheckCrud()
+    monkeypatch.setattr(result_sink, "check_crud", fake)
+    return fake
+
+
+@pytest.fixture
+def items(monkeypatch):
+    fake = FakeBatchCrud()
+    monkeypatch.setattr(result_sink, "batch_crud", fake)
+    return fake
+
+
+def success(item_id):
+    return {"item_id": item_id, "status": "SUCCESS", "gstin": f"GSTIN{item_id}", "vendor_name": "Vendor",
+            "amount": 100.0, "decision": "RELEASE", "rule_id": "R1", "reason": "ok", "risk_level": "LOW",
+            "data_source": "API"}
+
+
+def failed(item_id):
+    return {"item_id": item_id, "status": "FAILED", "error_message": "lookup failed"}
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def assert_all_accounted(sink, items, item_ids):
+    """Every result is either stored or listed in sink.failures"""
+    failed_ids = {f["item_id"] for f in sink.failures}
+    assert set(items.updated) | failed_ids == set(item_ids)
+
+
+class TestFlushing:
+
+    def test_flushes_on_item_threshold(self, checks, items):
+        sink = BatchResultSink(flush_items=3, flush_interval_ms=NEVER_MS)
+        for item_id in range(3):
+            sink.submit(success(item_id))
+
+        # Flushed by the writer thread without waiting for close()
+        wait_for(lambda: sink.written == 3)
+        assert items.bulk_calls == [3]
+        assert checks.threads == items.threads == {"batch-result-writer"}
+
+        for item_id in range(3, 10):
+            sink.submit(success(item_id))
+        sink.close()
+        assert items.bulk_calls == [3, 3, 3, 1]
+        assert sink.flushes == 4
+
+    def test_flushes_on_interval(self, checks, items):
+        sink = BatchResultSink(flush_items=NEVER_ITEMS, flush_interval_ms=20)
+        sink.submit(success(1))
+        sink.submit(failed(2))
+
+        wait_for(lambda: sink.written == 2)
+        assert items.bulk_calls == [2]
+        sink.close()
+        assert sink.flushes == 1
+
+    def test_results_are_stored(self, checks, items):
+        with BatchResultSink(flush_items=NEVER_ITEMS, flush_interval_ms=NEVER_MS) as sink:
+            sink.submit(success(1))
+            sink.submit(failed(2))
+
+        assert [check["gstin"] for check in checks.saved] == ["GSTIN1"]
+        assert items.updated[1]["status"] == "SUCCESS"
+        assert items.updated[1]["check_id"] == "check-GSTIN1"
+        assert items.updated[1]["decision"] == "RELEASE"
+        assert items.updated[2] == {"item_id": 2, "status": "FAILED", "error_message": "lookup failed"}
+        assert sink.failures == []
+
+
+class TestClose:
+
+    def test_drains_the_queue(self, checks, items):
+        sink = BatchResultSink(flush_items=NEVER_ITEMS, flush_interval_ms=NEVER_MS)
+        for item_id in range(250):
+            sink.submit(success(item_id) if item_id % 5 else failed(item_id))
+
+        assert sink.close() == []
+        assert sink.written == 250
+        assert items.bulk_calls == [250]
+        assert len(checks.saved) == 200
+        assert_all_accounted(sink, items, range(250))
+
+    def test_submit_after_close(self, checks, items):
+        sink = BatchResultSink()
+        sink.close()
+
+        with pytest.raises(RuntimeError):
+            sink.submit(success(1))
+        assert sink.close() == []
+
+    def test_close_result_sinks(self, checks, items):
+        sink = BatchResultSink(flush_items=NEVER_ITEMS, flush_interval_ms=NEVER_MS)
+        sink.submit(success(1))
+
+        close_result_sinks()
+
+        assert 1 in items.updated
+        with pytest.raises(RuntimeError):
+            sink.submit(success(2))
+
+
+class TestFallback:
+    """A failed bulk statement is retried item by item so only the offending items fail"""
+
+    def test_failed_bulk_update(self, checks, monkeypatch):
+        items = FakeBatchCrud(fail_bulk=True, fail_items={3})
+        monkeypatch.setattr(result_sink, "batch_crud", items)
+
+        with BatchResultSink(flush_items=NEVER_ITEMS, flush_interval_ms=NEVER_MS) as sink:
+            for item_id in range(1, 6):
+                sink.submit(success(item_id) if item_id % 2 else failed(item_id))
+
+        assert set(items.updated) == {1, 2, 4, 5}
+        assert [f["item_id"] for f in sink.failures] == [3]
+        assert sink.failures[0]["error"].startswith("Failed to save batch item")
+        assert_all_accounted(sink, items, range(1, 6))
+
+    def test_failed_bulk_check_insert(self, items, monkeypatch):
+        checks = FakeCheckCrud(fail_bulk=True, fail_gstins={"GSTIN2"})
+        monkeypatch.setattr(result_sink, "check_crud", checks)
+
+        with BatchResultSink(flush_items=NEVER_ITEMS, flush_interval_ms=NEVER_MS) as sink:
+            for item_id in (1, 2, 3):
+                sink.submit(success(item_id))
+
+        assert [check["gstin"] for check in checks.saved] == ["GSTIN1", "GSTIN3"]
+        # The item whose check could not be saved is stored as FAILED, and counted once
+        assert items.updated[2]["status"] == "FAILED"
+        assert items.updated[2]["error_message"].startswith("Failed to save compliance check")
+        assert items.updated[3]["check_id"] == "check-GSTIN3"
+        assert [f["item_id"] for f in sink.failures] == [2]
+
+    def test_everything_fails(self, monkeypatch):
+        checks = FakeCheckCrud(fail_bulk=True, fail_gstins={"GSTIN1"})
+        items = FakeBatchCrud(fail_bulk=True, fail_items={1, 2})
+        monkeypatch.setattr(result_sink, "check_crud", checks)
+        monkeypatch.setattr(result_sink, "batch_crud", items)
+
+        with BatchResultSink(flush_items=1, flush_interval_ms=NEVER_MS) as sink:
+            sink.submit(success(1))
+            sink.submit(failed(2))
+            sink.submit(failed(3))
+
+        assert set(items.updated) == {3}
+        assert sorted(f["item_id"] for f in sink.failures) == [1, 2]
+        assert sink.written == 3
+        assert_all_accounted(sink, items, (1, 2, 3))
+
+
+class TestUpdateBatchItemsPostgres:
+    """The execute_values statement of update_batch_items (no PostgreSQL server needed)"""
+
+    def test_values_line_up_with_columns_and_casts(self, monkeypatch):
+        import psycopg2.extras
+
+        calls = []
+        monkeypatch.setattr(psycopg2.extras, "execute_values",
+                            lambda cursor, sql, rows, template, page_size: calls.append((sql, rows, template)))
+        monkeypatch.setattr(batch_crud, "DB_ENGINE", "postgres")
+
+        @contextlib.contextmanager
+        def connection():
+            class Conn:
+                def commit(self):
+                    pass
+            yield Conn(), None
+
+        monkeypatch.setattr(batch_crud, "get_connection", connection)
+
+        batch_crud.update_batch_items([
+            {"item_id": "item-1", "status": "SUCCESS", "decision": "RELEASE", "check_id": "check-1",
+             "risk_level": "LOW", "reason": "ok"},
+            {"item_id": "item-2", "status": "FAILED", "error_message": "boom"},
+        ])
+
+        (sql, rows, template), = calls
+        columns = [c.strip() for c in re.search(r"AS v \(([^)]*)\)", sql).group(1).split(",")]
+        placeholders = [p.strip() for p in template.strip("()").split(",")]
+        assert len(columns) == len(placeholders) == len(rows[0])
+        assert dict(zip(columns, placeholders)) == {
+            "id": "%s::uuid", "status": "%s", "decision": "%s", "check_id": "%s::uuid",
+            "error_message": "%s", "risk_level": "%s", "reason": "%s",
+        }
+        assert [dict(zip(columns, row)) for row in rows] == [
+            {"id": "item-1", "status": "SUCCESS", "decision": "RELEASE", "check_id": "check-1",
+             "error_message": None, "risk_level": "LOW", "reason": "ok"},
+            {"id": "item-2", "status": "FAILED", "decision": None, "check_id": None,
+             "error_message": "boom", "risk_level": None, "reason": None},
+        ]
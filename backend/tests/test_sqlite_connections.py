@@ -0,0 +1,120 @@
+"""
+Tests for the persistent per-thread SQLite connections
+"""
+import threading
+
+import pytest
+
+from app.core.config import settings
+from app.db import session
+from app.db.session import SQLiteConnectionManager, get_connection
+
+
+@pytest.fixture
+def manager(tmp_path):
+    manager = SQLiteConnectionManager(str(tmp_path / "test.db"))
+    yield manager
+    manager.close_all()
+
+
+@pytest.fixture
+def scratch(manager, monkeypatch):
+    """get_connection() over a throwaway database with one table"""
+    monkeypatch.setattr(session, "_sqlite_connections", manager)
+    conn = manager.get()
+    conn.execute("CREATE TABLE t (n INTEGER)")
+    conn.commit()
+    return manager
+
+
+def on_thread(func):
+    result = []
+    thread = threading.Thread(target=lambda: result.append(func()))
+    thread.start()
+    thread.join(timeout=5)
+    return result[0]
+
+
+def count_rows(manager):
+    return manager.get().execute("SELECT COUNT(*) FROM t").fetchone()[0]
+
+
+class TestPerThreadConnections:
+
+    def test_reused_within_a_thread(self, manager):
+        assert manager.get() is manager.get()
+        assert manager.stats()["connections_opened"] == 1
+
+    def test_one_connection_per_thread(self, manager):
+        main = manager.get()
+        other = on_thread(manager.get)
+
+        assert other is not main
+        assert manager.stats()["connections_opened"] == 2
+
+    def test_close_all_and_reconnect(self, manager):
+        first = manager.get()
+        manager.close_all()
+
+        assert manager.stats()["open_connections"] == 0
+        assert manager.get() is not first
+        assert manager.stats()["connections_opened"] == 2
+
+
+class TestPragmas:
+
+    def pragma(self, manager, name):
+        return manager.get().execute(f"PRAGMA {name}").fetchone()[0]
+
+    def test_wal_mode(self, manager):
+        assert self.pragma(manager, "journal_mode") == "wal"
+
+    def test_tuning(self, manager):
+        assert self.pragma(manager, "busy_timeout") == settings.SQLITE_BUSY_TIMEOUT_MS
+        assert self.pragma(manager, "cache_size") == -settings.SQLITE_CACHE_SIZE_KB
+        assert self.pragma(manager, "synchronous") == {"OFF": 0, "NORMAL": 1, "FULL": 2, "EXTRA": 3}[
+            settings.SQLITE_SYNCHRONOUS.upper()]
+        assert self.pragma(manager, "temp_store") == 2  # MEMORY
+
+    def test_reader_not_blocked_by_open_write(self, scratch):
+        """WAL: another thread reads the last committed state while a write transaction is open"""
+        writer = scratch.get()
+        writer.execute("INSERT INTO t VALUES (1)")
+        assert writer.in_transaction
+
+        assert on_thread(lambda: count_rows(scratch)) == 0
+        writer.rollback()
+
+
+class TestGetConnection:
+
+    def test_uncommitted_work_rolled_back(self, scratch):
+        with get_connection() as (conn, cursor):
+            cursor.execute("INSERT INTO t VALUES (1)")
+
+        assert not scratch.get().in_transaction
+        assert count_rows(scratch) == 0
+
+    def test_rolled_back_on_error(self, scratch):
+        with pytest.raises(RuntimeError):
+            with get_connection() as (conn, cursor):
+                cursor.execute("INSERT INTO t VALUES (1)")
+                raise RuntimeError("failed mid-transaction")
+
+        assert not scratch.get().in_transaction
+        assert count_rows(scratch) == 0
+
+    def test_committed_work_kept(self, scratch):
+        with get_connection() as (conn, cursor):
+            cursor.execute("INSERT INTO t VALUES (1)")
+            conn.commit()
+
+        assert count_rows(scratch) == 1
+
+    def test_connection_outlives_the_block(self, scratch):
+        with get_connection() as (first, cursor):
+            pass
+        with get_connection() as (second, cursor):
+            pass
+
+        assert first is second is scratch.get()
@@ -0,0 +1,338 @@
+"""
+Tests for the tiered vendor cache: negative caching, stale-while-revalidate and write ordering
+"""
+from datetime import datetime, timedelta
+
+import pytest
+import requests
+
+from app.services import gsp
+from app.services import vendor_cache as vendor_cache_module
+from app.services.cache import CacheService
+from app.services.gsp import SandboxGSPProvider
+from app.services.vendor_cache import VendorCache
+
+GSTIN = "27AABCU9603R1ZM"
+OTHER = "29AAACS1234A1Z5"
+
+
+class FakeCacheService:
+    """The vendor slice of CacheService over dicts, recording the TTL of every negative entry"""
+
+    VENDOR_DATA_TTL = CacheService.VENDOR_DATA_TTL
+    VENDOR_STALE_TTL = CacheService.VENDOR_STALE_TTL
+    VENDOR_NOT_FOUND_TTL = CacheService.VENDOR_NOT_FOUND_TTL
+    VENDOR_ERROR_TTL = CacheService.VENDOR_ERROR_TTL
+
+    def __init__(self):
+        self.enabled = True
+        self.vendors = {}
+        self.misses = {}
+        self.vendor_writes = 0
+
+    def get_vendor_entries(self, gstins):
+        return ({g: self.vendors[g] for g in gstins if g in self.vendors},
+                {g: self.misses[g][0] for g in gstins if g in self.misses})
+
+    def set_vendor_data(self, gstin, data):
+        self.vendors[gstin] = data
+        self.vendor_writes += 1
+        return True
+
+    def set_vendor_data_many(self, vendors):
+        for gstin, data in vendors.items():
+            self.set_vendor_data(gstin, data)
+        return True
+
+    def set_vendor_miss(self, gstin, reason, ttl):
+        self.misses[gstin] = ({"reason": reason}, ttl)
+        return True
+
+    def invalidate_vendor(self, gstin):
+        self.vendors.pop(gstin, None)
+        return True
+
+    def invalidate_vendors(self, gstins):
+        for gstin in gstins:
+            self.vendors.pop(gstin, None)
+            self.misses.pop(gstin, None)
+        return len(gstins)
+
+
+class FakeVendorCrud:
+    def __init__(self):
+        self.rows = {}
+        self.saves = 0
+
+    def get_cached_vendor(self, gstin, max_age_hours=24):
+        return self.rows.get(gstin)
+
+    def get_cached_vendors(self, gstins, max_age_hours=24):
+        return {g: self.rows[g] for g in gstins if g in self.rows}
+
+    def save_vendor(self, vendor_data):
+        self.rows[vendor_data["gstin"]] = vendor_data
+        self.saves += 1
+
+    def save_vendors(self, vendors):
+        for vendor_data in vendors:
+            self.save_vendor(vendor_data)
+
+
+class Clock:
+    """Stands in for the time module in vendor_cache (LRU entry expiry)"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+class Response:
+    def __init__(self, status_code, payload=None):
+        self.status_code = status_code
+        self.payload = payload
+        self.text = str(payload)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f"HTTP {self.status_code}", response=self)
+
+    def json(self):
+        return self.payload
+
+
+class GSPSession:
+    """GSTIN search endpoint stand-in: answers from a queue, counts calls"""
+
+    def __init__(self):
+        self.responses = []
+        self.calls = 0
+
+    def post(self, url, json=None, headers=None, timeout=None):
+        self.calls += 1
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+class DeferredExecutor:
+    """Revalidation executor that runs submitted jobs only when the test says so"""
+
+    def __init__(self):
+        self.jobs = []
+
+    def submit(self, func, *args):
+        self.jobs.append((func, args))
+
+    def run_all(self):
+        jobs, self.jobs = self.jobs, []
+        for func, args in jobs:
+            func(*args)
+
+
+def vendor(gstin=GSTIN, age=timedelta(0), name="ACME"):
+    return {"gstin": gstin, "legal_name": name, "gst_status": "Active", "filing_history": [],
+            "last_updated": (datetime.now() - age).isoformat(), "source": "GSP_LIVE"}
+
+
+def found(name="ACME LIVE"):
+    return Response(200, {"data": {"data": {"lgnm": name, "sts": "Active"}}})
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    fake = FakeCacheService()
+    monkeypatch.setattr(vendor_cache_module, "cache", fake)
+    return fake
+
+
+@pytest.fixture
+def db(monkeypatch):
+    fake = FakeVendorCrud()
+    monkeypatch.setattr(vendor_cache_module, "vendor_crud", fake)
+    return fake
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(vendor_cache_module, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def vcache(redis, db, clock, monkeypatch):
+    """A fresh VendorCache over the fakes, also used by the GSP provider"""
+    instance = VendorCache()
+    monkeypatch.setattr(gsp, "vendor_cache", instance)
+    return instance
+
+
+@pytest.fixture
+def executor(monkeypatch):
+    executor = DeferredExecutor()
+    monkeypatch.setattr(gsp, "get_revalidate_executor", lambda: executor)
+    return executor
+
+
+@pytest.fixture
+def provider(vcache, executor, monkeypatch):
+    provider = SandboxGSPProvider("client", "secret")
+    provider.session = GSPSession()
+    monkeypatch.setattr(provider, "_get_access_token", lambda: "token")
+    monkeypatch.setattr(provider, "get_filing_history", lambda gstin, months=3: [])
+    return provider
+
+
+class TestNegativeCaching:
+
+    @pytest.mark.parametrize("response, reason, not_found", [
+        (Response(404), "HTTP_404", True),
+        (Response(422), "HTTP_422", True),
+        (Response(200, {"data": {}}), "NOT_FOUND", True),
+        (Response(403), "PERMISSION_DENIED", False),
+        (Response(503), "UPSTREAM_ERROR", False),
+        (requests.exceptions.Timeout("slow"), "TIMEOUT", False),
+    ])
+    def test_failure_ttl(self, provider, redis, response, reason, not_found):
+        provider.session.responses.append(response)
+
+        assert provider.get_vendor_data(GSTIN) is None
+
+        ttl = CacheService.VENDOR_NOT_FOUND_TTL if not_found else CacheService.VENDOR_ERROR_TTL
+        assert redis.misses[GSTIN] == ({"reason": reason}, ttl)
+
+    def test_negative_hit_skips_the_gsp(self, provider, vcache):
+        provider.session.responses.append(Response(404))
+        provider.get_vendor_data(GSTIN)
+
+        assert provider.get_vendor_data(GSTIN) is None
+        assert provider.session.calls == 1
+        assert vcache.lookup(GSTIN) == (None, VendorCache.NEGATIVE)
+
+    def test_memory_tier_expiry(self, vcache, clock):
+        """Not-found entries outlive upstream errors in the memory tier too"""
+        vcache.set_negative(GSTIN, "HTTP_404", not_found=True)
+        vcache.set_negative(OTHER, "TIMEOUT")
+
+        clock.now += CacheService.VENDOR_ERROR_TTL + 1
+        assert vcache.lookup_local(GSTIN) == (None, VendorCache.NEGATIVE)
+        assert vcache.lookup_local(OTHER) is None
+        clock.now += CacheService.VENDOR_NOT_FOUND_TTL - CacheService.VENDOR_ERROR_TTL
+        assert vcache.lookup_local(GSTIN) is None
+
+    def test_negative_entry_from_redis(self, vcache, redis, db):
+        """Another process's failed lookup is honoured and copied to the memory tier"""
+        redis.misses[GSTIN] = ({"reason": "HTTP_404"}, CacheService.VENDOR_NOT_FOUND_TTL)
+        db.rows[GSTIN] = vendor()
+
+        assert vcache.lookup(GSTIN) == (None, VendorCache.NEGATIVE)
+        assert vcache.lookup_local(GSTIN) == (None, VendorCache.NEGATIVE)
+
+    def test_success_clears_negative_entry(self, provider, vcache):
+        provider.session.responses.append(Response(503))
+        provider.get_vendor_data(GSTIN)
+
+        vcache.set(vendor(name="RECOVERED"))
+
+        data, status = vcache.lookup(GSTIN)
+        assert status == VendorCache.FRESH and data["legal_name"] == "RECOVERED"
+
+
+class TestStaleWhileRevalidate:
+
+    @pytest.fixture
+    def stale(self, redis):
+        redis.vendors[GSTIN] = vendor(age=timedelta(days=2), name="OLD")
+        return redis.vendors[GSTIN]
+
+    def test_stale_entry_served_and_refreshed(self, provider, vcache, executor, stale):
+        provider.session.responses.append(found("NEW"))
+
+        served = provider.get_vendor_data(GSTIN)
+
+        assert served["legal_name"] == "OLD"
+        assert served["data_source"] == VendorCache.STALE
+        assert provider.session.calls == 0
+        assert len(executor.jobs) == 1
+
+        executor.run_all()
+
+        data, status = vcache.lookup(GSTIN)
+        assert status == VendorCache.FRESH
+        assert data["trade_name"] == "NEW"
+        assert vcache.freshness_stats()["revalidating"] == 0
+
+    def test_one_refresh_in_flight_per_gstin(self, provider, executor, stale):
+        provider.get_vendor_data(GSTIN)
+        provider.get_vendor_data(GSTIN)
+        provider.get_vendor_data_many([GSTIN, GSTIN])
+
+        assert len(executor.jobs) == 1
+
+    def test_claim_released_after_failed_refresh(self, provider, vcache, executor, stale):
+        """A failed refresh is negatively cached, so it is not retried on every hit"""
+        provider.session.responses.append(Response(503))
+        provider.get_vendor_data(GSTIN)
+        executor.run_all()
+
+        assert vcache.freshness_stats()["revalidating"] == 0
+        assert vcache.begin_revalidation(GSTIN) is False
+
+    def test_stale_copy_is_not_written_back(self, vcache, redis, db, stale):
+        data, status = vcache.lookup(GSTIN)
+        assert status == VendorCache.STALE
+        writes = redis.vendor_writes
+
+        vcache.set(VendorCache.mark_stale(data))
+        vcache.set_many([VendorCache.mark_stale(data)])
+
+        assert redis.vendor_writes == writes
+        assert db.saves == 0
+
+    def test_status_from_last_updated(self, vcache):
+        assert vcache._status(vendor(age=timedelta(hours=23))) == VendorCache.FRESH
+        assert vcache._status(vendor(age=timedelta(hours=25))) == VendorCache.STALE
+        assert vcache._status({"gstin": GSTIN}) == VendorCache.FRESH
+        aware = {"last_updated": (datetime.now() - timedelta(days=3)).astimezone().isoformat()}
+        assert vcache._status(aware) == VendorCache.STALE
+
+
+class TestWriteOrdering:
+    """Writes of a version the memory tier already has, or has a newer one of, are skipped"""
+
+    def test_set_skips_same_and_older_versions(self, vcache, redis, db):
+        newer = vendor(name="NEWER")
+        older = vendor(name="OLDER", age=timedelta(minutes=5))
+
+        vcache.set(newer)
+        vcache.set(dict(newer))
+        vcache.set(older)
+
+        assert redis.vendor_writes == 1 and db.saves == 1
+        assert vcache.get(GSTIN)["legal_name"] == "NEWER"
+
+    def test_set_writes_newer_version(self, vcache, redis):
+        vcache.set(vendor(name="FIRST", age=timedelta(minutes=5)))
+        vcache.set(vendor(name="SECOND"))
+
+        assert redis.vendor_writes == 2
+        assert redis.vendors[GSTIN]["legal_name"] == "SECOND"
+
+    def test_set_many(self, vcache, redis, db):
+        vcache.set(vendor(name="CURRENT"))
+
+        vcache.set_many([vendor(name="OUTDATED", age=timedelta(hours=1)), vendor(OTHER, name="OTHER"), None])
+
+        assert redis.vendors[GSTIN]["legal_name"] == "CURRENT"
+        assert redis.vendors[OTHER]["legal_name"] == "OTHER"
+        assert db.saves == 2
+
+    def test_unparsable_last_updated_is_written(self, vcache, redis):
+        vcache.set(vendor(name="FIRST"))
+        vcache.set({**vendor(name="SECOND"), "last_updated": "yesterday"})
+
+        assert redis.vendors[GSTIN]["legal_name"] == "SECOND"
@@ -0,0 +1,52 @@
+"""
+Tests for vendor cache rows in the database
+"""
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.db.crud import vendor as vendor_crud
+from app.db.session import get_connection, ph
+
+
+def vendors(count, start=0):
+    return [{"gstin": f"27AAACS{i:04d}A1Z5", "legal_name": f"VENDOR {i}", "gst_status": "Active"}
+            for i in range(start, start + count)]
+
+
+@pytest.fixture
+def old_sqlite_variable_limit(test_db):
+    """This thread's connection limited to 999 bound variables, like SQLite builds before 3.32"""
+    with get_connection() as (conn, cursor):
+        previous = conn.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 999)
+    yield
+    with get_connection() as (conn, cursor):
+        conn.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, previous)
+
+
+class TestGetCachedVendors:
+
+    def test_more_gstins_than_one_query_takes(self, old_sqlite_variable_limit):
+        """2,500 GSTINs plus duplicates and unknowns"""
+        vendor_crud.save_vendors(vendors(2500))
+        gstins = [vendor["gstin"] for vendor in vendors(2500)]
+
+        cached = vendor_crud.get_cached_vendors(gstins + gstins[:10] + ["29AAACS9999A1Z5"])
+
+        assert len(cached) == 2500
+        assert cached["27AAACS1234A1Z5"]["legal_name"] == "VENDOR 1234"
+
+    def test_stale_entries_are_left_out(self, test_db):
+        vendor_crud.save_vendors(vendors(2))
+        with get_connection() as (conn, cursor):
+            cursor.execute(f"UPDATE vendors SET last_synced_at = {ph()} WHERE gstin = {ph()}",
+                           ((datetime.now() - timedelta(hours=30)).isoformat(), "27AAACS0001A1Z5"))
+            conn.commit()
+
+        cached = vendor_crud.get_cached_vendors(["27AAACS0000A1Z5", "27AAACS0001A1Z5"], max_age_hours=24)
+
+        assert list(cached) == ["27AAACS0000A1Z5"]
+
+    def test_no_gstins(self, test_db):
+        assert vendor_crud.get_cached_vendors([]) == {}
@@ -48,6 +48,16 @@ export default function BatchPage() {
             }
 
             setResult(data);
+
+            // Vendors are checked in the background - poll until the job finishes
+            let status = data;
+            while (status.status !== "COMPLETED" && status.status !== "FAILED") {
+                await new Promise((resolve) => setTimeout(resolve, 3000));
+                const statusResponse = await fetch(`${API_URL}/api/v1/batch/status/${data.job_id}`);
+                if (!statusResponse.ok) break;
+                status = await statusResponse.json();
+                setResult({ ...status, parse_errors: data.parse_errors });
+            }
         } catch (err) {
             setError(err.message || "Failed to upload batch");
             console.error(err);
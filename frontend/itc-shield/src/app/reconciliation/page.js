@@ -1,5 +1,5 @@
 "use client";
-import { useState } from "react";
+import { useEffect, useState } from "react";
 import AppLayout from "@/components/layout/AppLayout";
 import Card, { CardHeader, CardTitle, CardContent } from "@/components/ui/Card";
 import Button from "@/components/ui/Button";
@@ -25,6 +25,61 @@ export default function ReconciliationPage() {
     const [loading, setLoading] = useState(false);
     const [results, setResults] = useState(null);
     const [activeTab, setActiveTab] = useState("mismatch"); // Default to mismatch as it needs action
+    const [rows, setRows] = useState([]);
+    const [nextCursor, setNextCursor] = useState(null);
+    const [rowsLoading, setRowsLoading] = useState(false);
+
+    // Results are stored server-side; fetch them a page at a time per tab
+    const fetchRows = async (cursor = null) => {
+        const token = session?.access_token;
+        if (!results?.run_id || !token) return;
+
+        setRowsLoading(true);
+        try {
+            const params = { page_size: 100 };
+            if (cursor) params.cursor = cursor;
+            const { data } = await api.get(`/reconcile/runs/${results.run_id}/results/${activeTab}`, {
+                params,
+                ...getAuthConfig(token)
+            });
+            setRows((prev) => (cursor ? [...prev, ...data.items] : data.items));
+            setNextCursor(data.next_cursor);
+        } catch (error) {
+            console.error("Error fetching reconciliation results:", error);
+            toast.error("Failed to load results");
+        } finally {
+            setRowsLoading(false);
+        }
+    };
+
+    useEffect(() => {
+        setRows([]);
+        setNextCursor(null);
+        fetchRows();
+        // eslint-disable-next-line react-hooks/exhaustive-deps
+    }, [results?.run_id, activeTab]);
+
+    const handleExport = async () => {
+        const token = session?.access_token;
+        if (!results?.run_id || !token) return;
+
+        try {
+            const { data } = await api.get(`/reconcile/runs/${results.run_id}/export`, {
+                params: { format: "csv" },
+                responseType: "blob",
+                ...getAuthConfig(token)
+            });
+            const url = window.URL.createObjectURL(data);
+            const link = document.createElement("a");
+            link.href = url;
+            link.download = `reconciliation-${results.period}.csv`;
+            link.click();
+            window.URL.revokeObjectURL(url);
+        } catch (error) {
+            console.error("Export error:", error);
+            toast.error("Failed to export results");
+        }
+    };
 
     const handleFileChange = (e) => {
         if (e.target.files[0]) {
@@ -86,6 +141,7 @@ export default function ReconciliationPage() {
     const tabs = [
         { id: "matched", label: "Matched", icon: CheckCircle, count: results?.summary?.matched || 0, color: "text-green-600" },
         { id: "mismatch", label: "Mismatch", icon: AlertTriangle, count: results?.summary?.mismatch || 0, color: "text-yellow-600" },
+        { id: "probable_match", label: "Probable Match", icon: HelpCircle, count: results?.summary?.probable_match || 0, color: "text-purple-600" },
         { id: "missing_in_2b", label: "Missing in 2B", icon: XCircle, count: results?.summary?.missing_in_2b || 0, color: "text-red-600" },
         { id: "missing_in_pr", label: "Missing in PR", icon: HelpCircle, count: results?.summary?.missing_in_pr || 0, color: "text-blue-600" },
     ];
@@ -174,16 +230,13 @@ export default function ReconciliationPage() {
                             <div className="bg-white p-4 rounded-lg shadow border border-gray-200">
                                 <p className="text-sm text-gray-500">Matched Amount</p>
                                 <p className="text-2xl font-bold text-green-600">
-                                    {formatCurrency(results.results.matched.reduce((acc, item) => acc + item.pr_amount, 0))}
+                                    {formatCurrency(results.summary.matched_amount || 0)}
                                 </p>
                             </div>
                             <div className="bg-white p-4 rounded-lg shadow border border-gray-200">
                                 <p className="text-sm text-gray-500">Disputed Amount</p>
                                 <p className="text-2xl font-bold text-red-600">
-                                    {formatCurrency(
-                                        results.results.missing_in_2b.reduce((acc, item) => acc + item.pr_amount, 0) +
-                                        results.results.mismatch.reduce((acc, item) => acc + Math.abs(item.difference), 0)
-                                    )}
+                                    {formatCurrency(results.summary.disputed_amount || 0)}
                                 </p>
                             </div>
                         </div>
@@ -235,14 +288,14 @@ export default function ReconciliationPage() {
                                             </tr>
                                         </thead>
                                         <tbody className="bg-white divide-y divide-gray-200">
-                                            {results.results[activeTab].length === 0 ? (
+                                            {rows.length === 0 ? (
                                                 <tr>
                                                     <td colSpan="8" className="px-6 py-12 text-center text-gray-500">
-                                                        <p className="text-sm">No records found in this category.</p>
+                                                        <p className="text-sm">{rowsLoading ? "Loading..." : "No records found in this category."}</p>
                                                     </td>
                                                 </tr>
                                             ) : (
-                                                results.results[activeTab].map((item, idx) => (
+                                                rows.map((item, idx) => (
                                                     <tr key={idx} className="hover:bg-gray-50">
                                                         <td className="px-6 py-4 whitespace-nowrap text-sm font-medium text-gray-900">{item.gstin}</td>
                                                         <td className="px-6 py-4 whitespace-nowrap text-sm text-gray-500">{item.vendor_name || "-"}</td>
@@ -257,6 +310,7 @@ export default function ReconciliationPage() {
                                                             <Badge variant={
                                                                 item.status === "MATCHED" ? "success" :
                                                                     item.status === "MISMATCH" ? "warning" :
+                                                                        item.status === "PROBABLE_MATCH" ? "info" :
                                                                         "danger"
                                                             }>
                                                                 {item.message}
@@ -268,6 +322,17 @@ export default function ReconciliationPage() {
                                         </tbody>
                                     </table>
                                 </div>
+                                <div className="flex justify-between items-center pt-4">
+                                    <Button variant="secondary" onClick={handleExport}>
+                                        <Download className="w-4 h-4 mr-2" />
+                                        Export CSV
+                                    </Button>
+                                    {nextCursor && (
+                                        <Button variant="secondary" onClick={() => fetchRows(nextCursor)} disabled={rowsLoading}>
+                                            {rowsLoading ? "Loading..." : "Load more"}
+                                        </Button>
+                                    )}
+                                </div>
                             </div>
                         </div>
                     </div>
@@ -46,9 +46,9 @@ export default function BatchUpload({ onUploadSuccess }) {
             return;
         }
 
-        // Validate file size (5MB max)
-        if (file.size > 5 * 1024 * 1024) {
-            toast.error("File size must be less than 5MB");
+        // Validate file size (50MB max)
+        if (file.size > 50 * 1024 * 1024) {
+            toast.error("File size must be less than 50MB");
             return;
         }
 
@@ -156,7 +156,7 @@ export default function BatchUpload({ onUploadSuccess }) {
                             <FileText className="w-4 h-4 mt-0.5 text-blue-600 flex-shrink-0" />
                             <div>
                                 <p className="font-medium text-gray-900">Limits</p>
-                                <p>Maximum 500 vendors per batch, file size up to 5MB</p>
+                                <p>Maximum 10,000 vendors per batch, file size up to 50MB</p>
                             </div>
                         </div>
                         <div className="flex items-start gap-2">